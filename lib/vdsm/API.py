@@ -29,10 +29,12 @@ import logging
 import six
 
 from vdsm.network.api import confirm_connectivity
+from vdsm.network.api import network_stats
 from vdsm.network.errors import ConfigNetworkError
 
 from vdsm import utils
 from vdsm import constants
+from vdsm import executor
 from vdsm import throttledlog
 from vdsm import jobs
 from vdsm import v2v
@@ -51,12 +53,18 @@ from vdsm.common.commands import terminating
 from vdsm.common.compat import subprocess
 from vdsm.host import api as hostapi
 from vdsm.host import caps
+from vdsm.profiling import sampling as sampling_profile
+from vdsm.profiling.errors import UsageError
 # TODO fix name conflict and use from vdsm.storage import sd
 import vdsm.storage.sd
 from vdsm.storage import clusterlock
+from vdsm.storage import mailbox
 from vdsm.storage import managedvolume
+from vdsm.storage import resourceManager as rm
 from vdsm.storage import constants as sc
+from vdsm.virt import drivemonitor
 from vdsm.virt import migration
+from vdsm.virt import periodic
 from vdsm.virt import secret
 from vdsm.common.compat import pickle
 from vdsm.common.define import doneCode, errCode
@@ -1645,7 +1653,81 @@ class Global(APIBase):
         """
         Report host network statistics.
         """
-        return response.success(info=supervdsm.getProxy().network_stats())
+        return response.success(info=network_stats())
+
+    def getResourceManagerStats(self):
+        """
+        Report storage resource manager lock statistics.
+        """
+        return response.success(info=rm.stats())
+
+    def getDomainXMLStats(self):
+        """
+        Report domain XML cache and metadata write statistics per VM.
+        """
+        info = {vm_id: v.domain_xml_stats()
+                for vm_id, v in self._cif.getVMs().items()}
+        return response.success(info=info)
+
+    def getVolumeExtensionStats(self):
+        """
+        Report thin volume extension statistics.
+        """
+        info = mailbox.stats()
+        info.update(drivemonitor.stats())
+        return response.success(info=info)
+
+    def getPeriodicStats(self):
+        """
+        Report per-VM periodic operations and guest agent polling statistics.
+        """
+        info = periodic.stats()
+        info.update(self._cif.qga_poller.stats())
+        return response.success(info=info)
+
+    def getExecutorStats(self):
+        """
+        Report executors state and statistics.
+        """
+        return response.success(info=executor.stats())
+
+    def getHookStats(self):
+        """
+        Report hook scripts execution time.
+        """
+        return response.success(info=hooks.stats())
+
+    def getSchedulerStats(self):
+        """
+        Report scheduler statistics.
+        """
+        return response.success(info=self._cif.scheduler.stats())
+
+    def startSamplingProfiler(self, rate=0):
+        """
+        Start the sampling profiler.
+        """
+        try:
+            sampling_profile.start(rate=rate or None)
+        except UsageError as e:
+            return response.error('unexpected', str(e))
+        return response.success()
+
+    def stopSamplingProfiler(self):
+        """
+        Stop the sampling profiler.
+        """
+        try:
+            sampling_profile.stop()
+        except UsageError as e:
+            return response.error('unexpected', str(e))
+        return response.success()
+
+    def getSamplingProfile(self, clear=False):
+        """
+        Report the profile recorded by the sampling profiler.
+        """
+        return response.success(info=sampling_profile.dump(clear=clear))
 
     @api.logged(on="api.host")
     @api.method
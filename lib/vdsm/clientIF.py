@@ -58,6 +58,7 @@ from vdsm import alignmentScan
 from vdsm import numa
 from vdsm.common import concurrent
 from vdsm.common import function
+from vdsm.common import hostdev
 from vdsm.common import libvirtconnection
 from vdsm.common import response
 from vdsm.common import supervdsm
@@ -71,6 +72,15 @@ try:
 except ImportError:
     _glusterEnabled = False
 
+# libvirt events that may change the domain XML.
+_DOMAIN_XML_EVENTS = frozenset([
+    libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+    libvirt.VIR_DOMAIN_EVENT_ID_RTC_CHANGE,
+    libvirt.VIR_DOMAIN_EVENT_ID_JOB_COMPLETED,
+    libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED,
+    libvirt.VIR_DOMAIN_EVENT_ID_BLOCK_JOB_2,
+])
+
 
 class clientIF(object):
     """
@@ -131,6 +141,7 @@ class clientIF(object):
                 config.getint('vars', 'guest_agent_timeout'))
             self.channelListener.start()
             self.qga_poller.start()
+            hostdev.start_monitoring()
             self.threadLocal = threading.local()
             self.threadLocal.client = ''
 
@@ -147,6 +158,9 @@ class clientIF(object):
                 else:
                     raise
 
+            # Must be added before the http server, detecting any GET
+            # request.
+            self._prepareMetricsEndpoint()
             self._prepareHttpServer()
             self._prepareJSONRPCServer()
             self._connectToBroker()
@@ -194,6 +208,10 @@ class clientIF(object):
     def ready(self):
         return (self.irs is None or self.irs.ready) and not self._recovery
 
+    @property
+    def scheduler(self):
+        return self._scheduler
+
     def notify(self, event_id, params=None):
         """
         Send notification using provided subscription id as
@@ -297,6 +315,11 @@ class clientIF(object):
                     self
                 )
 
+    def _prepareMetricsEndpoint(self):
+        if config.getboolean('metrics', 'prometheus_enabled'):
+            from vdsm.metrics.endpoint import MetricsDetector
+            self._acceptor.add_detector(MetricsDetector())
+
     def _prepareHttpServer(self):
         if config.getboolean('vars', 'http_enable'):
             try:
@@ -387,6 +410,13 @@ class clientIF(object):
                 binding.stop()
             self._reactor.stop()
 
+            for v in self.getVMs().values():
+                try:
+                    v.flush_metadata()
+                except Exception as e:
+                    self.log.warning("Cannot write metadata for VM %s: %s",
+                                     v.id, e)
+
             self._enabled = False
             secret.clear()
             self.channelListener.stop()
@@ -566,11 +596,15 @@ class clientIF(object):
         return {'status': doneCode, 'alignment': aligning}
 
     def createVm(self, vmParams, vmRecover=False):
+        if vmRecover:
+            # Recovered VMs are not known to the API yet, so creating them,
+            # which is expensive, can run concurrently during recovery.
+            vm = Vm(self, vmParams, vmRecover)
         with self.vm_start_stop_lock:
             if not vmRecover:
                 if vmParams['vmId'] in self.vmContainer:
                     return errCode['exist']
-            vm = Vm(self, vmParams, vmRecover)
+                vm = Vm(self, vmParams, vmRecover)
             ret = vm.run()
             if not response.is_error(ret):
                 with self.vm_container_lock:
@@ -603,9 +637,10 @@ class clientIF(object):
         function.retry(self._recoverExistingVms, sleep=5)
 
     def _recoverExistingVms(self):
-        start_time = vdsm.common.time.monotonic_time()
+        clock = vdsm.common.time.Clock()
         try:
             self.log.debug('recovery: started')
+            clock.start("total")
 
             # Starting up libvirt might take long when host under high load,
             # we prefer running this code in external thread to avoid blocking
@@ -614,10 +649,12 @@ class clientIF(object):
                       numa.cpu_topology().cores)
             migration.SourceThread.ongoingMigrations.bound = mog
 
-            recovery.all_domains(self)
+            with clock.run("domains"):
+                recovery.all_domains(self)
 
             # recover stage 3: waiting for domains to go up
-            self._waitForDomainsUp()
+            with clock.run("domains_up"):
+                self._waitForDomainsUp()
 
             self._recovery = False
 
@@ -625,12 +662,14 @@ class clientIF(object):
             # and then prepare all volumes.
             # Actually, we need it just to get the resources for future
             # volumes manipulations
-            self._waitForStoragePool()
+            with clock.run("storage_pool"):
+                self._waitForStoragePool()
 
-            self._preparePathsForRecoveredVMs()
+            with clock.run("paths"):
+                self._preparePathsForRecoveredVMs()
 
-            self.log.info('recovery: completed in %is',
-                          vdsm.common.time.monotonic_time() - start_time)
+            clock.stop("total")
+            self.log.info('recovery: completed: %s', clock)
 
         except:
             self.log.exception("recovery: failed")
@@ -664,6 +703,9 @@ class clientIF(object):
             # in libvirt.
             # pylint: disable=unbalanced-tuple-unpacking
 
+            if eventid in _DOMAIN_XML_EVENTS:
+                v.invalidate_domain_xml()
+
             if eventid == libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE:
                 event, detail = args[:-1]
                 v.onLibvirtLifecycleEvent(event, detail, None)
@@ -729,7 +771,11 @@ class clientIF(object):
     def _preparePathsForRecoveredVMs(self):
         vm_objects = list(self.getVMs().values())
         num_vm_objects = len(vm_objects)
-        for idx, vm_obj in enumerate(vm_objects):
+        if not num_vm_objects:
+            return
+
+        def prepare(item):
+            idx, vm_obj = item
             # Let's recover as much VMs as possible
             try:
                 # Do not prepare volumes when system goes down
@@ -743,6 +789,16 @@ class clientIF(object):
                     "recovery [%d/%d]: failed for vm %s",
                     idx + 1, num_vm_objects, vm_obj.id)
 
+        max_workers = min(num_vm_objects,
+                          config.getint('vars', 'recovery_workers'))
+        results = list(concurrent.tmap(prepare, enumerate(vm_objects),
+                                       max_workers=max_workers,
+                                       name="recovery"))
+        # prepare() handles all errors, but do not hide a bug.
+        for res in results:
+            if not res.succeeded:
+                raise res.value
+
     def _prepare_network_drive(self, drive, res):
         """
         Fills drive object for network drives with network-specific data.
@@ -0,0 +1,109 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Cheap fixed-bucket histograms for timing hot paths.
+
+Observing a value costs one bisect and a few integer updates under a lock,
+so histograms can be updated on every lock acquisition or task dispatch.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import bisect
+import threading
+
+# Upper bounds in seconds, from 100 microseconds to 1 minute.
+TIME_BUCKETS = (
+    0.0001, 0.0005,
+    0.001, 0.005,
+    0.01, 0.05,
+    0.1, 0.5,
+    1.0, 5.0,
+    10.0, 60.0,
+)
+
+
+class Histogram(object):
+    """
+    Count observed values in buckets with fixed upper bounds.
+
+    Values larger than the last bound are counted in the implicit "+Inf"
+    bucket.
+    """
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        if list(buckets) != sorted(set(buckets)):
+            raise ValueError("Invalid buckets {}".format(buckets))
+        self._bounds = tuple(buckets)
+        self._lock = threading.Lock()
+        self.clear()
+
+    @property
+    def bounds(self):
+        return self._bounds
+
+    def observe(self, value):
+        i = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def clear(self):
+        with self._lock:
+            self._counts = [0] * (len(self._bounds) + 1)
+            self._count = 0
+            self._sum = 0.0
+            self._max = 0.0
+
+    def info(self):
+        """
+        Return a dict with cumulative bucket counts keyed by the bucket upper
+        bound, like Prometheus histograms:
+
+            {
+                "count": 3,
+                "sum": 0.0123,
+                "max": 0.01,
+                "buckets": {"0.0001": 0, ..., "0.01": 3, "+Inf": 3},
+            }
+        """
+        with self._lock:
+            counts = list(self._counts)
+            count = self._count
+            total = self._sum
+            maximum = self._max
+
+        buckets = {}
+        cumulative = 0
+        for bound, n in zip(self._bounds, counts):
+            cumulative += n
+            buckets[repr(bound)] = cumulative
+        buckets["+Inf"] = count
+
+        return {
+            "count": count,
+            "sum": total,
+            "max": maximum,
+            "buckets": buckets,
+        }
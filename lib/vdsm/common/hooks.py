@@ -22,6 +22,7 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
 
+import errno
 import glob
 import hashlib
 import itertools
@@ -33,12 +34,17 @@ import pkgutil
 import subprocess
 import sys
 import tempfile
+import threading
 
 import six
 
 from vdsm.common import commands
 from vdsm.common import exception
+from vdsm.common import inotify
+from vdsm.common import time
+from vdsm.common.cache import memoized
 from vdsm.common.constants import P_VDSM_HOOKS, P_VDSM_RUN
+from vdsm.common.histogram import Histogram
 
 _LAUNCH_FLAGS_FILE = 'launchflags'
 _LAUNCH_FLAGS_PATH = os.path.join(
@@ -48,7 +54,18 @@ _LAUNCH_FLAGS_PATH = os.path.join(
 )
 
 
-def _scriptsPerDir(dir_name):
+# Changes in the hooks root or in a hook directory that may change the
+# scripts of a hook directory.
+_WATCH_EVENTS = (inotify.IN_ATTRIB | inotify.IN_CREATE | inotify.IN_DELETE |
+                 inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO |
+                 inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF |
+                 inotify.IN_ONLYDIR)
+
+# Execution time per hook script, keyed by "hook_dir/script".
+_execution_time = {}
+
+
+def _validateHookDir(dir_name):
     if os.path.isabs(dir_name):
         raise ValueError("Cannot use absolute path as hook directory")
     head = dir_name
@@ -56,10 +73,116 @@ def _scriptsPerDir(dir_name):
         head, tail = os.path.split(head)
         if tail == "..":
             raise ValueError("Hook directory paths cannot contain '..'")
+
+
+def _scriptsPerDir(dir_name):
+    _validateHookDir(dir_name)
     path = os.path.join(P_VDSM_HOOKS, dir_name, '*')
     return [s for s in glob.glob(path)
             if os.path.isfile(s) and os.access(s, os.X_OK)]
 
+
+class _Registry(object):
+    """
+    Cache the executable scripts of hook directories.
+
+    Some hook points run on every stats poll, while hooks are rarely
+    installed. The scripts of a hook directory are listed once, and listed
+    again only after inotify reported a change in the directory or in the
+    hooks root. If the hooks root cannot be watched, directories are listed
+    on every lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._root = None
+        self._inotify = None
+        self._root_wd = None
+        self._dirs = {}
+        self._scripts = {}
+
+    def scripts(self, dir_name):
+        """
+        Return a sorted tuple of executable scripts in hook directory
+        dir_name.
+        """
+        with self._lock:
+            if not self._watching():
+                return tuple(sorted(_scriptsPerDir(dir_name)))
+            self._process_events()
+            scripts = self._scripts.get(dir_name)
+            if scripts is None:
+                scripts = self._list(dir_name)
+            return scripts
+
+    def _watching(self):
+        # P_VDSM_HOOKS is modified by tests.
+        if self._root != P_VDSM_HOOKS:
+            self._reset()
+            self._root = P_VDSM_HOOKS
+
+        if self._root_wd is None:
+            try:
+                if self._inotify is None:
+                    self._inotify = inotify.Inotify()
+                self._root_wd = self._inotify.add_watch(
+                    self._root, _WATCH_EVENTS)
+            except OSError as e:
+                logging.debug("Cannot watch hooks root %s: %s", self._root, e)
+                return False
+
+        return True
+
+    def _process_events(self):
+        for event in self._inotify.read_events():
+            if event.mask & inotify.IN_Q_OVERFLOW:
+                self._scripts.clear()
+            elif event.wd == self._root_wd:
+                if event.mask & (inotify.IN_DELETE_SELF |
+                                 inotify.IN_MOVE_SELF |
+                                 inotify.IN_IGNORED):
+                    # Start again when the root is available again.
+                    self._reset()
+                    return
+                self._scripts.pop(event.name, None)
+            else:
+                dir_name = self._dirs.get(event.wd)
+                if dir_name is not None:
+                    self._scripts.pop(dir_name, None)
+                    if event.mask & inotify.IN_IGNORED:
+                        del self._dirs[event.wd]
+
+    def _list(self, dir_name):
+        _validateHookDir(dir_name)
+        path = os.path.join(self._root, dir_name)
+        try:
+            # Watch before listing, so changes during listing are reported.
+            wd = self._inotify.add_watch(path, _WATCH_EVENTS)
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                raise
+            # Creating a top level directory is reported by the root watch.
+            cache = dir_name == os.path.basename(dir_name)
+        else:
+            self._dirs[wd] = dir_name
+            cache = True
+
+        scripts = tuple(sorted(_scriptsPerDir(dir_name)))
+        if cache:
+            self._scripts[dir_name] = scripts
+        return scripts
+
+    def _reset(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._root_wd = None
+        self._dirs.clear()
+        self._scripts.clear()
+
+
+_registry = _Registry()
+
 _DOMXML_HOOK = 1
 _JSON_HOOK = 2
 
@@ -69,9 +192,7 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
     if errors is None:
         errors = []
 
-    scripts = _scriptsPerDir(dir)
-    scripts.sort()
-
+    scripts = _registry.scripts(dir)
     if not scripts:
         return data
 
@@ -104,22 +225,25 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
         if vmconf.get('vmId'):
             scriptenv['vmId'] = vmconf.get('vmId')
         ppath = scriptenv.get('PYTHONPATH', '')
-        hook = os.path.dirname(pkgutil.get_loader('vdsm.hook').get_filename())
-        scriptenv['PYTHONPATH'] = ':'.join(ppath.split(':') + [hook])
+        scriptenv['PYTHONPATH'] = ':'.join(ppath.split(':') + [_hookPath()])
         if hookType == _DOMXML_HOOK:
             scriptenv['_hook_domxml'] = data_filename
         elif hookType == _JSON_HOOK:
             scriptenv['_hook_json'] = data_filename
 
         for s in scripts:
+            start = time.monotonic_time()
             p = commands.start([s], stdout=subprocess.PIPE,
                                stderr=subprocess.PIPE, env=scriptenv)
 
             with commands.terminating(p):
                 (out, err) = p.communicate()
 
+            elapsed = time.monotonic_time() - start
+            _observe(dir, s, elapsed)
+
             rc = p.returncode
-            logging.info('%s: rc=%s err=%s', s, rc, err)
+            logging.info('%s: rc=%s err=%s elapsed=%.2f', s, rc, err, elapsed)
             if rc != 0:
                 errors.append(err)
 
@@ -141,6 +265,27 @@ def _runHooksDir(data, dir, vmconf={}, raiseError=True, errors=None, params={},
         return json.loads(final_data)
 
 
+@memoized
+def _hookPath():
+    return os.path.dirname(pkgutil.get_loader('vdsm.hook').get_filename())
+
+
+def _observe(dir_name, script, elapsed):
+    key = dir_name + "/" + os.path.basename(script)
+    hist = _execution_time.get(key)
+    if hist is None:
+        hist = _execution_time.setdefault(key, Histogram())
+    hist.observe(elapsed)
+
+
+def stats():
+    """
+    Return histograms of hook scripts execution time, keyed by
+    "hook_dir/script".
+    """
+    return {key: hist.info() for key, hist in list(_execution_time.items())}
+
+
 def before_device_create(devicexml, vmconf={}, customProperties={}):
     return _runHooksDir(devicexml, 'before_device_create', vmconf=vmconf,
                         params=customProperties)
@@ -471,7 +616,7 @@ def remove_vm_launch_flags_file(vm_id):
 
 def _getHookInfo(dir):
     return dict((os.path.basename(script), _getScriptInfo(script))
-                for script in _scriptsPerDir(dir))
+                for script in _registry.scripts(dir))
 
 
 def installed():
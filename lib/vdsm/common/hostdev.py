@@ -28,6 +28,7 @@ import json
 import logging
 import operator
 import os
+import threading
 import uuid
 import xml.etree.ElementTree as etree
 
@@ -84,6 +85,23 @@ _last_alldevices_hash = None
 _device_tree_cache = {}
 _device_address_to_name_cache = {}
 
+# The device tree cache is kept up to date by libvirt node device events once
+# start_monitoring() was called. The cache is replaced, never modified in
+# place, so readers can use it without locking. Every event bumps the
+# generation; a full refresh racing with an event does not validate the cache
+# and the next reader refreshes it again.
+_device_tree_lock = threading.Lock()
+_device_tree_monitored = False
+_device_tree_valid = False
+_device_tree_generation = 0
+
+# Capabilities nested in other device capabilities (e.g. fc_host in
+# scsi_host). Libvirt is the only one who knows how to filter by them.
+_NESTED_CAPS = frozenset(('fc_host', 'vports'))
+
+# SCSI device parameters taken from its storage and scsi_generic children.
+_SCSI_CHILD_PARAMS = ('vendor', 'product', 'udev_path', 'block_path')
+
 
 class PCIHeaderType:
     ENDPOINT = 0
@@ -568,16 +586,46 @@ def _get_devices_from_libvirt(flags=0):
     """
     Returns all available host devices from libvirt processd to dict
     """
-    libvirt_devices = libvirtconnection.get().listAllDevices(flags)
     global _last_alldevices_hash
     global _device_tree_cache
     global _device_address_to_name_cache
 
-    if (flags == 0 and
-            __device_tree_hash(libvirt_devices) == _last_alldevices_hash):
+    if flags == 0 and _device_tree_valid:
         return _device_tree_cache, _device_address_to_name_cache
 
+    generation = _device_tree_generation
+    libvirt_devices = libvirtconnection.get().listAllDevices(flags)
+
+    if flags == 0:
+        tree_hash = __device_tree_hash(libvirt_devices)
+        if tree_hash == _last_alldevices_hash:
+            with _device_tree_lock:
+                _validate_device_tree(generation)
+            return _device_tree_cache, _device_address_to_name_cache
+
     devices = _process_all_devices(libvirt_devices)
+    address_to_name = _process_device_tree(devices)
+
+    if flags == 0:
+        with _device_tree_lock:
+            _device_tree_cache = devices
+            _device_address_to_name_cache = address_to_name
+            _last_alldevices_hash = tree_hash
+            _validate_device_tree(generation)
+    return devices, address_to_name
+
+
+def _validate_device_tree(generation):
+    global _device_tree_valid
+    _device_tree_valid = (_device_tree_monitored and
+                          generation == _device_tree_generation)
+
+
+def _process_device_tree(devices):
+    """
+    Add SCSI parameters provided by the children of SCSI devices, and return
+    the address to device name mapping of the devices.
+    """
     address_to_name = {}
 
     with _DeviceTreeCache(devices) as cache:
@@ -590,11 +638,113 @@ def _get_devices_from_libvirt(flags=0):
                 address_to_name, device_name, device_params
             )
 
-    if flags == 0:
+    return address_to_name
+
+
+def _update_device_tree(device_name, device_params=None):
+    """
+    Update the cached device tree with added, changed (device_params) or
+    removed (device_params is None) device. If the cache is not valid, it
+    will be rebuilt by the next reader anyway, so there is nothing to do.
+    """
+    global _device_tree_cache
+    global _device_address_to_name_cache
+    global _device_tree_generation
+
+    with _device_tree_lock:
+        _device_tree_generation += 1
+        if not _device_tree_valid:
+            return
+
+        devices = dict(_device_tree_cache)
+        old_params = devices.pop(device_name, None)
+        if device_params is not None:
+            devices[device_name] = device_params
+
+        # The SCSI device parameters depend on its children, so we must
+        # update the parent SCSI device of the changed device too.
+        affected = set()
+        for params in (old_params, device_params):
+            if params is None:
+                continue
+            if params['capability'] == 'scsi':
+                affected.add(device_name)
+            elif params['capability'] in ('storage', 'scsi_generic'):
+                affected.add(params.get('parent'))
+
+        with _DeviceTreeCache(devices) as cache:
+            for name in affected:
+                if name not in devices:
+                    continue
+                params = {k: v for k, v in devices[name].items()
+                          if k not in _SCSI_CHILD_PARAMS}
+                params.update(_process_scsi_device_params(name, cache))
+                devices[name] = params
+
+        address_to_name = {}
+        for name, params in devices.items():
+            _update_address_to_name_map(address_to_name, name, params)
+
         _device_tree_cache = devices
         _device_address_to_name_cache = address_to_name
-        _last_alldevices_hash = __device_tree_hash(libvirt_devices)
-    return devices, address_to_name
+
+
+def _invalidate_device_tree():
+    global _device_tree_valid
+    global _device_tree_generation
+    with _device_tree_lock:
+        _device_tree_generation += 1
+        _device_tree_valid = False
+
+
+def _on_node_device_lifecycle(conn, dev, event, detail, opaque):
+    if event == libvirt.VIR_NODE_DEVICE_EVENT_DELETED:
+        _update_device_tree(dev.name())
+    elif event == libvirt.VIR_NODE_DEVICE_EVENT_CREATED:
+        _node_device_changed(dev)
+
+
+def _on_node_device_update(conn, dev, opaque):
+    _node_device_changed(dev)
+
+
+def _node_device_changed(dev):
+    try:
+        device_name = dev.name()
+        device_params = _process_device_params(dev.XMLDesc())
+    except Exception:
+        # The device may be gone already, or its XML is invalid. Let the next
+        # reader find out from libvirt.
+        logging.exception("Cannot update device tree cache")
+        _invalidate_device_tree()
+    else:
+        _update_device_tree(device_name, device_params)
+
+
+def start_monitoring():
+    """
+    Keep the device tree cache up to date using libvirt node device events,
+    so listing host devices does not need to query libvirt.
+    """
+    global _device_tree_monitored
+    global _device_tree_valid
+    global _device_tree_generation
+    conn = libvirtconnection.get()
+    conn.nodeDeviceEventRegisterAny(
+        None,
+        libvirt.VIR_NODE_DEVICE_EVENT_ID_LIFECYCLE,
+        _on_node_device_lifecycle,
+        None)
+    conn.nodeDeviceEventRegisterAny(
+        None,
+        libvirt.VIR_NODE_DEVICE_EVENT_ID_UPDATE,
+        _on_node_device_update,
+        None)
+    # Events sent before registration were lost, start from a fresh tree.
+    with _device_tree_lock:
+        _device_tree_generation += 1
+        _device_tree_valid = False
+        _device_tree_monitored = True
 
 
 def _update_address_to_name_map(address_to_name, device_name, device_params):
@@ -706,7 +856,11 @@ def list_by_caps(caps=None):
     """
     devices = {}
     flags = sum([_LIBVIRT_DEVICE_FLAGS[cap] for cap in caps or []])
-    libvirt_devices, _ = _get_devices_from_libvirt(flags)
+    if _device_tree_monitored and not _NESTED_CAPS.intersection(caps or []):
+        libvirt_devices = _filter_by_flags(
+            _get_devices_from_libvirt()[0], flags)
+    else:
+        libvirt_devices, _ = _get_devices_from_libvirt(flags)
 
     for devName, params in libvirt_devices.items():
         devices[devName] = {'params': params}
@@ -716,6 +870,13 @@ def list_by_caps(caps=None):
     return devices
 
 
+def _filter_by_flags(devices, flags):
+    if not flags:
+        return devices
+    return {name: params for name, params in devices.items()
+            if flags & _LIBVIRT_DEVICE_FLAGS.get(params['capability'], 0)}
+
+
 def list_nvdimms():
     """
     Return dictionary of available NVDIMM namespace devices.
@@ -0,0 +1,141 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Minimal inotify(7) wrapper.
+
+The inotify file descriptor is non-blocking, so users can check for changes
+by calling read_events() when they need fresh data, without a thread
+waiting for events.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import ctypes
+import os
+import struct
+
+from collections import namedtuple
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+IN_ONLYDIR = 0x01000000
+
+IN_CLOEXEC = os.O_CLOEXEC
+IN_NONBLOCK = os.O_NONBLOCK
+
+_EVENT = struct.Struct("iIII")
+
+# Enough for the largest event: header, NAME_MAX and terminating null.
+_BUFSIZE = 64 * (_EVENT.size + 256)
+
+_libc = ctypes.CDLL("libc.so.6", use_errno=True)
+
+_inotify_init1 = _libc.inotify_init1
+_inotify_init1.argtypes = [ctypes.c_int]
+_inotify_init1.restype = ctypes.c_int
+
+_inotify_add_watch = _libc.inotify_add_watch
+_inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+_inotify_add_watch.restype = ctypes.c_int
+
+_inotify_rm_watch = _libc.inotify_rm_watch
+_inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+_inotify_rm_watch.restype = ctypes.c_int
+
+
+Event = namedtuple("Event", "wd,mask,cookie,name")
+
+
+class Inotify(object):
+
+    def __init__(self):
+        fd = _inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd == -1:
+            _raise_errno("inotify_init1")
+        self._fd = fd
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path, mask):
+        """
+        Watch path for events in mask, returning the watch descriptor.
+        """
+        wd = _inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd == -1:
+            _raise_errno("inotify_add_watch", path)
+        return wd
+
+    def rm_watch(self, wd):
+        if _inotify_rm_watch(self._fd, wd) == -1:
+            _raise_errno("inotify_rm_watch")
+
+    def read_events(self):
+        """
+        Return a list of pending events, or an empty list if there are no
+        events.
+        """
+        events = []
+        while True:
+            try:
+                buf = os.read(self._fd, _BUFSIZE)
+            except BlockingIOError:
+                return events
+            events.extend(_parse(buf))
+
+    def close(self):
+        if self._fd != -1:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _parse(buf):
+    offset = 0
+    while offset < len(buf):
+        wd, mask, cookie, size = _EVENT.unpack_from(buf, offset)
+        offset += _EVENT.size
+        name = buf[offset:offset + size].rstrip(b"\0")
+        offset += size
+        yield Event(wd, mask, cookie, os.fsdecode(name))
+
+
+def _raise_errno(func, path=None):
+    err = ctypes.get_errno()
+    msg = "%s: %s" % (func, os.strerror(err))
+    if path is None:
+        raise OSError(err, msg)
+    raise OSError(err, msg, path)
@@ -111,6 +111,101 @@ class Head:
         return "[" + ", ".join(items) + suffix
 
 
+class Truncated(object):
+    """
+    Formatter class for limiting the size of large values in log prints.
+
+    Usage example:
+
+        log.debug("Result: %s", Truncated(result, max_size=20))
+
+    This would log:
+        "Result: {'vmList': [{'vmId': ..."
+
+    Unlike repr(value)[:max_size], formatting stops when max_size characters
+    were produced, so the cost does not depend on the size of the value.
+    Values shorter than max_size are formatted like repr().
+    """
+
+    def __init__(self, value, max_size=4096):
+        """
+        Args:
+            value (object): value to format.
+            max_size (int): maximum number of characters displayed in str()
+                or repr(), not including the "..." suffix.
+        """
+        self.value = value
+        self.max_size = max_size
+
+    def __repr__(self):
+        out = _BoundedRepr(self.max_size)
+        try:
+            out.repr(self.value)
+        except _Full:
+            return out.getvalue()[:self.max_size] + "..."
+        return out.getvalue()
+
+
+class _Full(Exception):
+    """ Raised when a _BoundedRepr is full """
+
+
+class _BoundedRepr(object):
+
+    # Deeper containers are formatted using repr(), handling recursive
+    # containers.
+    MAX_DEPTH = 20
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._size = 0
+        self._parts = []
+
+    def getvalue(self):
+        return "".join(self._parts)
+
+    def repr(self, obj, depth=0):
+        # Subclasses may have a different repr(), so only the builtin types
+        # are formatted here.
+        if depth >= self.MAX_DEPTH:
+            self._write(repr(obj))
+        elif type(obj) is dict:
+            self._write("{")
+            for i, (key, value) in enumerate(six.iteritems(obj)):
+                if i:
+                    self._write(", ")
+                self.repr(key, depth + 1)
+                self._write(": ")
+                self.repr(value, depth + 1)
+            self._write("}")
+        elif type(obj) is list:
+            self._write("[")
+            self._items(obj, depth + 1)
+            self._write("]")
+        elif type(obj) is tuple:
+            self._write("(")
+            self._items(obj, depth + 1)
+            self._write(",)" if len(obj) == 1 else ")")
+        elif isinstance(obj, six.string_types):
+            # Avoid copying huge strings; one character more than the
+            # available space is enough to fill the buffer.
+            self._write(repr(obj[:self._limit - self._size + 1]))
+        else:
+            self._write(repr(obj))
+
+    def _items(self, items, depth):
+        for i, item in enumerate(items):
+            if i:
+                self._write(", ")
+            self.repr(item, depth)
+
+    def _write(self, s):
+        self._parts.append(s)
+        self._size += len(s)
+        if self._size > self._limit:
+            raise _Full
+
+
 class SimpleLogAdapter(logging.LoggerAdapter):
     # Because of how python implements the fact that warning
     # and warn are the same. I need to reimplement it here. :(
@@ -158,6 +253,10 @@ class UserGroupEnforcingHandler(logging.handlers.WatchedFileHandler):
         # Used to defer flushing when used by ThreadedHandler.
         self.buffering = False
 
+        # Total time formatting records, and total size of formatted records.
+        self._format_time = 0.0
+        self._written_bytes = 0
+
         # To trigger cred check:
         self._open()
 
@@ -167,6 +266,17 @@ class UserGroupEnforcingHandler(logging.handlers.WatchedFileHandler):
                 "Attempt to open log with incorrect credentials")
         return logging.handlers.WatchedFileHandler._open(self)
 
+    def format(self, record):
+        """
+        Extend super implementation to collect formatting stats.
+        """
+        start = time.monotonic()
+        msg = logging.handlers.WatchedFileHandler.format(self, record)
+        self._format_time += time.monotonic() - start
+        self._written_bytes += len(msg.encode(self.encoding or "utf-8",
+                                              "replace")) + 1
+        return msg
+
     def flush(self):
         """
         Extend super implementation to allow deferred flushing.
@@ -175,6 +285,16 @@ class UserGroupEnforcingHandler(logging.handlers.WatchedFileHandler):
             return
         logging.handlers.WatchedFileHandler.flush(self)
 
+    def stats(self):
+        """
+        Return total time formatting records, and total bytes written since
+        the handler was created.
+        """
+        return {
+            "format_time": self._format_time,
+            "written_bytes": self._written_bytes,
+        }
+
 
 class TimezoneFormatter(logging.Formatter):
     def converter(self, timestamp):
@@ -250,6 +370,10 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
         self._dropped_records = 0
         # The maximum number of pending records for the last interval.
         self._max_pending = 0
+        # Totals since the handler was created, reported by stats().
+        self._total_records = 0
+        self._total_dropped = 0
+        self._handle_time = 0.0
         self._thread = concurrent.thread(self._run, name="logfile")
         if start:
             self.start()
@@ -277,6 +401,7 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
                 self._cond.notify()
             else:
                 self._dropped_records += 1
+                self._total_dropped += 1
 
             # Is time to report stats?
             interval = record.created - self._last_report
@@ -329,6 +454,31 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
         """
         self._thread.start()
 
+    def stats(self):
+        """
+        Return handler stats:
+            pending (int): number of queued records.
+            records (int): number of records written to the target handler.
+            dropped (int): number of dropped records.
+            handle_time (float): total time in seconds handling records in
+                the target handler. Since the target does not flush while
+                handling queued records, this is mostly formatting time.
+
+        If the target handler has a stats() method, like
+        UserGroupEnforcingHandler, its stats are included.
+        """
+        with self._cond:
+            info = {
+                "pending": len(self._queue),
+                "records": self._total_records,
+                "dropped": self._total_dropped,
+                "handle_time": self._handle_time,
+            }
+        target_stats = getattr(self._target, "stats", None)
+        if target_stats is not None:
+            info.update(target_stats())
+        return info
+
     # Private
 
     def _can_handle(self, record):
@@ -365,13 +515,18 @@ class ThreadedHandler(logging.handlers.MemoryHandler):
             # syscall per cycle instead of one write() syscall per record. This
             # improves throuput significantly.
             self._target.buffering = True
+            start = time.monotonic()
+            count = 0
             try:
                 while len(self._queue):
                     record = self._queue.popleft()
                     if record is self._CLOSED:
                         return
                     self._target.handle(record)
+                    count += 1
             finally:
+                self._handle_time += time.monotonic() - start
+                self._total_records += count
                 self._target.buffering = False
                 self._target.flush()
 
@@ -408,6 +563,76 @@ class AllVmStatsValue(Suppressed):
         return repr({vm.get('vmId'): vm.get('status') for vm in self._value})
 
 
+class SamplingFilter(logging.Filter):
+    """
+    A filter passing only 1 of every rate records at DEBUG level or lower.
+
+    Records are counted separately for every message format, so sampling a
+    logger does not hide rare messages behind frequent ones, and every kind
+    of message is still logged. Records at INFO level or higher always pass.
+    """
+
+    # Messages formatted by the caller would grow the counters without limit;
+    # when we have too many formats, remaining messages share one counter.
+    MAX_MESSAGES = 1000
+
+    def __init__(self, rate):
+        if rate < 1:
+            raise ValueError("Invalid sample rate: %r" % rate)
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self._counters = {}
+        self._other = itertools.count()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        try:
+            counter = self._counters.get(record.msg)
+        except TypeError:
+            # Unhashable message.
+            counter = self._other
+        if counter is None:
+            if len(self._counters) < self.MAX_MESSAGES:
+                counter = self._counters.setdefault(
+                    record.msg, itertools.count())
+            else:
+                counter = self._other
+        # next() on itertools.count is atomic, no locking needed.
+        return next(counter) % self.rate == 0
+
+
+def set_sample_rate(rate, name=''):
+    """
+    Log only 1 of every rate DEBUG messages of logger name. Rate 1 disables
+    sampling.
+    """
+    sampler = SamplingFilter(rate)
+    log_name = None if not name else name
+    logger = logging.getLogger(log_name)
+    logging.info('Setting log sample rate on %r to %d', logger.name, rate)
+    for f in logger.filters[:]:
+        if isinstance(f, SamplingFilter):
+            logger.removeFilter(f)
+    if rate > 1:
+        logger.addFilter(sampler)
+
+
+def threaded_handlers():
+    """
+    Return the ThreadedHandler instances used by the configured loggers.
+    """
+    loggers = [logging.root]
+    loggers.extend(logging.Logger.manager.loggerDict.values())
+    handlers = []
+    for logger in loggers:
+        # loggerDict contains also PlaceHolder objects.
+        for h in getattr(logger, "handlers", ()):
+            if isinstance(h, ThreadedHandler) and h not in handlers:
+                handlers.append(h)
+    return handlers
+
+
 def set_level(level_name, name=''):
     log_level = logging.getLevelName(level_name)
     if not isinstance(log_level, type(logging.DEBUG)):
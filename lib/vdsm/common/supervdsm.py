@@ -27,8 +27,11 @@ from multiprocessing.managers import BaseManager, RemoteError
 import logging
 import threading
 
+from vdsm.common import concurrent
 from vdsm.common import constants
 from vdsm.common import function
+from vdsm.common import supervdsm_transport
+from vdsm.common.config import config
 from vdsm.common.panic import panic
 
 _g_singletonSupervdsmInstance = None
@@ -49,6 +52,18 @@ class ProxyCaller(object):
         self._supervdsmProxy = supervdsmProxy
 
     def __call__(self, *args, **kwargs):
+        client = self._supervdsmProxy._client
+        if client is not None:
+            try:
+                return client.call(self._funcName, args, kwargs)
+            except supervdsm_transport.ConnectError as e:
+                self._supervdsmProxy._log.debug(
+                    "Binary transport not available, using manager: %s", e)
+            except supervdsm_transport.Disconnected as e:
+                raise RuntimeError(
+                    "Broken communication with supervdsm. Failed call to %s: "
+                    "%s" % (self._funcName, e))
+
         callMethod = lambda: \
             getattr(self._supervdsmProxy._svdsm, self._funcName)(*args,
                                                                  **kwargs)
@@ -70,12 +85,50 @@ class SuperVdsmProxy(object):
     def __init__(self):
         self._manager = None
         self._svdsm = None
+        self._client = None
+        if config.get('vars', 'supervdsm_transport') == 'binary':
+            self._client = supervdsm_transport.Client(
+                pool_size=config.getint('vars', 'supervdsm_pool_size'))
         self._connect()
 
     def open(self, *args, **kwargs):
         # pylint: disable=no-member
         return self._manager.open(*args, **kwargs)
 
+    def batch(self, calls):
+        """
+        Run calls in supervdsm in one round trip.
+
+        calls is a list of (name, args, kwargs) tuples. Returns a list of
+        vdsm.common.concurrent.Result, one per call. When the binary
+        transport is not available, the calls are run one by one.
+        """
+        if self._client is not None:
+            try:
+                return self._client.batch(calls)
+            except supervdsm_transport.ConnectError as e:
+                self._log.debug(
+                    "Binary transport not available, using manager: %s", e)
+            except supervdsm_transport.Disconnected as e:
+                raise RuntimeError(
+                    "Broken communication with supervdsm. Failed batch: %s"
+                    % e)
+
+        results = []
+        for name, args, kwargs in calls:
+            try:
+                value = getattr(self._svdsm, name)(*args, **(kwargs or {}))
+            except RemoteError:
+                self._connect()
+                raise RuntimeError(
+                    "Broken communication with supervdsm. Failed call to %s"
+                    % name)
+            except Exception as e:
+                results.append(concurrent.Result(False, e))
+            else:
+                results.append(concurrent.Result(True, value))
+        return results
+
     def _connect(self):
         self._manager = _SuperVdsmManager(address=ADDRESS, authkey=b'')
         self._manager.register('instance')
@@ -0,0 +1,342 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Binary transport for supervdsm calls.
+
+The multiprocessing manager wraps every call in a generic manager message
+and serializes all callers on a single connection. This transport keeps a
+pool of connections to supervdsm, so several calls can be in flight at the
+same time, and sends every message in a compact frame:
+
+    +--------+----------+------------------+
+    | kind   | length   | payload          |
+    | 1 byte | 4 bytes  | length bytes     |
+    +--------+----------+------------------+
+
+The payload is a pickle. A CALL frame carries a (name, args, kwargs) tuple,
+and a BATCH frame carries a list of such tuples, executed in order in one
+round trip. The server replies to a CALL with a VALUE or ERROR frame, and
+to a BATCH with a RESULTS frame holding a list of (succeeded, value)
+tuples.
+
+Each connection serves one request at a time; the server runs a thread
+per connection, like the multiprocessing manager.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import logging
+import os
+import pickle
+import socket
+import struct
+import threading
+
+from contextlib import closing
+from multiprocessing.managers import RemoteError
+
+from vdsm.common import concurrent
+from vdsm.common import constants
+
+ADDRESS = os.path.join(constants.P_VDSM_RUN, "svdsm-rpc.sock")
+
+CALL = 1
+BATCH = 2
+VALUE = 3
+ERROR = 4
+RESULTS = 5
+
+# Sanity check, not a real limit; network reports of large hosts are a few
+# megabytes.
+MAX_PAYLOAD = 256 * 1024**2
+
+_HEADER = struct.Struct("!BI")
+
+
+class Error(Exception):
+    """ Base class for transport errors """
+
+
+class ConnectError(Error):
+    """
+    Raised when connecting to supervdsm failed. The request was not sent.
+    """
+
+
+class Disconnected(Error):
+    """
+    Raised when a connection was lost or returned an invalid frame. The
+    request may have been executed by supervdsm.
+    """
+
+
+class Server(object):
+
+    log = logging.getLogger("SuperVdsm.Transport")
+
+    def __init__(self, address, instance):
+        self._address = address
+        self._instance = instance
+        self._sock = None
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    def start(self):
+        if os.path.exists(self._address):
+            os.unlink(self._address)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self._address)
+            sock.listen(128)
+        except:
+            sock.close()
+            raise
+        self._sock = sock
+        self._running = True
+        self._thread = concurrent.thread(
+            self._serve, name="svdsm/accept", log=self.log)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        # Wakes up the thread blocked in accept().
+        self._sock.shutdown(socket.SHUT_RDWR)
+        self._thread.join()
+        self._sock.close()
+        # Wake up connection threads blocked in recv(); clients will see the
+        # connection closed.
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        try:
+            os.unlink(self._address)
+        except FileNotFoundError:
+            pass
+
+    def _serve(self):
+        self.log.debug("Serving on %s", self._address)
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                if not self._running:
+                    break
+                self.log.exception("Error accepting connection")
+                continue
+            with self._lock:
+                self._connections.add(conn)
+            t = concurrent.thread(
+                self._handle, args=(conn,), name="svdsm/conn", log=self.log)
+            t.start()
+        self.log.debug("Stopped serving on %s", self._address)
+
+    def _handle(self, conn):
+        try:
+            with closing(conn):
+                self._serve_connection(conn)
+        finally:
+            with self._lock:
+                self._connections.discard(conn)
+
+    def _serve_connection(self, conn):
+        while True:
+            try:
+                kind, payload = _recv(conn)
+            except (OSError, Disconnected):
+                return
+
+            if kind == CALL:
+                reply = self._call(pickle.loads(payload))
+            elif kind == BATCH:
+                reply = self._batch(pickle.loads(payload))
+            else:
+                self.log.error("Unexpected frame kind %d, closing", kind)
+                return
+
+            try:
+                _send(conn, *reply)
+            except OSError:
+                return
+
+    def _call(self, request):
+        try:
+            value = self._run(*request)
+            return VALUE, _dumps(value)
+        except Exception as e:
+            return ERROR, _dump_error(e)
+
+    def _batch(self, requests):
+        results = []
+        for request in requests:
+            try:
+                results.append((True, self._run(*request)))
+            except Exception as e:
+                results.append((False, e))
+        try:
+            return RESULTS, _dumps(results)
+        except Exception as e:
+            return ERROR, _dump_error(e)
+
+    def _run(self, name, args, kwargs):
+        # Like the multiprocessing manager, expose only public methods.
+        if name.startswith("_"):
+            raise AttributeError("Method %r is not exposed" % name)
+        return getattr(self._instance, name)(*args, **kwargs)
+
+
+class Client(object):
+    """
+    Call supervdsm using pooled connections.
+
+    A caller takes an idle connection from the pool or opens a new one, so
+    concurrent callers do not wait for each other. Up to pool_size idle
+    connections are kept open for the next calls.
+    """
+
+    def __init__(self, address=ADDRESS, pool_size=8):
+        self._address = address
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def call(self, name, args=(), kwargs=None):
+        """
+        Call supervdsm function name, returning the function result, or
+        raising the function error.
+        """
+        kind, value = self._request(CALL, (name, args, kwargs or {}))
+        if kind == ERROR:
+            raise value
+        return value
+
+    def batch(self, calls):
+        """
+        Run calls in one round trip.
+
+        calls is a list of (name, args, kwargs) tuples, executed by supervdsm
+        in order. Returns a list of vdsm.common.concurrent.Result, one per
+        call; a failed call does not prevent the next calls.
+        """
+        requests = [(name, args, kwargs or {}) for name, args, kwargs in calls]
+        kind, value = self._request(BATCH, requests)
+        if kind == ERROR:
+            raise value
+        return [concurrent.Result(*res) for res in value]
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
+
+    def _request(self, kind, message):
+        payload = _dumps(message)
+        sock, pooled = self._acquire()
+        try:
+            try:
+                _send(sock, kind, payload)
+            except OSError as e:
+                if not pooled:
+                    raise Disconnected("Error sending request: %s" % e)
+                # The pooled connection was closed by supervdsm, typically
+                # after a restart; the request was not received.
+                sock.close()
+                sock = self._connect()
+                _send(sock, kind, payload)
+            kind, payload = _recv(sock)
+        except OSError as e:
+            sock.close()
+            raise Disconnected("Error communicating with supervdsm: %s" % e)
+        except BaseException:
+            sock.close()
+            raise
+
+        if kind not in (VALUE, ERROR, RESULTS):
+            sock.close()
+            raise Disconnected("Unexpected frame kind %d" % kind)
+
+        self._release(sock)
+        return kind, pickle.loads(payload)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _release(self, sock):
+        with self._lock:
+            if len(self._idle) < self._pool_size:
+                self._idle.append(sock)
+                return
+        sock.close()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._address)
+        except OSError as e:
+            sock.close()
+            raise ConnectError(
+                "Cannot connect to %s: %s" % (self._address, e))
+        return sock
+
+
+def _send(sock, kind, payload):
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv(sock):
+    kind, length = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    if length > MAX_PAYLOAD:
+        raise Disconnected("Frame too large: %d bytes" % length)
+    return kind, _recv_exactly(sock, length)
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = sock.recv_into(view[pos:])
+        if n == 0:
+            raise Disconnected("Connection closed")
+        pos += n
+    return buf
+
+
+def _dumps(obj):
+    return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+
+def _dump_error(e):
+    try:
+        return _dumps(e)
+    except Exception:
+        # Like the multiprocessing manager, report errors that cannot be
+        # pickled as RemoteError.
+        return _dumps(RemoteError("%s: %s" % (type(e).__name__, e)))
@@ -31,6 +31,14 @@ import threading
 from vdsm.common import concurrent
 from vdsm.common import exception
 from vdsm.common import time
+from vdsm.common.histogram import Histogram
+
+# Number of slow task samples kept per executor.
+_SLOW_TASKS = 10
+
+# Running executors by name, for reporting.
+_executors = {}
+_executors_lock = threading.Lock()
 
 
 class NotRunning(Exception):
@@ -68,11 +76,16 @@ class Executor(object):
       the stuck task finishes.  This prevents creating an excessive number
       of threads when many tasks are stuck.
 
+    - With `work_stealing`, every worker has a local task queue. Tasks are
+      given to an idle worker, or queued in the busy workers queues in round
+      robin order. A worker with an empty queue steals the oldest task from
+      the other workers queues. See `StealingTaskQueue`.
+
     """
     _log = logging.getLogger('Executor')
 
     def __init__(self, name, workers_count, max_tasks, scheduler,
-                 max_workers=None, log=None):
+                 max_workers=None, log=None, work_stealing=False):
         """
         :param name: Name of the executor; no special purpose, just for
           logging and debugging.
@@ -97,19 +110,33 @@ class Executor(object):
         :param log: logger instance to override the default logger. This is
           useful for testing
         :type log: logger as returned by logging.getLogger()
+        :param work_stealing: Use a local task queue per worker, see
+          `StealingTaskQueue`.
+        :type work_stealing: bool
 
         """
         self._name = name
         self._workers_count = workers_count
         self._max_workers = max_workers
+        self._max_tasks = max_tasks
         self._worker_id = 0
-        self._tasks = TaskQueue(name, max_tasks)
+        self._work_stealing = work_stealing
+        if work_stealing:
+            self._tasks = StealingTaskQueue(name, max_tasks)
+        else:
+            self._tasks = TaskQueue(name, max_tasks)
         self._scheduler = scheduler
         if log is not None:
             self._log = log
         self._workers = set()
         self._lock = threading.Lock()
         self._running = False
+        self._stats_lock = threading.Lock()
+        self._dispatched = 0
+        self._rejected = 0
+        self._queue_wait = Histogram()
+        self._run_time = Histogram()
+        self._slow_tasks = collections.deque(maxlen=_SLOW_TASKS)
 
     def __repr__(self):
         return "<Executor %s workers=%d max_workers=%s %s at 0x%x>" % (
@@ -132,9 +159,14 @@ class Executor(object):
             self._running = True
             for _ in range(self._workers_count):
                 self._add_worker()
+        with _executors_lock:
+            _executors[self._name] = self
 
     def stop(self, wait=True):
         self._log.debug('Stopping executor')
+        with _executors_lock:
+            if _executors.get(self._name) is self:
+                del _executors[self._name]
         with self._lock:
             self._running = False
             self._tasks.clear()
@@ -168,7 +200,63 @@ class Executor(object):
         """
         if not self._running:
             raise NotRunning()
-        self._tasks.put(Task(callable, timeout, discard))
+        try:
+            self._tasks.put(Task(callable, timeout, discard))
+        except exception.ResourceExhausted:
+            with self._stats_lock:
+                self._rejected += 1
+            raise
+        with self._stats_lock:
+            self._dispatched += 1
+
+    def stats(self):
+        """
+        Return executor state and statistics:
+
+        - workers: number of workers, including discarded workers
+        - active_workers: number of workers that were not discarded
+        - queued: number of tasks waiting for a worker
+        - dispatched, rejected: number of tasks dispatched, and rejected
+          because the task queue was full
+        - queue_wait, run_time: histograms of the time tasks waited in the
+          queue, and of the time tasks ran
+        - running: the tasks running now, with their worker and duration
+        - slow_tasks: the last tasks that exceeded their timeout, with the
+          worker traceback at that time
+        """
+        with self._lock:
+            workers = tuple(self._workers)
+        with self._stats_lock:
+            dispatched = self._dispatched
+            rejected = self._rejected
+            slow_tasks = list(self._slow_tasks)
+
+        running = []
+        for worker in workers:
+            task = worker.task
+            if task is not None:
+                running.append({
+                    "worker": worker.name,
+                    "task": repr(task),
+                    "duration": task.duration,
+                    "discarded": worker.discarded,
+                })
+
+        return {
+            "work_stealing": self._work_stealing,
+            "workers": len(workers),
+            "active_workers": len([w for w in workers if not w.discarded]),
+            "workers_count": self._workers_count,
+            "max_workers": self._max_workers,
+            "queued": len(self._tasks),
+            "max_tasks": self._max_tasks,
+            "dispatched": dispatched,
+            "rejected": rejected,
+            "queue_wait": self._queue_wait.info(),
+            "run_time": self._run_time.info(),
+            "running": running,
+            "slow_tasks": slow_tasks,
+        }
 
     # Serving workers
 
@@ -225,6 +313,8 @@ class Executor(object):
 
         with self._lock:
             self._workers.remove(worker)
+            if self._work_stealing:
+                self._tasks.remove(worker.name)
             if not self._running:
                 return
             if self._may_add_workers():
@@ -235,26 +325,63 @@ class Executor(object):
             self._log.info("New worker added (%s active, %s total workers)",
                            self._active_workers, self._total_workers)
 
-    def _next_task(self):
+    def _next_task(self, worker):
         """
         Called from the worker thread to get the next task from the task queue.
         Raises NotRunning exception if executor was stopped.
         """
-        task = self._tasks.get()
+        if self._work_stealing:
+            task = self._tasks.get(worker.name)
+        else:
+            task = self._tasks.get()
         if task is _STOP:
             raise NotRunning()
         return task
 
+    def _task_finished(self, task):
+        """
+        Called from the worker thread when a task has finished.
+        """
+        self._queue_wait.observe(task.queue_wait)
+        self._run_time.observe(task.duration)
+
+    def _task_timed_out(self, worker, task, discarded, trace):
+        """
+        Called from the scheduler thread when a task exceeded its timeout.
+        """
+        sample = {
+            "worker": worker.name,
+            "task": repr(task),
+            "timeout": task.timeout,
+            "duration": task.duration,
+            "discarded": discarded,
+            "traceback": trace,
+        }
+        with self._stats_lock:
+            self._slow_tasks.append(sample)
+
     # Private
 
     def _add_worker(self):
         name = "%s/%d" % (self.name, self._worker_id)
         self._worker_id += 1
         worker = _Worker(self, self._scheduler, name, self._log)
+        if self._work_stealing:
+            self._tasks.add(name)
         worker.start()
         self._workers.add(worker)
 
 
+def stats():
+    """
+    Return the state and statistics of running executors, keyed by executor
+    name.
+    """
+    with _executors_lock:
+        executors = list(_executors.values())
+    return {e.name: e.stats() for e in executors}
+
+
 _STOP = object()
 
 
@@ -294,6 +421,10 @@ class _Worker(object):
     def discarded(self):
         return self._discarded
 
+    @property
+    def task(self):
+        return self._task
+
     def _run(self):
         self._log.debug('Worker started')
         try:
@@ -307,7 +438,7 @@ class _Worker(object):
             self._executor._worker_stopped(self)
 
     def _execute_task(self):
-        task = self._executor._next_task()
+        task = self._executor._next_task(self)
         with self._lock:
             self._scheduled_check = self._check_after(task.timeout)
         self._task = task
@@ -327,6 +458,7 @@ class _Worker(object):
                     self._scheduled_check.cancel()
                     self._scheduled_check = None
                 self._task_counter += 1
+            self._executor._task_finished(task)
             if self._discarded:
                 raise _WorkerDiscarded()
 
@@ -341,12 +473,20 @@ class _Worker(object):
         with self._lock:
             if task_number != self._task_counter:
                 return
-            if self._task.discard:
+            task = self._task
+            if task.discard:
                 if self._discarded:
                     raise AssertionError("Attempt to discard worker twice")
                 self._discarded = True
             else:
-                self._scheduled_check = self._check_after(self._task.timeout)
+                self._scheduled_check = self._check_after(task.timeout)
+        # we want to avoid to format the traceback with the lock held, so we
+        # do it here.
+        try:
+            trace = concurrent.format_traceback(self._thread.ident)
+        except KeyError:
+            trace = "(traceback not available)"
+        self._executor._task_timed_out(self, task, self._discarded, trace)
         if self._discarded:
             # Please make sure the executor call is performed outside the lock
             # -- there is another lock involved in the executor and we don't
@@ -354,11 +494,6 @@ class _Worker(object):
             self._executor._worker_discarded(self)
             self._log.info("Worker discarded: %s", self)
         else:
-            # we want to avoid to log with the lock held, so we do it here.
-            try:
-                trace = concurrent.format_traceback(self._thread.ident)
-            except KeyError:
-                trace = "(traceback not available)"
             self._log.warning("Worker blocked: %s, traceback:\n%s", self,
                               trace)
 
@@ -378,6 +513,7 @@ class Task(object):
         self._callable = callable
         self.timeout = timeout
         self.discard = discard
+        self._queued = time.monotonic_time()
         self._start = None
 
     @property
@@ -386,6 +522,15 @@ class Task(object):
             return 0
         return time.monotonic_time() - self._start
 
+    @property
+    def queue_wait(self):
+        """
+        Time from creating the task until it started to run.
+        """
+        if self._start is None:
+            return time.monotonic_time() - self._queued
+        return self._start - self._queued
+
     def __call__(self):
         self._start = time.monotonic_time()
         self._callable()
@@ -466,3 +611,156 @@ class TaskQueue(object):
     def clear(self):
         with self._cond:
             self._tasks.clear()
+
+    def __len__(self):
+        return len(self._tasks)
+
+
+class StealingTaskQueue(object):
+    """
+    Task queue with a local queue per worker.
+
+    A new task is given to the most recently idle worker, waking it up. If
+    all workers are busy, the task is queued in the workers local queues in
+    round robin order. A worker takes tasks from its own queue; when its
+    queue is empty it steals the oldest task of the other workers queues,
+    so tasks queued behind a blocked worker are run by the next free
+    worker.
+
+    Only putting tasks and idle workers waiting for tasks take the queue
+    lock. Taking and stealing tasks use the thread-safe deque operations.
+
+    Like TaskQueue, raises ResourceExhausted when max_tasks tasks are
+    queued.
+    """
+
+    def __init__(self, name, max_tasks):
+        self._name = name
+        self._max_tasks = max_tasks
+        self._lock = threading.Lock()
+        self._local = {}
+        # Replaced when workers are added or removed, so workers can iterate
+        # over it without the lock.
+        self._queues = ()
+        self._idle = []
+        # Tasks put when there are no workers.
+        self._pending = collections.deque()
+        self._next = 0
+
+    def __repr__(self):
+        return "<StealingTaskQueue %s max_tasks=%i tasks(%i) at 0x%x>" % (
+            self._name,
+            self._max_tasks,
+            len(self),
+            id(self)
+        )
+
+    def __len__(self):
+        return len(self._pending) + sum(len(q.tasks) for q in self._queues)
+
+    def add(self, name):
+        """
+        Add a local queue for worker name.
+        """
+        with self._lock:
+            queue = _LocalQueue(name)
+            self._local[name] = queue
+            self._queues += (queue,)
+
+    def remove(self, name):
+        """
+        Remove the local queue of worker name, moving its tasks to the other
+        workers.
+        """
+        with self._lock:
+            queue = self._local.pop(name)
+            self._queues = tuple(q for q in self._queues if q is not queue)
+            if queue in self._idle:
+                self._idle.remove(queue)
+            while True:
+                try:
+                    task = queue.tasks.popleft()
+                except IndexError:
+                    break
+                self._push(task)
+
+    def put(self, task):
+        """
+        Put a new task in the queue.
+        Do not block when full, raises ResourceExhausted instead.
+        """
+        with self._lock:
+            if len(self) >= self._max_tasks:
+                raise exception.ResourceExhausted(
+                    "Too many tasks",
+                    resource=self._name,
+                    current_tasks=self._max_tasks)
+            self._push(task)
+
+    def get(self, name):
+        """
+        Get a new task for worker name. Blocks if there are no tasks.
+        """
+        queue = self._local[name]
+        while True:
+            task = self._take(queue)
+            if task is not None:
+                return task
+
+            with self._lock:
+                queue.ready.clear()
+                self._idle.append(queue)
+
+            # A task may have been put before we became idle.
+            task = self._take(queue)
+            if task is not None:
+                with self._lock:
+                    if queue in self._idle:
+                        self._idle.remove(queue)
+                return task
+
+            queue.ready.wait()
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            for queue in self._queues:
+                queue.tasks.clear()
+
+    def _push(self, task):
+        # Must be called with the lock held.
+        if self._idle:
+            queue = self._idle.pop()
+            queue.tasks.append(task)
+            queue.ready.set()
+        elif self._queues:
+            queue = self._queues[self._next % len(self._queues)]
+            self._next += 1
+            queue.tasks.append(task)
+        else:
+            self._pending.append(task)
+
+    def _take(self, queue):
+        try:
+            return queue.tasks.popleft()
+        except IndexError:
+            pass
+        try:
+            return self._pending.popleft()
+        except IndexError:
+            pass
+        for other in self._queues:
+            if other is not queue:
+                try:
+                    return other.tasks.popleft()
+                except IndexError:
+                    pass
+        return None
+
+
+class _LocalQueue(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.tasks = collections.deque()
+        self.ready = threading.Event()
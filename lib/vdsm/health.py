@@ -21,6 +21,7 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import collections
 import gc
 import logging
 import os
@@ -28,10 +29,36 @@ import threading
 
 from vdsm.common import concurrent
 from vdsm.common import cpuarch
+from vdsm.common import logutils
 from vdsm.storage import lvm
 
 from . config import config
 from . import metrics
+from . metrics import registry
+
+_uncollectable = registry.gauge(
+    "vdsm_gc_uncollectable_objects",
+    "Number of uncollectable objects found in the last check")
+_cpu_user = registry.gauge(
+    "vdsm_cpu_user_percent", "Vdsm user cpu usage in the last interval")
+_cpu_sys = registry.gauge(
+    "vdsm_cpu_sys_percent", "Vdsm system cpu usage in the last interval")
+_rss = registry.gauge(
+    "vdsm_resident_memory_bytes", "Vdsm resident memory size")
+_threads = registry.gauge(
+    "vdsm_threads", "Number of vdsm threads")
+_log_pending = registry.gauge(
+    "vdsm_log_pending_records",
+    "Number of log records waiting for the logging thread")
+_log_records = registry.counter(
+    "vdsm_log_records_total", "Number of log records written")
+_log_dropped = registry.counter(
+    "vdsm_log_dropped_records_total",
+    "Number of log records dropped by an overloaded logging thread")
+_log_format = registry.counter(
+    "vdsm_log_format_seconds_total", "Time spent formatting log records")
+_log_written = registry.counter(
+    "vdsm_log_written_bytes_total", "Number of bytes written to the logs")
 
 _monitor = None
 
@@ -62,6 +89,7 @@ class Monitor(object):
         self._done = threading.Event()
         self._last = ProcStat()
         self._stats = {}
+        self._last_log_stats = _LOG_COUNTERS_ZERO
 
     def start(self):
         self.log.info("Starting health monitor (interval=%d)", self._interval)
@@ -94,6 +122,7 @@ class Monitor(object):
         self._check_garbage()
         self._check_resources()
         self._check_lvm_stats()
+        self._check_logging()
         self._report_stats()
 
     def _check_garbage(self):
@@ -130,6 +159,35 @@ class Monitor(object):
         self.log.info("LVM cache hit ratio: %.2f%% (hits: %d misses: %d)",
                       stats["hit_ratio"], stats["hits"], stats["misses"])
 
+    def _check_logging(self):
+        pending = 0
+        current = _LOG_COUNTERS_ZERO
+        for handler in logutils.threaded_handlers():
+            stats = handler.stats()
+            pending += stats["pending"]
+            current = _LogCounters(
+                records=current.records + stats["records"],
+                dropped=current.dropped + stats["dropped"],
+                format_time=current.format_time + stats.get(
+                    "format_time", stats["handle_time"]),
+                written_bytes=current.written_bytes + stats.get(
+                    "written_bytes", 0))
+        # Counters go back to zero if logging was configured again.
+        delta = _LogCounters(*(max(0, c - p) for c, p in
+                               zip(current, self._last_log_stats)))
+        self._last_log_stats = current
+
+        self.log.debug("logging: pending=%d, records=%d, dropped=%d, "
+                       "format_time=%.3f, written_bytes=%d",
+                       pending, delta.records, delta.dropped,
+                       delta.format_time, delta.written_bytes)
+
+        _log_pending.set(pending)
+        _log_records.inc(delta.records)
+        _log_dropped.inc(delta.dropped)
+        _log_format.inc(delta.format_time)
+        _log_written.inc(delta.written_bytes)
+
     def _report_stats(self):
         prefix = "hosts.vdsm"
         report = {}
@@ -141,6 +199,18 @@ class Monitor(object):
         report[prefix + '.threads_count'] = self._stats['threads']
         metrics.send(report)
 
+        _uncollectable.set(self._stats['uncollectable_obj'])
+        _cpu_user.set(self._stats['utime_pct'])
+        _cpu_sys.set(self._stats['stime_pct'])
+        _rss.set(self._stats['rss'] * 1024)
+        _threads.set(self._stats['threads'])
+
+
+_LogCounters = collections.namedtuple(
+    "_LogCounters", "records, dropped, format_time, written_bytes")
+
+_LOG_COUNTERS_ZERO = _LogCounters(0, 0, 0.0, 0)
+
 
 class ProcStat(object):
 
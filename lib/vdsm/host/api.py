@@ -28,6 +28,7 @@ from . import stats
 from vdsm import utils
 from vdsm import metrics
 from vdsm.common import hooks
+from vdsm.metrics import registry
 from vdsm.common.units import KiB, MiB
 from vdsm.config import config
 from vdsm.virt import vmstatus
@@ -85,9 +86,27 @@ def get_stats(cif, sample, multipath=False):
     return ret
 
 
+_vms = registry.gauge(
+    "vdsm_vms", "Number of vms", labels=("state",))
+_mem_available = registry.gauge(
+    "vdsm_host_memory_available_bytes", "Memory available for new vms")
+_mem_committed = registry.gauge(
+    "vdsm_host_memory_committed_bytes", "Memory committed to running vms")
+_sd_delay = registry.gauge(
+    "vdsm_storage_domain_delay_seconds",
+    "Time to read storage domain metadata in the last check",
+    labels=("domain",))
+_sd_last_check = registry.gauge(
+    "vdsm_storage_domain_last_check_seconds",
+    "Time since storage domain was checked",
+    labels=("domain",))
+
+
 def send_metrics(hoststats):
     prefix = "hosts"
     data = {}
+    delay = {}
+    last_check = {}
 
     try:
         for dom in hoststats['storageDomains']:
@@ -95,8 +114,20 @@ def send_metrics(hoststats):
             dom_info = hoststats['storageDomains'][dom]
             data[storage_prefix + '.delay'] = dom_info['delay']
             data[storage_prefix + '.last_check'] = dom_info['lastCheck']
+            delay[(dom,)] = dom_info['delay']
+            last_check[(dom,)] = dom_info['lastCheck']
 
         metrics.send(data)
+
+        _sd_delay.replace(delay)
+        _sd_last_check.replace(last_check)
+        _vms.replace({
+            ("all",): hoststats['vmCount'],
+            ("active",): hoststats['vmActive'],
+            ("migrating",): hoststats['vmMigrating'],
+        })
+        _mem_available.set(hoststats['memAvailable'] * MiB)
+        _mem_committed.set(hoststats['memCommitted'] * MiB)
     except KeyError:
         logging.exception('Host metrics collection failed')
 
@@ -21,8 +21,11 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import functools
 import os
 import logging
+import stat
+import threading
 
 from vdsm import cpuinfo
 from vdsm import host
@@ -33,12 +36,14 @@ from vdsm import osinfo
 from vdsm import utils
 from vdsm.common import cache
 from vdsm.common import commands
+from vdsm.common import concurrent
 from vdsm.common import cpuarch
 from vdsm.common import dsaversion
 from vdsm.common import hooks
 from vdsm.common import hostdev
 from vdsm.common import libvirtconnection
 from vdsm.common import supervdsm
+from vdsm.common import time
 from vdsm.common import xmlutils
 from vdsm.config import config
 from vdsm.host import rngsources
@@ -75,7 +80,79 @@ def _getIscsiIniName():
     return ''
 
 
-def get():
+# Package databases, modified when packages are installed or updated.
+_PACKAGE_DBS = ('/var/lib/rpm', '/var/lib/dpkg/status')
+
+_ONLINE_CPUS = '/sys/devices/system/cpu/online'
+
+
+class _StaticProvider(object):
+    """
+    Provide capabilities that change only when the host changes in a way
+    detected by key, for example when packages are updated or CPUs are added
+    or removed. The capabilities are collected again when the key changes,
+    or after invalidate() was called.
+
+    Memoized functions used by the provider are invalidated before
+    collecting capabilities again.
+    """
+
+    def __init__(self, func, key, memoized=()):
+        self.func = func
+        self._key = key
+        self._memoized = memoized
+        self._lock = threading.Lock()
+        self._value = None
+        self._value_key = None
+        functools.update_wrapper(self, func)
+
+    def __call__(self):
+        key = self._key()
+        with self._lock:
+            if self._value is None or key != self._value_key:
+                if self._value is not None:
+                    logging.info("Host changed, collecting %s again",
+                                 self.__name__)
+                    for func in self._memoized:
+                        func.invalidate()
+                self._value = self.func()
+                self._value_key = key
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+
+
+def _packages_key():
+    return tuple(_mtime(path) for path in _PACKAGE_DBS)
+
+
+def _cpus_key():
+    try:
+        with open(_ONLINE_CPUS) as f:
+            return f.read()
+    except EnvironmentError:
+        return None
+
+
+def _mtime(path):
+    """
+    Return the latest modification time of path, or of the files in path if
+    it is a directory, or None if path does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_mtime
+    return max([st.st_mtime] + [
+        entry.stat().st_mtime for entry in os.scandir(path)
+        if entry.is_file()])
+
+
+def _cpu_caps():
     caps = {}
     cpu_topology = numa.cpu_topology()
 
@@ -95,26 +172,62 @@ def get():
     caps['cpuModel'] = cpuinfo.model()
     caps['cpuFlags'] = ','.join(_getFlagsAndFeatures())
 
+    caps['numaNodes'] = dict(numa.topology())
+    caps['numaNodeDistance'] = dict(numa.distances())
+    caps['autoNumaBalancing'] = numa.autonuma_status()
+    caps['tscFrequency'] = _getTscFrequency()
+    caps['tscScaling'] = _getTscScaling()
+    return caps
+
+
+def _package_caps():
+    caps = {}
     caps.update(dsaversion.version_info())
+    caps['operatingSystem'] = osinfo.version()
+    caps['packages2'] = osinfo.package_versions()
+    caps['emulatedMachines'] = machinetype.emulated_machines(
+        cpuarch.effective())
+    return caps
+
+
+def _network_caps():
+    return supervdsm.getProxy().network_caps()
 
-    net_caps = supervdsm.getProxy().network_caps()
-    caps.update(net_caps)
 
+def _hooks_caps():
+    caps = {}
     try:
         caps['hooks'] = hooks.installed()
     except:
         logging.debug('not reporting hooks', exc_info=True)
+    return caps
 
-    caps['operatingSystem'] = osinfo.version()
+
+def _storage_caps():
+    caps = {}
+    caps['ISCSIInitiatorName'] = _getIscsiIniName()
+    caps['HBAInventory'] = hba.HBAInventory()
+
+    try:
+        caps["connector_info"] = managedvolume.connector_info()
+    except se.ManagedVolumeNotSupported as e:
+        logging.info("managedvolume not supported: %s", e)
+    except se.ManagedVolumeHelperFailed as e:
+        logging.exception("Error getting managedvolume connector info: %s", e)
+
+    # Which domain versions are supported by this host.
+    caps["domain_versions"] = sc.DOMAIN_VERSIONS
+
+    caps["supported_block_size"] = backends.supported_block_size()
+    return caps
+
+
+def _host_caps():
+    caps = {}
     caps['uuid'] = host.uuid()
-    caps['packages2'] = osinfo.package_versions()
     caps['realtimeKernel'] = osinfo.runtime_kernel_flags().realtime
     caps['kernelArgs'] = osinfo.kernel_args()
     caps['nestedVirtualization'] = osinfo.nested_virtualization().enabled
-    caps['emulatedMachines'] = machinetype.emulated_machines(
-        cpuarch.effective())
-    caps['ISCSIInitiatorName'] = _getIscsiIniName()
-    caps['HBAInventory'] = hba.HBAInventory()
     caps['vmTypes'] = ['kvm']
 
     caps['memSize'] = str(utils.readMemInfo()['MemTotal'] // 1024)
@@ -124,10 +237,6 @@ def get():
 
     caps['rngSources'] = rngsources.list_available()
 
-    caps['numaNodes'] = dict(numa.topology())
-    caps['numaNodeDistance'] = dict(numa.distances())
-    caps['autoNumaBalancing'] = numa.autonuma_status()
-
     caps['selinux'] = osinfo.selinux_status()
 
     caps['liveSnapshot'] = 'true'
@@ -153,25 +262,69 @@ def get():
         caps['boot_uuid'] = osinfo.boot_uuid()
     except Exception:
         logging.exception("Can not find boot uuid")
-    caps['tscFrequency'] = _getTscFrequency()
-    caps['tscScaling'] = _getTscScaling()
 
-    try:
-        caps["connector_info"] = managedvolume.connector_info()
-    except se.ManagedVolumeNotSupported as e:
-        logging.info("managedvolume not supported: %s", e)
-    except se.ManagedVolumeHelperFailed as e:
-        logging.exception("Error getting managedvolume connector info: %s", e)
+    caps["cd_change_pdiv"] = True
+    return caps
 
-    # Which domain versions are supported by this host.
-    caps["domain_versions"] = sc.DOMAIN_VERSIONS
 
-    caps["supported_block_size"] = backends.supported_block_size()
-    caps["cd_change_pdiv"] = True
+_cpu_caps = _StaticProvider(
+    _cpu_caps,
+    _cpus_key,
+    memoized=(cpuinfo._cpuinfo, numa._numa, machinetype.cpu_features))
+
+_package_caps = _StaticProvider(
+    _package_caps,
+    _packages_key,
+    memoized=(osinfo.version, machinetype.emulated_machines,
+              machinetype.compatible_cpu_models))
 
+# Providers are independent and collected concurrently.
+_PROVIDERS = (
+    _cpu_caps,
+    _package_caps,
+    _network_caps,
+    _hooks_caps,
+    _storage_caps,
+    _host_caps,
+)
+
+
+def get():
+    start = time.monotonic_time()
+    results = list(concurrent.tmap(
+        _collect, _PROVIDERS, max_workers=len(_PROVIDERS), name="caps"))
+
+    caps = {}
+    timings = []
+    for result in results:
+        if not result.succeeded:
+            raise result.value
+        name, provided, elapsed = result.value
+        caps.update(provided)
+        timings.append("%s=%.2f" % (name, elapsed))
+
+    logging.debug("Collected capabilities in %.2f seconds (%s)",
+                  time.monotonic_time() - start, ", ".join(sorted(timings)))
     return caps
 
 
+def invalidate():
+    """
+    Collect static capabilities again on the next get(), for cases not
+    detected automatically.
+    """
+    for provider in _PROVIDERS:
+        if isinstance(provider, _StaticProvider):
+            provider.invalidate()
+
+
+def _collect(provider):
+    start = time.monotonic_time()
+    provided = provider()
+    elapsed = time.monotonic_time() - start
+    return provider.__name__.lstrip('_'), provided, elapsed
+
+
 def _isHostedEngineDeployed():
     if not haClient:
         return False
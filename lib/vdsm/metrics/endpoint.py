@@ -0,0 +1,104 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+Serve the metrics registry to Prometheus on vdsm port.
+
+MetricsDetector detects "GET /metrics" requests on the connections accepted
+by MultiProtocolAcceptor, so it must be added before HttpDetector, which
+detects any GET request.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import logging
+import socket
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves import http_client as httplib
+
+from vdsm.common import concurrent
+from vdsm.metrics import registry
+
+PATH = "/metrics"
+
+# A scrape is a single small request; do not let a stuck client keep a
+# thread forever.
+_TIMEOUT = 30
+
+
+class MetricsDetector(object):
+    log = logging.getLogger("MetricsDetector")
+    NAME = "metrics"
+    REQUEST = b"GET " + PATH.encode("ascii")
+    REQUIRED_SIZE = len(REQUEST)
+
+    def __init__(self, expose=registry.expose):
+        self._expose = expose
+
+    def detect(self, data):
+        return data.startswith(self.REQUEST)
+
+    def handle_socket(self, client_socket, socket_address):
+        self.log.debug("metrics request from %s", socket_address)
+        t = concurrent.thread(self._serve,
+                              args=(client_socket, socket_address),
+                              name="metrics/http",
+                              log=self.log)
+        t.start()
+
+    def _serve(self, sock, address):
+        try:
+            sock.settimeout(_TIMEOUT)
+            _Handler(sock, address, self._expose)
+        except Exception:
+            self.log.exception("Error serving metrics to %s", address)
+        finally:
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except socket.error:
+                pass  # Some platforms may raise ENOTCONN here
+            finally:
+                sock.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Serve one scrape and close the connection.
+    """
+
+    def __init__(self, request, client_address, expose):
+        self._expose = expose
+        BaseHTTPRequestHandler.__init__(self, request, client_address, None)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path != PATH:
+            self.send_error(httplib.NOT_FOUND)
+            return
+        body = self._expose()
+        self.send_response(httplib.OK)
+        self.send_header("Content-Type", registry.CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        MetricsDetector.log.debug(format, *args)
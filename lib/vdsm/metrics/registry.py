@@ -0,0 +1,256 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+In-process metrics registry, exposed in the Prometheus text format.
+
+Metrics are created once, usually at module level, and updated by the code
+owning the data:
+
+    requests = registry.counter(
+        "vdsm_requests_total", "Number of requests", labels=("method",))
+    ...
+    requests.inc(method="Host.getStats")
+
+Updating a metric costs a dict lookup under a lock, so metrics can be
+updated on hot paths. Data collected by periodic operations, such as
+storage domains or vms stats, is published by replacing all the samples of
+a gauge at once:
+
+    delay.replace({(sd_id,): 0.001 for sd_id in domains})
+
+Exposing the metrics only formats the current values, so a scrape never
+waits for libvirt or storage.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import re
+import threading
+
+from vdsm.common import histogram as _histogram
+from vdsm.common.histogram import TIME_BUCKETS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_NAME = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+_LABEL = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+
+
+class Metric(object):
+
+    TYPE = None
+
+    def __init__(self, name, help, labels=()):
+        if not _NAME.match(name):
+            raise ValueError("Invalid metric name {!r}".format(name))
+        for label in labels:
+            if not _LABEL.match(label) or label.startswith("__"):
+                raise ValueError("Invalid label name {!r}".format(label))
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def clear(self):
+        with self._lock:
+            self._samples = {}
+
+    def expose(self):
+        """
+        Return a list of lines in Prometheus text format.
+        """
+        lines = [
+            "# HELP {} {}".format(self.name, _escape_help(self.help)),
+            "# TYPE {} {}".format(self.name, self.TYPE),
+        ]
+        with self._lock:
+            samples = list(self._samples.items())
+        for key, value in sorted(samples, key=lambda item: item[0]):
+            lines.extend(self._format(key, value))
+        return lines
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(
+                "Expected labels {}, got {}".format(self.labels, labels))
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _format(self, key, value):
+        return [_sample(self.name, self.labels, key, value)]
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, like the number of requests.
+    """
+
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, like the number of running vms.
+    """
+
+    TYPE = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = value
+
+    def replace(self, samples):
+        """
+        Replace all samples with samples, a dict mapping a tuple of label
+        values, in the order of the metric labels, to a value. Samples that
+        are not in samples, for example of a removed vm, are dropped.
+        """
+        samples = {tuple(str(v) for v in key): value
+                   for key, value in samples.items()}
+        for key in samples:
+            if len(key) != len(self.labels):
+                raise ValueError(
+                    "Expected labels {}, got {}".format(self.labels, key))
+        with self._lock:
+            self._samples = samples
+
+
+class Histogram(Metric):
+    """
+    Count observed values in fixed buckets, like the time to handle a
+    request.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        if "le" in labels:
+            raise ValueError("Invalid label name 'le'")
+        Metric.__init__(self, name, help, labels=labels)
+        self._buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            hist = self._samples.get(key)
+            if hist is None:
+                hist = self._samples[key] = _histogram.Histogram(
+                    self._buckets)
+        hist.observe(value)
+
+    def _format(self, key, hist):
+        info = hist.info()
+        bucket_labels = self.labels + ("le",)
+        lines = [
+            _sample(self.name + "_bucket", bucket_labels, key + (bound,), n)
+            for bound, n in info["buckets"].items()
+        ]
+        lines.append(_sample(self.name + "_sum", self.labels, key,
+                             info["sum"]))
+        lines.append(_sample(self.name + "_count", self.labels, key,
+                             info["count"]))
+        return lines
+
+
+class Registry(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels=labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels=labels))
+
+    def histogram(self, name, help, labels=(), buckets=TIME_BUCKETS):
+        return self.register(
+            Histogram(name, help, labels=labels, buckets=buckets))
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(
+                    "Metric {!r} already registered".format(metric.name))
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, metric):
+        with self._lock:
+            del self._metrics[metric.name]
+
+    def expose(self):
+        """
+        Return all metrics in Prometheus text format, encoded as utf-8.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        lines.append("")
+        return "\n".join(lines).encode("utf-8")
+
+
+_registry = Registry()
+
+counter = _registry.counter
+gauge = _registry.gauge
+histogram = _registry.histogram
+expose = _registry.expose
+
+
+def _sample(name, labels, values, value):
+    if labels:
+        pairs = ",".join('{}="{}"'.format(label, _escape_label(v))
+                         for label, v in zip(labels, values))
+        name = "{}{{{}}}".format(name, pairs)
+    return "{} {}".format(name, _format_value(value))
+
+
+def _format_value(value):
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(value)
+
+
+def _escape_help(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(text):
+    return (text.replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace('"', '\\"'))
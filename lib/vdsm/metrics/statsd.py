@@ -23,6 +23,10 @@ from __future__ import division
 
 import six
 import socket
+import threading
+
+from vdsm.common import time
+from vdsm.config import config
 
 _client = None
 
@@ -30,7 +34,14 @@ _client = None
 def start(address, port=8125):
     global _client
     if _client is None:
-        _client = _StatsClient(address, port=port)
+        client = _StatsClient(
+            address,
+            port=port,
+            maxudpsize=config.getint('metrics', 'statsd_max_packet_size'))
+        flush_interval = config.getint('metrics', 'statsd_flush_interval')
+        if flush_interval > 0:
+            client = _Aggregator(client, flush_interval)
+        _client = client
 
 
 def stop():
@@ -40,8 +51,7 @@ def stop():
 
 
 def send(report):
-    for name, value in six.iteritems(report):
-        _client.gauge(name, value)
+    _client.gauges(six.iteritems(report))
 
 
 class _StatsClient(object):
@@ -81,3 +91,67 @@ class _StatsClient(object):
         """
         data = '%s:%s|g' % (stat, value)
         self._send(data.encode('utf-8'))
+
+    def gauges(self, items):
+        """
+        Sending gauge reports for many metrics, packing as many newline
+        separated stat:value|g lines as fit in maxudpsize bytes in every
+        message. A line larger than maxudpsize is sent in its own message.
+
+        Args:
+            items (iterable): (stat, value) tuples
+        """
+        buf = []
+        size = 0
+        for stat, value in items:
+            line = ('%s:%s|g' % (stat, value)).encode('utf-8')
+            if buf and size + 1 + len(line) > self._maxudpsize:
+                self._send(b'\n'.join(buf))
+                buf = []
+                size = 0
+            if buf:
+                size += 1
+            buf.append(line)
+            size += len(line)
+        if buf:
+            self._send(b'\n'.join(buf))
+
+
+class _Aggregator(object):
+    """
+    Aggregate reports on the client side, sending the last value of every
+    metric once per flush_interval seconds.
+
+    Reports sent by different components during the interval are packed
+    together, reducing the number of messages. The values are flushed by
+    the first report after the interval has passed, so they may be sent
+    up to one reporting period late.
+    """
+
+    def __init__(self, client, flush_interval, clock=time.monotonic_time):
+        self._client = client
+        self._flush_interval = flush_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = clock()
+
+    def gauges(self, items):
+        with self._lock:
+            self._pending.update(items)
+            now = self._clock()
+            if now - self._last_flush < self._flush_interval:
+                return
+            self._last_flush = now
+            pending, self._pending = self._pending, {}
+        self._client.gauges(six.iteritems(pending))
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = self._clock()
+            pending, self._pending = self._pending, {}
+        self._client.gauges(six.iteritems(pending))
+
+    def close(self):
+        self.flush()
+        self._client.close()
@@ -28,22 +28,27 @@ from vdsm.network import bond_monitor
 from vdsm.network import dhcp_monitor
 from vdsm.network import lldp
 from vdsm.network.ipwrapper import getLinks
+from vdsm.network.link import stats as link_stats
+from vdsm.network.netinfo import cache as netinfo_cache
 
 Lldp = lldp.driver()
 
 
 def init_privileged_network_components():
     _lldp_init()
+    netinfo_cache.start_monitoring()
 
 
 def init_unprivileged_network_components(cif, net_api):
     dhcp_monitor.initialize_monitor(cif, net_api)
     bond_monitor.initialize_monitor(cif)
+    link_stats.start_monitoring()
 
 
 def stop_unprivileged_network_components():
     dhcp_monitor.Monitor.instance().stop()
     bond_monitor.stop()
+    link_stats.stop_monitoring()
 
 
 @contextmanager
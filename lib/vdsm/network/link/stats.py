@@ -21,36 +21,140 @@ from __future__ import absolute_import
 from __future__ import division
 
 import errno
+import logging
+import threading
 
+from vdsm.common import concurrent
 from vdsm.network.link import bond
 from vdsm.network.link import iface
 from vdsm.network.link import nic
 from vdsm.network.link import vlan
+from vdsm.network.netlink import link
+from vdsm.network.netlink import monitor
 
 
 def report():
     stats = {}
-    for iface_properties in iface.list():
+    for properties in link.iter_links_stats():
         try:
-            interface = iface.iface(iface_properties['name'])
-            stats[interface.device] = _generate_iface_stats(interface)
+            stats[properties['name']] = _generate_link_stats(properties)
         except IOError as e:
             if e.errno != errno.ENODEV:
                 raise
     return stats
 
 
-def _generate_iface_stats(interface):
-    stats = interface.statistics()
+def _generate_link_stats(properties):
+    counters = properties['stats']
+    is_up = link.is_link_up(properties['flags'], check_oper_status=True)
+    stats = {
+        'name': properties['name'],
+        'rx': counters['rx_bytes'],
+        'tx': counters['tx_bytes'],
+        'state': 'up' if is_up else 'down',
+        'rxDropped': counters['rx_dropped'],
+        'txDropped': counters['tx_dropped'],
+        'rxErrors': counters['rx_errors'],
+        'txErrors': counters['tx_errors'],
+    }
+    stats['speed'], stats['duplex'] = _cache.speed_and_duplex(properties)
+    return stats
+
+
+def _read_speed_and_duplex(properties):
+    device = properties['name']
+    iface_type = properties.get('type') or iface.get_alternative_type(device)
     speed = 0
-    if interface.type() == iface.Type.NIC:
-        speed = nic.speed(interface.device)
-    elif interface.type() == iface.Type.BOND:
-        speed = bond.speed(interface.device)
-    elif interface.type() == iface.Type.VLAN:
-        speed = vlan.speed(interface.device)
+    if iface_type == iface.Type.NIC:
+        speed = nic.speed(device)
+    elif iface_type == iface.Type.BOND:
+        speed = bond.speed(device)
+    elif iface_type == iface.Type.VLAN:
+        speed = vlan.speed(device)
 
-    stats['speed'] = speed
-    stats['duplex'] = nic.duplex(interface.device)
+    return iface_type, speed, nic.duplex(device)
 
-    return stats
+
+class _SpeedCache(object):
+    """
+    Cache links type, speed and duplex, which are expensive to read for each
+    link, unlike the link statistics.
+
+    The cache is used only while link events are monitored. When a link
+    changes, its entry is dropped, with the entries of all bonds and vlans,
+    since their speed depends on other links.
+    """
+
+    _DEPENDENT_TYPES = (iface.Type.BOND, iface.Type.VLAN)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._enabled = False
+        self._generation = 0
+
+    def speed_and_duplex(self, properties):
+        key = (properties['name'], properties['index'])
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation
+
+        if entry is None:
+            entry = _read_speed_and_duplex(properties)
+            with self._lock:
+                # Do not cache a value read before the link changed.
+                if self._enabled and generation == self._generation:
+                    self._entries[key] = entry
+
+        _, speed, duplex = entry
+        return speed, duplex
+
+    def enable(self):
+        with self._lock:
+            self._enabled = True
+
+    def disable(self):
+        with self._lock:
+            self._enabled = False
+            self._generation += 1
+            self._entries.clear()
+
+    def link_changed(self, name):
+        with self._lock:
+            self._generation += 1
+            self._entries = {
+                key: entry for key, entry in self._entries.items()
+                if key[0] != name and entry[0] not in self._DEPENDENT_TYPES
+            }
+
+
+_cache = _SpeedCache()
+_monitor = None
+
+
+def start_monitoring():
+    """
+    Cache links speed and duplex until link events change them.
+    """
+    global _monitor
+    _monitor = monitor.object_monitor(groups=('link',))
+    _monitor.start()
+    concurrent.thread(
+        _handle_events, args=(_monitor,), name='link-stats'
+    ).start()
+    _cache.enable()
+
+
+def stop_monitoring():
+    _cache.disable()
+    _monitor.stop()
+    _monitor.wait()
+
+
+def _handle_events(events):
+    try:
+        for event in events:
+            _cache.link_changed(event.get('name'))
+    except monitor.MonitorError:
+        logging.exception('Link monitor failed, not caching link speed')
+        _cache.disable()
@@ -21,16 +21,20 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import collections
 import errno
 import logging
+import threading
 
 import six
 
+from vdsm.common import concurrent
 from vdsm.network import nmstate
 from vdsm.network.ip.address import ipv6_supported
 from vdsm.network.ipwrapper import getLinks
 from vdsm.network.link import iface as link_iface
 from vdsm.network.netconfpersistence import RunningConfig
+from vdsm.network.netlink import monitor
 
 from . import bonding
 from . import bridges
@@ -50,6 +54,151 @@ class NetworkIsMissing(Exception):
     pass
 
 
+# Parts of the networking report cached by _ReportCache.
+_ADDRESSES = 'addresses'
+_ROUTES = 'routes'
+_NMSTATE = 'nmstate'
+_PERMANENT_HWADDRS = 'permanent_hwaddrs'
+_REPORT = 'report'
+
+# Devices whose report depends on other devices (e.g. bridge ports).
+_DEPENDENT_DEVICES = ('bondings', 'bridges')
+
+_MONITORED_GROUPS = (
+    'link',
+    'ipv4-ifaddr',
+    'ipv6-ifaddr',
+    'ipv4-route',
+    'ipv6-route',
+)
+
+
+class _ReportCache(object):
+    """
+    Cache the parts of the networking report. A part is dropped when a
+    netlink event that may change it arrives, so only the affected parts are
+    collected again:
+
+    - link event: the changed device, bonds and bridges, nmstate state and
+      permanent hardware addresses
+    - address event: the addresses and nmstate state
+    - route event: the routes and nmstate state
+
+    The nmstate state includes the DHCP and IPv6 autoconf configuration and
+    the nameservers. These may change on an interface which is up, for
+    example when DHCP is enabled or a new lease is acquired. There is no
+    link event in this case, only address and route events.
+
+    Any event drops the assembled report. All parts are dropped when vdsm
+    applies a setup.
+
+    The cache is used only while netlink events are monitored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Serializes building the report, so concurrent requests do not
+        # collect the same parts, and do not modify the cached addresses and
+        # routes (defaultdicts) while another request is using them.
+        self.report_lock = threading.Lock()
+        self._enabled = False
+        self._values = {}
+        self._generations = collections.defaultdict(int)
+
+    def get(self, key, func, *args):
+        with self._lock:
+            try:
+                return self._values[key]
+            except KeyError:
+                generation = self._generations[key]
+
+        value = func(*args)
+
+        with self._lock:
+            # Do not cache a value collected before it was invalidated.
+            if self._enabled and generation == self._generations[key]:
+                self._values[key] = value
+        return value
+
+    def enable(self):
+        with self._lock:
+            self._enabled = True
+
+    def disable(self):
+        with self._lock:
+            self._enabled = False
+            self._invalidate(list(self._values))
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._invalidate(keys or list(self._values))
+
+    def link_changed(self, name):
+        with self._lock:
+            keys = [
+                key
+                for key, value in six.viewitems(self._values)
+                if key == ('device', name)
+                or (key[0] == 'device' and value[0] in _DEPENDENT_DEVICES)
+            ]
+            keys.extend((_NMSTATE, _PERMANENT_HWADDRS, _REPORT))
+            self._invalidate(keys)
+
+    def handle_event(self, event):
+        event_type = event.get('event')
+        if event_type in ('new_link', 'del_link'):
+            self.link_changed(event.get('name'))
+        elif event_type in ('new_addr', 'del_addr'):
+            self.invalidate(_ADDRESSES, _NMSTATE, _REPORT)
+        elif event_type in ('new_route', 'del_route'):
+            self.invalidate(_ROUTES, _NMSTATE, _REPORT)
+
+    def _invalidate(self, keys):
+        for key in keys:
+            self._generations[key] += 1
+            self._values.pop(key, None)
+
+
+_cache = _ReportCache()
+_monitor = None
+
+
+def start_monitoring():
+    """
+    Cache the networking report until netlink events or a setup change it.
+    """
+    global _monitor
+    _monitor = monitor.object_monitor(groups=_MONITORED_GROUPS)
+    _monitor.start()
+    concurrent.thread(
+        _handle_events, args=(_monitor,), name='netinfo-cache'
+    ).start()
+    _cache.enable()
+
+
+def stop_monitoring():
+    _cache.disable()
+    _monitor.stop()
+    _monitor.wait()
+
+
+def invalidate():
+    """
+    Drop the cached networking report, called when the host networking is
+    changed by vdsm.
+    """
+    _cache.invalidate()
+
+
+def _handle_events(events):
+    try:
+        for event in events:
+            _cache.handle_event(event)
+    except monitor.MonitorError:
+        logging.exception('Netlink monitor failed, not caching netinfo')
+        _cache.disable()
+
+
 def _get(vdsmnets=None):
     """
     Generate a networking report for all devices.
@@ -57,11 +206,48 @@ def _get(vdsmnets=None):
     retrieving data from the running config.
     :return: Dict of networking devices with all their details.
     """
-    ipaddrs = getIpAddrs()
-    routes = get_routes()
+    if vdsmnets is not None:
+        with _cache.report_lock:
+            return _report(vdsmnets)
+
+    running_nets = RunningConfig().networks
+    with _cache.report_lock:
+        report_nets, report = _cache.get(
+            _REPORT, _running_report, running_nets
+        )
+        # The running config was modified without a setup.
+        if report_nets != running_nets:
+            _cache.invalidate(_REPORT)
+            report_nets, report = _cache.get(
+                _REPORT, _running_report, running_nets
+            )
+    return _copy(report)
+
+
+def _copy(value):
+    """
+    Copy the report so callers can modify it. Faster than copy.deepcopy()
+    since the report contains only dicts, lists and immutable values.
+    """
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in six.viewitems(value)}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _running_report(running_nets):
+    return running_nets, _report(running_nets=running_nets)
+
+
+def _report(vdsmnets=None, running_nets=None):
+    ipaddrs = _cache.get(_ADDRESSES, getIpAddrs)
+    routes = _cache.get(_ROUTES, get_routes)
 
     devices_info = _devices_report(ipaddrs, routes)
-    nets_info = _networks_report(vdsmnets, routes, ipaddrs, devices_info)
+    nets_info = _networks_report(
+        vdsmnets, routes, ipaddrs, devices_info, running_nets
+    )
 
     add_qos_info_to_devices(nets_info, devices_info)
 
@@ -69,7 +255,7 @@ def _get(vdsmnets=None):
     devices = _get_dev_names(nets_info, flat_devs_info)
     extra_info = _create_default_extra_info(devices)
 
-    state = nmstate.state_show()
+    state = _cache.get(_NMSTATE, nmstate.state_show)
     extra_info.update(_get_devices_info_from_nmstate(state, devices))
     nameservers = nmstate.get_nameservers(state)
 
@@ -186,9 +372,12 @@ def _get_dev_names(nets_info, flat_devs_info):
     } | frozenset(flat_devs_info)
 
 
-def _networks_report(vdsmnets, routes, ipaddrs, devices_info):
+def _networks_report(
+    vdsmnets, routes, ipaddrs, devices_info, running_nets=None
+):
     if vdsmnets is None:
-        running_nets = RunningConfig().networks
+        if running_nets is None:
+            running_nets = RunningConfig().networks
         nets_info = networks_base_info(running_nets, routes, ipaddrs)
     else:
         nets_info = vdsmnets
@@ -226,31 +415,48 @@ def _devices_report(ipaddrs, routes):
     devs_report = {'bondings': {}, 'bridges': {}, 'nics': {}, 'vlans': {}}
 
     for dev in (link for link in getLinks() if not link.isHidden()):
-        if dev.isBRIDGE():
-            devinfo = devs_report['bridges'][dev.name] = bridges.info(dev)
-        elif dev.isNICLike():
-            devinfo = devs_report['nics'][dev.name] = nics.info(dev)
-            devinfo.update(bonding.get_bond_slave_agg_info(dev.name))
-        elif dev.isBOND():
-            devinfo = devs_report['bondings'][dev.name] = bonding.info(dev)
-            devinfo.update(bonding.get_bond_agg_info(dev.name))
-            devinfo.update(LEGACY_SWITCH)
-        elif dev.isVLAN():
-            devinfo = devs_report['vlans'][dev.name] = {
-                'iface': dev.device,
-                'vlanid': dev.vlanid,
-            }
-        else:
+        dev_type, info = _cache.get(('device', dev.name), _device_info, dev)
+        if dev_type is None:
             continue
-        devinfo.update(_devinfo(dev, routes, ipaddrs))
+        devinfo = devs_report[dev_type][dev.name] = dict(info)
+        devinfo.update(_ipinfo(dev, routes, ipaddrs))
 
     _permanent_hwaddr_info(devs_report)
 
     return devs_report
 
 
+def _device_info(dev):
+    """
+    Return the device type in the report and the device information which
+    does not depend on addresses and routes.
+    """
+    if dev.isBRIDGE():
+        dev_type = 'bridges'
+        devinfo = bridges.info(dev)
+    elif dev.isNICLike():
+        dev_type = 'nics'
+        devinfo = nics.info(dev)
+        devinfo.update(bonding.get_bond_slave_agg_info(dev.name))
+    elif dev.isBOND():
+        dev_type = 'bondings'
+        devinfo = bonding.info(dev)
+        devinfo.update(bonding.get_bond_agg_info(dev.name))
+        devinfo.update(LEGACY_SWITCH)
+    elif dev.isVLAN():
+        dev_type = 'vlans'
+        devinfo = {
+            'iface': dev.device,
+            'vlanid': dev.vlanid,
+        }
+    else:
+        return None, None
+    devinfo.update(_linkinfo(dev))
+    return dev_type, devinfo
+
+
 def _permanent_hwaddr_info(devs_report):
-    paddr = bonding.permanent_address()
+    paddr = _cache.get(_PERMANENT_HWADDRS, bonding.permanent_address)
     nics_info = devs_report.get('nics', {})
     for nic, nicinfo in six.viewitems(nics_info):
         if nic in paddr:
@@ -306,7 +512,14 @@ def get_net_iface_from_config(net, netattrs):
     return iface
 
 
-def _devinfo(link, routes, ipaddrs):
+def _linkinfo(link):
+    return {
+        'ipv6autoconf': is_ipv6_local_auto(link.name),
+        'mtu': link.mtu,
+    }
+
+
+def _ipinfo(link, routes, ipaddrs):
     gateway = get_gateway(routes, link.name)
     ipv4addr, ipv4netmask, ipv4addrs, ipv6addrs = getIpInfo(
         link.name, ipaddrs, gateway
@@ -316,10 +529,8 @@ def _devinfo(link, routes, ipaddrs):
         'addr': ipv4addr,
         'ipv4addrs': ipv4addrs,
         'ipv6addrs': ipv6addrs,
-        'ipv6autoconf': is_ipv6_local_auto(link.name),
         'gateway': gateway,
         'ipv6gateway': get_gateway(routes, link.name, family=6),
-        'mtu': link.mtu,
         'netmask': ipv4netmask,
         'ipv4defaultroute': is_default_route(gateway, routes),
     }
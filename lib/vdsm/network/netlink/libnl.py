@@ -43,6 +43,7 @@ from ctypes import c_char_p
 from ctypes import c_int
 from ctypes import c_size_t
 from ctypes import c_uint32
+from ctypes import c_uint64
 from ctypes import c_ushort
 from ctypes import c_void_p
 from ctypes import get_errno
@@ -186,6 +187,18 @@ class NlCbKind(object):
     NL_CB_CUSTOM = 3  # Customized handler specified by user
 
 
+# include/netlink/route/link.h
+class RtnlLinkStat(object):
+    RTNL_LINK_RX_PACKETS = 0
+    RTNL_LINK_TX_PACKETS = 1
+    RTNL_LINK_RX_BYTES = 2
+    RTNL_LINK_TX_BYTES = 3
+    RTNL_LINK_RX_ERRORS = 4
+    RTNL_LINK_TX_ERRORS = 5
+    RTNL_LINK_RX_DROPPED = 6
+    RTNL_LINK_TX_DROPPED = 7
+
+
 class RtnlObjectType(object):
     BASE = 'route'
     ADDR = BASE + '/addr'  # libnl/lib/route/addr.c
@@ -890,6 +903,23 @@ def rtnl_link_get_qdisc(link):
     return conversion_util.to_str(qdisc) if qdisc else None
 
 
+def rtnl_link_get_stat(link, stat_id):
+    """Return a statistical counter of link object.
+
+    @arg link            Link object
+    @arg stat_id         Identifier of statistical counter (RtnlLinkStat)
+
+    The counters are reported by the kernel in the link message (64 bit
+    counters if available), so no additional request is needed.
+
+    @return Value of counter or 0 if not specified.
+    """
+    _rtnl_link_get_stat = _libnl_route(
+        'rtnl_link_get_stat', c_uint64, c_void_p, c_int
+    )
+    return _rtnl_link_get_stat(link, stat_id)
+
+
 def rtnl_link_i2name(cache, ifindex):
     """Translate interface index to corresponding link name.
 
@@ -52,6 +52,20 @@ def iter_links():
                 link = libnl.nl_cache_get_next(link)
 
 
+def iter_links_stats():
+    """Generator that yields an information dictionary for each link of the
+    system, including the link statistics under the 'stats' key. All links
+    and their statistics are received in a single dump."""
+    with _pool.socket() as sock:
+        with _nl_link_cache(sock) as cache:
+            link = libnl.nl_cache_get_first(cache)
+            while link:
+                info = _link_info(link, cache=cache)
+                info['stats'] = _link_stats(link)
+                yield info
+                link = libnl.nl_cache_get_next(link)
+
+
 def is_link_up(link_flags, check_oper_status):
     """
     Check link status based on device status flags.
@@ -108,6 +122,25 @@ def _link_info(link, cache=None):
     return info
 
 
+def _link_stats(link):
+    """Returns a dictionary with the statistics of the link object, named
+    like the files in /sys/class/net/<link>/statistics."""
+    return {
+        name: libnl.rtnl_link_get_stat(link, stat_id)
+        for name, stat_id in _LINK_STATS
+    }
+
+
+_LINK_STATS = (
+    ('rx_bytes', libnl.RtnlLinkStat.RTNL_LINK_RX_BYTES),
+    ('tx_bytes', libnl.RtnlLinkStat.RTNL_LINK_TX_BYTES),
+    ('rx_dropped', libnl.RtnlLinkStat.RTNL_LINK_RX_DROPPED),
+    ('tx_dropped', libnl.RtnlLinkStat.RTNL_LINK_TX_DROPPED),
+    ('rx_errors', libnl.RtnlLinkStat.RTNL_LINK_RX_ERRORS),
+    ('tx_errors', libnl.RtnlLinkStat.RTNL_LINK_TX_ERRORS),
+)
+
+
 def _link_index_to_name(link_index, cache=None):
     """Returns the textual name of the link with index equal to link_index."""
     if cache is None:
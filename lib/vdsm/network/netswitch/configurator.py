@@ -40,6 +40,7 @@ from vdsm.network.netconfpersistence import RunningConfig, Transaction
 from vdsm.network.netlink import waitfor
 from vdsm.network.link import bond
 from vdsm.network.netinfo import bridges
+from vdsm.network.netinfo import cache as netinfo_cache
 from vdsm.network.netinfo.cache import get as netinfo_get, NetInfo
 from vdsm.network.netinfo.cache import get_net_iface_from_config
 
@@ -68,7 +69,10 @@ def validate(networks, bondings, net_info, running_config):
 
 
 def setup(networks, bondings, options, in_rollback):
-    _setup_nmstate(networks, bondings, options, in_rollback)
+    try:
+        _setup_nmstate(networks, bondings, options, in_rollback)
+    finally:
+        netinfo_cache.invalidate()
 
     if options.get('commitOnSuccess'):
         persist()
@@ -92,6 +96,8 @@ def _setup_nmstate(networks, bondings, options, in_rollback):
     logging.info('Desired state: %s', desired_state)
     _setup_dynamic_src_routing(networks)
     nmstate.setup(desired_state, verify_change=not in_rollback)
+    # The netlink events about the changes may not have arrived yet.
+    netinfo_cache.invalidate()
     net_info = NetInfo(netinfo_get())
 
     with Transaction(in_rollback=in_rollback, persistent=False) as config:
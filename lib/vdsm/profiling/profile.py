@@ -26,21 +26,26 @@ profiling facade.
 
 from . import cpu
 from . import memory
+from . import sampling
 
 
 def start():
     cpu.start()
     memory.start()
+    if sampling.is_enabled():
+        sampling.start()
 
 
 def stop():
     cpu.stop()
     memory.stop()
+    if sampling.is_running():
+        sampling.stop()
 
 
 def status():
     res = {}
-    for profiler in (cpu, memory):
+    for profiler in (cpu, memory, sampling):
         res[profiler.__name__] = {
             "enabled": profiler.is_enabled(),
             "running": profiler.is_running()
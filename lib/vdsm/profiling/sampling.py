@@ -0,0 +1,258 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+"""
+This module provides statistical sampling profiling.
+
+Unlike the cpu profiler, the sampling profiler does not trace every function
+call. A background thread wakes up rate times per second, and records the
+stack of every other thread. The cost depends on the number of threads and
+the rate, not on the code being profiled, so the profiler can run in
+production.
+
+Stacks are counted in collapsed format, one line per unique stack:
+
+    thread;outer (file.py);inner (file.py) count
+
+This is the input format of flamegraph.pl and speedscope.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+from vdsm.common import concurrent
+from vdsm.config import config
+
+from .errors import UsageError
+
+_lock = threading.Lock()
+_profiler = None
+
+
+class Profiler(object):
+
+    def __init__(self, rate=50, max_stacks=10000):
+        """
+        Arguments:
+          rate          Samples per second
+          max_stacks    Maximum number of unique stacks kept. When full, the
+                        oldest stack is dropped.
+        """
+        if rate <= 0:
+            raise ValueError("Invalid rate: %r" % rate)
+        self.rate = rate
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        # (thread name, (code, ...)) -> _Stack, oldest first.
+        self._stacks = {}
+        # Thread ident -> (leaf frame, _Stack) in the last sample.
+        self._last = {}
+        self._samples = 0
+        self._dropped = 0
+        self._labels = {}
+
+    def start(self):
+        if self.is_running():
+            raise UsageError("Sampling profiler is already running")
+        logging.info("Starting sampling profiler (rate=%s)", self.rate)
+        self._done.clear()
+        self._thread = concurrent.thread(
+            self._run, name="profiling/sampler", log=logging.getLogger())
+        self._thread.start()
+
+    def stop(self):
+        if not self.is_running():
+            raise UsageError("Sampling profiler is not running")
+        logging.info("Stopping sampling profiler")
+        self._done.set()
+        self._thread.join()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None
+
+    def dump(self, clear=False):
+        """
+        Return a dict with the profile in collapsed format, and the number
+        of samples and dropped stacks. If clear is True, start a new
+        profile.
+        """
+        with self._lock:
+            stacks = [(key, stack.count)
+                      for key, stack in self._stacks.items()]
+            info = {
+                "running": self.is_running(),
+                "rate": self.rate,
+                "samples": self._samples,
+                "dropped": self._dropped,
+            }
+            if clear:
+                for stack in self._stacks.values():
+                    stack.dropped = True
+                self._stacks = {}
+                self._samples = 0
+                self._dropped = 0
+
+        lines = []
+        for (name, codes), count in stacks:
+            frames = [name]
+            frames.extend(self._label(code) for code in codes)
+            lines.append("%s %d" % (";".join(frames), count))
+        lines.sort()
+        info["stacks"] = "".join(line + "\n" for line in lines)
+        return info
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        try:
+            # Waking up from Event.wait() with a timeout is much more
+            # expensive than from sleep(), and the sampler wakes up often.
+            while True:
+                time.sleep(interval)
+                if self._done.is_set():
+                    break
+                self._sample()
+        finally:
+            # Do not keep other threads frames when not sampling.
+            with self._lock:
+                self._last = {}
+
+    def _sample(self):
+        me = threading.current_thread().ident
+        frames = sys._current_frames()
+        names = None
+        last = {}
+
+        with self._lock:
+            self._samples += 1
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                # Most threads are blocked in the same frame since the last
+                # sample; a frame stack cannot change, so we can count it
+                # without walking the stack again.
+                entry = self._last.get(ident)
+                if (entry is not None and entry[0] is frame and
+                        not entry[1].dropped):
+                    stack = entry[1]
+                else:
+                    if names is None:
+                        names = {t.ident: t.name
+                                 for t in threading.enumerate()}
+                    stack = self._lookup(names.get(ident, "unknown"), frame)
+                stack.count += 1
+                last[ident] = (frame, stack)
+            self._last = last
+
+    def _lookup(self, name, frame):
+        # Must be called with the lock held.
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        key = (name, tuple(codes))
+
+        stack = self._stacks.get(key)
+        if stack is None:
+            if len(self._stacks) >= self.max_stacks:
+                oldest = next(iter(self._stacks))
+                self._stacks.pop(oldest).dropped = True
+                self._dropped += 1
+            stack = self._stacks[key] = _Stack()
+        return stack
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = "%s (%s)" % (code.co_name, _short_path(code.co_filename))
+            self._labels[code] = label
+        return label
+
+
+class _Stack(object):
+
+    __slots__ = ("count", "dropped")
+
+    def __init__(self):
+        self.count = 0
+        self.dropped = False
+
+
+def _short_path(filename):
+    # Keep the package and module name, enough to find the code.
+    parent, name = os.path.split(filename)
+    return os.path.join(os.path.basename(parent), name)
+
+
+def start(rate=None):
+    """ Starts application wide sampling profiling """
+    global _profiler
+    with _lock:
+        if _profiler and _profiler.is_running():
+            raise UsageError("Sampling profiler is already running")
+        if rate is None:
+            rate = config.getint('devel', 'sampling_profile_rate')
+        _profiler = Profiler(
+            rate=rate,
+            max_stacks=config.getint('devel', 'sampling_profile_max_stacks'))
+        _profiler.start()
+
+
+def stop():
+    """ Stops application wide sampling profiling """
+    with _lock:
+        if _profiler is None:
+            raise UsageError("Sampling profiler is not running")
+        _profiler.stop()
+
+
+def dump(clear=False):
+    """
+    Return the application wide profile. The profile is kept after the
+    profiler was stopped, until clear is True or the profiler is started
+    again.
+    """
+    with _lock:
+        if _profiler is None:
+            return {
+                "running": False,
+                "rate": 0,
+                "samples": 0,
+                "dropped": 0,
+                "stacks": "",
+            }
+        return _profiler.dump(clear=clear)
+
+
+def is_enabled():
+    return config.getboolean('devel', 'sampling_profile_enable')
+
+
+def is_running():
+    with _lock:
+        return _profiler is not None and _profiler.is_running()
@@ -332,6 +332,14 @@ command_info = {
     'Host_getCapabilities': {'ret': Host_getCapabilities_Ret},
     'Host_getNetworkCapabilities': {'ret': 'info'},
     'Host_getNetworkStatistics': {'ret': 'info'},
+    'Host_getResourceManagerStats': {'ret': 'info'},
+    'Host_getDomainXMLStats': {'ret': 'info'},
+    'Host_getVolumeExtensionStats': {'ret': 'info'},
+    'Host_getPeriodicStats': {'ret': 'info'},
+    'Host_getHookStats': {'ret': 'info'},
+    'Host_getExecutorStats': {'ret': 'info'},
+    'Host_getSchedulerStats': {'ret': 'info'},
+    'Host_getSamplingProfile': {'ret': 'info'},
     'Host_getConnectedStoragePools': {'ret': 'poollist'},
     'Host_getDeviceList': {'ret': 'devList'},
     'Host_getDevicesVisibility': {'ret': 'visible'},
@@ -41,12 +41,16 @@ class BindingJsonRpc(object):
         self._executor = executor.Executor(name="jsonrpc",
                                            workers_count=_THREADS,
                                            max_tasks=_TASKS,
-                                           scheduler=scheduler)
+                                           scheduler=scheduler,
+                                           work_stealing=config.getboolean(
+                                               'vars',
+                                               'executor_work_stealing'))
         self._bridge = bridge
         self._server = JsonRpcServer(
             bridge, timeout, cif,
             functools.partial(self._executor.dispatch,
-                              timeout=_TIMEOUT, discard=False))
+                              timeout=_TIMEOUT, discard=False),
+            log_max_size=config.getint('rpc', 'log_max_size'))
         self._reactor = StompReactor(subs)
         self.startReactor()
 
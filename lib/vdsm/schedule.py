@@ -57,14 +57,23 @@ Finally, when the scheduler is not needed any more:
     scheduler.stop()
 
 This will cancel any pending calls and terminate the scheduler thread.
+
+WheelScheduler is a drop-in replacement keeping calls in a hierarchical
+timer wheel instead of a heap. Scheduling and canceling a call are O(1),
+and canceled calls are removed immediately, at the cost of firing calls up
+to one wheel tick (10 milliseconds by default) late.
+
+Both schedulers report how late calls fired in stats().
 """
 
 import heapq
 import logging
+import math
 import threading
 import time
 
 from vdsm.common import concurrent
+from vdsm.common.histogram import Histogram
 
 
 class Scheduler(object):
@@ -92,6 +101,7 @@ class Scheduler(object):
         self._cond = threading.Condition(threading.Lock())
         self._running = False
         self._calls = []
+        self._lateness = Histogram()
         self._thread = concurrent.thread(self._run, name=self._name,
                                          log=self._log)
 
@@ -156,8 +166,17 @@ class Scheduler(object):
                     if not self._running:
                         return
                 expired = self._pop_expired_calls()
-            for call in expired:
-                call._execute()
+            _execute(expired, self._clock, self._lateness)
+
+    def stats(self):
+        """
+        Return the number of scheduled calls, including canceled calls not
+        removed yet, and a histogram of the time from the call deadline
+        until the call was executed.
+        """
+        with self._cond:
+            calls = len(self._calls)
+        return {"calls": calls, "lateness": self._lateness.info()}
 
     def _time_until_deadline(self):
         if len(self._calls) > 0:
@@ -183,6 +202,261 @@ class Scheduler(object):
                 call.cancel()
 
 
+class WheelScheduler(object):
+    """
+    Schedule calls for future execution in a background thread, keeping
+    calls in a hierarchical timer wheel.
+
+    Time is divided into ticks of resolution seconds. A call is kept in
+    the first wheel if it expires in the next 256 ticks, in the second
+    wheel if it expires in the next 256**2 ticks, and so on. When the
+    first wheel completes a rotation, the calls of the next slot of the
+    second wheel are moved to the first wheel, and so on.
+
+    Calls never fire before their deadline, and may fire up to one tick
+    after it. Canceled calls are removed from the wheel immediately.
+
+    This class is thread safe; multiple threads can schedule calls or cancel
+    the scheduler.
+    """
+
+    DEFAULT_DELAY = 30.0  # Used if no call are scheduled
+
+    _BITS = 8
+    _SLOTS = 1 << _BITS
+    _MASK = _SLOTS - 1
+    _LEVELS = 4
+
+    _log = logging.getLogger("Scheduler")
+
+    def __init__(self, name="Scheduler", clock=time.time, resolution=0.01):
+        """
+        Initialize a scheduler.
+
+        Arguments:
+          name          Used as sheculer thread name
+          clock         Callable returning current time (default time.time)
+          resolution    Wheel tick in seconds (default 0.01)
+        """
+        self._name = name
+        self._clock = clock
+        self._resolution = resolution
+        self._cond = threading.Condition(threading.Lock())
+        self._running = False
+        self._wheels = [[set() for i in range(self._SLOTS)]
+                        for level in range(self._LEVELS)]
+        self._counts = [0] * self._LEVELS
+        self._base = clock()
+        # The next tick to process.
+        self._tick = 0
+        # The tick the scheduler thread will wake up for.
+        self._wakeup = None
+        self._lateness = Histogram()
+        self._thread = concurrent.thread(self._run, name=self._name,
+                                         log=self._log)
+
+    def start(self):
+        self._log.debug("Starting scheduler %s", self._name)
+        with self._cond:
+            if self._running:
+                raise AssertionError("Scheduler already running")
+            self._running = True
+            self._thread.start()
+
+    def stop(self, wait=False):
+        """
+        Cancel all scheduled calls and stop the scheduler. Scheduling calls
+        after the scheduler was stopped will raise AssertionError.
+        """
+        self._log.debug("Stopping scheduler %s", self._name)
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if wait:
+            self._thread.join()
+
+    def schedule(self, delay, callable):
+        """
+        Schedule callable to be called after delay seconds on the scheduler
+        thread.
+
+        Callable must not block or take excessive time to complete. If it does
+        not finish quickly, it may delay other scheduled calls on the scheduler
+        thread.
+
+        Returns a ScheduledCall that may be canceled if callable was not called
+        yet.
+        """
+        deadline = self._clock() + delay
+        call = _WheelCall(deadline, callable, self)
+        expires = int(math.ceil((deadline - self._base) / self._resolution))
+        with self._cond:
+            if not self._running:
+                raise AssertionError("Scheduler not running")
+            self._insert(call, expires)
+            if self._wakeup is None or expires < self._wakeup:
+                self._cond.notify()
+        return call
+
+    def stats(self):
+        """
+        Return the number of scheduled calls, and a histogram of the time
+        from the call deadline until the call was executed.
+        """
+        with self._cond:
+            calls = sum(self._counts)
+        return {"calls": calls, "lateness": self._lateness.info()}
+
+    def _run(self):
+        self._log.debug("started")
+        try:
+            self._loop()
+            self._log.debug("stopped")
+        finally:
+            self._cancel_calls()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                delay = self._time_until_next_tick()
+                if delay > 0.0:
+                    self._cond.wait(delay)
+                    if not self._running:
+                        return
+                self._wakeup = None
+                expired = self._pop_expired_calls()
+            _execute(expired, self._clock, self._lateness)
+
+    def _time_until_next_tick(self):
+        """
+        Return the time until the next tick with calls, or the next tick
+        moving calls from the other wheels. Must be called with the lock
+        held.
+        """
+        if sum(self._counts) == 0:
+            self._wakeup = None
+            return self.DEFAULT_DELAY
+
+        # Calls in the other wheels are moved to the first wheel at the end
+        # of the rotation.
+        rotation = (self._tick | self._MASK) + 1
+        if self._counts[0] > 0:
+            # All calls in the first wheel expire before the end of the
+            # next rotation.
+            tick = self._tick
+            wheel = self._wheels[0]
+            while not wheel[tick & self._MASK]:
+                tick += 1
+            if sum(self._counts[1:]) > 0:
+                tick = min(tick, rotation)
+        else:
+            tick = rotation
+
+        self._wakeup = tick
+        return self._base + tick * self._resolution - self._clock()
+
+    def _pop_expired_calls(self):
+        """
+        Process all ticks until now, returning the expired calls. Must be
+        called with the lock held.
+        """
+        now_tick = int((self._clock() - self._base) / self._resolution)
+        expired = []
+        while self._tick <= now_tick:
+            if self._counts[0] == 0 and self._tick & self._MASK:
+                # Nothing to do until the next rotation.
+                self._tick = min(now_tick + 1, (self._tick | self._MASK) + 1)
+                continue
+
+            if self._tick & self._MASK == 0:
+                self._cascade()
+
+            slot = self._wheels[0][self._tick & self._MASK]
+            if slot:
+                for call in slot:
+                    call._slot = None
+                self._counts[0] -= len(slot)
+                expired.extend(slot)
+                slot.clear()
+
+            self._tick += 1
+
+        expired.sort(key=lambda call: call._deadline)
+        return expired
+
+    def _cascade(self):
+        for level in range(1, self._LEVELS):
+            index = (self._tick >> (self._BITS * level)) & self._MASK
+            slot = self._wheels[level][index]
+            calls = list(slot)
+            slot.clear()
+            self._counts[level] -= len(calls)
+            for call in calls:
+                self._insert(call, call._expires)
+            if index != 0:
+                break
+
+    def _insert(self, call, expires):
+        # Must be called with the lock held.
+        if expires < self._tick:
+            expires = self._tick
+        # Wheel level keeps calls expiring in less than 256**(level + 1)
+        # ticks.
+        delta = expires - self._tick
+        level = max(0, (delta.bit_length() - 1) // self._BITS)
+        if level >= self._LEVELS:
+            # Too far in the future; will be moved again when reaching the
+            # last wheel slot.
+            level = self._LEVELS - 1
+            expires = self._tick + (1 << (self._BITS * self._LEVELS)) - 1
+        index = (expires >> (self._BITS * level)) & self._MASK
+        slot = self._wheels[level][index]
+        slot.add(call)
+        call._expires = expires
+        call._slot = slot
+        call._level = level
+        self._counts[level] += 1
+
+    def _remove(self, call):
+        with self._cond:
+            slot = call._slot
+            if slot is not None:
+                slot.discard(call)
+                call._slot = None
+                self._counts[call._level] -= 1
+
+    def _cancel_calls(self):
+        # Help the garbage collector by breaking reference cycles
+        with self._cond:
+            for wheel in self._wheels:
+                for slot in wheel:
+                    for call in slot:
+                        call._callable = _INVALID
+                        call._slot = None
+                    slot.clear()
+            self._counts = [0] * self._LEVELS
+
+
+def create(type, name="Scheduler", clock=time.time):
+    """
+    Create a scheduler of type "heap" or "wheel".
+    """
+    if type == "heap":
+        return Scheduler(name=name, clock=clock)
+    if type == "wheel":
+        return WheelScheduler(name=name, clock=clock)
+    raise ValueError("Unsupported scheduler type: %r" % type)
+
+
+def _execute(calls, clock, lateness):
+    for call in calls:
+        if call.valid():
+            lateness.observe(clock() - call._deadline)
+            call._execute()
+
+
 class ScheduledCall(object):
     """
     Returned when a callable is scheduled. The caller may cancel the call if it
@@ -224,6 +498,27 @@ class ScheduledCall(object):
         return self._deadline < other._deadline
 
 
+class _WheelCall(ScheduledCall):
+    """
+    A call scheduled in a WheelScheduler, removed from the wheel when
+    canceled.
+    """
+
+    __slots__ = ('_scheduler', '_expires', '_slot', '_level')
+
+    def __init__(self, deadline, callable, scheduler):
+        ScheduledCall.__init__(self, deadline, callable)
+        self._scheduler = scheduler
+        self._expires = None
+        self._slot = None
+        self._level = None
+
+    def cancel(self):
+        ScheduledCall.cancel(self)
+        if self._slot is not None:
+            self._scheduler._remove(self)
+
+
 # Sentinel for marking calls as invalid. Callable so we can invalidate a call
 # in a thread safe manner without locks.
 def _INVALID():
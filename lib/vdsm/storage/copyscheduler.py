@@ -0,0 +1,121 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+"""
+copyscheduler - limit concurrent volume copies.
+
+Volumes are copied by qemu-img convert, possibly by many concurrent storage
+tasks and jobs copying different images. Running too many copies at the same
+time on the same storage overloads the storage, and running too few wastes
+the available bandwidth.
+
+The copies are limited per host and per storage domain. Every copy must
+acquire a slot before it starts.
+
+The volumes of a single image chain must be copied in order, base volume
+first. When copying a volume on top of its destination backing chain, qemu-img
+opens the backing chain read-only, and qemu image locking prevents writing to
+the backing volumes at the same time.
+
+Example usage::
+
+    with copyscheduler.slot((src_sd_id, dst_sd_id)):
+        operation.run()
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import logging
+import threading
+
+from contextlib import contextmanager
+
+from vdsm.common.units import MiB
+from vdsm.config import config
+
+log = logging.getLogger("storage.copyscheduler")
+
+
+class Limiter(object):
+    """
+    Limit the number of concurrent copies per host and per storage domain.
+    """
+
+    def __init__(self, max_workers, max_domain_workers):
+        if max_workers < 1:
+            raise ValueError("max_workers {} < 1".format(max_workers))
+        if max_domain_workers < 1:
+            raise ValueError(
+                "max_domain_workers {} < 1".format(max_domain_workers))
+        self._host = threading.BoundedSemaphore(max_workers)
+        self._max_domain_workers = max_domain_workers
+        self._lock = threading.Lock()
+        self._domains = {}
+
+    @contextmanager
+    def slot(self, sd_ids):
+        """
+        Wait until a copy accessing sd_ids can run.
+
+        Domain slots are always acquired in the same order, and the host slot
+        is acquired last, so concurrent callers cannot deadlock.
+        """
+        acquired = []
+        try:
+            for sd_id in sorted(set(sd_ids)):
+                sem = self._domain_semaphore(sd_id)
+                sem.acquire()
+                acquired.append(sem)
+            with self._host:
+                yield
+        finally:
+            for sem in reversed(acquired):
+                sem.release()
+
+    def _domain_semaphore(self, sd_id):
+        with self._lock:
+            sem = self._domains.get(sd_id)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self._max_domain_workers)
+                self._domains[sd_id] = sem
+            return sem
+
+
+_limiter = Limiter(
+    config.getint("irs", "copy_max_workers"),
+    config.getint("irs", "copy_max_domain_workers"))
+
+
+def slot(sd_ids):
+    """
+    Wait until a copy accessing storage domains sd_ids can run, using the
+    host limits.
+    """
+    log.debug("Waiting for copy slot on storage domains %s", sorted(sd_ids))
+    return _limiter.slot(sd_ids)
+
+
+def rate_limit():
+    """
+    Return the rate limit for a single copy in bytes per second, or None if
+    copies are not rate limited.
+    """
+    rate = config.getint("irs", "copy_rate_limit_mb")
+    return rate * MiB if rate > 0 else None
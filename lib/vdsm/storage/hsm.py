@@ -2438,23 +2438,29 @@ class HSM(object):
                 "domType=%s, spUUID=%s, conList=%s" %
                 (domType, spUUID, conList)))
 
-        res = []
-        connections = []
+        conObjs = []
+        conDefs = {}
         for conDef in conList:
             conInfo = _connectionDict2ConnectionInfo(domType, conDef)
             conObj = storageServer.ConnectionFactory.createConnection(conInfo)
-            try:
-                self._connectStorageOverIser(conDef, conObj, domType)
-                conObj.connect()
-            except Exception as err:
-                self.log.error(
-                    "Could not connect to storageServer", exc_info=True)
-                status, _ = self._translateConnectionError(err)
+            conObjs.append(conObj)
+            conDefs[id(conObj)] = conDef
+
+        def prepare(conObj):
+            self._connectStorageOverIser(conDefs[id(conObj)], conObj, domType)
+
+        res = []
+        connections = []
+        for conDef, result in zip(
+                conList, storageServer.connect_all(conObjs, prepare=prepare)):
+            if result.error is not None:
+                status, _ = self._translateConnectionError(result.error)
             else:
                 status = 0
-                connections.append(conObj)
+                connections.append(result.connection)
 
-            res.append({'id': conDef["id"], 'status': status})
+            res.append({'id': conDef["id"], 'status': status,
+                        'elapsed': result.elapsed})
 
         if connections and domType == sd.ISCSI_DOMAIN:
             # We sleep here for 5 seconds (by default), to allow time for
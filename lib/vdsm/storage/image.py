@@ -33,6 +33,7 @@ from vdsm.common.marks import deprecated
 from vdsm.common.threadlocal import vars
 from vdsm.common.units import MiB
 from vdsm.storage import constants as sc
+from vdsm.storage import copyscheduler
 from vdsm.storage import exception as se
 from vdsm.storage import glance
 from vdsm.storage import imageSharing
@@ -458,12 +459,17 @@ class Image:
                             dstVol.getFormat()),
                         create=dstVol.requires_create(),
                         target_is_zero=dstVol.zero_initialized(),
+                        rate_limit=copyscheduler.rate_limit(),
                     )
-                    with utils.stopwatch(
-                            "Copy volume {}".format(srcVol.volUUID),
-                            level=logging.INFO,
-                            log=self.log):
-                        self._run_qemuimg_operation(operation)
+                    # The volumes of the chain must be copied in order, since
+                    # qemu-img opens the destination backing chain read-only.
+                    # Copies of other images may run at the same time.
+                    with copyscheduler.slot((srcSdUUID, destDom.sdUUID)):
+                        with utils.stopwatch(
+                                "Copy volume {}".format(srcVol.volUUID),
+                                level=logging.INFO,
+                                log=self.log):
+                            self._run_qemuimg_operation(operation)
                 except ActionStopped:
                     raise
                 except se.StorageException:
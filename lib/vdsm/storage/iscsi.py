@@ -204,6 +204,10 @@ def addIscsiNode(iface, target, credentials=None):
     # bounded iface. Explicitly specifying tpgt on iSCSI login imposes creation
     # of the node record in the new style format which enables to access a
     # portal through multiple ifaces for multipathing.
+    #
+    # Only modifying the node records is serialized. Logging in may take
+    # several seconds per target, and logins to different nodes can run
+    # concurrently.
     with _iscsiadmTransactionLock:
         iscsiadm.node_new(iface.name, target.address, target.iqn)
         try:
@@ -215,14 +219,19 @@ def addIscsiNode(iface, target, credentials=None):
 
             setRpFilterIfNeeded(iface.netIfaceName, target.portal.hostname,
                                 True)
+        except:
+            removeIscsiNode(iface, target)
+            raise
 
-            iscsiadm.node_login(iface.name, target.address, target.iqn)
+    try:
+        iscsiadm.node_login(iface.name, target.address, target.iqn)
 
+        with _iscsiadmTransactionLock:
             iscsiadm.node_update(iface.name, target.address, target.iqn,
                                  "node.startup", "manual")
-        except:
-            removeIscsiNode(iface, target)
-            raise
+    except:
+        removeIscsiNode(iface, target)
+        raise
 
 
 def removeIscsiNode(iface, target):
@@ -23,6 +23,8 @@ from __future__ import division
 
 import os
 import errno
+import heapq
+import itertools
 import time
 import threading
 import struct
@@ -41,6 +43,8 @@ from vdsm.storage.threadPool import ThreadPool
 
 from vdsm import constants
 from vdsm.common import concurrent
+from vdsm.common.histogram import Histogram
+from vdsm.common.time import monotonic_time
 
 __author__ = "ayalb"
 __date__ = "$Mar 9, 2009 5:25:07 PM$"
@@ -114,6 +118,12 @@ class SPM_Extend_Message:
         self.pool = volumeData['poolID']
         self.volumeData = volumeData
         self.callback = callbackFunction
+        self.newSize = newSize
+        # Requests with lower priority value are sent first. Requests without
+        # priority (e.g. extending before merge) are the most urgent.
+        self.priority = volumeData.get('priority', 0)
+        self.created = monotonic_time()
+        self._merged = []
 
         # Message structure is rigid (order must be kept and is relied upon):
         # Version (1 byte), OpCode (4 bytes), Domain UUID (16 bytes), Volume
@@ -132,6 +142,30 @@ class SPM_Extend_Message:
     def __getitem__(self, index):
         return self.payload[index]
 
+    @property
+    def key(self):
+        return (self.volumeData['domainID'], self.volumeData['volumeID'])
+
+    def merge(self, other):
+        """
+        Merge other request for the same volume into this request. When this
+        request is completed, the callbacks of both requests are called.
+        """
+        self.priority = min(self.priority, other.priority)
+        self.created = min(self.created, other.created)
+        self._merged.append(other)
+        self._merged.extend(other._merged)
+        other._merged = []
+
+    def callbacks(self):
+        """
+        Return list of (callback, volumeData) tuples for this request and the
+        requests merged into it.
+        """
+        return [(msg.callback, msg.volumeData)
+                for msg in [self] + self._merged
+                if msg.callback]
+
     def checkReply(self, reply):
         # Sanity check - Make sure reply is for current message
         sizeOffset = 5 + 2 * PACKED_UUID_SIZE
@@ -183,6 +217,116 @@ class SPM_Extend_Message:
             return {'status': {'code': 0, 'message': 'Done'}}
 
 
+class ExtendQueue(object):
+    """
+    Queue of extend requests waiting for a free mailbox slot, serving the
+    requests with the lowest priority first.
+
+    A request for a volume that already has a pending request is merged into
+    the pending request, keeping the larger size.
+
+    Provides the subset of queue.Queue interface used by HSM_MailMonitor.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._heap = []
+        self._pending = {}
+        self._seq = itertools.count()
+
+    def put(self, msg):
+        with self._cond:
+            entry = self._pending.pop(msg.key, None)
+            if entry is not None:
+                old = entry[-1]
+                # Invalidate the old entry, removed lazily in get().
+                entry[-1] = None
+                if msg.newSize > old.newSize:
+                    msg.merge(old)
+                else:
+                    old.merge(msg)
+                    msg = old
+                _stats.merged()
+            entry = [msg.priority, next(self._seq), msg]
+            heapq.heappush(self._heap, entry)
+            self._pending[msg.key] = entry
+            _stats.queued(len(self._pending))
+            self._cond.notify()
+
+    def get(self, block=True, timeout=None):
+        with self._cond:
+            if block:
+                deadline = None if timeout is None else \
+                    monotonic_time() + timeout
+                while not self._pending:
+                    remaining = None if deadline is None else \
+                        deadline - monotonic_time()
+                    if remaining is not None and remaining <= 0:
+                        raise queue.Empty
+                    self._cond.wait(remaining)
+            elif not self._pending:
+                raise queue.Empty
+
+            while True:
+                entry = heapq.heappop(self._heap)
+                msg = entry[-1]
+                if msg is not None:
+                    del self._pending[msg.key]
+                    _stats.queued(len(self._pending))
+                    return msg
+
+    def qsize(self):
+        with self._cond:
+            return len(self._pending)
+
+
+class ExtendStats(object):
+    """
+    Statistics of HSM extend requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._max_queued = 0
+        self._merged = 0
+        self._latency = Histogram()
+
+    def queued(self, depth):
+        with self._lock:
+            self._queued = depth
+            self._max_queued = max(self._max_queued, depth)
+
+    def merged(self):
+        with self._lock:
+            self._merged += 1
+
+    def replied(self, latency):
+        self._latency.observe(latency)
+
+    def info(self):
+        with self._lock:
+            info = {
+                "queued": self._queued,
+                "max_queued": self._max_queued,
+                "merged": self._merged,
+            }
+        info["latency"] = self._latency.info()
+        return info
+
+
+_stats = ExtendStats()
+
+
+def stats():
+    """
+    Return extend requests statistics: the number of requests waiting for a
+    free mailbox slot, the number of merged requests, and a histogram of the
+    time from sending a request until the SPM replied.
+    """
+    return _stats.info()
+
+
 class HSM_Mailbox:
 
     log = logging.getLogger('storage.Mailbox.HSM')
@@ -191,7 +335,7 @@ class HSM_Mailbox:
         self._hostID = str(hostID)
         self._poolID = str(poolID)
         self._monitorInterval = monitorInterval
-        self._queue = queue.Queue(-1)
+        self._queue = ExtendQueue()
         self._inbox = inbox
         if not os.path.exists(self._inbox):
             self.log.error("HSM_Mailbox create failed - inbox %s does not "
@@ -338,17 +482,18 @@ class HSM_MailMonitor(object):
                                "%s", self._msgCounter, MESSAGES_PER_MAILBOX,
                                repr(newMsg))
                 msg.checkReply(newMsg)
-                if msg.callback:
+                _stats.replied(monotonic_time() - msg.created)
+                for callback, volumeData in msg.callbacks():
                     try:
                         id = str(uuid.uuid4())
-                        if not self.tp.queueTask(id, runTask, (msg.callback,
-                                                 msg.volumeData)):
+                        if not self.tp.queueTask(id, runTask, (callback,
+                                                 volumeData)):
                             raise Exception()
                     except:
                         self.log.error("HSM_MailMonitor: exception caught "
                                        "while running msg callback, for "
                                        "message: %s, callback function: %s",
-                                       repr(msg.payload), msg.callback,
+                                       repr(msg.payload), callback,
                                        exc_info=True)
             except RuntimeError as e:
                 self.log.error("HSM_MailMonitor: exception: %s caught while "
@@ -400,8 +545,10 @@ class HSM_MailMonitor(object):
                     duplicate = False
                     break
             if duplicate:
-                self.log.debug("HSM_MailMonitor - ignoring duplicate message "
+                self.log.debug("HSM_MailMonitor - merging duplicate message "
                                "%s" % (repr(message)))
+                self._activeMessages[i].merge(message)
+                _stats.merged()
                 return
         if freeSlot is None:
             raise RuntimeError("HSM_MailMonitor - Active messages list full, "
@@ -28,6 +28,7 @@ import errno
 from glob import glob
 import logging
 import re
+import threading
 from collections import namedtuple
 from contextlib import closing
 
@@ -92,19 +93,27 @@ def rescan():
     timeout = config.getint('irs', 'udev_settle_timeout')
     udevadm.settle(timeout)
 
+    # Devices may have been removed and their names reused for other LUNs.
+    _cache.invalidate()
 
-def resize_devices():
+
+def resize_devices(guids=None):
     """
     This is needed in case a device has been increased on the storage server
     Resize multipath map if the underlying slaves are bigger than
     the map size.
     The slaves can be bigger if the LUN size has been increased on the storage
     server after the initial discovery.
+
+    If guids is specified, resize only the specified devices instead of
+    all multipath devices.
     """
+    if guids is None:
+        guids = (guid for dmId, guid in getMPDevsIter())
     log.info("Resizing multipath devices")
     with utils.stopwatch(
             "Resizing multipath devices", level=logging.INFO, log=log):
-        for dmId, guid in getMPDevsIter():
+        for guid in guids:
             try:
                 _resize_if_needed(guid)
             except Exception:
@@ -252,11 +261,176 @@ def getHBTL(physdev):
     return HBTL(*hbtl[0].split(":"))
 
 
+def _read_attrs(devdir, names):
+    """
+    Read sysfs attributes of a device, returning a dict mapping attribute
+    name to its stripped value. Attributes that cannot be read are missing
+    from the result.
+    """
+    attrs = {}
+    for name in names:
+        try:
+            with open(os.path.join(devdir, name), "r") as f:
+                attrs[name] = f.read().strip()
+        except (OSError, IOError) as e:
+            log.warning("Problem reading %s of device %s: %s",
+                        name, devdir, e)
+    return attrs
+
+
+class DeviceCache(object):
+    """
+    Cache the attributes of multipath devices and paths that do not change
+    while the device exists.
+
+    Getting the serial of a device requires running scsi_id, and getting the
+    attributes of a path requires reading many sysfs files and querying
+    supervdsm for the iSCSI session. On hosts with hundreds of LUNs this
+    makes pathListIter() take minutes. The attributes are read once and kept
+    until the next rescan().
+
+    Multipath devices are identified by their WWID, so the serial is cached by
+    the device guid. Path device names may be reused for another LUN or iSCSI
+    session, so a path entry is valid only while the sysfs link of the path
+    is the same.
+
+    Attributes that can change, like the device size and the path status, are
+    never cached.
+    """
+
+    PATH_ATTRS = ("device/vendor", "device/model", "device/rev",
+                  "queue/logical_block_size", "queue/physical_block_size")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._serials = {}
+        self._paths = {}
+        self._sessions = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._serials.clear()
+            self._paths.clear()
+            self._sessions.clear()
+
+    def prune(self, guids, slaves):
+        """
+        Drop entries of devices and paths not in guids and slaves.
+        """
+        with self._lock:
+            for guid in set(self._serials) - set(guids):
+                del self._serials[guid]
+            for slave in set(self._paths) - set(slaves):
+                del self._paths[slave]
+
+    def serial(self, guid, dmId):
+        with self._lock:
+            serial = self._serials.get(guid)
+        if serial is None:
+            serial = get_scsi_serial(dmId)
+            # scsi_id fails for devices without valid paths; try again next
+            # time.
+            if serial:
+                with self._lock:
+                    self._serials[guid] = serial
+        return serial
+
+    def path(self, slave):
+        """
+        Return dict with the static attributes of path slave.
+        """
+        try:
+            link = os.readlink(os.path.join(SYS_BLOCK, slave))
+        except OSError:
+            link = None
+
+        with self._lock:
+            entry = self._paths.get(slave)
+        if entry is not None and link is not None and entry[0] == link:
+            return entry[1]
+
+        info, complete = self._read_path(slave)
+        if complete and link is not None:
+            with self._lock:
+                self._paths[slave] = (link, info)
+        return info
+
+    def session(self, sessionID):
+        with self._lock:
+            info = self._sessions.get(sessionID)
+        if info is None:
+            info = _session_info(sessionID)
+            with self._lock:
+                self._sessions[sessionID] = info
+        return info
+
+    def _read_path(self, slave):
+        attrs = _read_attrs(os.path.join(SYS_BLOCK, slave), self.PATH_ATTRS)
+        complete = len(attrs) == len(self.PATH_ATTRS)
+
+        info = {
+            "vendor": attrs.get("device/vendor", ""),
+            "product": attrs.get("device/model", ""),
+            "fwrev": attrs.get("device/rev", ""),
+            "logicalblocksize": attrs.get("queue/logical_block_size", ""),
+            "physicalblocksize": attrs.get("queue/physical_block_size", ""),
+        }
+
+        try:
+            hbtl = getHBTL(slave)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                log.warn("Device has no hbtl: %s", slave)
+                info["lun"] = 0
+            else:
+                log.error("Error: %s while trying to get hbtl of device: "
+                          "%s", e, slave)
+                raise
+        else:
+            info["lun"] = hbtl.lun
+
+        if iscsi.devIsiSCSI(slave):
+            info["type"] = DEV_ISCSI
+            info["session"] = iscsi.getiScsiSession(slave)
+        else:
+            info["type"] = DEV_FCP
+            info["session"] = None
+
+        return info, complete
+
+
+def _session_info(sessionID):
+    # FIXME: This entire part is for BC. It should be moved to hsm and not
+    # preserved for new APIs. New APIs should keep numeric types and sane
+    # field names.
+    sess = iscsi.getSessionInfo(sessionID)
+    sessionInfo = {
+        "connection": sess.target.portal.hostname,
+        "port": str(sess.target.portal.port),
+        "iqn": sess.target.iqn,
+        "portal": str(sess.target.tpgt),
+        "initiatorname": sess.iface.name
+    }
+
+    # Note that credentials must be sent back in order for the engine to tell
+    # vdsm how to reconnect later
+    if sess.credentials:
+        cred = sess.credentials
+        sessionInfo['user'] = cred.username
+        sessionInfo['password'] = cred.password
+
+    return sessionInfo
+
+
+_cache = DeviceCache()
+
+
 def pathListIter(filterGuids=()):
     filterLen = len(filterGuids) if filterGuids else -1
     devsFound = 0
-    knownSessions = {}
     pathStatuses = devicemapper.getPathsStatus()
+    seenGuids = []
+    seenSlaves = []
 
     for dmId, guid in getMPDevsIter():
         if devsFound == filterLen:
@@ -266,12 +440,13 @@ def pathListIter(filterGuids=()):
             continue
 
         devsFound += 1
+        seenGuids.append(guid)
 
         devInfo = {
             "guid": guid,
             "dm": dmId,
             "capacity": str(getDeviceSize(dmId)),
-            "serial": get_scsi_serial(dmId),
+            "serial": _cache.serial(guid, dmId),
             "paths": [],
             "connections": [],
             "devtypes": [],
@@ -289,83 +464,28 @@ def pathListIter(filterGuids=()):
                 log.warning("No such physdev '%s' is ignored" % slave)
                 continue
 
-            if not devInfo["vendor"]:
-                try:
-                    devInfo["vendor"] = getVendor(slave)
-                except Exception:
-                    log.warn("Problem getting vendor from device `%s`",
-                             slave, exc_info=True)
-
-            if not devInfo["product"]:
-                try:
-                    devInfo["product"] = getModel(slave)
-                except Exception:
-                    log.warn("Problem getting model name from device `%s`",
-                             slave, exc_info=True)
-
-            if not devInfo["fwrev"]:
-                try:
-                    devInfo["fwrev"] = getFwRev(slave)
-                except Exception:
-                    log.warn("Problem getting fwrev from device `%s`",
-                             slave, exc_info=True)
+            seenSlaves.append(slave)
+            path = _cache.path(slave)
+
+            for key in ("vendor", "product", "fwrev"):
+                if not devInfo[key]:
+                    devInfo[key] = path[key]
 
             if (not devInfo["logicalblocksize"] or
                     not devInfo["physicalblocksize"]):
-                try:
-                    logBlkSize, phyBlkSize = getDeviceBlockSizes(slave)
-                    devInfo["logicalblocksize"] = str(logBlkSize)
-                    devInfo["physicalblocksize"] = str(phyBlkSize)
-                except Exception:
-                    log.warn("Problem getting blocksize from device `%s`",
-                             slave, exc_info=True)
+                devInfo["logicalblocksize"] = path["logicalblocksize"]
+                devInfo["physicalblocksize"] = path["physicalblocksize"]
 
             pathInfo = {}
             pathInfo["physdev"] = slave
             pathInfo["state"] = pathStatuses.get(slave, "failed")
             pathInfo["capacity"] = str(getDeviceSize(slave))
-            try:
-                hbtl = getHBTL(slave)
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    log.warn("Device has no hbtl: %s", slave)
-                    pathInfo["lun"] = 0
-                else:
-                    log.error("Error: %s while trying to get hbtl of device: "
-                              "%s", e, slave)
-                    raise
-            else:
-                pathInfo["lun"] = hbtl.lun
-
-            if iscsi.devIsiSCSI(slave):
-                devInfo["devtypes"].append(DEV_ISCSI)
-                pathInfo["type"] = DEV_ISCSI
-                sessionID = iscsi.getiScsiSession(slave)
-                if sessionID not in knownSessions:
-                    # FIXME: This entire part is for BC. It should be moved to
-                    # hsm and not preserved for new APIs. New APIs should keep
-                    # numeric types and sane field names.
-                    sess = iscsi.getSessionInfo(sessionID)
-                    sessionInfo = {
-                        "connection": sess.target.portal.hostname,
-                        "port": str(sess.target.portal.port),
-                        "iqn": sess.target.iqn,
-                        "portal": str(sess.target.tpgt),
-                        "initiatorname": sess.iface.name
-                    }
-
-                    # Note that credentials must be sent back in order for
-                    # the engine to tell vdsm how to reconnect later
-                    if sess.credentials:
-                        cred = sess.credentials
-                        sessionInfo['user'] = cred.username
-                        sessionInfo['password'] = cred.password
-
-                    knownSessions[sessionID] = sessionInfo
-                devInfo["connections"].append(knownSessions[sessionID])
-            else:
-                devInfo["devtypes"].append(DEV_FCP)
-                pathInfo["type"] = DEV_FCP
+            pathInfo["lun"] = path["lun"]
+            pathInfo["type"] = path["type"]
+            devInfo["devtypes"].append(path["type"])
+
+            if path["type"] == DEV_ISCSI:
+                devInfo["connections"].append(_cache.session(path["session"]))
 
             if devInfo["devtype"] == "":
                 devInfo["devtype"] = pathInfo["type"]
@@ -377,6 +497,9 @@ def pathListIter(filterGuids=()):
 
         yield devInfo
 
+    if not filterGuids:
+        _cache.prune(seenGuids, seenSlaves)
+
 
 TOXIC_REGEX = re.compile(r"[%s]" % re.sub(r"[\-\\\]]",
                          lambda m: "\\" + m.group(),
@@ -232,7 +232,8 @@ def check(image, format=None):
 def convert(srcImage, dstImage, srcFormat=None, dstFormat=None,
             dstQcow2Compat=None, backing=None, backingFormat=None,
             preallocation=None, compressed=False, unordered_writes=False,
-            create=True, bitmaps=False, target_is_zero=False):
+            create=True, bitmaps=False, target_is_zero=False,
+            rate_limit=None):
     """
     Arguments:
         unordered_writes (bool): Allow out-of-order writes to the destination.
@@ -247,6 +248,8 @@ def convert(srcImage, dstImage, srcFormat=None, dstFormat=None,
             required to keep preallocated image preallocated, and improves
             performance. This option is effective only with qemu-img 5.1 and
             later.
+        rate_limit (int): If set, limit the I/O rate of the copy to rate_limit
+            bytes per second.
     """
     cmd = [_qemuimg.cmd, "convert", "-p", "-t", "none", "-T", "none"]
     options = []
@@ -294,6 +297,9 @@ def convert(srcImage, dstImage, srcFormat=None, dstFormat=None,
     if bitmaps:
         cmd.append('--bitmaps')
 
+    if rate_limit:
+        cmd.extend(('-r', str(rate_limit)))
+
     cmd.append(srcImage)
     cmd.append(dstImage)
 
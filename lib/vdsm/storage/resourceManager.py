@@ -31,6 +31,8 @@ from six.moves import queue
 
 from vdsm import utils
 from vdsm.common import concurrent
+from vdsm.common import histogram
+from vdsm.common import time
 from vdsm.common.logutils import SimpleLogAdapter
 from vdsm.storage import exception as se
 from vdsm.storage import guarded
@@ -176,6 +178,8 @@ class Request(object):
         self._isCanceled = False
         self._doneEvent = threading.Event()
         self._callback = callback
+        self._created = time.monotonic_time()
+        self._granted = None
         self.reqID = str(uuid4())
         self._log = SimpleLogAdapter(self._log, {"ResName": self.full_name,
                                                  "ReqID": self.reqID})
@@ -218,6 +222,7 @@ class Request(object):
                                                    "request")
 
             self._isActive = False
+            self._granted = time.monotonic_time()
             self._log.debug("Granted request")
             self._doneEvent.set()
 
@@ -236,6 +241,15 @@ class Request(object):
         with self._syncRoot:
             return (not self._isCanceled) and self._doneEvent.isSet()
 
+    def wait_time(self):
+        """
+        Return the time waited until the request was granted, or None if the
+        request was not granted.
+        """
+        if self._granted is None:
+            return None
+        return self._granted - self._created
+
     def __str__(self):
         return "Request for %s - %s: %s" % (self.full_name, self.lockType,
                                             self._status())
@@ -346,7 +360,10 @@ class _ResourceManager(object):
     _resourceNameValidator = re.compile(r"^[^\s.]+$")
 
     def __init__(self):
-        self._syncRoot = rwlock.RWLock()
+        # Protects only namespaces registration. Namespaces are never
+        # removed, so looking up a namespace does not need any lock, and
+        # resources are protected by the namespace shards locks.
+        self._syncRoot = threading.Lock()
         self._namespaces = {}
 
     def registerNamespace(self, namespace, factory):
@@ -357,7 +374,7 @@ class _ResourceManager(object):
             raise NamespaceRegistered("Namespace '%s' already registered"
                                       % namespace)
 
-        with self._syncRoot.exclusive:
+        with self._syncRoot:
             if namespace in self._namespaces:
                 raise NamespaceRegistered("Namespace '%s' already registered"
                                           % namespace)
@@ -366,30 +383,40 @@ class _ResourceManager(object):
 
             self._namespaces[namespace] = Namespace(factory)
 
+    def _getNamespace(self, namespace):
+        try:
+            return self._namespaces[namespace]
+        except KeyError:
+            raise ValueError("Namespace '%s' is not registered with this "
+                             "manager" % namespace)
+
     def getResourceStatus(self, namespace, name):
         if not self._resourceNameValidator.match(name):
             raise se.InvalidResourceName(name)
 
-        with self._syncRoot.shared:
-            try:
-                namespaceObj = self._namespaces[namespace]
-            except KeyError:
-                raise ValueError("Namespace '%s' is not registered with this "
-                                 "manager" % namespace)
-            resources = namespaceObj.resources
-            with namespaceObj.lock:
-                if not namespaceObj.factory.resourceExists(name):
-                    raise KeyError("No such resource '%s.%s'" % (namespace,
-                                                                 name))
+        namespaceObj = self._getNamespace(namespace)
+        shard = namespaceObj.shard(name)
+        with shard.lock:
+            if not namespaceObj.factory.resourceExists(name):
+                raise KeyError("No such resource '%s.%s'" % (namespace,
+                                                             name))
+
+            if name not in shard.resources:
+                return STATUS_FREE
 
-                if name not in resources:
-                    return STATUS_FREE
+            return _statusFromType(shard.resources[name].currentLock)
 
-                return _statusFromType(resources[name].currentLock)
+    def stats(self):
+        """
+        Return lock statistics for all namespaces.
+        """
+        namespaces = list(self._namespaces.items())
+        return {name: ns.stats.info() for name, ns in namespaces}
 
     def _switchLockType(self, resourceInfo, newLockType):
         switchLock = (resourceInfo.currentLock != newLockType)
         resourceInfo.currentLock = newLockType
+        resourceInfo.lockedSince = time.monotonic_time()
 
         if resourceInfo.realObj is None:
             return
@@ -469,73 +496,93 @@ class _ResourceManager(object):
         if lockType not in (SHARED, EXCLUSIVE):
             raise InvalidLockType("Invalid locktype %r was used" % lockType)
 
+        namespaceObj = self._getNamespace(namespace)
+        stats = namespaceObj.stats
+        shard = namespaceObj.shard(name)
+
         request = Request(namespace, name, lockType, callback)
         self._log.debug("Trying to register resource '%s' for lock type '%s'",
                         full_name, lockType)
-        with utils.RollbackContext() as contextCleanup, self._syncRoot.shared:
-            try:
-                namespaceObj = self._namespaces[namespace]
-            except KeyError:
-                raise ValueError("Namespace '%s' is not registered with this "
-                                 "manager" % namespace)
 
-            resources = namespaceObj.resources
-            with namespaceObj.lock:
-                try:
-                    resource = resources[name]
-                except KeyError:
-                    if not namespaceObj.factory.resourceExists(name):
-                        raise KeyError("No such resource '%s'" % (full_name))
-                else:
-                    if len(resource.queue) == 0 and \
-                            resource.currentLock == SHARED and \
-                            request.lockType == SHARED:
-                        resource.activeUsers += 1
-                        self._log.debug("Resource '%s' found in shared state "
-                                        "and queue is empty, Joining current "
-                                        "shared lock (%d active users)",
-                                        full_name, resource.activeUsers)
-                        request.grant()
-                        contextCleanup.defer(request.emit,
-                                             ResourceRef(namespace, name,
-                                                         resource.realObj,
-                                                         request.reqID))
-                        return RequestRef(request)
-
-                    resource.queue.insert(0, request)
-                    self._log.debug("Resource '%s' is currently locked, "
-                                    "Entering queue (%d in queue)",
-                                    full_name, len(resource.queue))
-                    return RequestRef(request)
+        # Fast path - joining a shared lock nobody is waiting for does not
+        # need to create the resource or queue the request.
+        if lockType == SHARED:
+            with shard.lock:
+                resource = shard.resources.get(name)
+                joined = (resource is not None and
+                          resource.currentLock == SHARED and
+                          len(resource.queue) == 0)
+                if joined:
+                    resource.activeUsers += 1
+                    activeUsers = resource.activeUsers
+                    realObj = resource.realObj
 
-                # TODO : Creating the object inside the namespace lock causes
-                #        the entire namespace to lock and might cause
-                #        performance issues. As this is no currently a problem
-                #        I left it as it is to keep the code simple. If there
-                #        is a bottleneck in the resource framework, its
-                #        probably here.
-                try:
-                    obj = namespaceObj.factory.createResource(name, lockType)
-                except:
-                    self._log.warning(
-                        "Resource factory failed to create resource"
-                        " '%s'. Canceling request.", full_name, exc_info=True)
-                    contextCleanup.defer(request.cancel)
+            if joined:
+                self._log.debug("Resource '%s' found in shared state and "
+                                "queue is empty, Joining current shared lock "
+                                "(%d active users)", full_name, activeUsers)
+                request.grant()
+                stats.granted(request, fast=True)
+                request.emit(ResourceRef(namespace, name, realObj,
+                                         request.reqID))
+                return RequestRef(request)
+
+        with utils.RollbackContext() as contextCleanup, shard.lock:
+            resources = shard.resources
+            try:
+                resource = resources[name]
+            except KeyError:
+                if not namespaceObj.factory.resourceExists(name):
+                    raise KeyError("No such resource '%s'" % (full_name))
+            else:
+                if len(resource.queue) == 0 and \
+                        resource.currentLock == SHARED and \
+                        request.lockType == SHARED:
+                    resource.activeUsers += 1
+                    self._log.debug("Resource '%s' found in shared state "
+                                    "and queue is empty, Joining current "
+                                    "shared lock (%d active users)",
+                                    full_name, resource.activeUsers)
+                    request.grant()
+                    stats.granted(request)
+                    contextCleanup.defer(request.emit,
+                                         ResourceRef(namespace, name,
+                                                     resource.realObj,
+                                                     request.reqID))
                     return RequestRef(request)
 
-                resource = resources[name] = ResourceInfo(obj, namespace, name)
-                resource.currentLock = request.lockType
-                resource.activeUsers += 1
+                resource.queue.insert(0, request)
+                stats.queued()
+                self._log.debug("Resource '%s' is currently locked, "
+                                "Entering queue (%d in queue)",
+                                full_name, len(resource.queue))
+                return RequestRef(request)
 
-                self._log.debug("Resource '%s' is free. Now locking as '%s' "
-                                "(1 active user)", full_name, request.lockType)
-                request.grant()
-                contextCleanup.defer(request.emit,
-                                     ResourceRef(namespace, name,
-                                                 resource.realObj,
-                                                 request.reqID))
+            # Creating the object inside the shard lock blocks only the
+            # resources in the same shard.
+            try:
+                obj = namespaceObj.factory.createResource(name, lockType)
+            except:
+                self._log.warning(
+                    "Resource factory failed to create resource"
+                    " '%s'. Canceling request.", full_name, exc_info=True)
+                contextCleanup.defer(request.cancel)
                 return RequestRef(request)
 
+            resource = resources[name] = ResourceInfo(obj, namespace, name)
+            resource.currentLock = request.lockType
+            resource.activeUsers += 1
+
+            self._log.debug("Resource '%s' is free. Now locking as '%s' "
+                            "(1 active user)", full_name, request.lockType)
+            request.grant()
+            stats.granted(request)
+            contextCleanup.defer(request.emit,
+                                 ResourceRef(namespace, name,
+                                             resource.realObj,
+                                             request.reqID))
+            return RequestRef(request)
+
     def releaseResource(self, namespace, name):
         # WARN : unlike in resource acquire the user now has the request
         #        object and can CANCEL THE REQUEST at any time. Always use
@@ -544,120 +591,183 @@ class _ResourceManager(object):
         full_name = "%s.%s" % (namespace, name)
 
         self._log.debug("Trying to release resource '%s'", full_name)
-        with utils.RollbackContext() as contextCleanup, self._syncRoot.shared:
+        namespaceObj = self._getNamespace(namespace)
+        stats = namespaceObj.stats
+        shard = namespaceObj.shard(name)
+
+        with utils.RollbackContext() as contextCleanup, shard.lock:
+            resources = shard.resources
+
             try:
-                namespaceObj = self._namespaces[namespace]
+                resource = resources[name]
             except KeyError:
-                raise ValueError("Namespace '%s' is not registered with this "
-                                 "manager", namespace)
-            resources = namespaceObj.resources
+                raise ValueError("Resource '%s.%s' is not currently "
+                                 "registered" % (namespace, name))
 
-            with namespaceObj.lock:
-                try:
-                    resource = resources[name]
-                except KeyError:
-                    raise ValueError("Resource '%s.%s' is not currently "
-                                     "registered" % (namespace, name))
+            resource.activeUsers -= 1
+            self._log.debug("Released resource '%s' (%d active users)",
+                            full_name, resource.activeUsers)
 
-                resource.activeUsers -= 1
-                self._log.debug("Released resource '%s' (%d active users)",
-                                full_name, resource.activeUsers)
-
-                # Is some one else is using the resource
-                if resource.activeUsers > 0:
-                    return
-                self._log.debug("Resource '%s' is free, finding out if anyone "
-                                "is waiting for it.", full_name)
-                # Grant a request
-                while True:
-                    # Is there someone waiting for the resource
-                    if len(resource.queue) == 0:
-                        self._freeResource(resources[name])
-                        del resources[name]
-                        self._log.debug("No one is waiting for resource '%s', "
-                                        "Clearing records.", full_name)
-                        return
-
-                    self._log.debug("Resource '%s' has %d requests in queue. "
-                                    "Handling top request.", full_name,
-                                    len(resource.queue))
-                    nextRequest = resource.queue.pop()
-                    # We lock the request to simulate a transaction. We cannot
-                    # grant the request before there is a resource switch. And
-                    # we can't do a resource switch before we can guarantee
-                    # that the request will be granted.
-                    with nextRequest.syncRoot:
-                        if nextRequest.canceled():
-                            self._log.debug("Request '%s' was canceled, "
-                                            "Ignoring it.", nextRequest)
-                            continue
-
-                        try:
-                            self._switchLockType(resource,
-                                                 nextRequest.lockType)
-                        except Exception:
-                            self._log.warning(
-                                "Resource factory failed to create "
-                                "resource '%s'. Canceling request.",
-                                full_name, exc_info=True)
-                            nextRequest.cancel()
-                            continue
-
-                        nextRequest.grant()
-                        contextCleanup.defer(
-                            partial(nextRequest.emit,
-                                    ResourceRef(namespace, name,
-                                                resource.realObj,
-                                                nextRequest.reqID)))
-
-                        resource.activeUsers += 1
-
-                        self._log.debug("Request '%s' was granted",
-                                        nextRequest)
-                        break
-
-                # If the lock is exclusive were done
-                if resource.currentLock == EXCLUSIVE:
+            # Is some one else is using the resource
+            if resource.activeUsers > 0:
+                return
+            stats.released(resource)
+            self._log.debug("Resource '%s' is free, finding out if anyone "
+                            "is waiting for it.", full_name)
+            # Grant a request
+            while True:
+                # Is there someone waiting for the resource
+                if len(resource.queue) == 0:
+                    self._freeResource(resources[name])
+                    del resources[name]
+                    self._log.debug("No one is waiting for resource '%s', "
+                                    "Clearing records.", full_name)
                     return
 
-                # Keep granting shared locks
-                self._log.debug("This is a shared lock. Granting all shared "
-                                "requests")
-                while len(resource.queue) > 0:
-
-                    nextRequest = resource.queue[-1]
+                self._log.debug("Resource '%s' has %d requests in queue. "
+                                "Handling top request.", full_name,
+                                len(resource.queue))
+                nextRequest = resource.queue.pop()
+                # We lock the request to simulate a transaction. We cannot
+                # grant the request before there is a resource switch. And
+                # we can't do a resource switch before we can guarantee
+                # that the request will be granted.
+                with nextRequest.syncRoot:
                     if nextRequest.canceled():
-                        resource.queue.pop()
+                        self._log.debug("Request '%s' was canceled, "
+                                        "Ignoring it.", nextRequest)
                         continue
 
-                    if nextRequest.lockType == EXCLUSIVE:
-                        break
-
-                    nextRequest = resource.queue.pop()
                     try:
-                        nextRequest.grant()
-                        contextCleanup.defer(
-                            partial(nextRequest.emit,
-                                    ResourceRef(namespace, name,
-                                                resource.realObj,
-                                                nextRequest.reqID)))
-                    except RequestAlreadyProcessedError:
+                        self._switchLockType(resource,
+                                             nextRequest.lockType)
+                    except Exception:
+                        self._log.warning(
+                            "Resource factory failed to create "
+                            "resource '%s'. Canceling request.",
+                            full_name, exc_info=True)
+                        nextRequest.cancel()
                         continue
 
+                    nextRequest.grant()
+                    stats.granted(nextRequest)
+                    contextCleanup.defer(
+                        partial(nextRequest.emit,
+                                ResourceRef(namespace, name,
+                                            resource.realObj,
+                                            nextRequest.reqID)))
+
                     resource.activeUsers += 1
-                    self._log.debug("Request '%s' was granted (%d "
-                                    "active users)", nextRequest,
-                                    resource.activeUsers)
+
+                    self._log.debug("Request '%s' was granted",
+                                    nextRequest)
+                    break
+
+            # If the lock is exclusive were done
+            if resource.currentLock == EXCLUSIVE:
+                return
+
+            # Keep granting shared locks
+            self._log.debug("This is a shared lock. Granting all shared "
+                            "requests")
+            while len(resource.queue) > 0:
+
+                nextRequest = resource.queue[-1]
+                if nextRequest.canceled():
+                    resource.queue.pop()
+                    continue
+
+                if nextRequest.lockType == EXCLUSIVE:
+                    break
+
+                nextRequest = resource.queue.pop()
+                try:
+                    nextRequest.grant()
+                    stats.granted(nextRequest)
+                    contextCleanup.defer(
+                        partial(nextRequest.emit,
+                                ResourceRef(namespace, name,
+                                            resource.realObj,
+                                            nextRequest.reqID)))
+                except RequestAlreadyProcessedError:
+                    continue
+
+                resource.activeUsers += 1
+                self._log.debug("Request '%s' was granted (%d "
+                                "active users)", nextRequest,
+                                resource.activeUsers)
 
 
 class Namespace(object):
     """
     Namespace struct
+
+    Resources are kept in several shards, each protected by its own lock, so
+    requests for different resources in the same namespace rarely contend,
+    and creating a resource blocks only the resources in the same shard.
     """
+    SHARDS = 16
+
     def __init__(self, factory):
-        self.resources = {}
-        self.lock = threading.Lock()  # rwlock.RWLock()
+        self.shards = [Shard() for _ in range(self.SHARDS)]
         self.factory = factory
+        self.stats = NamespaceStats()
+
+    def shard(self, name):
+        return self.shards[hash(name) % self.SHARDS]
+
+
+class Shard(object):
+    """
+    Shard struct
+    """
+    def __init__(self):
+        self.resources = {}
+        self.lock = threading.Lock()
+
+
+class NamespaceStats(object):
+    """
+    Lock statistics of a namespace.
+
+    The wait histogram measures the time from registering a request until it
+    was granted. The hold histogram measures the time a resource was locked,
+    from the time it was locked or switched to another lock type, until the
+    last user released it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._fast_path = 0
+        self._queued = 0
+        self.wait = histogram.Histogram()
+        self.hold = histogram.Histogram()
+
+    def granted(self, request, fast=False):
+        with self._lock:
+            self._requests += 1
+            if fast:
+                self._fast_path += 1
+        self.wait.observe(request.wait_time())
+
+    def queued(self):
+        with self._lock:
+            self._queued += 1
+
+    def released(self, resource):
+        self.hold.observe(time.monotonic_time() - resource.lockedSince)
+
+    def info(self):
+        with self._lock:
+            info = {
+                "requests": self._requests,
+                "fast_path": self._fast_path,
+                "queued": self._queued,
+            }
+        info["wait"] = self.wait.info()
+        info["hold"] = self.hold.info()
+        return info
 
 
 class ResourceInfo(object):
@@ -668,6 +778,7 @@ class ResourceInfo(object):
         self.queue = []
         self.activeUsers = 0
         self.currentLock = None
+        self.lockedSince = time.monotonic_time()
         self.realObj = realObj
         self.namespace = namespace
         self.name = name
@@ -831,6 +942,13 @@ def releaseResource(namespace, name):
     _manager.releaseResource(namespace, name)
 
 
+def stats():
+    """
+    Return lock statistics per namespace, for finding lock hot spots.
+    """
+    return _manager.stats()
+
+
 def getNamespace(*args):
     """
     Format namespace stirng from sequence of names.
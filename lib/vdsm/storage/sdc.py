@@ -25,9 +25,13 @@ for keeping storage related data that is expensive to harvest, but needed often
 from __future__ import absolute_import
 
 import logging
+import os
 import threading
+import time
 
 from vdsm import utils
+from vdsm.common import time as vdsm_time
+from vdsm.config import config
 from vdsm.storage import exception as se
 from vdsm.storage import lvm
 from vdsm.storage import misc
@@ -69,6 +73,10 @@ class StorageDomainCache:
         self.__inProgress = set()
         self.__staleStatus = self.STORAGE_STALE
         self.knownSDs = {}  # {sdUUID: mod.findDomain}
+        # Multipath devices used by block domains, used to refresh only the
+        # storage of a domain instead of rescanning all the storage.
+        self._devices = {}  # {sdUUID: frozenset of device guids}
+        self._lastFullRefresh = None
 
     def invalidateStorage(self):
         self.log.info("Invalidating storage domain cache")
@@ -78,16 +86,22 @@ class StorageDomainCache:
     @misc.samplingmethod
     def refreshStorage(self, resize=True):
         self.log.info("Refreshing storage domain cache (resize=%s)", resize)
-        with utils.stopwatch(
-                "Refreshing storage domain cache",
-                level=logging.INFO,
-                log=self.log):
+        # Callers arriving during a refresh are grouped by samplingmethod. If
+        # the last refresh was very recent, delay this one, grouping more
+        # callers into a single rescan.
+        self._waitForRefreshInterval()
+
+        clock = vdsm_time.Clock()
+        with clock.run("total"):
             self.__staleStatus = self.STORAGE_REFRESHING
 
-            multipath.rescan()
+            with clock.run("rescan"):
+                multipath.rescan()
             if resize:
-                multipath.resize_devices()
-            lvm.invalidateCache()
+                with clock.run("resize"):
+                    multipath.resize_devices()
+            with clock.run("lvm"):
+                lvm.invalidateCache()
 
             # If a new invalidateStorage request came in after the refresh
             # started then we cannot flag the storages as updated (force a
@@ -96,6 +110,36 @@ class StorageDomainCache:
                 if self.__staleStatus == self.STORAGE_REFRESHING:
                     self.__staleStatus = self.STORAGE_UPDATED
 
+        self._lastFullRefresh = vdsm_time.monotonic_time()
+        self.log.info("Refreshed storage domain cache: %s", clock)
+
+    def _waitForRefreshInterval(self):
+        interval = config.getfloat("irs", "storage_refresh_min_interval")
+        if self._lastFullRefresh is None or interval <= 0:
+            return
+        now = vdsm_time.monotonic_time()
+        remaining = self._lastFullRefresh + interval - now
+        if remaining > 0:
+            self.log.info("Delaying storage refresh by %.2f seconds",
+                          remaining)
+            time.sleep(remaining)
+
+    def _refreshDomainStorage(self, sdUUID, devices):
+        """
+        Refresh only the storage used by block domain sdUUID, instead of
+        rescanning all iSCSI and FC connections, resizing all multipath
+        devices, and invalidating the entire LVM cache.
+        """
+        self.log.info("Refreshing storage of domain %s (devices=%s)",
+                      sdUUID, sorted(devices))
+        clock = vdsm_time.Clock()
+        with clock.run("total"):
+            with clock.run("resize"):
+                multipath.resize_devices(devices)
+            with clock.run("lvm"):
+                lvm.invalidateVG(sdUUID, invalidatePVs=True)
+        self.log.info("Refreshed storage of domain %s: %s", sdUUID, clock)
+
     def produce_manifest(self, sdUUID):
         """
         Return a StorageDomainManifest for sdUUID. New code must use this, as
@@ -130,13 +174,12 @@ class StorageDomainCache:
                 self._syncroot.wait()
 
         try:
-            # If multiple calls reach this point and the storage is not
-            # updated the refreshStorage() sampling method is called
-            # serializing (and eventually grouping) the requests.
             if self.__staleStatus != self.STORAGE_UPDATED:
-                self.refreshStorage()
+                domain = self._findStaleDomain(sdUUID)
+            else:
+                domain = self._findDomain(sdUUID)
 
-            domain = self._findDomain(sdUUID)
+            self._updateDevices(domain)
 
             with self._syncroot:
                 self.__domainCache[sdUUID] = domain
@@ -147,6 +190,52 @@ class StorageDomainCache:
                 self.__inProgress.remove(sdUUID)
                 self._syncroot.notifyAll()
 
+    def _findStaleDomain(self, sdUUID):
+        devices = self._devices.get(sdUUID)
+        if devices:
+            # We know the devices of this domain, so refreshing them is
+            # enough, unless the domain is missing some devices.
+            self._refreshDomainStorage(sdUUID, devices)
+            try:
+                domain = self._findDomain(sdUUID)
+            except se.StorageDomainDoesNotExist:
+                self.log.info("Domain %s not found after refreshing its "
+                              "storage, refreshing all storage", sdUUID)
+            else:
+                if not self._isPartial(domain):
+                    return domain
+                self.log.info("Domain %s is missing devices, refreshing "
+                              "all storage", sdUUID)
+
+        # If multiple calls reach this point and the storage is not
+        # updated the refreshStorage() sampling method is called
+        # serializing (and eventually grouping) the requests.
+        self.refreshStorage()
+        return self._findDomain(sdUUID)
+
+    def _blockDomainVG(self, domain):
+        from vdsm.storage import blockSD
+        if not isinstance(domain, blockSD.BlockStorageDomain):
+            return None
+        return lvm.getVG(domain.sdUUID)
+
+    def _isPartial(self, domain):
+        vg = self._blockDomainVG(domain)
+        return vg is not None and vg.partial != lvm.VG_OK
+
+    def _updateDevices(self, domain):
+        try:
+            vg = self._blockDomainVG(domain)
+        except Exception:
+            self.log.warning("Cannot get devices of domain %s",
+                             domain.sdUUID, exc_info=True)
+            return
+        if vg is None:
+            return
+        devices = frozenset(os.path.basename(pv) for pv in vg.pv_name)
+        with self._syncroot:
+            self._devices[domain.sdUUID] = devices
+
     def _findDomain(self, sdUUID):
         try:
             findMethod = self.knownSDs[sdUUID]
@@ -200,6 +289,7 @@ class StorageDomainCache:
         with self._syncroot:
             lvm.invalidateCache()
             self.__domainCache.clear()
+            self._devices.clear()
 
     def manuallyAddDomain(self, domain):
         self.log.info(
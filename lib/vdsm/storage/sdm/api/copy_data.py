@@ -27,6 +27,7 @@ from vdsm import utils
 
 from vdsm.common import properties
 from vdsm.storage import constants as sc
+from vdsm.storage import copyscheduler
 from vdsm.storage import exception as se
 from vdsm.storage import guarded
 from vdsm.storage import qemuimg
@@ -102,12 +103,17 @@ class Job(base.Job):
                         create=self._dest.requires_create,
                         bitmaps=self._copy_bitmaps,
                         target_is_zero=self._dest.zero_initialized,
+                        rate_limit=copyscheduler.rate_limit(),
                     )
-                    with utils.stopwatch(
-                            "Copy volume {}".format(self._source.path),
-                            level=logging.INFO,
-                            log=self.log):
-                        self._operation.run()
+                    # Concurrent copy jobs share the host and storage
+                    # domain limits.
+                    with copyscheduler.slot(
+                            (self._source.sd_id, self._dest.sd_id)):
+                        with utils.stopwatch(
+                                "Copy volume {}".format(self._source.path),
+                                level=logging.INFO,
+                                log=self.log):
+                            self._operation.run()
 
 
 def _create_endpoint(params, host_id, writable):
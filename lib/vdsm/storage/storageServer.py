@@ -26,13 +26,17 @@ from os.path import normpath
 import os
 import socket
 from collections import namedtuple
+from contextlib import contextmanager
 import six
 import sys
+import threading
 
 from vdsm.config import config
 from vdsm import utils
+from vdsm.common import concurrent
 from vdsm.common import supervdsm
 from vdsm.common import udevadm
+from vdsm.common.time import monotonic_time
 from vdsm.gluster import cli as gluster_cli
 from vdsm.gluster import exception as ge
 from vdsm.storage import exception as se
@@ -43,6 +47,8 @@ from vdsm.storage import mount
 from vdsm.storage.mount import MountError
 
 
+log = logging.getLogger("storage.StorageServer")
+
 IscsiConnectionParameters = namedtuple("IscsiConnectionParameters",
                                        "id, target, iface, credentials")
 
@@ -62,6 +68,8 @@ FcpConnectionParameters = namedtuple("FcpConnectionParameters", "id")
 
 ConnectionInfo = namedtuple("ConnectionInfo", "type, params")
 
+ConnectResult = namedtuple("ConnectResult", "connection, error, elapsed")
+
 
 class ExampleConnection(object):
     """Do not inherit from this object it is just to show and document the
@@ -503,9 +511,15 @@ class IscsiConnection(object):
         self._cred = credentials
 
     def connect(self):
+        self.login()
+        _settle()
+
+    def login(self):
+        """
+        Log in to the target without waiting for udev events. Callers must
+        wait for udev events before accessing the new devices.
+        """
         iscsi.addIscsiNode(self._iface, self._target, self._cred)
-        timeout = config.getint("irs", "udev_settle_timeout")
-        udevadm.settle(timeout)
 
     def _match(self, session):
         target = session.target
@@ -729,3 +743,105 @@ class ConnectionFactory(object):
             raise UnknownConnectionTypeError(conType)
 
         return ctor(**params)
+
+
+def connect_all(connections, prepare=None):
+    """
+    Connect connections concurrently, returning a list of ConnectResult, in
+    the same order as connections.
+
+    Logging in to iSCSI targets and mounting remote file systems may take
+    several seconds per connection, so connections are connected
+    concurrently, limiting the number of concurrent connections to the same
+    server. Waiting for udev events after logging in to iSCSI targets is done
+    once after all connections were connected.
+
+    If prepare is specified, it is called with the connection before
+    connecting it, in the same worker thread.
+    """
+    if not connections:
+        return []
+
+    max_workers = min(len(connections),
+                      config.getint("irs", "connect_max_workers"))
+    limiter = _ServerLimiter(
+        config.getint("irs", "connect_max_server_workers"))
+
+    def connect(item):
+        index, con = item
+        with limiter.slot(_server(con)):
+            start = monotonic_time()
+            try:
+                if prepare:
+                    prepare(con)
+                if isinstance(con, IscsiConnection):
+                    con.login()
+                else:
+                    con.connect()
+            except Exception as e:
+                log.error("Could not connect to storage server %s",
+                          con.id, exc_info=True)
+                return index, ConnectResult(con, e, monotonic_time() - start)
+            elapsed = monotonic_time() - start
+            log.info("Connected %s in %.2f seconds", con.id, elapsed)
+            return index, ConnectResult(con, None, elapsed)
+
+    with utils.stopwatch(
+            "Connecting {} connections using {} workers".format(
+                len(connections), max_workers),
+            level=logging.INFO,
+            log=log):
+        results = concurrent.tmap(
+            connect, enumerate(connections), max_workers=max_workers,
+            name="connect")
+        results = [r.value[1] for r in sorted(results,
+                                              key=lambda r: r.value[0])]
+
+    if any(isinstance(r.connection, IscsiConnection) and r.error is None
+           for r in results):
+        _settle()
+
+    return results
+
+
+class _ServerLimiter(object):
+    """
+    Limit the number of concurrent connections to the same server.
+    """
+
+    def __init__(self, max_workers):
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._servers = {}
+
+    @contextmanager
+    def slot(self, server):
+        if server is None:
+            yield
+            return
+        with self._lock:
+            sem = self._servers.get(server)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self._max_workers)
+                self._servers[server] = sem
+        with sem:
+            yield
+
+
+def _server(con):
+    """
+    Return the server of a connection, or None if the connection does not
+    access a remote server.
+    """
+    if isinstance(con, IscsiConnection):
+        return con.target.portal.hostname
+    if isinstance(con, (MountConnection, NFSConnection)):
+        remote = con.remotePath
+        if ":" in remote:
+            return remote.rsplit(":", 1)[0]
+    return None
+
+
+def _settle():
+    timeout = config.getint("irs", "udev_settle_timeout")
+    udevadm.settle(timeout)
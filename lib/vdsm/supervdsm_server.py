@@ -43,6 +43,7 @@ from vdsm.common import concurrent
 from vdsm.common import constants
 from vdsm.common import lockfile
 from vdsm.common import sigutils
+from vdsm.common import supervdsm_transport
 from vdsm.common import time
 from vdsm.common import zombiereaper
 
@@ -291,6 +292,7 @@ def main(args):
 
         log.debug("Setting up keep alive thread")
 
+        rpc_server = None
         try:
             signal.signal(signal.SIGTERM, terminate)
             signal.signal(signal.SIGINT, terminate)
@@ -305,6 +307,12 @@ def main(args):
 
             chown(address, args.user, args.group)
 
+            log.debug("Starting binary transport on %s", args.rpc_sockfile)
+            rpc_server = supervdsm_transport.Server(
+                args.rpc_sockfile, _SuperVdsm())
+            rpc_server.start()
+            chown(args.rpc_sockfile, args.user, args.group)
+
             if args.enable_network:
                 init_privileged_network_components()
 
@@ -315,6 +323,11 @@ def main(args):
 
             log.debug("Terminated normally")
         finally:
+            if rpc_server is not None:
+                try:
+                    rpc_server.stop()
+                except Exception:
+                    log.exception("Error while stopping binary transport")
             try:
                 with connection.Client(address, authkey=_AUTHKEY) as conn:
                     server.shutdown(conn)
@@ -339,6 +352,11 @@ def option_parser():
         dest='sockfile',
         required=True,
         help="socket file path")
+    parser.add_argument(
+        '--rpc-sockfile',
+        default=supervdsm_transport.ADDRESS,
+        help=("binary transport socket file path (default %s)"
+              % supervdsm_transport.ADDRESS))
     parser.add_argument(
         '--pidfile',
         default=None,
@@ -41,6 +41,7 @@ from vdsm.common import commands
 from vdsm.common import dsaversion
 from vdsm.common import hooks
 from vdsm.common import lockfile
+from vdsm.common import logutils
 from vdsm.common import libvirtconnection
 from vdsm.common import sigutils
 from vdsm.common import supervdsm
@@ -99,8 +100,9 @@ def serve_clients(log):
             except:
                 panic("Error initializing IRS")
 
-        scheduler = schedule.Scheduler(name="vdsm.Scheduler",
-                                       clock=time.monotonic_time)
+        scheduler = schedule.create(config.get('vars', 'scheduler_type'),
+                                    name="vdsm.Scheduler",
+                                    clock=time.monotonic_time)
         scheduler.start()
 
         from vdsm.clientIF import clientIF  # must import after config is read
@@ -134,12 +136,27 @@ def serve_clients(log):
         libvirtconnection.stop_event_loop(wait=False)
 
 
+def _configure_log_sampling():
+    value = config.get('vars', 'log_sample_rates')
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, rate = item.rsplit(':', 1)
+        logutils.set_sample_rate(int(rate), name.strip())
+
+
 def run():
     try:
         lconfig.fileConfig(loggerConfFile, disable_existing_loggers=False)
     except Exception as e:
         raise FatalError("Cannot configure logging: %s" % e)
 
+    try:
+        _configure_log_sampling()
+    except ValueError as e:
+        raise FatalError("Cannot configure log sampling: %s" % e)
+
     # Shorten WARNING and CRITICAL to make the log align nicer.
     logging.addLevelName(logging.WARNING, 'WARN')
     logging.addLevelName(logging.CRITICAL, 'CRIT')
@@ -23,6 +23,7 @@ from __future__ import division
 
 from contextlib import contextmanager
 import enum
+import threading
 import xml.etree.ElementTree as etree
 
 from vdsm.common import xmlutils
@@ -183,3 +184,135 @@ class DomainDescriptor(MutableDomainDescriptor):
     @contextmanager
     def metadata_descriptor(self):
         yield metadata.Descriptor.from_tree(self._dom)
+
+
+class DomainXMLCache(object):
+    """
+    Cache the libvirt domain XML of a VM, parsed as DomainDescriptor, so
+    flows needing the current domain XML do not fetch and parse it again
+    when the domain did not change.
+
+    The cache is invalidated when the domain is modified using libvirt
+    domain methods (see on_call), and must be invalidated by the VM when
+    libvirt reports an event that may change the domain XML.
+
+    Some changes initiated by the guest or by QEMU do not have an event
+    registered by vdsm, and are not tracked. For example the CD-ROM tray
+    state, the guest agent channel state, and the current balloon size.
+    The cached descriptor may be stale for these, so XML passed outside of
+    vdsm, to hooks, to the migration destination, or to defineXML(), must
+    be fetched from libvirt.
+    """
+
+    # libvirt domain methods that do not modify the domain XML.
+    READONLY_CALLS = frozenset([
+        "ID",
+        "OSType",
+        "UUIDString",
+        "XMLDesc",
+        "blockInfo",
+        "blockIoTune",
+        "blockJobInfo",
+        "blockStats",
+        "blockStatsFlags",
+        "controlInfo",
+        "fsInfo",
+        "getCPUStats",
+        "getTime",
+        "guestInfo",
+        "hasManagedSaveImage",
+        "info",
+        "interfaceAddresses",
+        "interfaceStats",
+        "isActive",
+        "isPersistent",
+        "jobInfo",
+        "jobStats",
+        "maxMemory",
+        "memoryParameters",
+        "memoryStats",
+        "metadata",
+        "migrateGetMaxDowntime",
+        "migrateGetMaxSpeed",
+        "name",
+        "numaParameters",
+        "schedulerParameters",
+        "state",
+        "vcpus",
+    ])
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dom = None
+        self._descriptor = None
+        self._generation = 0
+        self._hits = 0
+        self._fetches = 0
+        self._parses = 0
+
+    def get(self, dom):
+        """
+        Return DomainDescriptor for libvirt domain dom, fetching the domain
+        XML only if the cached XML was invalidated, or was fetched from
+        another domain object.
+        """
+        with self._lock:
+            if self._descriptor is not None and self._dom is dom:
+                self._hits += 1
+                return self._descriptor
+            generation = self._generation
+            self._fetches += 1
+
+        xml = dom.XMLDesc()
+        descriptor = self.parse(xml)
+
+        with self._lock:
+            # If the cache was invalidated while we fetched the XML, the
+            # XML may be stale.
+            if generation == self._generation:
+                self._dom = dom
+                self._descriptor = descriptor
+
+        return descriptor
+
+    def parse(self, xml, xml_source=XmlSource.LIBVIRT):
+        """
+        Return DomainDescriptor for domain XML string xml, counting the
+        parse in the VM statistics.
+        """
+        descriptor = DomainDescriptor(xml, xml_source=xml_source)
+        with self._lock:
+            self._parses += 1
+        return descriptor
+
+    def xml(self, dom):
+        """
+        Return the domain XML string of libvirt domain dom.
+        """
+        return self.get(dom).xml
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._dom = None
+            self._descriptor = None
+
+    def on_call(self, name):
+        """
+        Called after libvirt domain method name was called, invalidating the
+        cache unless the method does not modify the domain XML.
+        """
+        if name not in self.READONLY_CALLS:
+            self.invalidate()
+
+    def stats(self):
+        """
+        Return the number of cache hits, domain XML fetches from libvirt,
+        and domain XML parses.
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "fetches": self._fetches,
+                "parses": self._parses,
+            }
@@ -21,12 +21,28 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import threading
+
 import libvirt
 
+from vdsm.common.histogram import Histogram
+from vdsm.common.time import monotonic_time
+from vdsm.common.units import MiB
 from vdsm.config import config
 from vdsm.virt.vmdevices import lookup
 from vdsm.virt.vmdevices import storage
 
+# Write rate assumed for drives without a measured write rate, used to
+# prioritize extension requests.
+ASSUMED_WRITE_RATE = 100 * MiB
+
+# A vm which requested an extension in the last WRITING_WINDOW seconds is
+# considered writing quickly.
+WRITING_WINDOW = 60
+
+# Time from requesting an extension until the VM was resumed.
+_resume_latency = Histogram()
+
 
 class ImprobableResizeRequestError(RuntimeError):
     pass
@@ -44,6 +60,8 @@ class DriveMonitor(object):
         self._enabled = enabled
         self._events_enabled = config.getboolean(
             'irs', 'enable_block_threshold_event')
+        # Last allocation sample per drive name: (volumeID, time, alloc)
+        self._samples = {}
 
     def events_enabled(self):
         return self._events_enabled
@@ -226,6 +244,46 @@ class DriveMonitor(object):
             return True
         return False
 
+    def extend_priority(self, drive, alloc, physical, now=None):
+        """
+        Record drive allocation, and return the priority of an extension
+        request for this drive: the estimated number of seconds until the
+        drive becomes full. Drives that will become full sooner should be
+        extended first.
+
+        The write rate is measured using the previous allocation sample of
+        the same volume. If the write rate is unknown, ASSUMED_WRITE_RATE is
+        used.
+        """
+        if now is None:
+            now = monotonic_time()
+
+        rate = 0
+        prev = self._samples.get(drive.name)
+        if prev is not None:
+            volumeID, prev_time, prev_alloc = prev
+            if (volumeID == drive.volumeID and now > prev_time and
+                    alloc > prev_alloc):
+                rate = (alloc - prev_alloc) / (now - prev_time)
+        self._samples[drive.name] = (drive.volumeID, now, alloc)
+
+        if rate == 0:
+            rate = ASSUMED_WRITE_RATE
+
+        return max(0, physical - alloc) / rate
+
+    def writing(self, now=None):
+        """
+        Return True if a drive of this vm requested an extension recently,
+        meaning that the vm is writing quickly and drives watermarks should
+        be checked more often.
+        """
+        if now is None:
+            now = monotonic_time()
+
+        return any(now - sample_time < WRITING_WINDOW
+                   for _, sample_time, _ in list(self._samples.values()))
+
     def update_threshold_state_exceeded(self, drive):
         if (drive.threshold_state != storage.BLOCK_THRESHOLD.EXCEEDED and
                 self.events_enabled()):
@@ -239,3 +297,112 @@ class DriveMonitor(object):
             self._log.info(
                 "Drive %s needs to be extended, forced threshold_state "
                 "to exceeded", drive.name)
+
+
+class WatermarkCollector(object):
+    """
+    Get drives watermarks from the block stats in the libvirt bulk stats
+    samples, avoiding a blockInfo() call, which is a QEMU monitor round trip,
+    per drive on every monitoring cycle.
+
+    The block stats are sampled every vm_sample_interval seconds, so they
+    are used only if the sample is not older than max_age seconds, and never
+    for drives that exceeded their threshold, which need fresh watermarks.
+
+    Bulk stats are used only when block threshold events are enabled. Without
+    events, the watermarks are the only way to detect that a drive needs
+    extension, and a sample taken up to max_age seconds ago may be too old
+    for a fast writer.
+    """
+
+    def __init__(self, stats_cache, max_age):
+        self._stats_cache = stats_cache
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._bulk = 0
+        self._block_info = 0
+
+    def watermarks(self, vm_id, events_enabled):
+        """
+        Return a dict mapping drive name to tuple (path, BlockInfo) from the
+        last bulk stats sample of VM vm_id, or empty dict if the sample is
+        missing or too old, or block threshold events are disabled.
+        """
+        if self._max_age <= 0 or not events_enabled:
+            return {}
+
+        sample = self._stats_cache.get(vm_id)
+        if sample.last_value is None or sample.stats_age > self._max_age:
+            return {}
+
+        stats = sample.last_value
+        result = {}
+        for idx in range(stats.get("block.count", 0)):
+            prefix = "block.%d." % idx
+            try:
+                name = stats[prefix + "name"]
+                path = stats[prefix + "path"]
+                blockinfo = storage.BlockInfo(
+                    stats[prefix + "capacity"],
+                    stats[prefix + "allocation"],
+                    stats[prefix + "physical"])
+            except KeyError:
+                # Bulk stats include only the values libvirt could get.
+                continue
+            result[name] = (path, blockinfo)
+
+        return result
+
+    def get(self, watermarks, drive):
+        """
+        Return the BlockInfo of drive from watermarks, or None if drive must
+        be queried using blockInfo().
+        """
+        blockinfo = self._lookup(watermarks, drive)
+        with self._lock:
+            if blockinfo is None:
+                self._block_info += 1
+            else:
+                self._bulk += 1
+        return blockinfo
+
+    def stats(self):
+        """
+        Return the number of watermarks taken from bulk stats, and the number
+        of watermarks queried using blockInfo().
+        """
+        with self._lock:
+            return {"bulk": self._bulk, "block_info": self._block_info}
+
+    def _lookup(self, watermarks, drive):
+        if drive.threshold_state == storage.BLOCK_THRESHOLD.EXCEEDED:
+            return None
+
+        try:
+            path, blockinfo = watermarks[drive.name]
+        except KeyError:
+            return None
+
+        # The sample may be older than the current volume, after taking a
+        # snapshot or extending the volume.
+        if path != drive.path:
+            return None
+        if drive.chunked and blockinfo.physical < drive.apparentsize:
+            return None
+
+        return blockinfo
+
+
+def resumed_after_extension(latency):
+    """
+    Record the time from requesting an extension until the VM was resumed.
+    """
+    _resume_latency.observe(latency)
+
+
+def stats():
+    """
+    Return histogram of the time from requesting an extension until the VM
+    was resumed.
+    """
+    return {"resume_latency": _resume_latency.info()}
@@ -29,6 +29,7 @@ from functools import partial
 from vdsm.common import concurrent
 from vdsm.common import exception
 from vdsm.common import logutils
+from vdsm.config import config
 
 from vdsm.virt import errors
 from vdsm.virt import virdomain
@@ -127,6 +128,10 @@ class Job:
         # but not persisted to vm metadata.
         self._live_info = None
 
+        # Monotonic time of the last libvirt job query. Not persisted, so the
+        # job is queried once after recovery.
+        self.polled = None
+
     @property
     def id(self):
         return self._id
@@ -255,6 +260,10 @@ class DriveMerger:
         self._lock = threading.RLock()
         self._jobs = {}
         self._cleanup_threads = {}
+        # Job progress is driven by libvirt block job events. Polling libvirt
+        # is only a safety net for missed events.
+        self._poll_interval = config.getint(
+            'vars', 'vm_block_job_poll_interval')
 
     def merge(self, driveSpec, base, top, bandwidth, job_id):
         bandwidth = int(bandwidth)
@@ -533,14 +542,21 @@ class DriveMerger:
         Persist jobs in vm metadata.
         """
         self._vm.sync_jobs_metadata()
-        self._vm.sync_metadata()
+        self._vm.sync_metadata(durable=True)
         self._vm.update_domain_descriptor()
 
     def find_job_id(self, drive):
         with self._lock:
-            for job in self._jobs.values():
-                if job.drive == drive:
-                    return job.id
+            job = self._find_job(drive)
+            return job.id if job else None
+
+    def _find_job(self, drive):
+        """
+        Must run under self._lock.
+        """
+        for job in self._jobs.values():
+            if job.drive == drive:
+                return job
         return None
 
     def load_jobs(self, jobs):
@@ -568,7 +584,8 @@ class DriveMerger:
                     if job.state == Job.EXTEND:
                         self._update_extend(job)
                     if job.state == Job.COMMIT:
-                        self._update_commit(job)
+                        if self._poll_needed(job):
+                            self._update_commit(job)
                     elif job.state == Job.CLEANUP:
                         self._update_cleanup(job)
                 except Exception:
@@ -590,17 +607,22 @@ class DriveMerger:
             log.debug("Extend for job %s running for %d seconds",
                       job.id, duration)
 
+    def _poll_needed(self, job):
+        """
+        Must run under self._lock.
+        """
+        if (job.polled is not None and
+                time.monotonic() - job.polled < self._poll_interval):
+            log.debug("Job %s is ongoing, waiting for block job events",
+                      job.id)
+            return False
+        return True
+
     def _update_commit(self, job):
         """
         Must run under self._lock.
         """
-        try:
-            # Returns empty dict if job has gone.
-            # pylint: disable=no-member
-            job.live_info = self._dom.blockJobInfo(job.drive)
-        except libvirt.libvirtError:
-            log.exception("Error getting block job info")
-            job.live_info = None
+        if not self._update_live_info(job):
             return
 
         if job.live_info:
@@ -623,15 +645,13 @@ class DriveMerger:
 
         if not cleanup:
             # Recovery after vdsm restart.
-            pivot = self._active_commit_ready(job)
-            self._start_cleanup(job, pivot)
+            self._retry_cleanup(job)
 
         elif cleanup.state == CleanupThread.TRYING:
             log.debug("Job %s is ongoing", job.id)
 
         elif cleanup.state == CleanupThread.RETRY:
-            pivot = self._active_commit_ready(job)
-            self._start_cleanup(job, pivot)
+            self._retry_cleanup(job)
 
         elif cleanup.state == CleanupThread.DONE:
             log.info("Cleanup completed, untracking job %s", job.id)
@@ -641,6 +661,37 @@ class DriveMerger:
             log.error("Cleanup aborted, untracking job %s", job.id)
             self._untrack_job(job.id)
 
+    def _retry_cleanup(self, job):
+        """
+        Must run under self._lock.
+        """
+        # The cleanup may have been started by a block job event, using live
+        # info older than the poll interval. Query the job again before
+        # choosing whether to pivot.
+        if not self._update_live_info(job):
+            return
+
+        pivot = self._active_commit_ready(job)
+        self._start_cleanup(job, pivot)
+
+    def _update_live_info(self, job):
+        """
+        Query libvirt for job live info. Return True if the info was updated.
+
+        Must run under self._lock.
+        """
+        try:
+            # Returns empty dict if job has gone.
+            # pylint: disable=no-member
+            job.live_info = self._dom.blockJobInfo(job.drive)
+        except libvirt.libvirtError:
+            log.exception("Error getting block job info")
+            job.live_info = None
+            return False
+
+        job.polled = time.monotonic()
+        return True
+
     def _start_cleanup(self, job, pivot):
         """
         Must run under self._lock.
@@ -661,10 +712,77 @@ class DriveMerger:
             return
 
         log.info("Starting cleanup for job %s", job.id)
-        t = CleanupThread(self._vm, job, drive, pivot)
+        callback = partial(self._cleanup_completed, job_id=job.id)
+        t = CleanupThread(self._vm, job, drive, pivot, callback=callback)
         t.start()
         self._cleanup_threads[job.id] = t
 
+    def _cleanup_completed(self, job_id):
+        """
+        Called from the cleanup thread when cleanup has finished. Untrack the
+        job now instead of waiting for the next job query. Cleanup that
+        needs a retry is left to the next job query.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != Job.CLEANUP:
+                return
+
+            cleanup = self._cleanup_threads.get(job_id)
+            if cleanup and cleanup.state in (CleanupThread.DONE,
+                                             CleanupThread.ABORT):
+                self._update_cleanup(job)
+
+    def on_block_job_event(self, drive, job_status):
+        """
+        Called from libvirt event thread when a block job for drive changed
+        its status.
+        """
+        with self._lock:
+            job = self._find_job(drive)
+            if job is None:
+                return
+
+            try:
+                if job.state == Job.COMMIT:
+                    self._commit_event(job, job_status)
+                elif job.state == Job.CLEANUP:
+                    self._cleanup_event(job, job_status)
+            except Exception:
+                log.exception("Error handling event for job %s", job.id)
+
+    def _commit_event(self, job, job_status):
+        """
+        Must run under self._lock.
+        """
+        if job_status == libvirt.VIR_DOMAIN_BLOCK_JOB_READY:
+            if job.active_commit:
+                # Libvirt marks the mirror as ready before emitting this
+                # event, so there is no need to check the xml.
+                log.info("Job %s is ready for pivot", job.id)
+                self._start_cleanup(job, True)
+        elif job_status in (libvirt.VIR_DOMAIN_BLOCK_JOB_COMPLETED,
+                            libvirt.VIR_DOMAIN_BLOCK_JOB_FAILED,
+                            libvirt.VIR_DOMAIN_BLOCK_JOB_CANCELED):
+            # Libvirt will not report this job again.
+            log.info("Job %s has completed", job.id)
+            self._start_cleanup(job, False)
+
+    def _cleanup_event(self, job, job_status):
+        """
+        Must run under self._lock.
+        """
+        cleanup = self._cleanup_threads.get(job.id)
+        if cleanup is None:
+            return
+
+        if job_status == libvirt.VIR_DOMAIN_BLOCK_JOB_READY:
+            if cleanup.state == CleanupThread.RETRY:
+                # Previous pivot attempt failed since the job was not ready.
+                self._start_cleanup(job, True)
+        elif job_status == libvirt.VIR_DOMAIN_BLOCK_JOB_COMPLETED:
+            cleanup.block_job_completed()
+
     def _active_commit_ready(self, job):
         # Check the job state in the xml to make sure the job is
         # ready. We know about two interesting corner cases:
@@ -692,7 +810,10 @@ class DriveMerger:
         return disk.find("./mirror[@ready='yes']") is not None
 
     def wait_for_cleanup(self):
-        for t in self._cleanup_threads.values():
+        # Completed cleanup threads untrack their jobs.
+        with self._lock:
+            threads = list(self._cleanup_threads.values())
+        for t in threads:
             t.join()
 
 
@@ -709,15 +830,18 @@ class CleanupThread(object):
     # Unrecoverable cleanup error, run should not be retried by the caller.
     ABORT = 'ABORT'
 
-    # Sample interval for libvirt xml volume chain update after pivot.
+    # Sample interval for libvirt xml volume chain update after pivot, used
+    # if libvirt did not report the block job completion.
     WAIT_INTERVAL = 1
 
-    def __init__(self, vm, job, drive, doPivot):
+    def __init__(self, vm, job, drive, doPivot, callback=None):
         self.vm = vm
         self.job = job
         self.drive = drive
         self.doPivot = doPivot
+        self._callback = callback
         self._state = self.TRYING
+        self._completed = threading.Event()
         self._thread = concurrent.thread(
             self.run, name="merge/" + job.id[:8])
 
@@ -731,6 +855,13 @@ class CleanupThread(object):
     def join(self):
         self._thread.join()
 
+    def block_job_completed(self):
+        """
+        Called when libvirt reports that the block job has completed after the
+        pivot, waking up the thread waiting for the xml update.
+        """
+        self._completed.set()
+
     def tryPivot(self):
         # We call imageSyncVolumeChain which will mark the current leaf
         # ILLEGAL.  We do this before requesting a pivot so that we can
@@ -796,6 +927,13 @@ class CleanupThread(object):
 
     @logutils.traceback()
     def run(self):
+        try:
+            self._run()
+        finally:
+            if self._callback:
+                self._callback()
+
+    def _run(self):
         try:
             self.update_base_size()
             if self.doPivot:
@@ -859,7 +997,10 @@ class CleanupThread(object):
             curVols = sorted([entry.uuid for entry in chains[alias]])
 
             if curVols == origVols:
-                time.sleep(self.WAIT_INTERVAL)
+                # Wake up on block job completion event, or check again
+                # after WAIT_INTERVAL if the event was missed.
+                if self._completed.wait(self.WAIT_INTERVAL):
+                    self._completed.clear()
             elif curVols == expectedVols:
                 self.vm.log.info("The XML update has been completed")
                 break
@@ -55,11 +55,13 @@ from contextlib import contextmanager
 import logging
 import operator
 import threading
+import time
 import xml.etree.ElementTree as ET
 
 import libvirt
 import six
 
+from vdsm.common import concurrent
 from vdsm.common import conv
 from vdsm.common import errors
 from vdsm.common import xmlutils
@@ -407,6 +409,9 @@ class Descriptor(object):
         self._values = {}
         self._custom = {}
         self._devices = []
+        # Last metadata written by dump(), used to skip unchanged metadata.
+        self._dumped_dom = None
+        self._dumped_xml = None
 
     def __bool__(self):
         # custom properties may be missing, and that's fine.
@@ -499,22 +504,34 @@ class Descriptor(object):
         self._log.debug(
             'loading metadata for %s: %s', dom.UUIDString(), md_xml)
         self._load(xmlutils.fromstring(md_xml))
+        self._dumped_dom = None
+        self._dumped_xml = None
 
     def dump(self, dom):
         """
         Serializes all the content stored in the descriptor, completely
         overwriting the content of the libvirt domain.
 
+        If the content did not change since the last dump to the same
+        domain, the libvirt domain is not modified.
+
         :param dom: domain to access
         :type dom: libvirt.Domain
+        :return: True if the libvirt domain was modified
+        :rtype: bool
         """
         md_xml = self._build_xml()
+        if dom is self._dumped_dom and md_xml == self._dumped_xml:
+            return False
         dom.setMetadata(libvirt.VIR_DOMAIN_METADATA_ELEMENT,
                         md_xml,
                         self._namespace,
                         self._namespace_uri)
+        self._dumped_dom = dom
+        self._dumped_xml = md_xml
         self._log.debug(
             'dumped metadata for %s: %s', dom.UUIDString(), md_xml)
+        return True
 
     def to_xml(self):
         """
@@ -930,3 +947,104 @@ def _keyvalue_to_elem(key, value, elem):
         raise UnsupportedType(key, value)
     subelem.text = str(value)
     return subelem
+
+
+class Syncer(object):
+    """
+    Write metadata to a libvirt domain behind the callers, coalescing write
+    requests made within a short delay into a single write.
+
+    Flows which need the metadata in the libvirt domain, for example before
+    migrating or reading the domain XML, must call flush(). Flows which
+    persist state needed for recovery before modifying the domain must use
+    write().
+    """
+
+    _log = logging.getLogger('virt.metadata.Syncer')
+
+    def __init__(self, write, delay, name=None):
+        """
+        :param write: callable writing the metadata, returning True if the
+            libvirt domain was modified.
+        :param delay: seconds to wait before writing requested metadata. If
+            0, the metadata is written when requested.
+        :param name: name of the thread writing the metadata.
+        """
+        self._write = write
+        self._delay = delay
+        self._name = name
+        # Serializes writes.
+        self._write_lock = threading.Lock()
+        # Protects the state below.
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._scheduled = False
+        self._requested = 0
+        self._written = 0
+
+    def request(self):
+        """
+        Request writing the metadata. If a delay is configured, return
+        immediately, and write the metadata later from another thread.
+        """
+        with self._lock:
+            self._requested += 1
+            self._dirty = True
+            if self._delay > 0:
+                if self._scheduled:
+                    return
+                self._scheduled = True
+
+        if self._delay > 0:
+            t = concurrent.thread(
+                self._delayed_flush, name=self._name, log=self._log)
+            t.start()
+        else:
+            self.flush()
+
+    def write(self):
+        """
+        Request writing the metadata and write it now, with pending
+        requests. Return when the metadata was written, or raise if writing
+        failed.
+        """
+        with self._lock:
+            self._requested += 1
+            self._dirty = True
+        self.flush()
+
+    def flush(self):
+        """
+        Write requested metadata now. Return when the metadata was written.
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+            try:
+                written = self._write()
+            except:
+                with self._lock:
+                    self._dirty = True
+                raise
+            if written:
+                with self._lock:
+                    self._written += 1
+
+    def stats(self):
+        """
+        Return the number of write requests, and the number of writes
+        modifying the libvirt domain.
+        """
+        with self._lock:
+            return {"requested": self._requested, "written": self._written}
+
+    def _delayed_flush(self):
+        time.sleep(self._delay)
+        with self._lock:
+            self._scheduled = False
+        try:
+            self.flush()
+        except Exception as e:
+            self._log.warning("Cannot write metadata: %s", e)
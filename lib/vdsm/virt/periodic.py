@@ -25,11 +25,12 @@ from __future__ import division
 Code to perform periodic maintenance and bookkeeping of the VMs.
 """
 
+import heapq
 import logging
 import threading
+import zlib
 
 import libvirt
-import six
 
 from vdsm import executor
 from vdsm import host
@@ -37,6 +38,8 @@ from vdsm import throttledlog
 from vdsm.common import errors
 from vdsm.common import exception
 from vdsm.common import libvirtconnection
+from vdsm.common.histogram import Histogram
+from vdsm.common.time import monotonic_time
 from vdsm.config import config
 from vdsm.virt import migration
 from vdsm.virt import recovery
@@ -56,6 +59,7 @@ _THROTTLING_INTERVAL = 10  # seconds
 
 _operations = []
 _executor = None
+_vm_scheduler = None
 
 
 class Error(errors.Base):
@@ -93,7 +97,9 @@ def start(cif, scheduler):
                                   workers_count=_WORKERS,
                                   max_tasks=_TASKS,
                                   scheduler=scheduler,
-                                  max_workers=_MAX_WORKERS)
+                                  max_workers=_MAX_WORKERS,
+                                  work_stealing=config.getboolean(
+                                      'vars', 'executor_work_stealing'))
 
     _executor.start()
 
@@ -116,6 +122,15 @@ def stop():
     _executor.stop(wait=False)
 
 
+def stats():
+    """
+    Return per-VM operations statistics, see VmScheduler.info().
+    """
+    if _vm_scheduler is None:
+        return {}
+    return _vm_scheduler.info()
+
+
 class Operation(object):
     """
     Operation runs a callable with a given period until
@@ -232,39 +247,148 @@ class Operation(object):
         )
 
 
-class VmDispatcher(object):
+class VmScheduler(object):
     """
-    Adapter class. Dispatch an Operation to all VMs, to improve
-    isolation among them.
+    Run all the per-VM operations from a single periodic tick.
+
+    VmScheduler keeps the next due time of every VM for every operation, and
+    on every tick handles only the VMs which are due:
+
+    - The first run of a VM is spread over the operation period using a hash
+      of the VM id, to avoid running the operation for all VMs on the same
+      tick.
+    - VMs requiring the operation are kept in the operation active set. VMs
+      not requiring it are checked again in the next period, without
+      dispatching a task.
+    - The operation may adapt the interval of a VM, for example checking
+      drives watermarks more often while the VM is writing quickly.
+
+    The lag between the due time of a VM and the time the operation started
+    to run is recorded per operation, see info().
     """
 
-    _log = logging.getLogger("virt.periodic.VmDispatcher")
+    _log = logging.getLogger("virt.periodic.VmScheduler")
 
-    def __init__(self, get_vms, executor, create, timeout):
+    def __init__(self, get_vms, executor):
         """
         get_vms: callable which will return a dict which maps
                  vm_ids to vm_instances
         executor: executor.Executor instance
-        create: callable to obtain the real callable to
-                dispatch, with its timeout
-        timeout: per-vm operation timeout, in seconds
-                 (fractions allowed).
         """
         self._get_vms = get_vms
         self._executor = executor
-        self._create = create
-        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._ops = []
+        self._vm_ids = frozenset()
+
+    def add(self, create, period):
+        """
+        Run the operation created by create(vm) every period seconds for
+        every VM.
+        """
+        with self._lock:
+            self._ops.append(_VmOperation(create, period))
 
     def __call__(self):
+        now = monotonic_time()
         vms = self._get_vms()
         skipped = []
 
-        for vm_id, vm_obj in six.viewitems(vms):
+        with self._lock:
+            vm_ids = frozenset(vms)
+            added = vm_ids - self._vm_ids
+            removed = self._vm_ids - vm_ids
+            self._vm_ids = vm_ids
+
+            for op in self._ops:
+                for vm_id in removed:
+                    op.remove(vm_id)
+                for vm_id in added:
+                    op.add(vm_id, now)
+                skipped.extend(op.run(vms, now, self._executor))
+
+        if skipped:
+            self._log.warning('could not run %s', skipped)
+        return skipped  # for testing purposes
+
+    def info(self):
+        """
+        Return per operation statistics:
+
+            {
+                "DriveWatermarkMonitor": {
+                    "period": 2,
+                    "vms": 3,
+                    "dispatched": 120,
+                    "skipped": 0,
+                    "lag": {...},
+                },
+                ...
+            }
+
+        "vms" is the number of VMs requiring the operation, and "lag" is an
+        histogram of the time from a VM due time until the operation started
+        to run.
+        """
+        with self._lock:
+            return {op.name: op.info() for op in self._ops}
+
+    def __repr__(self):
+        return '<VmScheduler operations=%s at 0x%x>' % (
+            [op.name for op in self._ops], id(self)
+        )
+
+
+class _VmOperation(object):
+    """
+    Schedule of one per-VM operation. Must be used under VmScheduler lock.
+    """
+
+    _log = logging.getLogger("virt.periodic.VmScheduler")
+
+    def __init__(self, create, period):
+        self.create = create
+        self.period = period
+        self.name = getattr(create, "__name__", str(create))
+        self._timeout = _timeout_from(period)
+        # Heap of (due, vm_id). Entries of removed or rescheduled VMs are
+        # skipped when popped.
+        self._queue = []
+        self._due = {}
+        self._active = set()
+        self._lag = Histogram()
+        self._dispatched = 0
+        self._skipped = 0
+
+    def add(self, vm_id, now):
+        self._schedule(vm_id, now + self.period * _phase(vm_id))
+
+    def remove(self, vm_id):
+        self._due.pop(vm_id, None)
+        self._active.discard(vm_id)
+
+    def run(self, vms, now, executor):
+        """
+        Dispatch the operation for VMs due at now, and return the ids of the
+        VMs which could not run.
+        """
+        skipped = []
+
+        while self._queue and self._queue[0][0] <= now:
+            due, vm_id = heapq.heappop(self._queue)
+            if self._due.get(vm_id) != due:
+                continue
+
+            interval = self.period
             try:
-                op = self._create(vm_obj)
+                op = self.create(vms[vm_id])
 
                 if not op.required:
+                    self._active.discard(vm_id)
                     continue
+
+                self._active.add(vm_id)
+                interval = op.interval(self.period)
                 # When dealing with blocked domains, we also want to avoid
                 # to pile up jobs that libvirt can't handle and that will
                 # eventually clog it.
@@ -276,24 +400,64 @@ class VmDispatcher(object):
                     skipped.append(vm_id)
                     continue
 
+                executor.dispatch(_LaggingTask(op, due, self._lag),
+                                  self._timeout)
+                self._dispatched += 1
+            except exception.ResourceExhausted:
+                skipped.append(vm_id)
             except Exception:
-                # we want to make sure to have VM UUID logged
-                self._log.exception("while dispatching %s", op)
-            else:
-                try:
-                    self._executor.dispatch(op, self._timeout)
-                except exception.ResourceExhausted:
-                    skipped.append(vm_id)
+                self._log.exception("while dispatching %s for vm %s",
+                                    self.name, vm_id)
+            finally:
+                self._reschedule(vm_id, due, interval, now)
+
+        self._skipped += len(skipped)
+        return skipped
+
+    def info(self):
+        return {
+            "period": self.period,
+            "vms": len(self._active),
+            "dispatched": self._dispatched,
+            "skipped": self._skipped,
+            "lag": self._lag.info(),
+        }
+
+    def _reschedule(self, vm_id, due, interval, now):
+        # Keep the VM phase, unless we are late.
+        next_due = due + interval
+        if next_due <= now:
+            next_due = now + interval
+        self._schedule(vm_id, next_due)
+
+    def _schedule(self, vm_id, due):
+        self._due[vm_id] = due
+        heapq.heappush(self._queue, (due, vm_id))
+
+
+class _LaggingTask(object):
+    """
+    Executor task recording the lag from the due time until the task started.
+    """
 
-        if skipped:
-            self._log.warning('could not run %s on %s',
-                              self._create, skipped)
-        return skipped  # for testing purposes
+    def __init__(self, func, due, lag):
+        self._func = func
+        self._due = due
+        self._lag = lag
+
+    def __call__(self):
+        self._lag.observe(max(0, monotonic_time() - self._due))
+        self._func()
 
     def __repr__(self):
-        return '<VmDispatcher operation=%s at 0x%x>' % (
-            self._create, id(self)
-        )
+        return repr(self._func)
+
+
+def _phase(vm_id):
+    """
+    Return a stable fraction in [0, 1) for spreading VMs over a period.
+    """
+    return zlib.crc32(vm_id.encode("utf-8")) / 2**32
 
 
 class _RunnableOnVm(object):
@@ -310,6 +474,12 @@ class _RunnableOnVm(object):
     def runnable(self):
         return self._vm.isDomainReadyForCommands()
 
+    def interval(self, period):
+        """
+        Return the interval until the next run of the operation on this vm.
+        """
+        return period
+
     def __call__(self):
         migrating = self._vm.isMigrating()
         try:
@@ -380,6 +550,12 @@ class DriveWatermarkMonitor(_RunnableOnVm):
         return (super(DriveWatermarkMonitor, self).required and
                 self._vm.drive_monitor.monitoring_needed())
 
+    def interval(self, period):
+        # A vm writing quickly may fill a drive before the next check.
+        if self._vm.drive_monitor.writing():
+            return period / 2
+        return period
+
     def _execute(self):
         self._vm.monitor_drives()
 
@@ -429,37 +605,44 @@ def _kill_long_paused_vms(cif):
 
 
 def _create(cif, scheduler):
-    def per_vm_operation(func, period):
-        disp = VmDispatcher(
-            cif.getVMs, _executor, func, _timeout_from(period))
-        return Operation(disp, period, scheduler)
+    global _vm_scheduler
+
+    _vm_scheduler = VmScheduler(cif.getVMs, _executor)
+
+    # Needs dispatching because updating the volume stats needs
+    # access to the storage, thus can block.
+    _vm_scheduler.add(
+        UpdateVolumes,
+        config.getint('irs', 'vol_size_sample_interval'))
+
+    # Job monitoring need QEMU monitor access.
+    _vm_scheduler.add(
+        BlockjobMonitor,
+        config.getint('vars', 'vm_sample_jobs_interval'))
+
+    # We do this only until we get high water mark notifications
+    # from QEMU. It accesses storage and/or QEMU monitor, so can block,
+    # thus we need dispatching.
+    _vm_scheduler.add(
+        DriveWatermarkMonitor,
+        config.getint('vars', 'vm_watermark_interval'))
+
+    _vm_scheduler.add(
+        NvramDataMonitor,
+        config.getint('sampling', 'nvram_data_update_interval'))
+
+    _vm_scheduler.add(
+        TpmDataMonitor,
+        config.getint('sampling', 'tpm_data_update_interval'))
 
     ops = [
-        # Needs dispatching because updating the volume stats needs
-        # access to the storage, thus can block.
-        per_vm_operation(
-            UpdateVolumes,
-            config.getint('irs', 'vol_size_sample_interval')),
-
-        # Job monitoring need QEMU monitor access.
-        per_vm_operation(
-            BlockjobMonitor,
-            config.getint('vars', 'vm_sample_jobs_interval')),
-
-        # We do this only until we get high water mark notifications
-        # from QEMU. It accesses storage and/or QEMU monitor, so can block,
-        # thus we need dispatching.
-        per_vm_operation(
-            DriveWatermarkMonitor,
-            config.getint('vars', 'vm_watermark_interval')),
-
-        per_vm_operation(
-            NvramDataMonitor,
-            config.getint('sampling', 'nvram_data_update_interval')),
-
-        per_vm_operation(
-            TpmDataMonitor,
-            config.getint('sampling', 'tpm_data_update_interval')),
+        # The tick only dispatches the due per-VM operations, so it does
+        # not block.
+        Operation(
+            _vm_scheduler,
+            config.getfloat('sampling', 'vm_operations_tick'),
+            scheduler,
+            exclusive=True),
 
         Operation(
             lambda: recovery.lookup_external_vms(cif),
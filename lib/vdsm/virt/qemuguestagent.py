@@ -27,6 +27,7 @@ Periodic scheduler that polls QEMU Guest Agent for information.
 
 from collections import defaultdict
 import copy
+import heapq
 import ipaddress
 import json
 import libvirt
@@ -38,6 +39,7 @@ import time
 from vdsm import utils
 from vdsm import executor
 from vdsm.common import exception
+from vdsm.common.histogram import Histogram
 from vdsm.common.time import monotonic_time
 from vdsm.config import config
 from vdsm.virt import periodic
@@ -74,6 +76,9 @@ _COMMAND_TIMEOUT = config.getint('guest_agent', 'qga_command_timeout')
 _INITIAL_INTERVAL = config.getint('guest_agent', 'qga_initial_info_interval')
 _TASK_TIMEOUT = config.getint('guest_agent', 'qga_task_timeout')
 _THROTTLING_INTERVAL = 60
+# Unresponsive agents are queried again after _THROTTLING_INTERVAL, doubled
+# on every consecutive failed poll up to _MAX_BACKOFF.
+_MAX_BACKOFF = 600
 
 from libvirt import \
     VIR_DOMAIN_GUEST_INFO_USERS,  \
@@ -118,6 +123,10 @@ _QEMU_COMMAND_PERIODS = {
         config.getint('guest_agent', 'qga_active_users_period'),
 }
 
+# Names of polled commands for reporting.
+_COMMAND_NAMES = dict(_QEMU_COMMANDS)
+_COMMAND_NAMES[VDSM_GUEST_INFO] = _QEMU_GUEST_INFO_COMMAND
+
 _DISK_DEVICE_RE = re.compile('^(/dev/[hsv]d[a-z]+)[0-9]+$')
 
 
@@ -146,7 +155,10 @@ class QemuGuestAgentPoller(object):
                                            workers_count=_WORKERS,
                                            max_tasks=_TASKS,
                                            scheduler=scheduler,
-                                           max_workers=_MAX_WORKERS)
+                                           max_workers=_MAX_WORKERS,
+                                           work_stealing=config.getboolean(
+                                               'vars',
+                                               'executor_work_stealing'))
         self._operations = []
         self._capabilities_lock = threading.Lock()
         self._capabilities = {}
@@ -154,11 +166,23 @@ class QemuGuestAgentPoller(object):
         self._guest_info = defaultdict(dict)
         self._last_failure_lock = threading.Lock()
         self._last_failure = defaultdict(lambda: 0)
+        # Number of consecutive failed polls per vm.
+        self._failures = defaultdict(int)
         self._last_check_lock = threading.Lock()
         # Key is tuple (vm_id, command)
         self._last_check = defaultdict(lambda: 0)
         self._initial_interval = config.getint(
             'guest_agent', 'qga_initial_info_interval')
+        # Polling schedule: heap of (due, vm_id, command). Entries which do
+        # not match self._due are stale and skipped.
+        self._schedule_lock = threading.Lock()
+        self._queue = []
+        self._due = {}
+        # Vms with a poll running in the executor.
+        self._polling = set()
+        self._lag = {command: Histogram() for command in _COMMAND_NAMES}
+        self._dispatched = defaultdict(int)
+        self._skipped = defaultdict(int)
         self.log.info('Using libvirt for querying QEMU-GA')
 
     def start(self):
@@ -223,11 +247,21 @@ class QemuGuestAgentPoller(object):
     def reset_failure(self, vm_id):
         with self._last_failure_lock:
             del self._last_failure[vm_id]
+            self._failures.pop(vm_id, None)
 
     def set_failure(self, vm_id):
         with self._last_failure_lock:
             self._last_failure[vm_id] = monotonic_time()
 
+    def backoff(self, vm_id):
+        """
+        Return the time to wait after the last failure before querying the
+        agent again, doubled on every consecutive failed poll.
+        """
+        failures = self._failures.get(vm_id, 0)
+        return min(_THROTTLING_INTERVAL * 2 ** max(failures - 1, 0),
+                   _MAX_BACKOFF)
+
     def last_check(self, vm_id, command):
         return self._last_check[(vm_id, command)]
 
@@ -339,66 +373,221 @@ class QemuGuestAgentPoller(object):
             self.set_last_check(vm.id, VDSM_GUEST_INFO_NETWORK, now)
 
     def _poller(self):
-        for vm_id, vm_obj in six.viewitems(self._cif.getVMs()):
-            now = monotonic_time()
-            # Ensure we know guest agent's capabilities
-            self._on_boot(vm_obj, now)
-            if not self._runnable_on_vm(vm_obj):
-                self.log.debug(
-                    'Skipping vm-id=%s in this run and not querying QEMU-GA',
-                    vm_id)
-                continue
-            caps = self.get_caps(vm_id)
-            # Update capabilities -- if we just got the caps above then this
-            # will fall through
-            if (now - self.last_check(vm_id, VDSM_GUEST_INFO)
-                    >= _QEMU_COMMAND_PERIODS[VDSM_GUEST_INFO]):
-                self._qga_capability_check(vm_obj, now)
-                caps = self.get_caps(vm_id)
-            if caps['version'] is None:
-                # If we don't know about the agent there is no reason to
-                # proceed any further
-                continue
-            # Update guest info
-            types = 0
-            have_disk_mapping = False
-            for command in _QEMU_COMMANDS.keys():
-                if _QEMU_COMMANDS[command] not in caps['commands']:
-                    continue
-                if now - self.last_check(vm_id, command) \
-                        < _QEMU_COMMAND_PERIODS[command]:
+        """
+        Dispatch a poll for every vm with due commands.
+
+        Every command of every vm has its own due time. Vms are polled
+        concurrently by the executor, so a slow or hung agent delays only
+        its own vm. A vm is not polled again before its previous poll has
+        finished.
+        """
+        now = monotonic_time()
+        vms = self._cif.getVMs()
+        due = defaultdict(dict)
+        busy = []
+
+        with self._schedule_lock:
+            self._update_vms(vms, now)
+            while self._queue and self._queue[0][0] <= now:
+                entry = heapq.heappop(self._queue)
+                when, vm_id, command = entry
+                if self._due.get((vm_id, command)) != when:
                     continue
-                # Commands that have special handling go here
-                if command == VIR_DOMAIN_GUEST_INFO_FILESYSTEM and \
-                        _QEMU_DISKS_COMMAND in caps['commands']:
-                    disk_info = self._qga_call_get_disks(vm_obj)
-                    if len(disk_info.get('diskMapping', {})) > 0:
-                        self.update_guest_info(vm_id, disk_info)
-                        have_disk_mapping = True
-                if command == VDSM_GUEST_INFO_DRIVERS:
-                    self.update_guest_info(
-                        vm_id, self._qga_call_get_devices(vm_obj))
-                    self.set_last_check(vm_id, command, now)
-                elif command == VDSM_GUEST_INFO_NETWORK:
-                    self.update_guest_info(
-                        vm_id, self._qga_call_network_interfaces(vm_obj))
-                    self.set_last_check(vm_id, command, now)
-                # Commands handled by libvirt guestInfo() go here
+                if vm_id in self._polling:
+                    busy.append(entry)
                 else:
-                    types |= command
-            info = self._libvirt_get_guest_info(
-                vm_obj, types, not have_disk_mapping)
-            if info is None:
-                self.log.debug('Failed to query QEMU-GA for vm=%s', vm_id)
-                self.set_failure(vm_id)
-            else:
-                self.update_guest_info(vm_id, info)
-                for command in _QEMU_COMMANDS.keys():
-                    if types & command:
-                        self.set_last_check(vm_id, command, now)
+                    due[vm_id][command] = when
+            # Keep the due time of busy vms, so the lag is reported.
+            for entry in busy:
+                heapq.heappush(self._queue, entry)
+                self._skipped[entry[2]] += 1
+
+            # Vms starting up are polled on every cycle, see _on_boot().
+            for vm_id, vm_obj in six.viewitems(vms):
+                if vm_id not in self._polling and self._booting(vm_obj):
+                    due.setdefault(vm_id, {})
+
+            for vm_id, commands in six.viewitems(due):
+                self._dispatch(vms[vm_id], commands, now)
+
         # Remove stale info
         self._cleanup()
 
+    def _update_vms(self, vms, now):
+        """
+        Must be called under self._schedule_lock.
+        """
+        scheduled = set(vm_id for vm_id, _ in self._due)
+        for vm_id in scheduled - set(vms):
+            for command in _COMMAND_NAMES:
+                self._due.pop((vm_id, command), None)
+        for vm_id in set(vms) - scheduled:
+            for command in _COMMAND_NAMES:
+                self._schedule(vm_id, command, now)
+
+    def _schedule(self, vm_id, command, when):
+        """
+        Must be called under self._schedule_lock.
+        """
+        self._due[(vm_id, command)] = when
+        heapq.heappush(self._queue, (when, vm_id, command))
+
+    def _dispatch(self, vm_obj, commands, now):
+        """
+        Must be called under self._schedule_lock.
+        """
+        vm_id = vm_obj.id
+        last_failure = self.last_failure(vm_id)
+        if (commands and not self._booting(vm_obj) and
+                now - last_failure < self.backoff(vm_id)):
+            # Unresponsive agent, try again when the backoff expires.
+            retry = last_failure + self.backoff(vm_id)
+            for command in commands:
+                self._schedule(vm_id, command, retry)
+            return
+
+        try:
+            self._executor.dispatch(
+                _Poll(self, vm_obj, commands), _TASK_TIMEOUT)
+        except exception.ResourceExhausted:
+            self.log.debug('Cannot poll vm-id=%s, executor queue full',
+                           vm_id)
+            for command, when in six.viewitems(commands):
+                self._schedule(vm_id, command, when)
+                self._skipped[command] += 1
+        else:
+            self._polling.add(vm_id)
+            for command in commands:
+                self._dispatched[command] += 1
+
+    def _booting(self, vm):
+        return time.time() - vm.start_time <= _INITIAL_INTERVAL
+
+    def _poll(self, vm_obj, commands):
+        """
+        Poll the due commands of one vm. Runs in the executor.
+        """
+        vm_id = vm_obj.id
+        start = monotonic_time()
+        failed = self.last_failure(vm_id)
+        try:
+            for command, when in six.viewitems(commands):
+                self._lag[command].observe(max(0, start - when))
+            self._poll_commands(vm_obj, commands, start)
+        finally:
+            with self._last_failure_lock:
+                failure = self._last_failure.get(vm_id, 0)
+                if failure > failed:
+                    self._failures[vm_id] += 1
+                elif self.last_check(vm_id, None) >= start:
+                    # The agent responded.
+                    self._failures.pop(vm_id, None)
+            with self._schedule_lock:
+                self._polling.discard(vm_id)
+                if (vm_id, VDSM_GUEST_INFO) in self._due:
+                    self._reschedule(vm_id, commands, start, failure)
+
+    def _reschedule(self, vm_id, commands, start, failure):
+        """
+        Must be called under self._schedule_lock.
+        """
+        retry = failure + self.backoff(vm_id)
+        for command in commands:
+            last = self.last_check(vm_id, command)
+            if failure >= start:
+                # Unresponsive agent, retry when the backoff expires.
+                when = retry
+            elif last >= start:
+                when = last + _QEMU_COMMAND_PERIODS[command]
+            else:
+                # Command not supported or not needed yet.
+                when = start + _QEMU_COMMAND_PERIODS[command]
+            self._schedule(vm_id, command, when)
+
+    def _poll_commands(self, vm_obj, commands, now):
+        vm_id = vm_obj.id
+        # Ensure we know guest agent's capabilities
+        self._on_boot(vm_obj, now)
+        if not commands or not self._runnable_on_vm(vm_obj):
+            self.log.debug(
+                'Skipping vm-id=%s in this run and not querying QEMU-GA',
+                vm_id)
+            return
+        caps = self.get_caps(vm_id)
+        # Update capabilities -- if we just got the caps above then this
+        # will fall through
+        if (VDSM_GUEST_INFO in commands and
+                self.last_check(vm_id, VDSM_GUEST_INFO) < now):
+            self._qga_capability_check(vm_obj, now)
+            caps = self.get_caps(vm_id)
+        if caps['version'] is None:
+            # If we don't know about the agent there is no reason to
+            # proceed any further
+            return
+        # Update guest info
+        types = 0
+        have_disk_mapping = False
+        for command in _QEMU_COMMANDS.keys():
+            if command not in commands:
+                continue
+            if _QEMU_COMMANDS[command] not in caps['commands']:
+                continue
+            if self.last_check(vm_id, command) >= now:
+                # Already checked by _on_boot().
+                continue
+            # Commands that have special handling go here
+            if command == VIR_DOMAIN_GUEST_INFO_FILESYSTEM and \
+                    _QEMU_DISKS_COMMAND in caps['commands']:
+                disk_info = self._qga_call_get_disks(vm_obj)
+                if len(disk_info.get('diskMapping', {})) > 0:
+                    self.update_guest_info(vm_id, disk_info)
+                    have_disk_mapping = True
+            if command == VDSM_GUEST_INFO_DRIVERS:
+                self.update_guest_info(
+                    vm_id, self._qga_call_get_devices(vm_obj))
+                self.set_last_check(vm_id, command, now)
+            elif command == VDSM_GUEST_INFO_NETWORK:
+                self.update_guest_info(
+                    vm_id, self._qga_call_network_interfaces(vm_obj))
+                self.set_last_check(vm_id, command, now)
+            # Commands handled by libvirt guestInfo() go here
+            else:
+                types |= command
+        if not types:
+            # guestInfo() with no types would query all types.
+            return
+        info = self._libvirt_get_guest_info(
+            vm_obj, types, not have_disk_mapping)
+        if info is None:
+            self.log.debug('Failed to query QEMU-GA for vm=%s', vm_id)
+            self.set_failure(vm_id)
+        else:
+            self.update_guest_info(vm_id, info)
+            for command in _QEMU_COMMANDS.keys():
+                if types & command:
+                    self.set_last_check(vm_id, command, now)
+
+    def stats(self):
+        """
+        Return polling statistics per command, in the same format as
+        periodic.stats().
+        """
+        with self._capabilities_lock:
+            caps = [c['commands'] for c in self._capabilities.values()]
+        with self._schedule_lock:
+            dispatched = dict(self._dispatched)
+            skipped = dict(self._skipped)
+        return {
+            'qga:' + name: {
+                'period': _QEMU_COMMAND_PERIODS[command],
+                'vms': sum(1 for commands in caps if name in commands),
+                'dispatched': dispatched.get(command, 0),
+                'skipped': skipped.get(command, 0),
+                'lag': self._lag[command].info(),
+            }
+            for command, name in six.viewitems(_COMMAND_NAMES)
+        }
+
     def _libvirt_get_guest_info(self, vm, types, store_disk_mapping=True):
         guest_info = {}
         self.log.debug(
@@ -532,6 +721,10 @@ class QemuGuestAgentPoller(object):
                 if vm_id not in vm_container:
                     del self._last_failure[vm_id]
                     removed.add(vm_id)
+            for vm_id in copy.copy(self._failures):
+                if vm_id not in vm_container:
+                    del self._failures[vm_id]
+                    removed.add(vm_id)
         with self._last_check_lock:
             for vm_id, command in copy.copy(self._last_check):
                 if vm_id not in vm_container:
@@ -542,7 +735,7 @@ class QemuGuestAgentPoller(object):
 
     def _runnable_on_vm(self, vm):
         last_failure = self.last_failure(vm.id)
-        if (monotonic_time() - last_failure) < _THROTTLING_INTERVAL:
+        if (monotonic_time() - last_failure) < self.backoff(vm.id):
             return False
         if not vm.isDomainRunning():
             return False
@@ -666,3 +859,24 @@ class QemuGuestAgentPoller(object):
         else:
             self.set_failure(vm.id)
             return {}
+
+
+class _Poll(object):
+    """
+    Executor task polling the due commands of one vm.
+    """
+
+    def __init__(self, poller, vm, commands):
+        self._poller = poller
+        self._vm = vm
+        self._commands = commands
+
+    def __call__(self):
+        self._poller._poll(self._vm, self._commands)
+
+    def __repr__(self):
+        return '<_Poll vm=%s commands=%s at 0x%x>' % (
+            self._vm.id,
+            [_COMMAND_NAMES[c] for c in self._commands],
+            id(self)
+        )
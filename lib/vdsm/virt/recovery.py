@@ -25,8 +25,11 @@ import logging
 
 import libvirt
 
+from vdsm.common import concurrent
 from vdsm.common import libvirtconnection
 from vdsm.common import response
+from vdsm.common.time import Clock
+from vdsm.config import config
 from vdsm.virt import vmchannels
 from vdsm.virt import vmstatus
 from vdsm.virt import vmxml
@@ -62,25 +65,42 @@ def _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
 
 def _list_domains():
     conn = libvirtconnection.get()
+    dom_objs = conn.listAllDomains()
     domains = []
-    for dom_obj in conn.listAllDomains():
-        dom_uuid = 'unknown'
-        try:
-            dom_uuid = dom_obj.UUIDString()
-            logging.debug("Found domain %s", dom_uuid)
-            dom_xml = dom_obj.XMLDesc()
-        except libvirt.libvirtError as e:
-            if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
-                logging.exception("domain %s is dead", dom_uuid)
-            else:
-                raise
-        else:
-            if _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
-                continue
-            domains.append((dom_obj, dom_xml, _is_external_vm(dom_xml),))
+    for res in concurrent.tmap(
+            _domain_info, dom_objs, max_workers=_max_workers(dom_objs),
+            name="recovery"):
+        if not res.succeeded:
+            raise res.value
+        if res.value is not None:
+            domains.append(res.value)
     return domains
 
 
+def _domain_info(dom_obj):
+    """
+    Return a tuple (dom_obj, dom_xml, external) for domain dom_obj, or None if
+    the domain is dead or should be ignored.
+    """
+    dom_uuid = 'unknown'
+    try:
+        dom_uuid = dom_obj.UUIDString()
+        logging.debug("Found domain %s", dom_uuid)
+        dom_xml = dom_obj.XMLDesc()
+    except libvirt.libvirtError as e:
+        if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+            logging.exception("domain %s is dead", dom_uuid)
+            return None
+        raise
+    if _is_ignored_vm(dom_uuid, dom_obj, dom_xml):
+        return None
+    return dom_obj, dom_xml, _is_external_vm(dom_xml)
+
+
+def _max_workers(items):
+    return max(1, min(len(items), config.getint('vars', 'recovery_workers')))
+
+
 def _recover_domain(cif, vm_id, dom_xml, external):
     external_str = " (external)" if external else ""
     cif.log.debug("recovery: trying with VM%s %s", external_str, vm_id)
@@ -113,9 +133,13 @@ def _recovery_params(vm_id, dom_xml, external):
 
 
 def all_domains(cif):
-    doms = _list_domains()
+    clock = Clock()
+    with clock.run("list"):
+        doms = _list_domains()
     num_doms = len(doms)
-    for idx, (dom_obj, dom_xml, external) in enumerate(doms):
+
+    def recover(item):
+        idx, (dom_obj, dom_xml, external) = item
         vm_id = dom_obj.UUIDString()
         if _recover_domain(cif, vm_id, dom_xml, external):
             cif.log.info(
@@ -134,6 +158,23 @@ def all_domains(cif):
                     'recovery [1:%d/%d]: failed to kill loose domain %s',
                     idx + 1, num_doms, vm_id)
 
+    errors = []
+    with clock.run("recover"):
+        for res in concurrent.tmap(
+                recover, enumerate(doms), max_workers=_max_workers(doms),
+                name="recovery"):
+            if not res.succeeded:
+                errors.append(res.value)
+
+    # Like recovering the domains one by one, an unexpected error fails the
+    # recovery so it is retried, but only after trying all the domains.
+    if errors:
+        cif.log.error("recovery: %d domains failed with unexpected errors",
+                      len(errors))
+        raise errors[0]
+
+    cif.log.info("recovery: recovered %d domains: %s", num_doms, clock)
+
 
 def lookup_external_vms(cif):
     conn = libvirtconnection.get()
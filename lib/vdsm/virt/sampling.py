@@ -50,7 +50,8 @@ from vdsm.virt.utils import ExpiringCache
 _THP_STATE_PATH = '/sys/kernel/mm/transparent_hugepage/enabled'
 if not os.path.exists(_THP_STATE_PATH):
     _THP_STATE_PATH = '/sys/kernel/mm/redhat_transparent_hugepage/enabled'
-_METRICS_ENABLED = config.getboolean('metrics', 'enabled')
+_METRICS_ENABLED = (config.getboolean('metrics', 'enabled') or
+                    config.getboolean('metrics', 'prometheus_enabled'))
 _NOWAIT_ENABLED = config.getboolean('vars', 'nowait_domain_stats')
 
 
@@ -81,11 +81,13 @@ class Defined(Disconnected):
 
 class Notifying(object):
     # virDomain wrapper that notifies vm when a method raises an exception with
-    # get_error_code() = VIR_ERR_OPERATION_TIMEOUT
+    # get_error_code() = VIR_ERR_OPERATION_TIMEOUT, and optionally calls
+    # oncall(name) after method name was called successfully.
 
-    def __init__(self, dom, tocb):
+    def __init__(self, dom, tocb, oncall=None):
         self._dom = dom
         self._cb = tocb
+        self._oncall = oncall
 
     @property
     def connected(self):
@@ -100,6 +102,8 @@ class Notifying(object):
             try:
                 ret = attr(*args, **kwargs)
                 self._cb(False)
+                if self._oncall is not None:
+                    self._oncall(name)
                 return ret
             except libvirt.libvirtError as e:
                 if e.get_error_code() == libvirt.VIR_ERR_OPERATION_TIMEOUT:
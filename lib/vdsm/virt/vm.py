@@ -101,6 +101,7 @@ from vdsm.virt import vmtune
 from vdsm.virt import vmxml
 from vdsm.virt import xmlconstants
 from vdsm.virt.domain_descriptor import DomainDescriptor
+from vdsm.virt.domain_descriptor import DomainXMLCache
 from vdsm.virt.domain_descriptor import MutableDomainDescriptor
 from vdsm.virt.domain_descriptor import XmlSource
 from vdsm.virt.jobs import snapshot
@@ -243,6 +244,10 @@ class DestroyedOnResumeError(DestroyedOnStartupError):
 _MIGRATION_ORIGIN = '_MIGRATION_ORIGIN'
 _FILE_ORIGIN = '_FILE_ORIGIN'
 
+_watermark_collector = drivemonitor.WatermarkCollector(
+    sampling.stats_cache,
+    config.getint('vars', 'vm_watermark_max_sample_age'))
+
 
 class _AlteredState(object):
 
@@ -376,6 +381,7 @@ class Vm(object):
             self.conf['xml'] = self._src_domain_xml
         self.log = SimpleLogAdapter(self.log, {"vmId": self.id})
         self._dom = virdomain.Disconnected(self.id)
+        self._xml_cache = DomainXMLCache()
         self.cif = cif
         self._custom = {'vmId': self.id}
         self._exit_info = {}
@@ -386,6 +392,10 @@ class Vm(object):
         self._balloon_target = None
         self._drive_merger = DriveMerger(self)
         self._md_desc = metadata.Descriptor.from_xml(self.conf['xml'])
+        self._md_syncer = metadata.Syncer(
+            self._write_metadata,
+            config.getfloat('vars', 'vm_metadata_sync_delay'),
+            name="vm/md/" + self.id[:8])
         self._init_from_metadata()
         self._destroy_requested = threading.Event()
         self._monitorResponse = 0
@@ -876,7 +886,7 @@ class Vm(object):
         return mem_size_mb
 
     def hibernate(self, dst):
-        hooks.before_vm_hibernate(self._dom.XMLDesc(), self._custom)
+        hooks.before_vm_hibernate(self._domain_xml(), self._custom)
         fname = self.cif.prepareVolumePath(dst)
         try:
             self._dom.save(fname)
@@ -887,7 +897,7 @@ class Vm(object):
         for dev in self._customDevices():
             hooks.before_device_migrate_source(
                 dev._deviceXML, self._custom, dev.custom)
-        hooks.before_vm_migrate_source(self._dom.XMLDesc(), self._custom)
+        hooks.before_vm_migrate_source(self._domain_xml(), self._custom)
 
     def _startUnderlyingVm(self):
         self.log.debug("Start")
@@ -1235,12 +1245,16 @@ class Vm(object):
                 if (drive.chunked or drive.replicaChunked) and not
                 drive.readonly]
 
-    def getExtendInfo(self, drive):
+    def getExtendInfo(self, drive, blockinfo=None):
         """
         Return extension info for a chunked drive or drive replicating to
         chunked replica volume.
+
+        If blockinfo is specified, it is used instead of querying libvirt.
         """
-        capacity, alloc, physical = self._dom.blockInfo(drive.path)
+        if blockinfo is None:
+            blockinfo = self._dom.blockInfo(drive.path)
+        capacity, alloc, physical = blockinfo
 
         # Libvirt reports watermarks only for the source drive, but for
         # file-based drives it reports the same alloc and physical, which
@@ -1269,17 +1283,27 @@ class Vm(object):
         Return True if at least one drive is being extended, False otherwise.
         """
         extended = False
+        watermarks = _watermark_collector.watermarks(
+            self.id, self.drive_monitor.events_enabled())
+        bulk = 0
 
         try:
             for drive in self.drive_monitor.monitored_drives():
-                if self.extend_drive_if_needed(drive):
+                blockinfo = _watermark_collector.get(watermarks, drive)
+                if blockinfo is not None:
+                    bulk += 1
+                if self.extend_drive_if_needed(drive, blockinfo=blockinfo):
                     extended = True
         except drivemonitor.ImprobableResizeRequestError:
             return False
 
+        if bulk:
+            self.log.debug("Avoided %d blockInfo calls using bulk stats "
+                           "(total: %s)", bulk, _watermark_collector.stats())
+
         return extended
 
-    def extend_drive_if_needed(self, drive):
+    def extend_drive_if_needed(self, drive, blockinfo=None):
         """
         Check if a drive should be extended, and start extension flow if
         needed.
@@ -1296,6 +1320,8 @@ class Vm(object):
         - SET: this method should never receive a drive in this state,
                emit warning and exit.
 
+        If blockinfo is specified, it is used instead of querying libvirt.
+
         Return True if started an extension flow, False otherwise.
         """
 
@@ -1306,7 +1332,8 @@ class Vm(object):
             return
 
         try:
-            capacity, alloc, physical = self.getExtendInfo(drive)
+            capacity, alloc, physical = self.getExtendInfo(
+                drive, blockinfo=blockinfo)
         except libvirt.libvirtError as e:
             self.log.error("Unable to get watermarks for drive %s: %s",
                            drive.name, e)
@@ -1315,6 +1342,8 @@ class Vm(object):
         if drive.threshold_state == BLOCK_THRESHOLD.UNSET:
             self.drive_monitor.set_threshold(drive, physical)
 
+        priority = self.drive_monitor.extend_priority(drive, alloc, physical)
+
         if not self.drive_monitor.should_extend_volume(
                 drive, drive.volumeID, capacity, alloc, physical):
             return False
@@ -1330,15 +1359,16 @@ class Vm(object):
         self.log.info(
             "Requesting extension for volume %s on domain %s (apparent: "
             "%s, capacity: %s, allocated: %s, physical: %s "
-            "threshold_state: %s)",
+            "threshold_state: %s, priority: %.2f)",
             drive.volumeID, drive.domainID, drive.apparentsize, capacity,
-            alloc, physical, drive.threshold_state)
+            alloc, physical, drive.threshold_state, priority)
 
-        self.extendDriveVolume(drive, drive.volumeID, physical, capacity)
+        self.extendDriveVolume(
+            drive, drive.volumeID, physical, capacity, priority=priority)
         return True
 
     def extendDriveVolume(self, vmDrive, volumeID, curSize, capacity,
-                          callback=None):
+                          callback=None, priority=None):
         """
         Extend drive volume and its replica volume during replication.
 
@@ -1350,6 +1380,9 @@ class Vm(object):
 
             def callback(error=None):
 
+        If priority is specified, the extension request is sent before
+        requests with higher priority value. Requests without priority are
+        sent first.
         """
         newSize = vmDrive.getNextVolumeSize(curSize, capacity)
 
@@ -1362,12 +1395,17 @@ class Vm(object):
         clock = vdsm.common.time.Clock()
         clock.start("total")
 
+        # Used to measure the time until the VM is resumed.
+        requested = vdsm.common.time.monotonic_time()
+
         if vmDrive.replicaChunked:
             self.__extendDriveReplica(
-                vmDrive, newSize, clock, callback=callback)
+                vmDrive, newSize, clock, requested, callback=callback,
+                priority=priority)
         else:
             self.__extendDriveVolume(
-                vmDrive, volumeID, newSize, clock, callback=callback)
+                vmDrive, volumeID, newSize, clock, requested,
+                callback=callback, priority=priority)
 
     def refresh_drive_volume(self, volInfo):
         self.log.debug("Refreshing drive volume for %s (domainID: %s, "
@@ -1413,10 +1451,11 @@ class Vm(object):
                        vmDrive.name, vmDrive.domainID, vmDrive.volumeID)
         self.__extendDriveVolume(
             vmDrive, vmDrive.volumeID, volInfo['newSize'], clock,
-            callback=volInfo["callback"])
+            volInfo["requested"], callback=volInfo["callback"],
+            priority=volInfo.get("priority"))
 
     def __extendDriveVolume(self, vmDrive, volumeID, newSize, clock,
-                            callback=None):
+                            requested, callback=None, priority=None):
         clock.start("extend-volume")
         volInfo = {
             'domainID': vmDrive.domainID,
@@ -1427,8 +1466,11 @@ class Vm(object):
             'poolID': vmDrive.poolID,
             'volumeID': volumeID,
             'clock': clock,
+            'requested': requested,
             'callback': callback,
         }
+        if priority is not None:
+            volInfo['priority'] = priority
         self.log.debug("Requesting an extension for the volume: %s", volInfo)
         self.cif.irs.sendExtendMsg(
             vmDrive.poolID,
@@ -1436,7 +1478,8 @@ class Vm(object):
             newSize,
             self.after_volume_extension)
 
-    def __extendDriveReplica(self, drive, newSize, clock, callback=None):
+    def __extendDriveReplica(self, drive, newSize, clock, requested,
+                             callback=None, priority=None):
         clock.start("extend-replica")
         volInfo = {
             'domainID': drive.diskReplicate['domainID'],
@@ -1446,8 +1489,11 @@ class Vm(object):
             'poolID': drive.diskReplicate['poolID'],
             'volumeID': drive.diskReplicate['volumeID'],
             'clock': clock,
+            'requested': requested,
             'callback': callback,
         }
+        if priority is not None:
+            volInfo['priority'] = priority
         self.log.debug("Requesting an extension for the volume "
                        "replication: %s", volInfo)
         self.cif.irs.sendExtendMsg(drive.poolID,
@@ -1480,7 +1526,9 @@ class Vm(object):
                     self.getDiskDevices()[:], volInfo['name'])
                 self._update_drive_volume_size(drive, volSize)
 
-            self._resume_if_needed()
+            if self._resume_if_needed():
+                drivemonitor.resumed_after_extension(
+                    vdsm.common.time.monotonic_time() - volInfo["requested"])
 
             if callback:
                 callback()
@@ -1504,8 +1552,11 @@ class Vm(object):
         self.drive_monitor.set_threshold(drive, volsize.apparentsize)
 
     def _resume_if_needed(self):
+        """
+        Return True if the VM was paused and resumed.
+        """
         try:
-            self.cont()
+            res = self.cont()
         except libvirt.libvirtError as e:
             current_status = self.lastStatus
             if (current_status == vmstatus.UP and
@@ -1518,6 +1569,9 @@ class Vm(object):
                 self.log.exception("Cannot resume VM")
         except DestroyedOnResumeError:
             self.log.debug("Cannot resume VM: paused for too long, destroyed")
+        else:
+            return not response.is_error(res)
+        return False
 
     def maybe_resume(self):
         """
@@ -2065,7 +2119,7 @@ class Vm(object):
 
     def migration_parameters(self):
         return {
-            '_srcDomXML': self._dom.XMLDesc(),
+            '_srcDomXML': self._domain_xml(),
             'vmId': self.id,
             'xml': self._domain.xml,
             'elapsedTimeOffset': (
@@ -2081,6 +2135,7 @@ class Vm(object):
         modified by libvirt and will not be rejected by the migration
         end.
         """
+        self.flush_metadata()
         return self._dom.XMLDesc(flags=libvirt.VIR_DOMAIN_XML_MIGRATABLE)
 
     def _get_vm_migration_progress(self):
@@ -2537,7 +2592,7 @@ class Vm(object):
                 "hotplugged device %s", dev_obj)
         else:
             self._set_device_metadata(attrs, data)
-            self.sync_metadata()
+            self.sync_metadata(durable=True)
 
     def _hotunplug_device_metadata(self, dev_class, dev_obj):
         attrs, _ = get_metadata(dev_class, dev_obj)
@@ -2547,7 +2602,7 @@ class Vm(object):
                 "hotunplugged device %s", dev_obj)
         else:
             self._clear_device_metadata(attrs)
-            self.sync_metadata()
+            self.sync_metadata(durable=True)
 
     def _set_device_metadata(self, attrs, dev_conf):
         """
@@ -2744,7 +2799,8 @@ class Vm(object):
             if state in vmstatus.LIBVIRT_DOWN_STATES:
                 self._dom = virdomain.Defined(self.id, dom)
                 return
-            self._dom = virdomain.Notifying(dom, self._timeoutExperienced)
+            self._dom = virdomain.Notifying(
+                dom, self._timeoutExperienced, self._xml_cache.on_call)
         elif self._altered_state.origin == _MIGRATION_ORIGIN:
             self._incoming_migration_prepared.set()
             # self._dom will be disconnected until migration ends.
@@ -2791,7 +2847,8 @@ class Vm(object):
 
             self._dom = virdomain.Notifying(
                 self._connection.lookupByUUIDString(self.id),
-                self._timeoutExperienced)
+                self._timeoutExperienced,
+                self._xml_cache.on_call)
         else:
 
             flags = libvirt.VIR_DOMAIN_NONE
@@ -2821,9 +2878,11 @@ class Vm(object):
                 dom = self._connection.defineXML(self._domain.xml)
                 self._dom = virdomain.Defined(self.id, dom)
                 self._update_metadata()
+                self.flush_metadata()
                 dom.createWithFlags(flags)
-                self._dom = virdomain.Notifying(dom, self._timeoutExperienced)
-                hooks.after_vm_start(self._dom.XMLDesc(), self._custom)
+                self._dom = virdomain.Notifying(
+                    dom, self._timeoutExperienced, self._xml_cache.on_call)
+                hooks.after_vm_start(self._domain_xml(), self._custom)
                 for dev in self._customDevices():
                     hooks.after_device_create(dev._deviceXML, self._custom,
                                               dev.custom)
@@ -3837,7 +3896,7 @@ class Vm(object):
         # libvirt doesn't generate a device removal event on lease hot
         # unplug, so we must update domain descriptor here.
         # See https://bugzilla.redhat.com/1639228.
-        self._updateDomainDescriptor()
+        self.update_domain_descriptor()
 
         return response.success(vmList={})
 
@@ -3917,7 +3976,7 @@ class Vm(object):
             self.cont(guestTimeSync=True)
             fromSnapshot = self._altered_state.from_snapshot
             self._altered_state = _AlteredState()
-            hooks.after_vm_dehibernate(self._dom.XMLDesc(), self._custom,
+            hooks.after_vm_dehibernate(self._domain_xml(), self._custom,
                                        {'FROM_SNAPSHOT': fromSnapshot})
         elif self._altered_state.origin == _MIGRATION_ORIGIN:
             finished, timeout = self._waitForUnderlyingMigration()
@@ -3933,7 +3992,7 @@ class Vm(object):
             self._domDependentInit()
             self._altered_state = _AlteredState()
             hooks.after_vm_migrate_destination(
-                self._dom.XMLDesc(), self._custom)
+                self._domain_xml(), self._custom)
 
             for dev in self._customDevices():
                 hooks.after_device_migrate_destination(
@@ -3968,8 +4027,9 @@ class Vm(object):
             # or restart vdsm if connection to libvirt was lost
             self._dom = virdomain.Notifying(
                 self._connection.lookupByUUIDString(self.id),
-                self._timeoutExperienced)
-            self.sync_metadata()
+                self._timeoutExperienced,
+                self._xml_cache.on_call)
+            self.sync_metadata(durable=True)
 
             if not migrationFinished:
                 state = self._dom.state(0)
@@ -4004,16 +4064,16 @@ class Vm(object):
             # the transient domain.
             self.log.debug("Switching transient VM to persistent")
             try:
-                self._connection.defineXML(self._dom.XMLDesc())
+                self._connection.defineXML(self._domain_xml())
             except libvirt.libvirtError as e:
                 self.log.info("Failed to make VM persistent: %s'", e)
 
     def _underlyingCont(self):
-        hooks.before_vm_cont(self._dom.XMLDesc(), self._custom)
+        hooks.before_vm_cont(self._domain_xml(), self._custom)
         self._dom.resume()
 
     def _underlyingPause(self):
-        hooks.before_vm_pause(self._dom.XMLDesc(), self._custom)
+        hooks.before_vm_pause(self._domain_xml(), self._custom)
         self._dom.suspend()
 
     def findDriveByUUIDs(self, drive):
@@ -4087,7 +4147,7 @@ class Vm(object):
                         # don't belong to metadata.
                         if k in dev:
                             dev[k] = v
-                self.sync_metadata()
+                self.sync_metadata(durable=True)
                 break
         else:
             self.log.error("Unable to update the drive object for: %s",
@@ -4447,7 +4507,7 @@ class Vm(object):
             ) as dev:
                 del dev['diskReplicate']
 
-        self.sync_metadata()
+        self.sync_metadata(durable=True)
 
     def _persist_drive_replica(self, drive, replica):
         with self._confLock:
@@ -4456,7 +4516,7 @@ class Vm(object):
             ) as dev:
                 dev['diskReplicate'] = replica
 
-        self.sync_metadata()
+        self.sync_metadata(durable=True)
 
     def _diskSizeExtendCow(self, drive, newSizeBytes):
         try:
@@ -4657,7 +4717,7 @@ class Vm(object):
 
         with self._md_desc.device(devtype="cdrom", name=block_dev) as dev:
             dev["change"] = change_dict
-        self.sync_metadata()
+        self.sync_metadata(durable=True)
 
     def _apply_cd_change(self, block_dev):
         """
@@ -4690,7 +4750,7 @@ class Vm(object):
                 self.log.warning(
                     "Invalid CD change=%s state=%s.", change, state)
 
-        self.sync_metadata()
+        self.sync_metadata(durable=True)
 
     def _discard_cd_change(self, block_dev):
         """
@@ -4698,7 +4758,7 @@ class Vm(object):
         """
         with self._md_desc.device(devtype="cdrom", name=block_dev) as dev:
             dev.pop("change", None)
-        self.sync_metadata()
+        self.sync_metadata(durable=True)
 
     def _create_disk_xml(self, vm_dev, path, device, iface, type):
         disk_elem = vmxml.Element('disk', type=type, device=vm_dev)
@@ -4954,15 +5014,40 @@ class Vm(object):
         return self._domain.name
 
     def update_domain_descriptor(self):
+        self.invalidate_domain_xml()
         self._updateDomainDescriptor()
 
     def _updateDomainDescriptor(self, xml=None):
-        domxml = self._dom.XMLDesc() if xml is None else xml
-        self._domain = DomainDescriptor(
-            domxml,
-            xml_source=(
-                XmlSource.INITIAL if xml is not None else
-                XmlSource.LIBVIRT))
+        if xml is None:
+            self.flush_metadata()
+            self._domain = self._xml_cache.get(self._dom)
+        else:
+            self._domain = self._xml_cache.parse(
+                xml, xml_source=XmlSource.INITIAL)
+
+    def _domain_xml(self):
+        """
+        Return the current libvirt domain XML, including pending metadata
+        changes. The XML is always fetched from libvirt, since it is passed
+        outside of vdsm, and the cached descriptor does not track changes
+        made by the guest, see DomainXMLCache.
+        """
+        self.flush_metadata()
+        return self._dom.XMLDesc()
+
+    def invalidate_domain_xml(self):
+        """
+        Called when the libvirt domain XML may have changed without calling
+        libvirt domain methods, for example on libvirt events.
+        """
+        self._xml_cache.invalidate()
+
+    def domain_xml_stats(self):
+        stats = self._xml_cache.stats()
+        md_stats = self._md_syncer.stats()
+        stats["metadata_requested"] = md_stats["requested"]
+        stats["metadata_written"] = md_stats["written"]
+        return stats
 
     def _updateMetadataDescriptor(self):
         # load will overwrite any existing content, as per doc.
@@ -5009,10 +5094,32 @@ class Vm(object):
         # in the XML metadata.
         self._md_desc.add_custom(self._custom['custom'])
 
-    def sync_metadata(self):
+    def sync_metadata(self, durable=False):
+        """
+        Request writing the metadata to the libvirt domain. The metadata is
+        written after a short delay, coalescing requests made in quick
+        succession. Use flush_metadata() to wait until the metadata is
+        written.
+
+        If durable is True, write the metadata before returning, and raise
+        if writing failed. Flows persisting state needed by recovery before
+        modifying the domain must use durable=True.
+        """
         if self._external:
             return
-        self._md_desc.dump(self._dom)
+        if durable:
+            self._md_syncer.write()
+        else:
+            self._md_syncer.request()
+
+    def flush_metadata(self):
+        """
+        Write pending metadata to the libvirt domain now.
+        """
+        self._md_syncer.flush()
+
+    def _write_metadata(self):
+        return self._md_desc.dump(self._dom)
 
     def releaseVm(self, gracefulAttempts=1):
         """
@@ -5049,6 +5156,10 @@ class Vm(object):
             self._incoming_migration_vm_running.set()
             self.guestAgent.stop()
             if self._dom.connected:
+                try:
+                    self.flush_metadata()
+                except Exception as e:
+                    self.log.warning("Cannot write metadata: %s", e)
                 result = self._destroyVm(gracefulAttempts)
                 if response.is_error(result):
                     return result
@@ -5388,7 +5499,7 @@ class Vm(object):
             # In this case self._dom is disconnected because the function
             # _completeIncomingMigration didn't update it yet.
             try:
-                domxml = self._dom.XMLDesc()
+                domxml = self._domain_xml()
             except virdomain.NotConnectedError:
                 pass
             else:
@@ -5412,7 +5523,7 @@ class Vm(object):
             # The event handler delivers the domain instance in the
             # callback however we do not use it.
             try:
-                domxml = self._dom.XMLDesc()
+                domxml = self._domain_xml()
             except virdomain.NotConnectedError:
                 pass
             else:
@@ -5606,19 +5717,21 @@ class Vm(object):
         """
         Implement virConnectDomainEventBlockJobCallback.
 
-        Currently we only log the event; we may want to use this to optimize
-        waiting for completion.
+        Live merge jobs are advanced by these events; the periodic block job
+        monitor is only a fallback for missed events.
 
         For more info see:
         https://libvirt.org/html/libvirt-libvirt-domain.html#virConnectDomainEventBlockJobCallback
         """  # NOQA: E501 (long line)
 
-        job_id = "(untracked)"
+        tracked_id = None
 
         # Only COMMIT and ACTIVE_COMMIT jobs are tracked.
         if job_type in (libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_COMMIT,
                         libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_ACTIVE_COMMIT):
-            job_id = self._drive_merger.find_job_id(drive) or job_id
+            tracked_id = self._drive_merger.find_job_id(drive)
+
+        job_id = tracked_id or "(untracked)"
 
         type_name = blockjob.type_name(job_type)
 
@@ -5639,13 +5752,18 @@ class Vm(object):
                 "Block job %s type %s for drive %s: unexpected status %s",
                 job_id, type_name, drive, job_status)
 
+        if tracked_id:
+            self._drive_merger.on_block_job_event(drive, job_status)
+
     def merge(self, driveSpec, baseVolUUID, topVolUUID, bandwidth, jobUUID):
         return self._drive_merger.merge(
             driveSpec, baseVolUUID, topVolUUID, bandwidth, jobUUID)
 
     def drive_get_actual_volume_chain(self, drives):
         ret = {}
-        self._updateDomainDescriptor()
+        # Callers poll the chain waiting for libvirt to update the XML,
+        # sometimes without an event invalidating the cached XML.
+        self.update_domain_descriptor()
         for drive in drives:
             alias = drive['alias']
             diskXML = vmdevices.lookup.xml_device_by_alias(
@@ -21,7 +21,7 @@ from six.moves import queue
 from vdsm.common import exception as vdsmexception
 
 from vdsm.common.compat import json
-from vdsm.common.logutils import Suppressed, traceback
+from vdsm.common.logutils import Suppressed, Truncated, traceback
 from vdsm.common.threadlocal import vars
 from vdsm.common.time import monotonic_time, event_time
 from vdsm.common.password import protect_passwords, unprotect_passwords
@@ -275,9 +275,11 @@ class JsonRpcServer(object):
     """
     Creates new JsonrRpcServer by providing a bridge, timeout in seconds
     which defining how often we should log connections stats and thread
-    factory.
+    factory. If log_max_size is positive, requests parameters and results
+    are truncated to log_max_size characters in the log.
     """
-    def __init__(self, bridge, timeout, cif, threadFactory=None):
+    def __init__(self, bridge, timeout, cif, threadFactory=None,
+                 log_max_size=0):
         self._bridge = bridge
         self._cif = cif
         self._workQueue = queue.Queue()
@@ -285,6 +287,7 @@ class JsonRpcServer(object):
         self._timeout = timeout
         self._next_report = monotonic_time() + self._timeout
         self._counter = 0
+        self._log_max_size = log_max_size
 
     def queueRequest(self, req):
         self._workQueue.put_nowait(req)
@@ -325,12 +328,12 @@ class JsonRpcServer(object):
         # running VMs is recovered, see https://bugzilla.redhat.com/1339291
         if not self._cif.ready:
             self.log.info("In recovery, ignoring '%s' in bridge with %s",
-                          req.method, req.params)
+                          req.method, self._loggable(req.params))
             return JsonRpcResponse(
                 None, vdsmexception.RecoveryInProgress(), req.id)
 
         self.log.log(logLevel, "Calling '%s' in bridge with %s",
-                     req.method, req.params)
+                     req.method, self._loggable(req.params))
         try:
             method = self._bridge.dispatch(req.method)
         except exception.JsonRpcMethodNotFoundError as e:
@@ -357,13 +360,20 @@ class JsonRpcServer(object):
         else:
             res = True if res is None else res
             self.log.log(logLevel, "Return '%s' in bridge with %s",
-                         req.method, res)
+                         req.method, self._loggable(res))
             if isinstance(res, Suppressed):
                 res = res.value
             return JsonRpcResponse(res, None, req.id)
         finally:
             vars.context = None
 
+    def _loggable(self, value):
+        # Formatting is deferred to the logging thread, and done only if the
+        # record was not filtered out.
+        if self._log_max_size > 0:
+            return Truncated(value, max_size=self._log_max_size)
+        return value
+
     @traceback(log=log)
     def serve_requests(self):
         while True:
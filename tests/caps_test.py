@@ -26,8 +26,11 @@ from __future__ import division
 import os
 import platform
 import tempfile
+import threading
+import time
 from testlib import VdsmTestCase as TestCaseBase
-from monkeypatch import MonkeyPatch
+from testlib import namedTemporaryDir
+from monkeypatch import MonkeyPatch, MonkeyPatchScope
 
 from vdsm.host import caps
 from vdsm import cpuinfo
@@ -348,3 +351,90 @@ class TestCaps(TestCaseBase):
         expected = ['flag_1', 'flag_2', 'flag_3']
         self.assertEqual(3, len(flags))
         self.assertTrue(all([x in flags for x in expected]))
+
+
+class FakeProvider(object):
+
+    def __init__(self, name, caps, barrier=None):
+        self.__name__ = name
+        self.caps = caps
+        self.barrier = barrier
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.barrier:
+            # Fails unless all providers run concurrently.
+            self.barrier.wait(5)
+        if isinstance(self.caps, Exception):
+            raise self.caps
+        return self.caps
+
+
+class TestProviders(TestCaseBase):
+
+    def test_concurrent(self):
+        barrier = threading.Barrier(3)
+        providers = (
+            FakeProvider('_a', {'a': 1}, barrier),
+            FakeProvider('_b', {'b': 2}, barrier),
+            FakeProvider('_c', {'c': 3}, barrier),
+        )
+        with MonkeyPatchScope([(caps, '_PROVIDERS', providers)]):
+            self.assertEqual(caps.get(), {'a': 1, 'b': 2, 'c': 3})
+
+    def test_provider_error(self):
+        providers = (
+            FakeProvider('_a', {'a': 1}),
+            FakeProvider('_b', RuntimeError("no caps for you")),
+        )
+        with MonkeyPatchScope([(caps, '_PROVIDERS', providers)]):
+            with self.assertRaises(RuntimeError):
+                caps.get()
+
+    def test_static_cached(self):
+        func = FakeProvider('_static', {'a': 1})
+        provider = caps._StaticProvider(func, lambda: 'key')
+        self.assertEqual(provider(), {'a': 1})
+        self.assertEqual(provider(), {'a': 1})
+        self.assertEqual(func.calls, 1)
+
+    def test_static_key_changed(self):
+        key = ['0-3']
+        memoized = cache.memoized(lambda: time.monotonic())
+        func = FakeProvider('_static', {'a': 1})
+        provider = caps._StaticProvider(
+            func, lambda: key[0], memoized=(memoized,))
+        memoized_value = memoized()
+        provider()
+        key[0] = '0-7'
+        provider()
+        self.assertEqual(func.calls, 2)
+        self.assertNotEqual(memoized(), memoized_value)
+
+    def test_static_invalidate(self):
+        func = FakeProvider('_static', {'a': 1})
+        provider = caps._StaticProvider(func, lambda: 'key')
+        with MonkeyPatchScope([(caps, '_PROVIDERS', (provider,))]):
+            caps.get()
+            caps.invalidate()
+            caps.get()
+        self.assertEqual(func.calls, 2)
+
+    def test_packages_key(self):
+        with namedTemporaryDir() as tmpdir:
+            db = os.path.join(tmpdir, 'rpm')
+            os.mkdir(db)
+            packages = os.path.join(db, 'rpmdb.sqlite')
+            with open(packages, 'w'):
+                pass
+            os.utime(packages, (1000, 1000))
+            os.utime(db, (1000, 1000))
+            missing = os.path.join(tmpdir, 'missing')
+            with MonkeyPatchScope([
+                (caps, '_PACKAGE_DBS', (db, missing)),
+            ]):
+                key = caps._packages_key()
+                self.assertEqual(key, (1000, None))
+                os.utime(packages, (2000, 2000))
+                self.assertNotEqual(caps._packages_key(), key)
@@ -463,3 +463,41 @@ class TestExternalVMTracking(TestCaseBase):
             recovery.lookup_external_vms(self.cif)
         self.assertEqual(sorted(self.cif.pop_unknown_vm_ids()), [])
         self.assertEqual(sorted(self.cif.vmContainer.keys()), ['2'])
+
+
+class RecoveredVm(object):
+
+    def __init__(self, vm_id, error=None):
+        self.id = vm_id
+        self.error = error
+        self.prepared = False
+
+    def preparePaths(self):
+        if self.error:
+            raise self.error
+        self.prepared = True
+
+
+class TestPreparePathsForRecoveredVMs(TestCaseBase):
+
+    def setUp(self):
+        self.cif = FakeClientIF()
+        self.cif._enabled = True
+        self.vms = [RecoveredVm('vm-%02d' % i) for i in range(20)]
+
+    def add_vms(self):
+        for vm in self.vms:
+            self.cif.vmContainer[vm.id] = vm
+
+    def test_all_vms(self):
+        self.add_vms()
+        self.cif._preparePathsForRecoveredVMs()
+        self.assertTrue(all(vm.prepared for vm in self.vms))
+
+    def test_failing_vm(self):
+        # A VM failing to prepare its paths does not fail the recovery.
+        self.vms[0].error = VolumeError("failed")
+        self.add_vms()
+        self.cif._preparePathsForRecoveredVMs()
+        self.assertFalse(self.vms[0].prepared)
+        self.assertTrue(all(vm.prepared for vm in self.vms[1:]))
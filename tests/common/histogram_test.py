@@ -0,0 +1,57 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+import pytest
+from vdsm.common import histogram
+
+
+def test_empty():
+    h = histogram.Histogram(buckets=(1, 2))
+    assert h.info() == {
+        "count": 0,
+        "sum": 0.0,
+        "max": 0.0,
+        "buckets": {"1": 0, "2": 0, "+Inf": 0},
+    }
+
+
+def test_observe():
+    h = histogram.Histogram(buckets=(1, 2))
+    for value in (0.5, 1, 1.5, 3):
+        h.observe(value)
+    assert h.info() == {
+        "count": 4,
+        "sum": 6.0,
+        "max": 3,
+        "buckets": {"1": 2, "2": 3, "+Inf": 4},
+    }
+
+
+def test_clear():
+    h = histogram.Histogram(buckets=(1, 2))
+    h.observe(1)
+    h.clear()
+    assert h.info()["count"] == 0
+
+
+@pytest.mark.parametrize("buckets", [(2, 1), (1, 1)])
+def test_invalid_buckets(buckets):
+    with pytest.raises(ValueError):
+        histogram.Histogram(buckets=buckets)
@@ -0,0 +1,99 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import errno
+
+import pytest
+
+from vdsm.common import inotify
+
+
+@pytest.fixture
+def watcher():
+    with inotify.Inotify() as watcher:
+        yield watcher
+
+
+def test_no_events(tmpdir, watcher):
+    watcher.add_watch(str(tmpdir), inotify.IN_CREATE)
+    assert watcher.read_events() == []
+
+
+def test_create(tmpdir, watcher):
+    wd = watcher.add_watch(str(tmpdir), inotify.IN_CREATE | inotify.IN_DELETE)
+    tmpdir.join("a").write("")
+    tmpdir.join("b").write("")
+    tmpdir.join("a").remove()
+
+    events = watcher.read_events()
+
+    assert [(e.wd, e.mask, e.name) for e in events] == [
+        (wd, inotify.IN_CREATE, "a"),
+        (wd, inotify.IN_CREATE, "b"),
+        (wd, inotify.IN_DELETE, "a"),
+    ]
+    assert watcher.read_events() == []
+
+
+def test_attrib(tmpdir, watcher):
+    tmpdir.join("a").write("")
+    wd = watcher.add_watch(str(tmpdir), inotify.IN_ATTRIB)
+    tmpdir.join("a").chmod(0o755)
+
+    events = watcher.read_events()
+
+    assert [(e.wd, e.mask, e.name) for e in events] == [
+        (wd, inotify.IN_ATTRIB, "a"),
+    ]
+
+
+def test_dir_removed(tmpdir, watcher):
+    path = tmpdir.mkdir("dir")
+    wd = watcher.add_watch(str(path), inotify.IN_DELETE_SELF)
+    path.remove()
+
+    masks = [e.mask for e in watcher.read_events() if e.wd == wd]
+
+    assert masks == [inotify.IN_DELETE_SELF, inotify.IN_IGNORED]
+
+
+def test_rm_watch(tmpdir, watcher):
+    wd = watcher.add_watch(str(tmpdir), inotify.IN_CREATE)
+    watcher.rm_watch(wd)
+    tmpdir.join("a").write("")
+
+    assert [e.mask for e in watcher.read_events()] == [inotify.IN_IGNORED]
+
+
+def test_watch_missing(tmpdir, watcher):
+    with pytest.raises(OSError) as e:
+        watcher.add_watch(str(tmpdir.join("missing")), inotify.IN_CREATE)
+    assert e.value.errno == errno.ENOENT
+
+
+def test_watch_only_dir(tmpdir, watcher):
+    tmpdir.join("a").write("")
+    with pytest.raises(OSError) as e:
+        watcher.add_watch(
+            str(tmpdir.join("a")), inotify.IN_CREATE | inotify.IN_ONLYDIR)
+    assert e.value.errno == errno.ENOTDIR
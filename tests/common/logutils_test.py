@@ -23,6 +23,7 @@ from __future__ import division
 
 from __future__ import print_function
 
+import collections
 import logging
 import threading
 import time
@@ -33,6 +34,7 @@ from contextlib import contextmanager
 from testlib import VdsmTestCase as TestCaseBase
 from testlib import expandPermutations, permutations
 from testlib import forked
+from testValidation import slowtest
 
 from vdsm.common import concurrent
 from vdsm.common import logutils
@@ -244,6 +246,20 @@ class TestThreadedHandler(TestCaseBase):
 
         self.assertEqual(target.messages[100:], [])
 
+    def test_stats(self):
+        target = Handler()
+        with threaded_handler(10, target) as (handler, logger):
+            for i in range(20):
+                logger.critical("Message %d", i)
+            self.assertEqual(handler.stats()["pending"], 10)
+            handler.start()
+
+        stats = handler.stats()
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["records"], 10)
+        self.assertEqual(stats["dropped"], 10)
+        self.assertGreater(stats["handle_time"], 0)
+
     @permutations([
         # adaptive, level
         (False, logging.DEBUG),
@@ -346,3 +362,216 @@ class TestHeadFormatter(TestCaseBase):
     ])
     def test_head(self, items, limit, result):
         self.assertEqual(str(logutils.Head(items, max_items=limit)), result)
+
+
+def vm_stats(count):
+    """
+    Return a result similar to Host.getAllVmStats or Host.getVMFullList on
+    a host running count vms.
+    """
+    return [
+        {
+            "vmId": "%08d-0000-0000-0000-000000000000" % i,
+            "vmName": "vm-%d" % i,
+            "status": "Up",
+            "elapsedTime": "123456",
+            "cpuUser": "1.25",
+            "cpuSys": "0.50",
+            "memUsage": "42",
+            "monitorResponse": "0",
+            "guestIPs": "10.0.0.%d" % (i % 256),
+            "network": {
+                "vnet%d" % n: {
+                    "name": "vnet%d" % n,
+                    "rxErrors": "0",
+                    "txErrors": "0",
+                    "rx": "123456789",
+                    "tx": "987654321",
+                    "sampleTime": 4321.5,
+                } for n in range(2)
+            },
+            "disks": {
+                name: {
+                    "readRate": "0.00",
+                    "writeRate": "1024.00",
+                    "readLatency": "0.000000",
+                    "writeLatency": "0.001234",
+                    "flushLatency": "0.000100",
+                    "apparentsize": "10737418240",
+                    "truesize": "2147483648",
+                    "imageID": "%08d-1111-1111-1111-111111111111" % i,
+                } for name in ("sda", "sdb", "hdc")
+            },
+        } for i in range(count)
+    ]
+
+
+@expandPermutations
+class TestTruncated(TestCaseBase):
+
+    @permutations([
+        # value
+        ({},),
+        ([],),
+        ((),),
+        ((1,),),
+        ((1, "two"),),
+        ({"a": [1, (2, 3)], "b": {"c": None}},),
+        ("it's \"quoted\"\n",),
+        (b"bytes",),
+        (logutils.Suppressed({"secret": "value"}),),
+        (vm_stats(2),),
+        (collections.OrderedDict([("a", 1), ("b", 2)]),),
+        (collections.namedtuple("Point", "x y")(1, 2),),
+    ])
+    def test_short(self, value):
+        self.assertEqual(
+            str(logutils.Truncated(value, max_size=4096)), repr(value))
+
+    @permutations([
+        # value, max_size, result
+        (list(range(100)), 10, "[0, 1, 2, ..."),
+        ({"key": "x" * 100}, 15, "{'key': 'xxxxxx..."),
+        ("x" * 10**6, 5, "'xxxx..."),
+        ((1, 2, 3), 9, "(1, 2, 3)"),
+        ((1, 2, 3), 8, "(1, 2, 3..."),
+    ])
+    def test_truncated(self, value, max_size, result):
+        self.assertEqual(
+            str(logutils.Truncated(value, max_size=max_size)), result)
+
+    def test_recursive(self):
+        value = []
+        value.append(value)
+        self.assertEqual(
+            str(logutils.Truncated(value, max_size=10)), "[[[[[[[[[[...")
+
+    def test_recursive_short(self):
+        value = []
+        value.append(value)
+        depth = logutils._BoundedRepr.MAX_DEPTH
+        self.assertEqual(
+            str(logutils.Truncated(value, max_size=4096)),
+            "[" * depth + repr(value) + "]" * depth)
+
+
+class TestSamplingFilter(TestCaseBase):
+
+    def setUp(self):
+        self.target = Handler()
+        self.logger = logging.Logger("test")
+        self.logger.addHandler(self.target)
+
+    def test_debug(self):
+        self.logger.addFilter(logutils.SamplingFilter(3))
+        for i in range(7):
+            self.logger.debug("Message %d", i)
+        self.assertEqual(
+            self.target.messages, ["Message 0", "Message 3", "Message 6"])
+
+    def test_info(self):
+        self.logger.addFilter(logutils.SamplingFilter(3))
+        for i in range(3):
+            self.logger.info("Message %d", i)
+        self.assertEqual(
+            self.target.messages, ["Message 0", "Message 1", "Message 2"])
+
+    def test_per_message(self):
+        self.logger.addFilter(logutils.SamplingFilter(2))
+        for i in range(2):
+            self.logger.debug("Calling %d", i)
+            self.logger.debug("Return %d", i)
+        self.assertEqual(self.target.messages, ["Calling 0", "Return 0"])
+
+    def test_too_many_messages(self):
+        f = logutils.SamplingFilter(2)
+        f.MAX_MESSAGES = 1
+        self.logger.addFilter(f)
+        for msg in ("a", "b", "c", "d"):
+            self.logger.debug(msg)
+        # "b", "c", and "d" share one counter.
+        self.assertEqual(self.target.messages, ["a", "b", "d"])
+
+    def test_unhashable_message(self):
+        f = logutils.SamplingFilter(2)
+        results = []
+        for i in range(3):
+            record = self.logger.makeRecord(
+                "test", logging.DEBUG, __file__, 0, ["message", i], (), None)
+            results.append(f.filter(record))
+        self.assertEqual(results, [True, False, True])
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            logutils.SamplingFilter(0)
+
+
+class TestSetSampleRate(TestCaseBase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("test.set_sample_rate")
+        self.addCleanup(logutils.set_sample_rate, 1, self.logger.name)
+
+    def test_set(self):
+        logutils.set_sample_rate(10, self.logger.name)
+        logutils.set_sample_rate(5, self.logger.name)
+        self.assertEqual(
+            [f.rate for f in self.logger.filters], [5])
+
+    def test_disable(self):
+        logutils.set_sample_rate(10, self.logger.name)
+        logutils.set_sample_rate(1, self.logger.name)
+        self.assertEqual(self.logger.filters, [])
+
+    def test_invalid(self):
+        logutils.set_sample_rate(10, self.logger.name)
+        with self.assertRaises(ValueError):
+            logutils.set_sample_rate(0, self.logger.name)
+        self.assertEqual(
+            [f.rate for f in self.logger.filters], [10])
+
+
+@expandPermutations
+class TestLoggingOverhead(TestCaseBase):
+
+    @slowtest
+    @permutations([
+        # max_size, sample_rate
+        (0, 1),
+        (4096, 1),
+        (4096, 10),
+    ])
+    def test_return_300_vms(self, max_size, sample_rate):
+        # Logging the result of Host.getVMFullList on a host with 300 vms at
+        # DEBUG level, similar to JsonRpcServer.
+        result = vm_stats(300)
+        formatter = logging.Formatter(
+            "%(asctime)s %(levelname)s (%(threadName)s) [%(name)s] "
+            "%(message)s (%(module)s:%(lineno)d)")
+        records = []
+        target = Handler()
+        target.handle = lambda record: records.append(
+            formatter.format(record))
+        logger = logging.Logger("jsonrpc.JsonRpcServer")
+        if sample_rate > 1:
+            logger.addFilter(logutils.SamplingFilter(sample_rate))
+
+        calls = 1000
+        with threaded_handler(calls, target, adaptive=False) as (
+                handler, logger_):
+            logger.addHandler(handler)
+            start = time.process_time()
+            for i in range(calls):
+                value = result
+                if max_size:
+                    value = logutils.Truncated(result, max_size=max_size)
+                logger.debug("Return '%s' in bridge with %s",
+                             "Host.getVMFullList", value)
+            handler.start()
+        elapsed = time.process_time() - start
+
+        written = sum(len(r) for r in records)
+        print("max_size=%d sample_rate=%d: %d records, %d bytes, "
+              "%.3f cpu msec per call"
+              % (max_size, sample_rate, len(records), written,
+                 elapsed / calls * 1000))
@@ -0,0 +1,306 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import os
+import threading
+
+from multiprocessing.managers import BaseManager
+from multiprocessing.managers import RemoteError
+
+import pytest
+
+from vdsm.common import concurrent
+from vdsm.common import supervdsm_transport
+from vdsm.common.time import monotonic_time
+
+
+class Unpicklable(Exception):
+
+    def __init__(self):
+        Exception.__init__(self, "unpicklable")
+        self.lock = threading.Lock()
+
+
+class FakeSuperVdsm(object):
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.waiting = threading.Event()
+
+    def echo(self, *args, **kwargs):
+        return args, kwargs
+
+    def fail(self, msg):
+        raise ValueError(msg)
+
+    def fail_unpicklable(self):
+        raise Unpicklable()
+
+    def return_unpicklable(self):
+        return threading.Lock()
+
+    def wait(self, timeout):
+        self.waiting.set()
+        return self.ready.wait(timeout)
+
+    def _private(self):
+        return "private"
+
+
+@pytest.fixture
+def address(tmpdir):
+    return str(tmpdir.join("svdsm-rpc.sock"))
+
+
+@pytest.fixture
+def instance():
+    return FakeSuperVdsm()
+
+
+@pytest.fixture
+def server(address, instance):
+    server = supervdsm_transport.Server(address, instance)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server, address):
+    client = supervdsm_transport.Client(address, pool_size=2)
+    yield client
+    client.close()
+
+
+def test_call(client):
+    assert client.call("echo", (1, "a"), {"b": [2]}) == ((1, "a"), {"b": [2]})
+
+
+def test_call_no_args(client):
+    assert client.call("echo") == ((), {})
+
+
+def test_call_error(client):
+    with pytest.raises(ValueError) as e:
+        client.call("fail", ("reason",))
+    assert str(e.value) == "reason"
+
+
+def test_call_unpicklable_error(client):
+    with pytest.raises(RemoteError):
+        client.call("fail_unpicklable")
+
+
+def test_call_unpicklable_value(client):
+    with pytest.raises(TypeError):
+        client.call("return_unpicklable")
+
+
+@pytest.mark.parametrize("name", ["_private", "missing"])
+def test_call_not_exposed(client, name):
+    with pytest.raises(AttributeError):
+        client.call(name)
+
+
+def test_connection_reused(client):
+    for i in range(3):
+        assert client.call("echo", (i,)) == ((i,), {})
+    assert len(client._idle) == 1
+
+
+def test_batch(client):
+    results = client.batch([
+        ("echo", (1,), {}),
+        ("fail", ("reason",), None),
+        ("echo", (), {"a": 2}),
+    ])
+
+    assert results[0] == concurrent.Result(True, ((1,), {}))
+    assert not results[1].succeeded
+    assert isinstance(results[1].value, ValueError)
+    assert results[2] == concurrent.Result(True, ((), {"a": 2}))
+
+
+def test_batch_unpicklable_value(client):
+    with pytest.raises(TypeError):
+        client.batch([("echo", (), {}), ("return_unpicklable", (), {})])
+
+
+def test_concurrent_calls(client, instance):
+    result = {}
+
+    def wait():
+        result["wait"] = client.call("wait", (2,))
+
+    t = concurrent.thread(wait)
+    t.start()
+    try:
+        assert instance.waiting.wait(2)
+        # Completes while the other call is blocked in supervdsm.
+        assert client.call("echo", (1,)) == ((1,), {})
+        assert "wait" not in result
+    finally:
+        instance.ready.set()
+        t.join()
+
+    assert result["wait"] is True
+    assert len(client._idle) == 2
+
+
+def test_pool_size(client, instance):
+    threads = [concurrent.thread(client.call, args=("wait", (2,)))
+               for i in range(4)]
+    for t in threads:
+        t.start()
+    instance.ready.set()
+    for t in threads:
+        t.join()
+
+    assert len(client._idle) <= 2
+
+
+def test_server_restarted(address, instance):
+    server = supervdsm_transport.Server(address, instance)
+    server.start()
+    client = supervdsm_transport.Client(address)
+    try:
+        client.call("echo")
+        server.stop()
+
+        # The pooled connection was closed by the old server.
+        server = supervdsm_transport.Server(address, instance)
+        server.start()
+        assert client.call("echo", (1,)) == ((1,), {})
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_server_stopped(address, instance):
+    server = supervdsm_transport.Server(address, instance)
+    server.start()
+    client = supervdsm_transport.Client(address)
+    try:
+        client.call("echo")
+    finally:
+        server.stop()
+
+    with pytest.raises(supervdsm_transport.ConnectError):
+        client.call("echo")
+
+
+def test_no_server(address):
+    client = supervdsm_transport.Client(address)
+    with pytest.raises(supervdsm_transport.ConnectError):
+        client.call("echo")
+
+
+def test_stop_removes_socket(address, instance):
+    server = supervdsm_transport.Server(address, instance)
+    server.start()
+    assert os.path.exists(address)
+    server.stop()
+    assert not os.path.exists(address)
+
+
+class _ServerManager(BaseManager):
+    pass
+
+
+class _ClientManager(BaseManager):
+    pass
+
+
+def _run_benchmark(call, threads, calls):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for i in range(calls):
+            start = monotonic_time()
+            call("echo", "/dev/mapper/%d" % i)
+            local.append(monotonic_time() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = monotonic_time()
+    workers = [concurrent.thread(worker) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = monotonic_time() - start
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return len(latencies) / elapsed, p99
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("threads", [1, 4])
+def test_benchmark(tmpdir, instance, threads):
+    calls = 2000 // threads
+
+    manager_address = str(tmpdir.join("svdsm.sock"))
+    manager = _ServerManager(address=manager_address, authkey=b'')
+    manager.register('instance', callable=lambda: instance)
+    manager_server = manager.get_server()
+    t = concurrent.thread(manager_server.serve_forever)
+    t.start()
+
+    manager = _ClientManager(address=manager_address, authkey=b'')
+    manager.register('instance')
+    manager.connect()
+    proxy = manager.instance()
+
+    def manager_call(name, *args):
+        return getattr(proxy, name)(*args)
+
+    manager_rate, manager_p99 = _run_benchmark(manager_call, threads, calls)
+
+    rpc_address = str(tmpdir.join("svdsm-rpc.sock"))
+    rpc_server = supervdsm_transport.Server(rpc_address, instance)
+    rpc_server.start()
+    client = supervdsm_transport.Client(rpc_address)
+    try:
+        def binary_call(name, *args):
+            return client.call(name, args)
+
+        binary_rate, binary_p99 = _run_benchmark(binary_call, threads, calls)
+
+        def batch_call(name, *args):
+            return client.batch([(name, args, None)] * 10)
+
+        batch_rate, batch_p99 = _run_benchmark(
+            batch_call, threads, calls // 10)
+    finally:
+        client.close()
+        rpc_server.stop()
+
+    print("%d threads: manager %d calls/s p99 %.6f, "
+          "binary %d calls/s p99 %.6f, "
+          "batch of 10 %d calls/s p99 %.6f"
+          % (threads, manager_rate, manager_p99, binary_rate, binary_p99,
+             batch_rate * 10, batch_p99))
+    assert batch_rate * 10 > manager_rate
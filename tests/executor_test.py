@@ -40,6 +40,8 @@ from testlib import VdsmTestCase as TestCaseBase
 
 class ExecutorTests(TestCaseBase):
 
+    work_stealing = False
+
     def setUp(self):
         self.scheduler = schedule.Scheduler()
         self.scheduler.start()
@@ -49,7 +51,8 @@ class ExecutorTests(TestCaseBase):
                                           workers_count=10,
                                           max_tasks=self.max_tasks,
                                           scheduler=self.scheduler,
-                                          max_workers=self.max_workers)
+                                          max_workers=self.max_workers,
+                                          work_stealing=self.work_stealing)
         self.executor.start()
         time.sleep(0.1)  # Give time to start all threads
 
@@ -265,6 +268,161 @@ class ExecutorTests(TestCaseBase):
             text.startswith('Worker blocked')
             for (level, text, _) in log.messages))
 
+    def test_stats(self):
+        tasks = [Task() for n in range(5)]
+        for task in tasks:
+            self.executor.dispatch(task)
+        for task in tasks:
+            self.assertTrue(task.executed.wait(1))
+
+        with self.assertRaises(exception.ResourceExhausted):
+            for n in range(31):
+                self.executor.dispatch(Task(wait=0.1))
+
+        stats = self.executor.stats()
+        self.assertEqual(stats["work_stealing"], self.work_stealing)
+        self.assertEqual(stats["workers_count"], 10)
+        self.assertEqual(stats["max_tasks"], self.max_tasks)
+        self.assertEqual(stats["rejected"], 1)
+        self.assertGreaterEqual(stats["dispatched"], 5 + self.max_tasks)
+        self.assertGreaterEqual(stats["run_time"]["count"], 5)
+        self.assertGreaterEqual(stats["queue_wait"]["count"], 5)
+
+    def test_stats_running(self):
+        blocked = threading.Event()
+        task = Task(event=blocked)
+        self.executor.dispatch(task)
+        try:
+            self.assertTrue(task.started.wait(1))
+            running = self.executor.stats()["running"]
+        finally:
+            blocked.set()
+
+        self.assertEqual(len(running), 1)
+        self.assertIn("Task", running[0]["task"])
+        self.assertFalse(running[0]["discarded"])
+
+    @slowtest
+    def test_stats_slow_tasks(self):
+        blocked = threading.Event()
+        task = Task(event=blocked)
+        self.executor.dispatch(task, 0.1)
+        try:
+            self.assertTrue(task.started.wait(1))
+            time.sleep(0.3)
+            slow_tasks = self.executor.stats()["slow_tasks"]
+        finally:
+            blocked.set()
+
+        self.assertEqual(len(slow_tasks), 1)
+        sample = slow_tasks[0]
+        self.assertEqual(sample["timeout"], 0.1)
+        self.assertTrue(sample["discarded"])
+        # The traceback shows where the task was blocked.
+        self.assertIn("__call__", sample["traceback"])
+
+    def test_module_stats(self):
+        self.assertIn("test", executor.stats())
+        self.executor.stop()
+        self.assertNotIn("test", executor.stats())
+
+
+class StealingExecutorTests(ExecutorTests):
+
+    work_stealing = True
+
+
+class StealingTaskQueueTests(TestCaseBase):
+
+    def setUp(self):
+        self.queue = executor.StealingTaskQueue("test", 10)
+        self.queue.add("a")
+        self.queue.add("b")
+
+    def test_round_robin(self):
+        for task in range(4):
+            self.queue.put(task)
+        self.assertEqual(len(self.queue), 4)
+        self.assertEqual(self.queue.get("a"), 0)
+        self.assertEqual(self.queue.get("b"), 1)
+
+    def test_steal(self):
+        for task in range(4):
+            self.queue.put(task)
+        # Worker "b" is blocked, "a" runs all the tasks.
+        self.assertEqual([self.queue.get("a") for i in range(4)],
+                         [0, 2, 1, 3])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_idle_worker(self):
+        result = []
+
+        def worker():
+            result.append(self.queue.get("b"))
+
+        t = concurrent.thread(worker)
+        t.start()
+        try:
+            # Wait until worker "b" is idle.
+            for i in range(100):
+                if self.queue._idle:
+                    break
+                time.sleep(0.01)
+            self.queue.put("task")
+        finally:
+            t.join(1)
+
+        self.assertEqual(result, ["task"])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_remove_moves_tasks(self):
+        for task in range(4):
+            self.queue.put(task)
+        self.queue.remove("b")
+        self.assertEqual([self.queue.get("a") for i in range(4)],
+                         [0, 2, 1, 3])
+
+    def test_too_many_tasks(self):
+        for task in range(10):
+            self.queue.put(task)
+        with self.assertRaises(exception.ResourceExhausted):
+            self.queue.put(10)
+
+    def test_clear(self):
+        for task in range(4):
+            self.queue.put(task)
+        self.queue.clear()
+        self.assertEqual(len(self.queue), 0)
+
+
+class ExecutorBenchmarkTests(TestCaseBase):
+
+    @slowtest
+    def test_throughput(self):
+        tasks = 20000
+        for work_stealing in (False, True):
+            lock = threading.Lock()
+            done = threading.Event()
+            count = [0]
+
+            def task():
+                with lock:
+                    count[0] += 1
+                    if count[0] == tasks:
+                        done.set()
+
+            e = executor.Executor('bench', 8, tasks, None,
+                                  work_stealing=work_stealing)
+            with utils.running(e):
+                start = time.monotonic()
+                for i in range(tasks):
+                    e.dispatch(task)
+                self.assertTrue(done.wait(60))
+                elapsed = time.monotonic() - start
+                stats = e.stats()
+            print("work_stealing=%s: %d tasks/s, queue wait max %.6f" % (
+                work_stealing, tasks / elapsed, stats["queue_wait"]["max"]))
+
 
 class TestWorkerSystemNames(TestCaseBase):
 
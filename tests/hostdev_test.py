@@ -21,6 +21,8 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import time
+
 import six
 
 from vdsm.common import exception
@@ -29,7 +31,7 @@ from vdsm.virt.vmdevices import network, hwclass
 
 from testlib import VdsmTestCase as TestCaseBase, XMLTestCase
 from testlib import permutations, expandPermutations
-from monkeypatch import MonkeyClass, MonkeyPatchScope
+from monkeypatch import MonkeyClass, MonkeyPatchScope, Patch
 from testValidation import skipif
 
 from vdsm.common import hooks
@@ -144,6 +146,135 @@ class HostdevTests(TestCaseBase):
         )
 
 
+def _monitored_device_tree(conn):
+    """
+    Patch hostdev to use conn and a fresh device tree cache monitoring conn
+    events.
+    """
+    return Patch([
+        (libvirtconnection, 'get', lambda *args, **kwargs: conn),
+        (hostdev, 'list_nvdimms', lambda: {}),
+        (hostdev, '_device_tree_monitored', False),
+        (hostdev, '_device_tree_valid', False),
+        (hostdev, '_last_alldevices_hash', None),
+        (hostdev, '_device_tree_cache', {}),
+        (hostdev, '_device_address_to_name_cache', {}),
+    ])
+
+
+@MonkeyClass(hostdev, '_sriov_totalvfs', hostdevlib.fake_totalvfs)
+@MonkeyClass(hostdev, '_pci_header_type', lambda _: 0)
+@MonkeyClass(hooks, 'after_hostdev_list_by_caps', lambda json: json)
+@MonkeyClass(hostdev, '_get_udev_block_mapping',
+             lambda: hostdevlib.UDEV_BLOCK_MAP)
+class HostdevMonitoringTests(TestCaseBase):
+
+    def setUp(self):
+        self.conn = hostdevlib.MonitoredConnection()
+        self.patch = _monitored_device_tree(self.conn)
+        self.patch.apply()
+        hostdev.start_monitoring()
+
+    def tearDown(self):
+        self.patch.revert()
+
+    def test_list_from_cache(self):
+        devices = hostdev.list_by_caps()
+        self.assertEqual(devices, hostdev.list_by_caps())
+        self.assertEqual(self.conn.list_calls, 1)
+        self.assertEqual(
+            {name: info['params'] for name, info in devices.items()},
+            hostdevlib.DEVICES_PROCESSED)
+
+    def test_list_by_caps_from_cache(self):
+        hostdev.list_by_caps()
+        devices = hostdev.list_by_caps(('pci', 'usb_device'))
+        self.assertEqual(
+            set(devices),
+            set(hostdevlib.DEVICES_BY_CAPS['pci']) |
+            set(hostdevlib.DEVICES_BY_CAPS['usb_device']))
+        self.assertEqual(self.conn.list_calls, 1)
+
+    def test_nested_caps_use_libvirt(self):
+        hostdev.list_by_caps()
+        hostdev.list_by_caps(('fc_host',))
+        self.assertEqual(self.conn.list_calls, 2)
+
+    def test_filter_unknown_capability(self):
+        devices = {'unknown_device': {'capability': 'unknown'}}
+        flags = hostdev._LIBVIRT_DEVICE_FLAGS['pci']
+        self.assertEqual(hostdev._filter_by_flags(devices, flags), {})
+        self.assertNotIn('unknown', hostdev._LIBVIRT_DEVICE_FLAGS)
+
+    def test_device_added(self):
+        hostdev.list_by_caps()
+        self.conn.add_device(hostdevlib.ADDITIONAL_DEVICE)
+        devices = hostdev.list_by_caps()
+        self.assertIn(hostdevlib.ADDITIONAL_DEVICE, devices)
+        self.assertEqual(
+            hostdev.device_name_from_address(
+                'pci', {'domain': '0', 'bus': '0', 'slot': '9',
+                        'function': '0'}),
+            hostdevlib.ADDITIONAL_DEVICE)
+        self.assertEqual(self.conn.list_calls, 1)
+
+    def test_device_removed(self):
+        address = {'slot': '26', 'bus': '0', 'domain': '0', 'function': '0'}
+        hostdev.list_by_caps()
+        self.conn.remove_device('pci_0000_00_1a_0')
+        self.assertNotIn('pci_0000_00_1a_0', hostdev.list_by_caps())
+        self.assertIsNone(hostdev.device_name_from_address('pci', address))
+        self.assertEqual(self.conn.list_calls, 1)
+
+    def test_device_updated(self):
+        name = 'pci_0000_00_1b_0'
+        hostdev.list_by_caps()
+        xml = self.conn.nodeDeviceLookupByName(name).XMLDesc()
+        self.conn.update_device(name, xml.replace('snd_hda_intel', 'vfio'))
+        params = hostdev.list_by_caps()[name]['params']
+        self.assertEqual(params['driver'], 'vfio')
+        self.assertEqual(self.conn.list_calls, 1)
+
+    def test_scsi_child_removed(self):
+        hostdev.list_by_caps()
+        self.conn.remove_device('scsi_generic_sg1')
+        params = hostdev.list_by_caps()['scsi_1_0_0_0']['params']
+        self.assertNotIn('udev_path', params)
+        self.assertNotIn('block_path', params)
+
+    def test_scsi_child_added(self):
+        hostdev.list_by_caps()
+        self.conn.remove_device('scsi_generic_sg1')
+        self.conn.add_device('scsi_generic_sg1')
+        params = hostdev.list_by_caps()['scsi_1_0_0_0']['params']
+        self.assertEqual(
+            params,
+            hostdevlib.DEVICES_PROCESSED['scsi_1_0_0_0'])
+        self.assertEqual(self.conn.list_calls, 1)
+
+    def test_event_during_refresh(self):
+        list_devices = self.conn.listAllDevices
+
+        def list_and_remove(flags=0):
+            devices = list_devices(flags)
+            self.conn.listAllDevices = list_devices
+            self.conn.remove_device('pci_0000_00_1a_0')
+            return devices
+
+        self.conn.listAllDevices = list_and_remove
+        hostdev.list_by_caps()
+        # The tree listed before the event must not be trusted.
+        self.assertNotIn('pci_0000_00_1a_0', hostdev.list_by_caps())
+        hostdev.list_by_caps()
+        self.assertEqual(self.conn.list_calls, 2)
+
+    def test_invalid_device_event(self):
+        hostdev.list_by_caps()
+        self.conn.add_device('pci_that_doesnt_exist')
+        hostdev.list_by_caps()
+        self.assertEqual(self.conn.list_calls, 2)
+
+
 @MonkeyClass(libvirtconnection, 'get', hostdevlib.Connection.get)
 @MonkeyClass(hostdev, '_sriov_totalvfs', hostdevlib.fake_totalvfs)
 @MonkeyClass(hostdev, '_pci_header_type', lambda _: 0)
@@ -157,6 +288,35 @@ class HostdevPerformanceTests(TestCaseBase):
                 len(libvirtconnection.get().listAllDevices())
             )
 
+    def test_1k_devices_monitored(self):
+        with hostdevlib.Connection.use_hostdev_tree():
+            recorded = libvirtconnection.get().listAllDevices()[:1000]
+        conn = hostdevlib.MonitoredConnection(recorded)
+        patch = _monitored_device_tree(conn)
+        patch.apply()
+        try:
+            hostdev.start_monitoring()
+
+            start = time.monotonic()
+            devices = hostdev.list_by_caps()
+            cold = time.monotonic() - start
+
+            start = time.monotonic()
+            for _ in range(10):
+                hostdev.list_by_caps()
+                hostdev.list_by_caps(('scsi',))
+            warm = (time.monotonic() - start) / 20
+
+            conn.remove_device('scsi_generic_sg5')
+            conn.add_device('scsi_generic_sg5', recorded[-1].XMLDesc())
+        finally:
+            patch.revert()
+
+        print("1000 devices: cold %.6f warm %.6f" % (cold, warm))
+        self.assertEqual(len(devices), len(recorded))
+        self.assertEqual(conn.list_calls, 1)
+        self.assertLess(warm, cold)
+
 
 @expandPermutations
 @MonkeyClass(libvirtconnection, 'get', hostdevlib.Connection)
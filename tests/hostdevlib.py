@@ -24,6 +24,8 @@ from __future__ import division
 from collections import namedtuple
 from contextlib import contextmanager
 
+import libvirt
+
 from vdsm.common import hostdev
 
 import vmfakecon as fake
@@ -466,6 +468,60 @@ class Connection(fake.Connection):
             cls.USE_HOSTDEV_TREE = old_value
 
 
+class MonitoredConnection(Connection):
+    """
+    Connection reporting device changes using node device events, like
+    libvirt does.
+    """
+
+    def __init__(self, devices=None):
+        super(MonitoredConnection, self).__init__()
+        if devices is not None:
+            self._virNodeDevices = list(devices)
+        self.list_calls = 0
+        self._callbacks = {}
+
+    def listAllDevices(self, flags=0):
+        self.list_calls += 1
+        return super(MonitoredConnection, self).listAllDevices(flags)
+
+    def nodeDeviceEventRegisterAny(self, dev, event_id, cb, opaque):
+        self._callbacks[event_id] = (cb, opaque)
+
+    def add_device(self, name, xml=None):
+        dev = self._node_device(name, xml)
+        self._virNodeDevices.append(dev)
+        self._lifecycle(dev, libvirt.VIR_NODE_DEVICE_EVENT_CREATED)
+
+    def remove_device(self, name):
+        dev = self._lookup(name)
+        self._virNodeDevices.remove(dev)
+        self._lifecycle(dev, libvirt.VIR_NODE_DEVICE_EVENT_DELETED)
+
+    def update_device(self, name, xml):
+        dev = self._node_device(name, xml)
+        index = self._virNodeDevices.index(self._lookup(name))
+        self._virNodeDevices[index] = dev
+        cb, opaque = self._callbacks[libvirt.VIR_NODE_DEVICE_EVENT_ID_UPDATE]
+        cb(self, dev, opaque)
+
+    def _lifecycle(self, dev, event):
+        cb, opaque = self._callbacks[
+            libvirt.VIR_NODE_DEVICE_EVENT_ID_LIFECYCLE]
+        cb(self, dev, event, 0, opaque)
+
+    def _node_device(self, name, xml):
+        if xml is None:
+            return self.nodeDeviceLookupByName(name)
+        return fake.VirNodeDeviceStub(xml)
+
+    def _lookup(self, name):
+        for dev in self._virNodeDevices:
+            if not getattr(dev, 'invalid', False) and dev.name() == name:
+                return dev
+        raise KeyError(name)
+
+
 def fake_totalvfs(device_name):
     if device_name == 'pci_0000_05_00_1':
         return 7
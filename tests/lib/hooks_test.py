@@ -345,6 +345,103 @@ def test_rhd_should_report_hook_stderr(caplog, hooks_dir):
                              if lvl == logging.INFO)
 
 
+@pytest.fixture
+def listed_dirs(monkeypatch):
+    """
+    Record hook directories listed by the registry.
+    """
+    listed = []
+    scripts_per_dir = hooks._scriptsPerDir
+
+    def record(dir_name):
+        listed.append(dir_name)
+        return scripts_per_dir(dir_name)
+
+    monkeypatch.setattr(hooks, "_scriptsPerDir", record)
+    return listed
+
+
+def test_registry_cached(hooks_dir, listed_dirs):
+    appender_script("1.sh").apply(hooks_dir)
+
+    for i in range(3):
+        scripts = hooks._registry.scripts(hooks_dir.basename)
+
+    assert scripts == (str(hooks_dir.join("1.sh")),)
+    assert listed_dirs == [hooks_dir.basename]
+
+
+def test_registry_script_added(hooks_dir, listed_dirs):
+    appender_script("2.sh").apply(hooks_dir)
+    hooks._registry.scripts(hooks_dir.basename)
+
+    appender_script("1.sh").apply(hooks_dir)
+
+    assert hooks._registry.scripts(hooks_dir.basename) == (
+        str(hooks_dir.join("1.sh")),
+        str(hooks_dir.join("2.sh")),
+    )
+    assert len(listed_dirs) == 2
+
+
+def test_registry_script_removed(hooks_dir):
+    appender_script("1.sh").apply(hooks_dir)
+    hooks._registry.scripts(hooks_dir.basename)
+
+    hooks_dir.join("1.sh").remove()
+
+    assert hooks._registry.scripts(hooks_dir.basename) == ()
+
+
+def test_registry_script_not_executable(hooks_dir):
+    appender_script("1.sh").apply(hooks_dir)
+    hooks._registry.scripts(hooks_dir.basename)
+
+    hooks_dir.join("1.sh").chmod(0o644)
+
+    assert hooks._registry.scripts(hooks_dir.basename) == ()
+
+
+def test_registry_dir_created(fake_hooks_root, listed_dirs):
+    for i in range(3):
+        assert hooks._registry.scripts("before_get_stats") == ()
+    assert listed_dirs == ["before_get_stats"]
+
+    hooks_dir = fake_hooks_root.mkdir("before_get_stats")
+    appender_script("1.sh").apply(hooks_dir)
+
+    assert hooks._registry.scripts("before_get_stats") == (
+        str(hooks_dir.join("1.sh")),
+    )
+
+
+def test_registry_dir_removed(hooks_dir):
+    appender_script("1.sh").apply(hooks_dir)
+    hooks._registry.scripts(hooks_dir.basename)
+
+    hooks_dir.remove()
+
+    assert hooks._registry.scripts(hooks_dir.basename) == ()
+
+
+@pytest.mark.parametrize("hooks_dir", indirect=True, argvalues=[
+    pytest.param(
+        [
+            appender_script("1.sh"),
+        ],
+        id="single hook"
+    ),
+])
+def test_rhd_should_record_execution_time(monkeypatch, hooks_dir):
+    monkeypatch.setattr(hooks, "_execution_time", {})
+    hooks._runHooksDir(u"", hooks_dir.basename)
+    hooks._runHooksDir(u"", hooks_dir.basename)
+
+    stats = hooks.stats()
+    assert list(stats) == [hooks_dir.basename + "/1.sh"]
+    assert stats[hooks_dir.basename + "/1.sh"]["count"] == 2
+
+
 @pytest.fixture
 def env_dump(hooks_dir):
     dump_path = str(hooks_dir.join("env_dump.pickle"))
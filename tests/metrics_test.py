@@ -0,0 +1,252 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import socket
+
+import pytest
+
+from vdsm.metrics import endpoint
+from vdsm.metrics import registry
+from yajsonrpc import stomp
+
+
+@pytest.fixture
+def reg():
+    return registry.Registry()
+
+
+def test_empty(reg):
+    assert reg.expose() == b""
+
+
+def test_counter(reg):
+    c = reg.counter("test_total", "Test counter")
+    c.inc()
+    c.inc(2)
+    assert reg.expose() == (
+        b"# HELP test_total Test counter\n"
+        b"# TYPE test_total counter\n"
+        b"test_total 3.0\n"
+    )
+
+
+def test_counter_decrease(reg):
+    c = reg.counter("test_total", "Test counter")
+    with pytest.raises(ValueError):
+        c.inc(-1)
+
+
+def test_counter_labels(reg):
+    c = reg.counter("test_total", "Test counter", labels=("method", "code"))
+    c.inc(method="b", code=0)
+    c.inc(method="a", code=1)
+    c.inc(method="b", code=0)
+    assert reg.expose() == (
+        b"# HELP test_total Test counter\n"
+        b"# TYPE test_total counter\n"
+        b'test_total{method="a",code="1"} 1.0\n'
+        b'test_total{method="b",code="0"} 2.0\n'
+    )
+
+
+@pytest.mark.parametrize("labels", [
+    {},
+    {"method": "a", "code": 0, "other": 1},
+    {"method": "a", "other": 1},
+])
+def test_wrong_labels(reg, labels):
+    c = reg.counter("test_total", "Test counter", labels=("method", "code"))
+    with pytest.raises(Exception):
+        c.inc(**labels)
+
+
+def test_gauge(reg):
+    g = reg.gauge("test_gauge", "Test gauge")
+    g.set(5)
+    g.set(1.5)
+    assert reg.expose() == (
+        b"# HELP test_gauge Test gauge\n"
+        b"# TYPE test_gauge gauge\n"
+        b"test_gauge 1.5\n"
+    )
+
+
+def test_gauge_replace(reg):
+    g = reg.gauge("test_gauge", "Test gauge", labels=("domain",))
+    g.replace({("sd1",): 1, ("sd2",): "0.5"})
+    g.replace({("sd2",): 2, ("sd3",): 3})
+    assert reg.expose() == (
+        b"# HELP test_gauge Test gauge\n"
+        b"# TYPE test_gauge gauge\n"
+        b'test_gauge{domain="sd2"} 2.0\n'
+        b'test_gauge{domain="sd3"} 3.0\n'
+    )
+
+
+def test_gauge_replace_wrong_labels(reg):
+    g = reg.gauge("test_gauge", "Test gauge", labels=("domain",))
+    g.replace({("sd1",): 1})
+    with pytest.raises(ValueError):
+        g.replace({("sd1", "extra"): 1})
+    assert b'test_gauge{domain="sd1"} 1.0\n' in reg.expose()
+
+
+@pytest.mark.parametrize("value,text", [
+    (float("inf"), b"+Inf"),
+    (float("-inf"), b"-Inf"),
+    (float("nan"), b"NaN"),
+])
+def test_gauge_special_values(reg, value, text):
+    g = reg.gauge("test_gauge", "Test gauge")
+    g.set(value)
+    assert reg.expose().endswith(b"test_gauge " + text + b"\n")
+
+
+def test_histogram(reg):
+    h = reg.histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0))
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(2.0)
+    assert reg.expose() == (
+        b"# HELP test_seconds Test histogram\n"
+        b"# TYPE test_seconds histogram\n"
+        b'test_seconds_bucket{le="0.1"} 1.0\n'
+        b'test_seconds_bucket{le="1.0"} 2.0\n'
+        b'test_seconds_bucket{le="+Inf"} 3.0\n'
+        b"test_seconds_sum 2.55\n"
+        b"test_seconds_count 3.0\n"
+    )
+
+
+def test_histogram_labels(reg):
+    h = reg.histogram("test_seconds", "Test histogram", labels=("verb",),
+                      buckets=(1.0,))
+    h.observe(0.5, verb="a")
+    assert reg.expose() == (
+        b"# HELP test_seconds Test histogram\n"
+        b"# TYPE test_seconds histogram\n"
+        b'test_seconds_bucket{verb="a",le="1.0"} 1.0\n'
+        b'test_seconds_bucket{verb="a",le="+Inf"} 1.0\n'
+        b'test_seconds_sum{verb="a"} 0.5\n'
+        b'test_seconds_count{verb="a"} 1.0\n'
+    )
+
+
+def test_histogram_le_label(reg):
+    with pytest.raises(ValueError):
+        reg.histogram("test_seconds", "Test histogram", labels=("le",))
+
+
+def test_escaping(reg):
+    g = reg.gauge("test_gauge", "Help with \\ and\nnewline", labels=("l",))
+    g.set(1, l='a "quoted" \\ value\n')
+    assert reg.expose() == (
+        b"# HELP test_gauge Help with \\\\ and\\nnewline\n"
+        b"# TYPE test_gauge gauge\n"
+        b'test_gauge{l="a \\"quoted\\" \\\\ value\\n"} 1.0\n'
+    )
+
+
+def test_sorted_by_name(reg):
+    reg.gauge("b", "B").set(1)
+    reg.gauge("a", "A").set(1)
+    lines = reg.expose().splitlines()
+    assert lines[1] == b"# TYPE a gauge"
+    assert lines[4] == b"# TYPE b gauge"
+
+
+def test_unregister(reg):
+    g = reg.gauge("test_gauge", "Test gauge")
+    reg.unregister(g)
+    assert reg.expose() == b""
+
+
+def test_duplicate_name(reg):
+    reg.gauge("test", "Test gauge")
+    with pytest.raises(ValueError):
+        reg.counter("test", "Test counter")
+
+
+@pytest.mark.parametrize("name", ["", "1abc", "a-b", "a b"])
+def test_invalid_name(reg, name):
+    with pytest.raises(ValueError):
+        reg.gauge(name, "Invalid")
+
+
+@pytest.mark.parametrize("label", ["", "a:b", "__reserved"])
+def test_invalid_label(reg, label):
+    with pytest.raises(ValueError):
+        reg.gauge("test", "Invalid", labels=(label,))
+
+
+# Endpoint
+
+
+@pytest.mark.parametrize("data", [
+    b"GET /metrics HTTP/1.1\r\n",
+    b"GET /metrics?x=1 HTTP/1.1\r\n",
+])
+def test_detect(data):
+    detector = endpoint.MetricsDetector()
+    assert detector.detect(data[:detector.REQUIRED_SIZE])
+
+
+@pytest.mark.parametrize("data", [
+    b"GET / HTTP/1.1\r\n",
+    b"PUT /metrics HTTP/1.1\r\n",
+    b"GET /images HTTP/1.1\r\n",
+] + [c.encode("utf-8") for c in stomp.COMMANDS])
+def test_reject(data):
+    detector = endpoint.MetricsDetector()
+    assert not detector.detect(data[:detector.REQUIRED_SIZE])
+
+
+def test_scrape(reg):
+    reg.gauge("test_gauge", "Test gauge").set(1)
+    status, headers, body = scrape(reg, b"/metrics")
+    assert status.startswith(b"HTTP/1.0 200")
+    assert (b"Content-Type: " + registry.CONTENT_TYPE.encode("ascii")
+            in headers)
+    assert body == reg.expose()
+
+
+def test_scrape_not_found(reg):
+    status, headers, body = scrape(reg, b"/metrics/other")
+    assert status.startswith(b"HTTP/1.0 404")
+
+
+def scrape(reg, path):
+    server, client = socket.socketpair()
+    with client:
+        endpoint.MetricsDetector(reg.expose).handle_socket(
+            server, ("127.0.0.1", 12345))
+        client.sendall(b"GET " + path + b" HTTP/1.0\r\n\r\n")
+        response = b""
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            response += data
+    head, body = response.split(b"\r\n\r\n", 1)
+    status, headers = head.split(b"\r\n", 1)
+    return status, headers.split(b"\r\n"), body
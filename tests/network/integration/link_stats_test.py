@@ -77,3 +77,12 @@ def test_report(device_ctx, device_ctx_args):
             'duplex',
         }
         assert expected_stat_names == set(stats[dev])
+
+
+def test_report_counters():
+    with dummy_device() as dev:
+        stats = link_stats.report()
+        for stat, name in (('rx', 'rx_bytes'), ('tx', 'tx_bytes')):
+            path = '/sys/class/net/{}/statistics/{}'.format(dev, name)
+            with open(path) as f:
+                assert stats[dev][stat] == int(f.read())
@@ -0,0 +1,147 @@
+# Copyright 2016-2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import absolute_import
+from __future__ import division
+
+import pytest
+
+from vdsm.network.link import iface
+from vdsm.network.link import stats as link_stats
+from vdsm.network.netlink import libnl
+
+UP = libnl.IfaceStatus.IFF_UP | libnl.IfaceStatus.IFF_RUNNING
+
+
+class FakeHost(object):
+    """
+    Links reported by a single dump, and their speed read from sysfs.
+    """
+
+    def __init__(self, links):
+        self.links = links
+        self.speed_reads = []
+
+    def iter_links_stats(self):
+        for index, (name, link_type) in enumerate(self.links, start=1):
+            yield {
+                'name': name,
+                'index': index,
+                'type': link_type,
+                'flags': UP,
+                'stats': {
+                    'rx_bytes': 100,
+                    'tx_bytes': 200,
+                    'rx_dropped': 1,
+                    'tx_dropped': 2,
+                    'rx_errors': 3,
+                    'tx_errors': 4,
+                },
+            }
+
+    def read_speed_and_duplex(self, properties):
+        self.speed_reads.append(properties['name'])
+        return properties['type'], 10000, 'full'
+
+
+@pytest.fixture
+def host(monkeypatch):
+    host = FakeHost([
+        ('eth0', iface.Type.NIC),
+        ('eth1', iface.Type.NIC),
+        ('bond0', iface.Type.BOND),
+        ('bond0.100', iface.Type.VLAN),
+        ('vnet0', 'tun'),
+    ])
+    monkeypatch.setattr(
+        link_stats.link, 'iter_links_stats', host.iter_links_stats)
+    monkeypatch.setattr(
+        link_stats, '_read_speed_and_duplex', host.read_speed_and_duplex)
+    monkeypatch.setattr(link_stats, '_cache', link_stats._SpeedCache())
+    return host
+
+
+def test_report(host):
+    stats = link_stats.report()
+    assert set(stats) == {'eth0', 'eth1', 'bond0', 'bond0.100', 'vnet0'}
+    assert stats['eth0'] == {
+        'name': 'eth0',
+        'rx': 100,
+        'tx': 200,
+        'state': 'up',
+        'rxDropped': 1,
+        'txDropped': 2,
+        'rxErrors': 3,
+        'txErrors': 4,
+        'speed': 10000,
+        'duplex': 'full',
+    }
+
+
+def test_not_monitored_reads_speed(host):
+    link_stats.report()
+    link_stats.report()
+    assert len(host.speed_reads) == 2 * len(host.links)
+
+
+def test_monitored_caches_speed(host):
+    link_stats._cache.enable()
+    link_stats.report()
+    link_stats.report()
+    assert len(host.speed_reads) == len(host.links)
+
+
+def test_link_changed(host):
+    link_stats._cache.enable()
+    link_stats.report()
+    del host.speed_reads[:]
+
+    link_stats._cache.link_changed('eth1')
+    link_stats.report()
+
+    # Bonds and vlans may depend on the changed link.
+    assert sorted(host.speed_reads) == ['bond0', 'bond0.100', 'eth1']
+
+
+def test_link_changed_while_reading(host, monkeypatch):
+    cache = link_stats._cache
+    cache.enable()
+
+    def read_and_change(properties):
+        cache.link_changed(properties['name'])
+        return host.read_speed_and_duplex(properties)
+
+    with monkeypatch.context() as m:
+        m.setattr(link_stats, '_read_speed_and_duplex', read_and_change)
+        link_stats.report()
+    del host.speed_reads[:]
+
+    link_stats.report()
+    assert len(host.speed_reads) == len(host.links)
+
+
+def test_disable_clears_cache(host):
+    link_stats._cache.enable()
+    link_stats.report()
+    link_stats._cache.disable()
+    del host.speed_reads[:]
+
+    link_stats.report()
+    assert len(host.speed_reads) == len(host.links)
@@ -0,0 +1,307 @@
+# Copyright 2016-2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import absolute_import
+from __future__ import division
+
+import collections
+import time
+
+import pytest
+
+from vdsm.network import nmstate
+from vdsm.network.netinfo import bonding
+from vdsm.network.netinfo import bridges
+from vdsm.network.netinfo import cache
+
+
+class FakeLink(object):
+
+    def __init__(self, name, link_type, device=None, vlanid=None):
+        self.name = name
+        self.type = link_type
+        self.device = device
+        self.vlanid = vlanid
+        self.mtu = 1500
+
+    def isHidden(self):
+        return False
+
+    def isBRIDGE(self):
+        return self.type == 'bridge'
+
+    def isNICLike(self):
+        return False
+
+    def isBOND(self):
+        return False
+
+    def isVLAN(self):
+        return self.type == 'vlan'
+
+
+class FakeHost(object):
+    """
+    Host networking, counting the calls collecting each part of the report.
+    """
+
+    def __init__(self, vlans):
+        self.links = [FakeLink('eth0.{}'.format(i), 'vlan', 'eth0', i)
+                      for i in range(vlans)]
+        self.links.extend(FakeLink('br{}'.format(i), 'bridge')
+                          for i in range(vlans))
+        self.networks = {}
+        self.dhcpv4 = set()
+        self.calls = collections.Counter()
+
+    def get_links(self):
+        self.calls['links'] += 1
+        return iter(self.links)
+
+    def get_ip_addrs(self):
+        self.calls['addresses'] += 1
+        addrs = collections.defaultdict(list)
+        addrs['br0'].append({
+            'family': 'inet',
+            'address': '192.168.1.2',
+            'scope': 'global',
+            'prefixlen': 24,
+            'flags': frozenset(['permanent']),
+        })
+        return addrs
+
+    def get_routes(self):
+        self.calls['routes'] += 1
+        return collections.defaultdict(list)
+
+    def state_show(self):
+        self.calls['nmstate'] += 1
+        ifaces = [
+            {
+                nmstate.Interface.NAME: name,
+                nmstate.Interface.IPV4: {
+                    nmstate.InterfaceIP.ENABLED: True,
+                    nmstate.InterfaceIP.DHCP: True,
+                },
+                nmstate.Interface.IPV6: {
+                    nmstate.InterfaceIP.ENABLED: False,
+                },
+            }
+            for name in self.dhcpv4
+        ]
+        return {nmstate.Interface.KEY: ifaces, nmstate.DNS.KEY: {}}
+
+    def permanent_address(self):
+        self.calls['permanent_address'] += 1
+        return {}
+
+    def bridge_info(self, link):
+        self.calls[link.name] += 1
+        return {'ports': [], 'stp': 'off', 'opts': {}}
+
+    def running_config(self):
+        host = self
+
+        class RunningConfig(object):
+            networks = dict(host.networks)
+
+        return RunningConfig()
+
+
+@pytest.fixture
+def host(monkeypatch):
+    host = FakeHost(vlans=5)
+    monkeypatch.setattr(cache, 'getLinks', host.get_links)
+    monkeypatch.setattr(cache, 'getIpAddrs', host.get_ip_addrs)
+    monkeypatch.setattr(cache, 'get_routes', host.get_routes)
+    monkeypatch.setattr(cache, 'RunningConfig', host.running_config)
+    monkeypatch.setattr(cache, 'report_network_qos', lambda *args: None)
+    monkeypatch.setattr(cache, 'is_ipv6_local_auto', lambda name: False)
+    monkeypatch.setattr(nmstate, 'state_show', host.state_show)
+    monkeypatch.setattr(bonding, 'permanent_address', host.permanent_address)
+    monkeypatch.setattr(bridges, 'info', host.bridge_info)
+    monkeypatch.setattr(cache, '_cache', cache._ReportCache())
+    device_info = cache._device_info
+
+    def count_device_info(dev):
+        host.calls['device_info'] += 1
+        return device_info(dev)
+
+    monkeypatch.setattr(cache, '_device_info', count_device_info)
+    return host
+
+
+@pytest.fixture
+def monitored(host):
+    cache._cache.enable()
+
+
+def test_not_monitored(host):
+    cache.get()
+    cache.get()
+    assert host.calls['addresses'] == 2
+    assert host.calls['nmstate'] == 2
+    assert host.calls['br0'] == 2
+
+
+@pytest.mark.usefixtures('monitored')
+def test_cached(host):
+    report = cache.get()
+    assert cache.get() == report
+    assert host.calls['links'] == 1
+    assert host.calls['addresses'] == 1
+    assert host.calls['routes'] == 1
+    assert host.calls['nmstate'] == 1
+    assert host.calls['br0'] == 1
+    assert report['bridges']['br0']['addr'] == '192.168.1.2'
+    assert report['vlans']['eth0.1'] == {
+        'iface': 'eth0',
+        'vlanid': 1,
+        'mtu': 1500,
+        'ipv6autoconf': False,
+        'addr': '',
+        'netmask': '',
+        'ipv4addrs': [],
+        'ipv6addrs': [],
+        'gateway': '',
+        'ipv6gateway': '::',
+        'ipv4defaultroute': False,
+        'dhcpv4': False,
+        'dhcpv6': False,
+    }
+
+
+@pytest.mark.usefixtures('monitored')
+def test_cached_report_copied(host):
+    report = cache.get()
+    report['bridges']['br0']['ports'].append('vnet0')
+    assert cache.get()['bridges']['br0']['ports'] == []
+
+
+@pytest.mark.usefixtures('monitored')
+def test_address_event(host):
+    cache.get()
+    cache._cache.handle_event({'event': 'new_addr', 'label': 'br1'})
+    cache.get()
+    assert host.calls['addresses'] == 2
+    assert host.calls['routes'] == 1
+    assert host.calls['nmstate'] == 2
+    assert host.calls['br0'] == 1
+
+
+@pytest.mark.usefixtures('monitored')
+def test_route_event(host):
+    cache.get()
+    cache._cache.handle_event({'event': 'del_route'})
+    cache.get()
+    assert host.calls['addresses'] == 1
+    assert host.calls['routes'] == 2
+    assert host.calls['nmstate'] == 2
+
+
+@pytest.mark.usefixtures('monitored')
+def test_dhcp_enabled(host):
+    assert not cache.get()['vlans']['eth0.1']['dhcpv4']
+
+    # Enabling DHCP on a link which is up changes only the addresses.
+    host.dhcpv4.add('eth0.1')
+    cache._cache.handle_event({'event': 'new_addr', 'label': 'eth0.1'})
+
+    assert cache.get()['vlans']['eth0.1']['dhcpv4']
+
+
+@pytest.mark.usefixtures('monitored')
+def test_link_event(host):
+    cache.get()
+    cache._cache.handle_event({'event': 'new_link', 'name': 'eth0.1'})
+    cache.get()
+    assert host.calls['addresses'] == 1
+    assert host.calls['nmstate'] == 2
+    assert host.calls['permanent_address'] == 2
+    # The changed link, and bridges that may use it as a port.
+    assert host.calls['device_info'] == 10 + 1 + 5
+    assert host.calls['br0'] == 2
+
+
+@pytest.mark.usefixtures('monitored')
+def test_event_while_collecting(host, monkeypatch):
+    get_ip_addrs = host.get_ip_addrs
+
+    def get_ip_addrs_and_change():
+        addrs = get_ip_addrs()
+        cache._cache.handle_event({'event': 'new_addr', 'label': 'br1'})
+        return addrs
+
+    with monkeypatch.context() as m:
+        m.setattr(cache, 'getIpAddrs', get_ip_addrs_and_change)
+        cache.get()
+
+    cache.get()
+    assert host.calls['addresses'] == 2
+
+
+@pytest.mark.usefixtures('monitored')
+def test_invalidate(host):
+    cache.get()
+    cache.invalidate()
+    cache.get()
+    assert host.calls['addresses'] == 2
+    assert host.calls['routes'] == 2
+    assert host.calls['nmstate'] == 2
+    assert host.calls['br0'] == 2
+
+
+@pytest.mark.usefixtures('monitored')
+def test_running_config_changed(host):
+    cache.get()
+    host.networks['net1'] = {'bridged': True, 'switch': 'ovs'}
+    cache.get()
+    assert host.calls['links'] == 2
+    assert host.calls['addresses'] == 1
+
+
+def test_500_devices(host, monkeypatch):
+    host = FakeHost(vlans=250)
+    monkeypatch.setattr(cache, 'getLinks', host.get_links)
+    monkeypatch.setattr(cache, 'getIpAddrs', host.get_ip_addrs)
+    monkeypatch.setattr(nmstate, 'state_show', host.state_show)
+    monkeypatch.setattr(bridges, 'info', host.bridge_info)
+    cache._cache.enable()
+
+    start = time.monotonic()
+    report = cache.get()
+    cold = time.monotonic() - start
+
+    start = time.monotonic()
+    for _ in range(10):
+        cache.get()
+    warm = (time.monotonic() - start) / 10
+
+    cache._cache.handle_event({'event': 'new_addr', 'label': 'br1'})
+    start = time.monotonic()
+    cache.get()
+    partial = time.monotonic() - start
+
+    print("500 devices: cold %.6f warm %.6f addresses changed %.6f"
+          % (cold, warm, partial))
+    assert len(report['vlans']) + len(report['bridges']) == 500
+    assert host.calls['links'] == 2
+    assert host.calls['br0'] == 1
+    assert warm < cold
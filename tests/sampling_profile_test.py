@@ -0,0 +1,248 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import time
+
+import pytest
+
+from vdsm.common import concurrent
+from vdsm.profiling import sampling
+from vdsm.profiling.errors import UsageError
+
+from testlib import make_config
+
+
+@pytest.fixture
+def config(monkeypatch):
+    cfg = make_config([
+        ('devel', 'sampling_profile_rate', '100'),
+        ('devel', 'sampling_profile_max_stacks', '100'),
+    ])
+    monkeypatch.setattr(sampling, 'config', cfg)
+    monkeypatch.setattr(sampling, '_profiler', None)
+
+
+class Sleepers(object):
+    """
+    Threads waiting in a known stack.
+    """
+
+    def __init__(self, count, depth=1):
+        self.cond = threading.Condition()
+        self.ready = 0
+        self.done = False
+        self.threads = [
+            concurrent.thread(self.outer, args=(depth,),
+                              name="sleeper/%d" % i)
+            for i in range(count)]
+        for t in self.threads:
+            t.start()
+        # A sleeper releases the lock only when waiting in inner(), so once
+        # all sleepers are ready, they are all in the expected stack.
+        with self.cond:
+            while self.ready < count:
+                self.cond.wait()
+
+    def outer(self, depth):
+        if depth > 1:
+            self.outer(depth - 1)
+        else:
+            self.inner()
+
+    def inner(self):
+        with self.cond:
+            self.ready += 1
+            self.cond.notify_all()
+            while not self.done:
+                self.cond.wait()
+
+    def stop(self):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join()
+
+
+@pytest.fixture
+def sleepers():
+    s = Sleepers(2)
+    yield s
+    s.stop()
+
+
+def test_sample(sleepers):
+    p = sampling.Profiler()
+    p._sample()
+    p._sample()
+    info = p.dump()
+
+    assert info["samples"] == 2
+    assert info["dropped"] == 0
+    assert not info["running"]
+
+    lines = info["stacks"].splitlines()
+    for name in ("sleeper/0", "sleeper/1"):
+        line = [line for line in lines if line.startswith(name + ";")][0]
+        stack, count = line.rsplit(" ", 1)
+        assert count == "2"
+        assert (
+            "outer (tests/sampling_profile_test.py);"
+            "inner (tests/sampling_profile_test.py);"
+            "wait (" in stack)
+
+
+def test_sampler_not_sampled(sleepers):
+    p = sampling.Profiler(rate=100)
+    p.start()
+    try:
+        time.sleep(0.2)
+    finally:
+        p.stop()
+    info = p.dump()
+    assert info["samples"] > 0
+    assert "profiling/sampler;" not in info["stacks"]
+
+
+def test_max_stacks():
+    p = sampling.Profiler(max_stacks=2)
+    s = Sleepers(1, depth=1)
+    try:
+        p._sample()
+    finally:
+        s.stop()
+    # Sampling new stacks drops the oldest stacks.
+    for depth in (2, 3, 4):
+        s = Sleepers(1, depth=depth)
+        try:
+            p._sample()
+        finally:
+            s.stop()
+    info = p.dump()
+    assert len(info["stacks"].splitlines()) == 2
+    assert info["dropped"] > 0
+
+
+def test_clear(sleepers):
+    p = sampling.Profiler()
+    p._sample()
+    info = p.dump(clear=True)
+    assert info["samples"] == 1
+    assert info["stacks"] != ""
+
+    info = p.dump()
+    assert info["samples"] == 0
+    assert info["stacks"] == ""
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_invalid_rate(rate):
+    with pytest.raises(ValueError):
+        sampling.Profiler(rate=rate)
+
+
+def test_start_stop(config, sleepers):
+    assert not sampling.is_running()
+    sampling.start()
+    try:
+        assert sampling.is_running()
+        with pytest.raises(UsageError):
+            sampling.start()
+        time.sleep(0.1)
+    finally:
+        sampling.stop()
+    assert not sampling.is_running()
+
+    info = sampling.dump()
+    assert info["rate"] == 100
+    assert not info["running"]
+    assert info["samples"] > 0
+    assert "sleeper/0;" in info["stacks"]
+
+
+def test_start_rate(config):
+    sampling.start(rate=10)
+    try:
+        assert sampling.dump()["rate"] == 10
+    finally:
+        sampling.stop()
+
+
+def test_start_clears_profile(config, sleepers):
+    sampling.start()
+    time.sleep(0.1)
+    sampling.stop()
+    sampling.start()
+    try:
+        assert sampling.dump()["samples"] == 0
+    finally:
+        sampling.stop()
+
+
+def test_stop_not_running(config):
+    with pytest.raises(UsageError):
+        sampling.stop()
+    sampling.start()
+    sampling.stop()
+    with pytest.raises(UsageError):
+        sampling.stop()
+
+
+def test_dump_not_started(config):
+    assert sampling.dump() == {
+        "running": False,
+        "rate": 0,
+        "samples": 0,
+        "dropped": 0,
+        "stacks": "",
+    }
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("threads", [50, 100])
+def test_overhead(threads):
+    # Vdsm runs 50-100 threads on a typical host, waiting in stacks of 10-30
+    # frames.
+    rate = 50
+    duration = 5.0
+    s = Sleepers(threads, depth=20)
+    try:
+        p = sampling.Profiler(rate=rate)
+        start_wall = time.monotonic()
+        start_cpu = time.process_time()
+        p.start()
+        time.sleep(duration)
+        p.stop()
+        cpu = time.process_time() - start_cpu
+        wall = time.monotonic() - start_wall
+    finally:
+        s.stop()
+
+    info = p.dump()
+    usage = cpu / wall * 100
+    print("%d threads, rate=%d: samples=%d stacks=%d cpu=%.2f%%"
+          % (threads, rate, info["samples"],
+             len(info["stacks"].splitlines()), usage))
+    assert usage < 2.0
@@ -43,6 +43,8 @@ class SchedulerTests(VdsmTestCase):
     MAX_TASKS = 1000
     PERMUTATIONS = ((time.time,), (vdsm.common.time.monotonic_time,))
 
+    scheduler_class = schedule.Scheduler
+
     def setUp(self):
         self.scheduler = None
 
@@ -145,6 +147,18 @@ class SchedulerTests(VdsmTestCase):
         for task, call in tasks:
             self.assertEqual(task.call_time, None)
 
+    @permutations(PERMUTATIONS)
+    def test_stats(self, clock):
+        self.create_scheduler(clock)
+        task = Task(clock)
+        self.scheduler.schedule(0.1, task)
+        self.scheduler.schedule(10, Task(clock))
+        task.wait(0.1 + self.GRACETIME)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["calls"], 1)
+        self.assertEqual(stats["lateness"]["count"], 1)
+        self.assertGreaterEqual(stats["lateness"]["sum"], 0.0)
+
     @stresstest
     @permutations(PERMUTATIONS)
     def test_latency(self, clock):
@@ -177,10 +191,66 @@ class SchedulerTests(VdsmTestCase):
 
     def create_scheduler(self, clock):
         self.clock = clock
-        self.scheduler = schedule.Scheduler(clock=clock)
+        self.scheduler = self.scheduler_class(clock=clock)
         self.scheduler.start()
 
 
+@expandPermutations
+class WheelSchedulerTests(SchedulerTests):
+
+    scheduler_class = schedule.WheelScheduler
+
+    @permutations(SchedulerTests.PERMUTATIONS)
+    def test_cancel_removes_call(self, clock):
+        self.create_scheduler(clock)
+        calls = [self.scheduler.schedule(10, Task(clock)) for i in range(10)]
+        self.assertEqual(self.scheduler.stats()["calls"], 10)
+        for call in calls:
+            call.cancel()
+        self.assertEqual(self.scheduler.stats()["calls"], 0)
+
+    def test_cancel_twice(self):
+        self.create_scheduler(time.time)
+        call = self.scheduler.schedule(10, Task(time.time))
+        call.cancel()
+        call.cancel()
+        self.assertFalse(call.valid())
+        self.assertEqual(self.scheduler.stats()["calls"], 0)
+
+    @broken_on_ci("timing sensitive, may fail on overloaded machine")
+    @permutations([
+        # delay, resolution
+        (0.3, 0.001),       # Second wheel
+        (0.7, 0.00001),     # Third wheel
+    ])
+    def test_move_between_wheels(self, delay, resolution):
+        clock = vdsm.common.time.monotonic_time
+        self.clock = clock
+        self.scheduler = schedule.WheelScheduler(
+            clock=clock, resolution=resolution)
+        self.scheduler.start()
+        task1 = Task(clock)
+        task2 = Task(clock)
+        deadline = clock() + delay
+        self.scheduler.schedule(delay, task1)
+        self.scheduler.schedule(delay + 1, task2)
+        task1.wait(delay + self.GRACETIME)
+        self.assertTrue(deadline <= task1.call_time)
+        self.assertTrue(task1.call_time < deadline + self.GRACETIME)
+        self.assertEqual(task2.call_time, None)
+
+    @permutations([["heap", schedule.Scheduler],
+                   ["wheel", schedule.WheelScheduler]])
+    def test_create(self, type, cls):
+        self.scheduler = schedule.create(type)
+        self.assertIsInstance(self.scheduler, cls)
+        self.scheduler.start()
+
+    def test_create_unsupported(self):
+        with self.assertRaises(ValueError):
+            schedule.create("list")
+
+
 class Task(object):
 
     def __init__(self, clock):
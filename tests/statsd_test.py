@@ -21,9 +21,16 @@
 
 from __future__ import absolute_import
 from __future__ import division
+from __future__ import print_function
+
+import socket
+import uuid
+
+from vdsm.common import concurrent
 from vdsm.metrics import statsd
 from testlib import mock
 from testlib import VdsmTestCase as TestCaseBase
+from testValidation import slowtest
 
 
 class StatsdModuleTest(TestCaseBase):
@@ -72,6 +79,211 @@ class StatsdModuleTest(TestCaseBase):
     def test_send_multiple(self):
         data = {'hello': 7, 'goodbye': 11}
         statsd.send(data)
-        calls = [mock.call(b'hello:7|g', self._address),
-                 mock.call(b'goodbye:11|g', self._address)]
-        self.mock_socket.return_value.sendto.assert_has_calls(calls)
+        sendto = self.mock_socket.return_value.sendto
+        sendto.assert_called_once_with(mock.ANY, self._address)
+        lines = sendto.call_args[0][0].split(b'\n')
+        self.assertEqual(sorted(lines), [b'goodbye:11|g', b'hello:7|g'])
+
+
+class UDPSink(object):
+    """
+    Receive statsd messages on a local UDP port, counting messages and
+    bytes.
+    """
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024**2)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.messages = []
+        self._thread = concurrent.thread(self._run, name="statsd/sink")
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            data = self.sock.recv(65536)
+            if data == b'':
+                return
+            self.messages.append(data)
+
+    def wait(self, client):
+        # An empty message marks the end of the messages.
+        client._send(b'')
+        self._thread.join()
+        self.sock.close()
+
+    def lines(self):
+        return [line for msg in self.messages for line in msg.split(b'\n')]
+
+    @property
+    def bytes(self):
+        return sum(len(msg) for msg in self.messages)
+
+
+def vm_report(vms):
+    # Similar to a report with vm metrics, 20 metrics per vm.
+    report = {}
+    for i in range(vms):
+        prefix = 'hosts.vms.%s' % uuid.UUID(int=i)
+        for name in ('cpu.user', 'cpu.sys', 'cpu.usage', 'balloon.current',
+                     'memory.usage', 'memory.available', 'memory.unused'):
+            report['%s.%s' % (prefix, name)] = i
+        for nic in ('vnet0', 'vnet1'):
+            for name in ('rx', 'tx', 'rx_errors', 'tx_errors'):
+                report['%s.network.%s.%s' % (prefix, nic, name)] = i * 1000
+        for disk in ('sda', 'vda'):
+            for name in ('read_rate', 'write_rate'):
+                report['%s.disk.%s.%s' % (prefix, disk, name)] = i * 100
+        report['%s.disk.vda.apparent_size' % prefix] = i * 1024**3
+    return report
+
+
+def expected_lines(report):
+    return sorted(('%s:%s|g' % (k, v)).encode('utf-8')
+                  for k, v in report.items())
+
+
+class StatsClientTest(TestCaseBase):
+
+    def setUp(self):
+        self.sink = UDPSink()
+
+    def create_client(self, maxudpsize=512):
+        self.client = statsd._StatsClient(
+            '127.0.0.1', port=self.sink.port, maxudpsize=maxudpsize)
+        self.addCleanup(self.client.close)
+
+    def test_gauges_batch(self):
+        self.create_client()
+        report = vm_report(10)
+        self.client.gauges(report.items())
+        self.sink.wait(self.client)
+
+        self.assertEqual(sorted(self.sink.lines()),
+                         expected_lines(report))
+        messages = self.sink.messages
+        self.assertLess(len(messages), len(report))
+        for msg in messages:
+            self.assertLessEqual(len(msg), 512)
+
+    def test_gauges_fill_messages(self):
+        self.create_client(maxudpsize=11)
+        self.client.gauges([('a', 1), ('b', 2), ('c', 3), ('d', 4), ('e', 5)])
+        self.sink.wait(self.client)
+
+        self.assertEqual(self.sink.messages, [
+            b'a:1|g\nb:2|g',
+            b'c:3|g\nd:4|g',
+            b'e:5|g',
+        ])
+
+    def test_gauges_line_too_long(self):
+        self.create_client(maxudpsize=8)
+        self.client.gauges([('a', 1), ('long.name', 2), ('c', 3)])
+        self.sink.wait(self.client)
+
+        self.assertEqual(self.sink.messages, [
+            b'a:1|g',
+            b'long.name:2|g',
+            b'c:3|g',
+        ])
+
+    def test_gauges_empty(self):
+        self.create_client()
+        self.client.gauges([])
+        self.sink.wait(self.client)
+
+        self.assertEqual(self.sink.messages, [])
+
+    @slowtest
+    def test_packets_per_report(self):
+        for vms in (100, 1000):
+            report = vm_report(vms)
+
+            def send_each(client):
+                for name, value in report.items():
+                    client.gauge(name, value)
+
+            def send_batch(client):
+                client.gauges(report.items())
+
+            for name, maxudpsize, send in (
+                    ('unbatched', 512, send_each),
+                    ('batched', 512, send_batch),
+                    ('batched', 1432, send_batch),
+                    ('batched', 8932, send_batch)):
+                sink = UDPSink()
+                client = statsd._StatsClient(
+                    '127.0.0.1', port=sink.port, maxudpsize=maxudpsize)
+                try:
+                    send(client)
+                    sink.wait(client)
+                finally:
+                    client.close()
+                print("%4d vms, %d metrics, %s maxudpsize=%d: "
+                      "%d packets, %d bytes"
+                      % (vms, len(report), name, maxudpsize,
+                         len(sink.messages), sink.bytes))
+                self.assertEqual(sorted(sink.lines()),
+                                 expected_lines(report))
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.reports = []
+        self.closed = False
+
+    def gauges(self, items):
+        self.reports.append(dict(items))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class AggregatorTest(TestCaseBase):
+
+    def setUp(self):
+        self.client = FakeClient()
+        self.clock = FakeClock()
+        self.aggregator = statsd._Aggregator(
+            self.client, 10, clock=self.clock)
+
+    def test_wait_for_interval(self):
+        self.aggregator.gauges([('a', 1)])
+        self.clock.now = 9
+        self.aggregator.gauges([('b', 2)])
+        self.assertEqual(self.client.reports, [])
+
+    def test_send_last_values(self):
+        self.aggregator.gauges([('a', 1), ('b', 1)])
+        self.clock.now = 5
+        self.aggregator.gauges([('a', 2)])
+        self.clock.now = 10
+        self.aggregator.gauges([('c', 3)])
+        self.assertEqual(self.client.reports, [{'a': 2, 'b': 1, 'c': 3}])
+
+    def test_next_interval(self):
+        self.clock.now = 10
+        self.aggregator.gauges([('a', 1)])
+        self.clock.now = 15
+        self.aggregator.gauges([('a', 2)])
+        self.clock.now = 20
+        self.aggregator.gauges([('b', 3)])
+        self.assertEqual(self.client.reports, [{'a': 1}, {'a': 2, 'b': 3}])
+
+    def test_close_flushes(self):
+        self.aggregator.gauges([('a', 1)])
+        self.aggregator.close()
+        self.assertEqual(self.client.reports, [{'a': 1}])
+        self.assertTrue(self.client.closed)
@@ -76,7 +76,7 @@ def tmp_repo(tmpdir, monkeypatch, tmp_fs):
 
     # Patch multipath discovery and resize
     monkeypatch.setattr(multipath, "rescan", lambda: None)
-    monkeypatch.setattr(multipath, "resize_devices", lambda: None)
+    monkeypatch.setattr(multipath, "resize_devices", lambda guids=None: None)
 
     # Patch the resource manager.
     manager = rm._ResourceManager()
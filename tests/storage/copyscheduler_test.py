@@ -0,0 +1,107 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+import threading
+
+import pytest
+
+from vdsm.storage import copyscheduler
+
+
+class Tracker(object):
+    """
+    Track the maximum number of concurrent copies.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def __exit__(self, *args):
+        with self._lock:
+            self.running -= 1
+
+
+def run_copies(limiter, sd_ids_list, duration=0.05):
+    tracker = Tracker()
+    done = threading.Event()
+
+    def copy(sd_ids):
+        with limiter.slot(sd_ids):
+            with tracker:
+                done.wait(duration)
+
+    threads = [threading.Thread(target=copy, args=(sd_ids,))
+               for sd_ids in sd_ids_list]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return tracker.max_running
+
+
+def test_host_limit():
+    limiter = copyscheduler.Limiter(max_workers=2, max_domain_workers=4)
+    sd_ids_list = [("src-%d" % i, "dst-%d" % i) for i in range(6)]
+    assert run_copies(limiter, sd_ids_list) == 2
+
+
+def test_domain_limit():
+    limiter = copyscheduler.Limiter(max_workers=6, max_domain_workers=1)
+    sd_ids_list = [("src", "dst-%d" % i) for i in range(6)]
+    assert run_copies(limiter, sd_ids_list) == 1
+
+
+def test_different_domains():
+    limiter = copyscheduler.Limiter(max_workers=4, max_domain_workers=1)
+    sd_ids_list = [("src-%d" % i, "dst-%d" % i) for i in range(4)]
+    assert run_copies(limiter, sd_ids_list) == 4
+
+
+def test_same_domain():
+    # Copying inside a domain uses one domain slot.
+    limiter = copyscheduler.Limiter(max_workers=2, max_domain_workers=1)
+    assert run_copies(limiter, [("sd", "sd")]) == 1
+
+
+def test_release_on_error():
+    limiter = copyscheduler.Limiter(max_workers=1, max_domain_workers=1)
+    with pytest.raises(RuntimeError):
+        with limiter.slot(("src", "dst")):
+            raise RuntimeError("copy failed")
+    assert run_copies(limiter, [("src", "dst")]) == 1
+
+
+@pytest.mark.parametrize("max_workers, max_domain_workers", [
+    (0, 1),
+    (1, 0),
+])
+def test_limiter_invalid(max_workers, max_domain_workers):
+    with pytest.raises(ValueError):
+        copyscheduler.Limiter(max_workers, max_domain_workers)
@@ -390,6 +390,93 @@ class TestExtendMessage:
         assert spm_mailer.msg.callback is None
 
 
+class TestExtendQueue:
+
+    def test_priority(self):
+        q = sm.ExtendQueue()
+        for vol_id, priority in [("a", 30), ("b", 10), ("c", 20)]:
+            vol_data = volume_data(make_uuid())
+            vol_data["priority"] = priority
+            vol_data["name"] = vol_id
+            q.put(sm.SPM_Extend_Message(vol_data, GiB))
+
+        names = [q.get(block=False).volumeData["name"] for _ in range(3)]
+        assert names == ["b", "c", "a"]
+
+    def test_no_priority_first(self):
+        q = sm.ExtendQueue()
+        vol_data = volume_data(make_uuid())
+        vol_data["priority"] = 10
+        q.put(sm.SPM_Extend_Message(vol_data, GiB))
+        urgent = sm.SPM_Extend_Message(volume_data(make_uuid()), GiB)
+        q.put(urgent)
+
+        assert q.get(block=False) is urgent
+
+    def test_fifo_same_priority(self):
+        q = sm.ExtendQueue()
+        msgs = [sm.SPM_Extend_Message(volume_data(make_uuid()), GiB)
+                for _ in range(3)]
+        for msg in msgs:
+            q.put(msg)
+
+        assert [q.get(block=False) for _ in range(3)] == msgs
+
+    @pytest.mark.parametrize("sizes", [(GiB, 2 * GiB), (2 * GiB, GiB)])
+    def test_merge_same_volume(self, sizes):
+        q = sm.ExtendQueue()
+        calls = []
+        first = volume_data()
+        first["priority"] = 20
+        q.put(sm.SPM_Extend_Message(
+            first, sizes[0], lambda vol_data: calls.append("first")))
+        second = volume_data()
+        second["priority"] = 10
+        q.put(sm.SPM_Extend_Message(
+            second, sizes[1], lambda vol_data: calls.append("second")))
+
+        assert q.qsize() == 1
+        msg = q.get(block=False)
+        assert msg.newSize == 2 * GiB
+        assert msg.priority == 10
+
+        for callback, vol_data in msg.callbacks():
+            callback(vol_data)
+        assert sorted(calls) == ["first", "second"]
+
+        with pytest.raises(sm.queue.Empty):
+            q.get(block=False)
+
+    def test_get_timeout(self):
+        q = sm.ExtendQueue()
+        start = time.monotonic()
+        with pytest.raises(sm.queue.Empty):
+            q.get(block=True, timeout=0.1)
+        assert time.monotonic() - start >= 0.1
+
+    def test_get_wakeup(self):
+        q = sm.ExtendQueue()
+        msg = sm.SPM_Extend_Message(volume_data(), GiB)
+        t = threading.Timer(0.1, q.put, args=(msg,))
+        t.start()
+        try:
+            assert q.get(block=True, timeout=MAILER_TIMEOUT) is msg
+        finally:
+            t.join()
+
+    def test_stats(self):
+        q = sm.ExtendQueue()
+        q.put(sm.SPM_Extend_Message(volume_data(), GiB))
+        q.put(sm.SPM_Extend_Message(volume_data(), GiB))
+        info = sm.stats()
+        assert info["queued"] == 1
+        assert info["merged"] >= 1
+        assert "latency" in info
+
+        q.get(block=False)
+        assert sm.stats()["queued"] == 0
+
+
 class TestValidation:
 
     def test_empty_mailbox(self):
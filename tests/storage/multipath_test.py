@@ -156,3 +156,95 @@ def test_scsi_id_fails(fake_scsi_id):
 
     scsi_serial = multipath.get_scsi_serial("fake_device")
     assert scsi_serial == ""
+
+
+@pytest.fixture
+def fake_sys_block(tmpdir, monkeypatch):
+    sys_block = tmpdir.mkdir("block")
+    monkeypatch.setattr(multipath, "SYS_BLOCK", str(sys_block))
+    monkeypatch.setattr(multipath.iscsi, "devIsiSCSI", lambda dev: False)
+    return tmpdir
+
+
+def make_path(root, name, target, vendor="vendor"):
+    devdir = root.join("devices", target, name)
+    devdir.join("device", "scsi_disk", target).ensure(dir=True)
+    devdir.join("device", "vendor").write(vendor + "\n")
+    devdir.join("device", "model").write("model\n")
+    devdir.join("device", "rev").write("1.0\n")
+    devdir.join("queue", "logical_block_size").write("512\n", ensure=True)
+    devdir.join("queue", "physical_block_size").write("4096\n")
+    link = root.join("block", name)
+    if link.check(link=1):
+        link.remove()
+    link.mksymlinkto(devdir)
+
+
+def test_device_cache_path(fake_sys_block):
+    make_path(fake_sys_block, "sdb", "1:0:0:3")
+    cache = multipath.DeviceCache()
+    assert cache.path("sdb") == {
+        "vendor": "vendor",
+        "product": "model",
+        "fwrev": "1.0",
+        "logicalblocksize": "512",
+        "physicalblocksize": "4096",
+        "lun": "3",
+        "type": multipath.DEV_FCP,
+        "session": None,
+    }
+
+
+def test_device_cache_path_cached(fake_sys_block):
+    make_path(fake_sys_block, "sdb", "1:0:0:3")
+    cache = multipath.DeviceCache()
+    cache.path("sdb")
+    fake_sys_block.join("devices", "1:0:0:3", "sdb", "device",
+                        "vendor").write("changed\n")
+    assert cache.path("sdb")["vendor"] == "vendor"
+
+    cache.invalidate()
+    assert cache.path("sdb")["vendor"] == "changed"
+
+
+def test_device_cache_path_reused(fake_sys_block):
+    make_path(fake_sys_block, "sdb", "1:0:0:3")
+    cache = multipath.DeviceCache()
+    assert cache.path("sdb")["lun"] == "3"
+
+    # Path removed and the name reused for another LUN.
+    make_path(fake_sys_block, "sdb", "1:0:0:4", vendor="other")
+    path = cache.path("sdb")
+    assert path["lun"] == "4"
+    assert path["vendor"] == "other"
+
+
+def test_device_cache_path_incomplete(fake_sys_block):
+    make_path(fake_sys_block, "sdb", "1:0:0:3")
+    vendor = fake_sys_block.join("devices", "1:0:0:3", "sdb", "device",
+                                 "vendor")
+    vendor.remove()
+    cache = multipath.DeviceCache()
+    assert cache.path("sdb")["vendor"] == ""
+
+    # Incomplete info is not cached.
+    vendor.write("vendor\n")
+    assert cache.path("sdb")["vendor"] == "vendor"
+
+
+def test_device_cache_serial(monkeypatch):
+    calls = []
+
+    def get_scsi_serial(dmId):
+        calls.append(dmId)
+        return "serial-" + dmId
+
+    monkeypatch.setattr(multipath, "get_scsi_serial", get_scsi_serial)
+    cache = multipath.DeviceCache()
+    assert cache.serial("guid", "dm-1") == "serial-dm-1"
+    assert cache.serial("guid", "dm-1") == "serial-dm-1"
+    assert calls == ["dm-1"]
+
+    cache.prune([], [])
+    assert cache.serial("guid", "dm-1") == "serial-dm-1"
+    assert calls == ["dm-1", "dm-1"]
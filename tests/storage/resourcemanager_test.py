@@ -450,6 +450,46 @@ class TestResourceManager:
         res1.release()
         res2.release()
 
+    def testStatsSharedFastPath(self, tmp_manager):
+        res1 = rm.acquireResource("storage", "resource", rm.SHARED)
+        res2 = rm.acquireResource("storage", "resource", rm.SHARED)
+        res1.release()
+        res2.release()
+
+        stats = rm.stats()["storage"]
+        assert stats["requests"] == 2
+        assert stats["fast_path"] == 1
+        assert stats["queued"] == 0
+        assert stats["wait"]["count"] == 2
+        # Both users released the resource at once.
+        assert stats["hold"]["count"] == 1
+
+    def testStatsContended(self, tmp_manager):
+        exclusive1 = rm.acquireResource("storage", "resource", rm.EXCLUSIVE)
+        resources = []
+
+        def callback(req, res):
+            resources.append(res)
+
+        req = rm._registerResource(
+            "storage", "resource", rm.EXCLUSIVE, callback)
+        time.sleep(0.01)
+        exclusive1.release()
+        req.wait()
+        resources[0].release()
+
+        stats = rm.stats()["storage"]
+        assert stats["requests"] == 2
+        assert stats["fast_path"] == 0
+        assert stats["queued"] == 1
+        assert stats["wait"]["max"] >= 0.01
+        assert stats["hold"]["count"] == 2
+
+    def testStatsAllNamespaces(self, tmp_manager):
+        assert set(rm.stats()) == {
+            "storage", "null", "string", "error", "switchfail", "crashy",
+            "failAfterSwitch"}
+
     def testResourceStatuses(self, tmp_manager):
         status = rm._getResourceStatus("storage", "resource")
         assert status == rm.STATUS_FREE
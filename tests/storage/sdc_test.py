@@ -0,0 +1,173 @@
+#
+# Copyright 2020 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+#
+# Refer to the README and COPYING files for full details of the license
+#
+
+from __future__ import absolute_import
+from __future__ import division
+
+from collections import namedtuple
+
+import pytest
+
+from vdsm.storage import exception as se
+from vdsm.storage import lvm
+from vdsm.storage import multipath
+from vdsm.storage import sdc
+
+FakeVG = namedtuple("FakeVG", "pv_name,partial")
+
+
+class FakeDomain(object):
+
+    def __init__(self, sdUUID):
+        self.sdUUID = sdUUID
+
+
+class FakeStorage(object):
+    """
+    Record storage refresh operations, and simulate block domains VGs.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.vgs = {}
+
+    def rescan(self):
+        self.calls.append(("rescan",))
+
+    def resize_devices(self, guids=None):
+        self.calls.append(
+            ("resize", None if guids is None else sorted(guids)))
+
+    def invalidateCache(self):
+        self.calls.append(("invalidateCache",))
+
+    def invalidateVG(self, vgName, invalidateLVs=True, invalidatePVs=False):
+        self.calls.append(("invalidateVG", vgName))
+
+    def find(self, sdUUID):
+        if sdUUID not in self.vgs:
+            raise se.StorageDomainDoesNotExist(sdUUID)
+        return FakeDomain(sdUUID)
+
+    def vg(self, domain):
+        return self.vgs[domain.sdUUID]
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FakeStorage()
+    monkeypatch.setattr(multipath, "rescan", storage.rescan)
+    monkeypatch.setattr(multipath, "resize_devices", storage.resize_devices)
+    monkeypatch.setattr(lvm, "invalidateCache", storage.invalidateCache)
+    monkeypatch.setattr(lvm, "invalidateVG", storage.invalidateVG)
+    return storage
+
+
+@pytest.fixture
+def cache(storage):
+    cache = sdc.StorageDomainCache()
+    cache._blockDomainVG = storage.vg
+    cache.knownSDs["sd-1"] = storage.find
+    return cache
+
+
+FULL_REFRESH = [("rescan",), ("resize", None), ("invalidateCache",)]
+
+
+def test_unknown_domain_full_refresh(cache, storage):
+    storage.vgs["sd-1"] = FakeVG(("/dev/mapper/a", "/dev/mapper/b"),
+                                 lvm.VG_OK)
+    cache.produce("sd-1")
+    assert storage.calls == FULL_REFRESH
+
+
+def test_known_domain_targeted_refresh(cache, storage):
+    storage.vgs["sd-1"] = FakeVG(("/dev/mapper/a", "/dev/mapper/b"),
+                                 lvm.VG_OK)
+    cache.produce("sd-1")
+    del storage.calls[:]
+
+    cache.manuallyRemoveDomain("sd-1")
+    cache.invalidateStorage()
+    cache.produce("sd-1")
+
+    assert storage.calls == [
+        ("resize", ["a", "b"]),
+        ("invalidateVG", "sd-1"),
+    ]
+
+
+def test_known_domain_missing_devices(cache, storage):
+    storage.vgs["sd-1"] = FakeVG(("/dev/mapper/a",), lvm.VG_OK)
+    cache.produce("sd-1")
+    del storage.calls[:]
+
+    # The domain was extended with a new device not visible yet.
+    storage.vgs["sd-1"] = FakeVG(("/dev/mapper/a", "[unknown]"),
+                                 lvm.VG_PARTIAL)
+    cache.manuallyRemoveDomain("sd-1")
+    cache.invalidateStorage()
+    cache.produce("sd-1")
+
+    assert storage.calls == [
+        ("resize", ["a"]),
+        ("invalidateVG", "sd-1"),
+    ] + FULL_REFRESH
+
+
+def test_known_domain_not_found(cache, storage):
+    storage.vgs["sd-1"] = FakeVG(("/dev/mapper/a",), lvm.VG_OK)
+    cache.produce("sd-1")
+    del storage.calls[:]
+
+    del storage.vgs["sd-1"]
+    cache.manuallyRemoveDomain("sd-1")
+    cache.invalidateStorage()
+    with pytest.raises(se.StorageDomainDoesNotExist):
+        cache.produce("sd-1")
+
+    assert storage.calls == [
+        ("resize", ["a"]),
+        ("invalidateVG", "sd-1"),
+    ] + FULL_REFRESH
+
+
+def test_refresh_clears_devices(cache, storage):
+    storage.vgs["sd-1"] = FakeVG(("/dev/mapper/a",), lvm.VG_OK)
+    cache.produce("sd-1")
+    del storage.calls[:]
+
+    cache.refresh()
+    del storage.calls[:]
+    cache.invalidateStorage()
+    cache.produce("sd-1")
+
+    assert storage.calls == FULL_REFRESH
+
+
+def test_cached_domain_no_refresh(cache, storage):
+    storage.vgs["sd-1"] = FakeVG(("/dev/mapper/a",), lvm.VG_OK)
+    cache.produce("sd-1")
+    del storage.calls[:]
+
+    cache.invalidateStorage()
+    cache.produce("sd-1")
+
+    assert storage.calls == []
@@ -21,7 +21,13 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import threading
+import time
+
+import pytest
+
 from monkeypatch import MonkeyPatch
+from testlib import make_config
 from testlib import permutations, expandPermutations
 from testlib import VdsmTestCase
 from vdsm.storage import storageServer
@@ -293,3 +299,106 @@ class TestGlusterFSNotAccessibleConnection(VdsmTestCase):
         gluster = GlusterFSConnection(id="id", spec="192.168.122.1:/music",
                                       options=userMountOptions)
         self.assertEqual(gluster.options, userMountOptions)
+
+
+class Tracker(object):
+    """
+    Track the maximum number of concurrent connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def __exit__(self, *args):
+        with self._lock:
+            self.running -= 1
+
+
+class TrackedMountConnection(MountConnection):
+
+    def __init__(self, id, spec, tracker, error=None):
+        super(TrackedMountConnection, self).__init__(
+            id, spec, mountClass=FakeMount)
+        self.tracker = tracker
+        self.error = error
+        self.connected = False
+
+    def connect(self):
+        with self.tracker:
+            time.sleep(0.05)
+            if self.error:
+                raise self.error
+            self.connected = True
+
+
+@pytest.fixture
+def connect_config(monkeypatch):
+    monkeypatch.setattr(storageServer, "config", make_config([
+        ("irs", "connect_max_workers", "4"),
+        ("irs", "connect_max_server_workers", "2"),
+    ]))
+
+
+def test_connect_all_order(connect_config):
+    tracker = Tracker()
+    error = RuntimeError("mount failed")
+    connections = [
+        TrackedMountConnection("1", "server1:/export1", tracker),
+        TrackedMountConnection("2", "server2:/export2", tracker, error=error),
+        TrackedMountConnection("3", "server3:/export3", tracker),
+    ]
+    results = storageServer.connect_all(connections)
+
+    assert [r.connection for r in results] == connections
+    assert [r.error for r in results] == [None, error, None]
+    assert all(r.elapsed >= 0 for r in results)
+    assert connections[0].connected
+    assert not connections[1].connected
+    assert connections[2].connected
+
+
+def test_connect_all_max_workers(connect_config):
+    tracker = Tracker()
+    connections = [
+        TrackedMountConnection(str(i), "server%d:/export" % i, tracker)
+        for i in range(8)]
+    storageServer.connect_all(connections)
+    assert tracker.max_running == 4
+
+
+def test_connect_all_max_server_workers(connect_config):
+    tracker = Tracker()
+    connections = [
+        TrackedMountConnection(str(i), "server:/export%d" % i, tracker)
+        for i in range(8)]
+    storageServer.connect_all(connections)
+    assert tracker.max_running == 2
+
+
+def test_connect_all_prepare(connect_config):
+    tracker = Tracker()
+    error = RuntimeError("prepare failed")
+    connections = [
+        TrackedMountConnection("1", "server:/export1", tracker),
+        TrackedMountConnection("2", "server:/export2", tracker),
+    ]
+
+    def prepare(con):
+        if con.id == "2":
+            raise error
+
+    results = storageServer.connect_all(connections, prepare=prepare)
+    assert [r.error for r in results] == [None, error]
+    assert connections[0].connected
+    assert not connections[1].connected
+
+
+def test_connect_all_empty(connect_config):
+    assert storageServer.connect_all([]) == []
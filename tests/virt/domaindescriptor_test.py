@@ -24,6 +24,7 @@ from __future__ import division
 
 from vdsm.common import xmlutils
 from vdsm.virt.domain_descriptor import (DomainDescriptor,
+                                         DomainXMLCache,
                                          MutableDomainDescriptor)
 from testlib import VdsmTestCase, XMLTestCase, permutations, expandPermutations
 
@@ -239,3 +240,82 @@ class DomainDescriptorTests(XMLTestCase):
         desc = DomainDescriptor(xml_data)
         reboot_config = desc.on_reboot_config()
         assert reboot_config == expected
+
+
+class FakeDomain(object):
+
+    def __init__(self, xml):
+        self.xml = xml
+        self.calls = 0
+
+    def XMLDesc(self, flags=0):
+        self.calls += 1
+        return self.xml
+
+
+class DomainXMLCacheTests(VdsmTestCase):
+
+    def test_cached(self):
+        cache = DomainXMLCache()
+        dom = FakeDomain(SOME_DEVICES)
+        desc = cache.get(dom)
+        assert desc.xml == SOME_DEVICES
+        assert cache.get(dom) is desc
+        assert cache.xml(dom) == SOME_DEVICES
+        assert dom.calls == 1
+        assert cache.stats() == {"hits": 2, "fetches": 1, "parses": 1}
+
+    def test_invalidate(self):
+        cache = DomainXMLCache()
+        dom = FakeDomain(SOME_DEVICES)
+        cache.get(dom)
+        dom.xml = REORDERED_DEVICES
+        cache.invalidate()
+        assert cache.xml(dom) == REORDERED_DEVICES
+        assert dom.calls == 2
+
+    def test_readonly_call(self):
+        cache = DomainXMLCache()
+        dom = FakeDomain(SOME_DEVICES)
+        cache.get(dom)
+        cache.on_call("blockInfo")
+        cache.get(dom)
+        assert dom.calls == 1
+
+    def test_modifying_call(self):
+        cache = DomainXMLCache()
+        dom = FakeDomain(SOME_DEVICES)
+        cache.get(dom)
+        cache.on_call("attachDevice")
+        cache.get(dom)
+        assert dom.calls == 2
+
+    def test_other_domain(self):
+        cache = DomainXMLCache()
+        cache.get(FakeDomain(SOME_DEVICES))
+        dom = FakeDomain(REORDERED_DEVICES)
+        assert cache.xml(dom) == REORDERED_DEVICES
+        assert dom.calls == 1
+
+    def test_invalidated_while_fetching(self):
+        cache = DomainXMLCache()
+        dom = FakeDomain(SOME_DEVICES)
+        orig_xmldesc = dom.XMLDesc
+
+        def xmldesc(flags=0):
+            xml = orig_xmldesc(flags)
+            cache.invalidate()
+            return xml
+
+        dom.XMLDesc = xmldesc
+        cache.get(dom)
+        dom.XMLDesc = orig_xmldesc
+        # The XML fetched before the invalidation must not be cached.
+        cache.get(dom)
+        assert dom.calls == 2
+
+    def test_parse(self):
+        cache = DomainXMLCache()
+        desc = cache.parse(SOME_DEVICES)
+        assert desc.xml == SOME_DEVICES
+        assert cache.stats() == {"hits": 0, "fetches": 0, "parses": 1}
@@ -29,11 +29,14 @@ import libvirt
 
 from vdsm import utils
 from vdsm.common import response
+from vdsm.common.histogram import Histogram
 from vdsm.common.units import MiB, GiB
+from vdsm.virt.domain_descriptor import DomainXMLCache
 from vdsm.virt.vmdevices.storage import Drive, DISK_TYPE, BLOCK_THRESHOLD
 from vdsm.virt.vmdevices import hwclass
 from vdsm.virt.utils import TimedAcquireLock
 from vdsm.virt import drivemonitor
+from vdsm.virt import metadata
 from vdsm.virt import vm
 from vdsm.virt import vmstatus
 
@@ -145,6 +148,7 @@ class DiskExtensionTestBase(VdsmTestCase):
             assert drive_obj.volumeID == volInfo['volumeID']
 
 
+@expandPermutations
 class TestDiskExtensionWithPolling(DiskExtensionTestBase):
 
     def test_no_extension_allocation_below_watermark(self):
@@ -245,6 +249,34 @@ class TestDiskExtensionWithPolling(DiskExtensionTestBase):
         assert testvm.lastStatus == vmstatus.UP
         assert dom.info()[0] == libvirt.VIR_DOMAIN_RUNNING
 
+    @permutations([
+        # paused, resumed
+        (True, 1),
+        (False, 0),
+    ])
+    def test_resume_latency(self, paused, resumed):
+        resume_latency = Histogram()
+        with make_env(
+                events_enabled=False,
+                drive_infos=self.DRIVE_INFOS) as (testvm, dom, drives), \
+                MonkeyPatchScope([
+                    (drivemonitor, '_resume_latency', resume_latency),
+                ]):
+            if paused:
+                testvm.pause()
+
+            vda = dom.block_info['/virtio/0']
+            vda['allocation'] = 0 * MiB
+            vdb = dom.block_info['/virtio/1']
+            vdb['allocation'] = allocation_threshold_for_resize_mb(
+                vdb, drives[1]) + 1 * MiB
+
+            testvm.monitor_drives()
+            simulate_extend_callback(testvm.cif.irs, extension_id=0)
+
+        # Only extensions resuming a paused VM are measured.
+        assert resume_latency.info()["count"] == resumed
+
     # TODO: add test with storage failures in the extension flow
 
 
@@ -565,6 +597,8 @@ class FakeVM(vm.Vm):
         self.cif = cif
         self.drive_monitor = drivemonitor.DriveMonitor(self, self.log)
         self._dom = dom
+        self._xml_cache = DomainXMLCache()
+        self._md_syncer = metadata.Syncer(self._write_metadata, 0)
         self._devices = {hwclass.DISK: disks}
 
         # needed for pause()/cont()
@@ -615,6 +649,12 @@ class FakeDomain(object):
         self._state = (libvirt.VIR_DOMAIN_PAUSED, )
 
     def resume(self):
+        if self._state[0] == libvirt.VIR_DOMAIN_RUNNING:
+            msg = "Requested operation is not valid: domain is not paused"
+            e = libvirt.libvirtError(msg)
+            e.err = [libvirt.VIR_ERR_OPERATION_INVALID,
+                     libvirt.VIR_FROM_QEMU, msg]
+            raise e
         self._state = (libvirt.VIR_DOMAIN_RUNNING, )
 
     def info(self):
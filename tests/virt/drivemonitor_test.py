@@ -28,6 +28,7 @@ import logging
 from vdsm.common.units import MiB, GiB
 from vdsm.virt.vmdevices import storage
 from vdsm.virt import drivemonitor
+from vdsm.virt import sampling
 
 from monkeypatch import MonkeyPatchScope
 
@@ -443,6 +444,140 @@ class TestDrivemonitor(VdsmTestCase):
         found = [drv.name for drv in mon.monitored_drives()]
         assert found == expected
 
+    def test_extend_priority_assumed_rate(self):
+        with make_env(events_enabled=True) as (mon, vm):
+            vda = make_drive(self.log, index=0, iface='virtio')
+            free = 10 * drivemonitor.ASSUMED_WRITE_RATE
+            priority = mon.extend_priority(vda, GiB, GiB + free, now=100)
+            assert priority == 10
+
+    def test_extend_priority_measured_rate(self):
+        with make_env(events_enabled=True) as (mon, vm):
+            vda = make_drive(self.log, index=0, iface='virtio')
+            mon.extend_priority(vda, GiB, 2 * GiB, now=100)
+            # Wrote 256 MiB in 2 seconds: full in 3 seconds.
+            priority = mon.extend_priority(
+                vda, GiB + 256 * MiB, GiB + 640 * MiB, now=102)
+            assert priority == 3
+
+    def test_extend_priority_new_volume(self):
+        with make_env(events_enabled=True) as (mon, vm):
+            vda = make_drive(self.log, index=0, iface='virtio')
+            mon.extend_priority(vda, GiB, 2 * GiB, now=100)
+            # After a snapshot, samples of the old volume are ignored.
+            vda.volumeID = 'volume_new'
+            free = drivemonitor.ASSUMED_WRITE_RATE
+            priority = mon.extend_priority(vda, 0, free, now=101)
+            assert priority == 1
+
+    def test_extend_priority_full(self):
+        with make_env(events_enabled=True) as (mon, vm):
+            vda = make_drive(self.log, index=0, iface='virtio')
+            assert mon.extend_priority(vda, 2 * GiB, GiB, now=100) == 0
+
+    def test_writing(self):
+        with make_env(events_enabled=True) as (mon, vm):
+            assert not mon.writing(now=100)
+            vda = make_drive(self.log, index=0, iface='virtio')
+            mon.extend_priority(vda, GiB, 2 * GiB, now=100)
+            assert mon.writing(now=100 + drivemonitor.WRITING_WINDOW - 1)
+            assert not mon.writing(now=100 + drivemonitor.WRITING_WINDOW)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def bulk_stats(path='/path/to/volume', physical=2 * GiB):
+    return {
+        'block.count': 2,
+        'block.0.name': 'vda',
+        'block.0.path': path,
+        'block.0.capacity': 10 * GiB,
+        'block.0.allocation': GiB,
+        'block.0.physical': physical,
+        # Missing watermarks, for example for a cdrom.
+        'block.1.name': 'hdc',
+        'block.1.path': '',
+    }
+
+
+class TestWatermarkCollector(VdsmTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = sampling.StatsCache(clock=self.clock)
+        self.cache.add('vm-id')
+        self.collector = drivemonitor.WatermarkCollector(self.cache, 15)
+        self.drive = make_drive(logging.getLogger('test'), 0,
+                                diskType=storage.DISK_TYPE.BLOCK)
+        self.drive.apparentsize = 2 * GiB
+
+    def put(self, stats):
+        # The cache needs two samples.
+        for i in range(2):
+            self.cache.put({'vm-id': stats}, self.clock())
+
+    def test_bulk(self):
+        self.put(bulk_stats())
+        watermarks = self.collector.watermarks('vm-id', True)
+        assert self.collector.get(watermarks, self.drive) == \
+            storage.BlockInfo(10 * GiB, GiB, 2 * GiB)
+        assert self.collector.stats() == {'bulk': 1, 'block_info': 0}
+
+    def test_missing_watermarks(self):
+        self.put(bulk_stats())
+        watermarks = self.collector.watermarks('vm-id', True)
+        assert 'hdc' not in watermarks
+
+    def test_no_sample(self):
+        watermarks = self.collector.watermarks('vm-id', True)
+        assert self.collector.get(watermarks, self.drive) is None
+        assert self.collector.stats() == {'bulk': 0, 'block_info': 1}
+
+    def test_sample_too_old(self):
+        self.put(bulk_stats())
+        self.clock.now += 16
+        watermarks = self.collector.watermarks('vm-id', True)
+        assert self.collector.get(watermarks, self.drive) is None
+
+    def test_disabled(self):
+        self.put(bulk_stats())
+        collector = drivemonitor.WatermarkCollector(self.cache, 0)
+        watermarks = collector.watermarks('vm-id', True)
+        assert collector.get(watermarks, self.drive) is None
+
+    def test_events_disabled(self):
+        # Without block threshold events, watermarks must be fresh.
+        self.put(bulk_stats())
+        watermarks = self.collector.watermarks('vm-id', False)
+        assert watermarks == {}
+        assert self.collector.get(watermarks, self.drive) is None
+        assert self.collector.stats() == {'bulk': 0, 'block_info': 1}
+
+    def test_exceeded(self):
+        self.put(bulk_stats())
+        self.drive.threshold_state = storage.BLOCK_THRESHOLD.EXCEEDED
+        watermarks = self.collector.watermarks('vm-id', True)
+        assert self.collector.get(watermarks, self.drive) is None
+
+    def test_path_changed(self):
+        # Sampled before taking a snapshot.
+        self.put(bulk_stats(path='/path/to/old-volume'))
+        watermarks = self.collector.watermarks('vm-id', True)
+        assert self.collector.get(watermarks, self.drive) is None
+
+    def test_volume_extended(self):
+        # Sampled before extending the volume.
+        self.put(bulk_stats(physical=GiB))
+        watermarks = self.collector.watermarks('vm-id', True)
+        assert self.collector.get(watermarks, self.drive) is None
+
 
 class FakeVM(object):
 
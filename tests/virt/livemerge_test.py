@@ -29,10 +29,13 @@ import pytest
 
 from vdsm.common import response
 from vdsm.common import exception
+from vdsm.common import concurrent
 from vdsm.common import xmlutils
 
+from vdsm.virt import livemerge
 from vdsm.virt import metadata
 from vdsm.virt.domain_descriptor import DomainDescriptor
+from vdsm.virt.domain_descriptor import DomainXMLCache
 from vdsm.virt.livemerge import (
     JobNotReadyError,
     JobUnrecoverableError,
@@ -43,7 +46,7 @@ from vdsm.virt.livemerge import (
 from vdsm.virt.vm import Vm
 from vdsm.virt.vmdevices import storage
 
-from testlib import recorded, read_data, read_files
+from testlib import make_config, recorded, read_data, read_files
 
 from . import vmfakelib as fake
 
@@ -61,6 +64,17 @@ class FakeTime(object):
         return self.time
 
 
+@pytest.fixture(autouse=True)
+def poll_interval(monkeypatch):
+    # Most tests drive the jobs by polling libvirt on every query_jobs() call.
+    set_poll_interval(monkeypatch, 0)
+
+
+def set_poll_interval(monkeypatch, interval):
+    cfg = make_config([('vars', 'vm_block_job_poll_interval', str(interval))])
+    monkeypatch.setattr(livemerge, "config", cfg)
+
+
 @pytest.fixture
 def fake_time(monkeypatch):
     fake_time = FakeTime()
@@ -207,6 +221,7 @@ class RunningVM(Vm):
         self.id = self._domain.id
         self._md_desc = metadata.Descriptor.from_xml(
             config.xmls["00-before.xml"])
+        self._md_syncer = metadata.Syncer(self._write_metadata, 0)
 
         drive = config.values["drive"]
         self._devices = {
@@ -228,6 +243,7 @@ class RunningVM(Vm):
         self.conf["xml"] = config.xmls["00-before.xml"]
 
         self._external = False  # Used when syncing metadata.
+        self._xml_cache = DomainXMLCache()
         self._dom = FakeDomain(config)
         self.drive_monitor = FakeDriveMonitor()
         self._confLock = threading.Lock()
@@ -528,6 +544,253 @@ def test_active_merge(monkeypatch):
     assert vm.drive_monitor.enabled
 
 
+def test_active_merge_events(monkeypatch):
+    # Pivot completion must be detected by the block job event.
+    monkeypatch.setattr(CleanupThread, "WAIT_INTERVAL", TIMEOUT * 2)
+
+    config = Config('active-merge')
+    merge_params = config.values["merge_params"]
+    job_id = merge_params["jobUUID"]
+
+    vm = RunningVM(config)
+    vm.merge(**merge_params)
+    complete_extend(vm, config)
+
+    block_job = vm._dom.block_jobs["sda"]
+    block_job["cur"] = block_job["end"]
+    vm._dom.xml = config.xmls["02-commit-ready.xml"]
+
+    # Libvirt reports that the job is ready, starting pivot without
+    # querying the job.
+    vm.on_block_job_event(
+        "sda",
+        libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_ACTIVE_COMMIT,
+        libvirt.VIR_DOMAIN_BLOCK_JOB_READY)
+
+    persisted_job = parse_jobs(vm)[job_id]
+    assert persisted_job["state"] == Job.CLEANUP
+
+    aborted = vm._dom.aborted.wait(TIMEOUT)
+    assert aborted, "Timeout waiting for blockJobAbort() call"
+
+    # Libvirt updates the xml and reports that the job has completed.
+    vm._dom.xml = config.xmls["04-abort-ready.xml"]
+    vm.on_block_job_event(
+        "sda",
+        libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_ACTIVE_COMMIT,
+        libvirt.VIR_DOMAIN_BLOCK_JOB_COMPLETED)
+
+    # Cleanup untracks the job without query_jobs() calls.
+    wait_for_untrack(vm)
+    assert parse_jobs(vm) == {}
+
+    expected_volumes_chain = xml_chain(config.xmls["05-after.xml"])
+    assert metadata_chain(vm._dom.metadata) == expected_volumes_chain
+    assert vm.drive_monitor.enabled
+
+
+def test_merge_cancel_event():
+    config = Config('active-merge')
+    merge_params = config.values["merge_params"]
+
+    vm = RunningVM(config)
+    vm.merge(**merge_params)
+    complete_extend(vm, config)
+
+    # Simulate user aborting the block job from virsh.
+    vm._dom.blockJobAbort("sda")
+    vm.on_block_job_event(
+        "sda",
+        libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_ACTIVE_COMMIT,
+        libvirt.VIR_DOMAIN_BLOCK_JOB_CANCELED)
+
+    wait_for_untrack(vm)
+    assert parse_jobs(vm) == {}
+
+    drive = vm.getDiskDevices()[0]
+    assert drive.volumeID == config.values["drive"]["volumeID"]
+
+
+def test_untracked_block_job_event():
+    config = Config('active-merge')
+    vm = RunningVM(config)
+
+    # Events for jobs not started by vdsm are only logged.
+    vm.on_block_job_event(
+        "sda",
+        libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_COPY,
+        libvirt.VIR_DOMAIN_BLOCK_JOB_READY)
+
+    assert vm.query_jobs() == {}
+
+
+def test_poll_interval(monkeypatch, fake_time):
+    set_poll_interval(monkeypatch, 60)
+
+    config = Config('active-merge')
+    merge_params = config.values["merge_params"]
+    job_id = merge_params["jobUUID"]
+
+    vm = RunningVM(config)
+    vm.merge(**merge_params)
+    complete_extend(vm, config)
+
+    # The first query after starting the commit queries libvirt.
+    block_job = vm._dom.block_jobs["sda"]
+    assert vm.query_jobs()[job_id]["cur"] == "0"
+
+    # Until the poll interval expires, the last live info is reported.
+    cur = block_job["end"] // 2
+    vm._dom.block_jobs["sda"] = dict(block_job, cur=cur)
+    fake_time.time += 59
+    assert vm.query_jobs()[job_id]["cur"] == "0"
+
+    fake_time.time += 1
+    assert vm.query_jobs()[job_id]["cur"] == str(cur)
+
+
+def test_volume_chain_updated_without_event():
+    config = Config('active-merge')
+    vm = RunningVM(config)
+    drive = vm.getDiskDevices()[0]
+    alias = drive["alias"]
+
+    chain = vm.drive_get_actual_volume_chain([drive])[alias]
+    before = xml_chain(config.xmls["00-before.xml"])
+    assert sorted(e.uuid for e in chain) == sorted(
+        v["volumeID"] for v in before)
+
+    # Libvirt may update the XML after pivot without an event invalidating
+    # the cached XML, see CleanupThread._waitForXMLUpdate().
+    vm._dom.xml = config.xmls["05-after.xml"]
+    chain = vm.drive_get_actual_volume_chain([drive])[alias]
+    after = xml_chain(config.xmls["05-after.xml"])
+    assert sorted(e.uuid for e in chain) == sorted(
+        v["volumeID"] for v in after)
+    assert len(after) < len(before)
+
+
+def test_pivot_retry_updates_live_info(monkeypatch, fake_time):
+    set_poll_interval(monkeypatch, 60)
+
+    config = Config('active-merge')
+    merge_params = config.values["merge_params"]
+    job_id = merge_params["jobUUID"]
+
+    vm = RunningVM(config)
+    vm.merge(**merge_params)
+    complete_extend(vm, config)
+    assert vm.query_jobs()[job_id]["cur"] == "0"
+
+    block_job = vm._dom.block_jobs["sda"]
+    block_job["cur"] = block_job["end"]
+    vm._dom.xml = config.xmls["02-commit-ready.xml"]
+
+    # The first pivot attempt fails since the job is not ready.
+    block_job_abort = vm._dom.blockJobAbort
+
+    def blockJobAbort(drive, flags=0):
+        monkeypatch.setattr(vm._dom, "blockJobAbort", block_job_abort)
+        raise fake.Error(libvirt.VIR_ERR_BLOCK_COPY_ACTIVE)
+
+    monkeypatch.setattr(vm._dom, "blockJobAbort", blockJobAbort)
+
+    vm.on_block_job_event(
+        "sda",
+        libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_ACTIVE_COMMIT,
+        libvirt.VIR_DOMAIN_BLOCK_JOB_READY)
+    vm._drive_merger.wait_for_cleanup()
+    assert vm._drive_merger._cleanup_threads[job_id].state == \
+        CleanupThread.RETRY
+
+    # Retrying the cleanup queries the job before the poll interval expires,
+    # and pivots again.
+    assert vm.query_jobs()[job_id]["cur"] == str(block_job["end"])
+
+    aborted = vm._dom.aborted.wait(TIMEOUT)
+    assert aborted, "Timeout waiting for blockJobAbort() call"
+
+    vm._dom.xml = config.xmls["04-abort-ready.xml"]
+    vm.on_block_job_event(
+        "sda",
+        libvirt.VIR_DOMAIN_BLOCK_JOB_TYPE_ACTIVE_COMMIT,
+        libvirt.VIR_DOMAIN_BLOCK_JOB_COMPLETED)
+    wait_for_untrack(vm)
+
+    expected_volumes_chain = xml_chain(config.xmls["05-after.xml"])
+    assert metadata_chain(vm._dom.metadata) == expected_volumes_chain
+
+
+class EventDomain(FakeDomain):
+    """
+    Fake domain running commit and pivot like libvirt, and emitting block job
+    events from another thread.
+    """
+
+    def __init__(self, config, vm):
+        super().__init__(config)
+        self._vm = vm
+        self.queries = 0
+
+    def blockCommit(self, drive, base_target, top_target, bandwidth, flags=0):
+        super().blockCommit(drive, base_target, top_target, bandwidth,
+                            flags=flags)
+        job = self.block_jobs[drive]
+        job["cur"] = job["end"]
+        self.xml = self._config.xmls["02-commit-ready.xml"]
+        self._emit(drive, job["type"], libvirt.VIR_DOMAIN_BLOCK_JOB_READY)
+
+    def blockJobInfo(self, drive, flags=0):
+        self.queries += 1
+        return super().blockJobInfo(drive, flags=flags)
+
+    def blockJobAbort(self, drive, flags=0):
+        job = self.block_jobs[drive]
+        super().blockJobAbort(drive, flags=flags)
+        self.xml = self._config.xmls["04-abort-ready.xml"]
+        self._emit(drive, job["type"], libvirt.VIR_DOMAIN_BLOCK_JOB_COMPLETED)
+
+    def _emit(self, drive, job_type, job_status):
+        t = concurrent.thread(
+            self._vm.on_block_job_event, args=(drive, job_type, job_status))
+        t.start()
+
+
+def test_concurrent_merges_events(monkeypatch):
+    # Only events can complete the merges.
+    set_poll_interval(monkeypatch, 3600)
+    monkeypatch.setattr(CleanupThread, "WAIT_INTERVAL", TIMEOUT * 2)
+
+    config = Config('active-merge')
+    merge_params = config.values["merge_params"]
+
+    vms = []
+    for i in range(100):
+        vm = RunningVM(config)
+        vm._dom = EventDomain(config, vm)
+        vms.append(vm)
+
+    start = time.monotonic()
+
+    for vm in vms:
+        vm.merge(**merge_params)
+        complete_extend(vm, config)
+
+    for vm in vms:
+        wait_for_untrack(vm)
+
+    elapsed = time.monotonic() - start
+    log.info("Completed %d merges in %.3f seconds", len(vms), elapsed)
+
+    # Libvirt was not queried for the job status.
+    assert sum(vm._dom.queries for vm in vms) == 0
+
+    expected_volumes_chain = xml_chain(config.xmls["05-after.xml"])
+    for vm in vms:
+        assert parse_jobs(vm) == {}
+        assert metadata_chain(vm._dom.metadata) == expected_volumes_chain
+
+
 def test_internal_merge():
     config = Config('internal-merge')
     sd_id = config.values["drive"]["domainID"]
@@ -900,6 +1163,27 @@ def wait_for_cleanup(vm):
     log.info("No more jobs")
 
 
+def wait_for_untrack(vm):
+    deadline = time.monotonic() + TIMEOUT
+    while vm._drive_merger.has_jobs():
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timeout waiting for job untracking")
+        time.sleep(0.01)
+
+
+def complete_extend(vm, config):
+    """
+    Simulate base volume extension completion, starting the commit.
+    """
+    drive = config.values["drive"]
+    base_id = config.values["merge_params"]["baseVolUUID"]
+    _, vol_info, new_size, extend_callback = vm.cif.irs.extend_requests[0]
+    base_volume = vm.cif.irs.prepared_volumes[
+        (drive["domainID"], drive["imageID"], base_id)]
+    base_volume['apparentsize'] = new_size
+    extend_callback(vol_info)
+
+
 def xml_chain(xml):
     md = metadata.Descriptor.from_xml(xml)
     with md.device(devtype="disk", name="sda") as dev:
@@ -23,6 +23,7 @@ from __future__ import division
 from __future__ import print_function
 
 import logging
+import threading
 
 from vdsm.common import xmlutils
 from vdsm.virt.vmdevices import common
@@ -336,6 +337,30 @@ class DescriptorTests(XMLTestCase):
             expected_xml
         )
 
+    def test_dump_unchanged(self):
+        dom = FakeDomain()
+        assert self.md_desc.dump(dom)
+        dom.xml.clear()
+        assert not self.md_desc.dump(dom)
+        assert dom.xml == {}
+
+        with self.md_desc.values() as vals:
+            vals['foobar'] = 42
+        assert self.md_desc.dump(dom)
+        assert dom.xml != {}
+
+    def test_dump_after_load(self):
+        dom = FakeDomain()
+        self.md_desc.dump(dom)
+        self.md_desc.load(dom)
+        assert self.md_desc.dump(dom)
+
+    def test_dump_other_domain(self):
+        self.md_desc.dump(FakeDomain())
+        dom = FakeDomain()
+        assert self.md_desc.dump(dom)
+        assert dom.xml != {}
+
     def test_update_domain(self):
         # libvirt takes care of namespace massaging
         base_xml = u'''<vm>
@@ -970,6 +995,91 @@ _DRIVE_TRANSIENT_DISK_XML = u"""<?xml version="1.0" encoding="utf-8"?>
 </domain>"""
 
 
+class FakeWriter(object):
+
+    def __init__(self):
+        self.writes = 0
+        self.written = threading.Event()
+        self.error = None
+
+    def __call__(self):
+        if self.error:
+            raise self.error
+        self.writes += 1
+        self.written.set()
+        return True
+
+
+class TestSyncer:
+
+    def test_write_immediately(self):
+        writer = FakeWriter()
+        syncer = metadata.Syncer(writer, 0)
+        syncer.request()
+        assert writer.writes == 1
+        syncer.request()
+        assert writer.writes == 2
+        assert syncer.stats() == {"requested": 2, "written": 2}
+
+    def test_coalesce(self):
+        writer = FakeWriter()
+        syncer = metadata.Syncer(writer, 0.1)
+        for i in range(3):
+            syncer.request()
+        assert writer.writes == 0
+        assert writer.written.wait(5)
+        assert writer.writes == 1
+        assert syncer.stats() == {"requested": 3, "written": 1}
+
+    def test_flush(self):
+        writer = FakeWriter()
+        syncer = metadata.Syncer(writer, 60)
+        syncer.request()
+        syncer.request()
+        syncer.flush()
+        assert writer.writes == 1
+        # Nothing to write.
+        syncer.flush()
+        assert writer.writes == 1
+
+    def test_flush_error(self):
+        writer = FakeWriter()
+        syncer = metadata.Syncer(writer, 60)
+        syncer.request()
+        writer.error = libvirt.libvirtError("error")
+        with pytest.raises(libvirt.libvirtError):
+            syncer.flush()
+        # The metadata is still pending.
+        writer.error = None
+        syncer.flush()
+        assert writer.writes == 1
+
+    def test_write(self):
+        writer = FakeWriter()
+        syncer = metadata.Syncer(writer, 60)
+        syncer.request()
+        syncer.write()
+        # Pending request was written with this write.
+        assert writer.writes == 1
+        assert syncer.stats() == {"requested": 2, "written": 1}
+
+    def test_write_error(self):
+        writer = FakeWriter()
+        syncer = metadata.Syncer(writer, 60)
+        writer.error = libvirt.libvirtError("error")
+        with pytest.raises(libvirt.libvirtError):
+            syncer.write()
+        # The metadata is still pending.
+        writer.error = None
+        syncer.flush()
+        assert writer.writes == 1
+
+    def test_unchanged(self):
+        syncer = metadata.Syncer(lambda: False, 0)
+        syncer.request()
+        assert syncer.stats() == {"requested": 1, "written": 0}
+
+
 class MetadataFromXMLTests(XMLTestCase):
 
     def test_shared_from_metadata(self):
@@ -382,82 +382,140 @@ class PeriodicOperationTests(_PeriodicBase):
 VM_NUM = 5  # just a number, no special meaning
 
 
-VM_IDS = [
-    [()],
-    [((0,))],
-    [((0, 2))],
-    [((VM_NUM - 1,))],
-    [((VM_NUM - 2, VM_NUM - 1))]
-]
+class VmSchedulerTests(TestCaseBase):
 
-
-@expandPermutations
-class VmDispatcherTests(TestCaseBase):
+    PERIOD = 10
+    TICK = 0.5
 
     def setUp(self):
         self.cif = fake.ClientIF()
+        for i in range(VM_NUM):
+            vm_id = _fake_vm_id(i)
+            with self.cif.vm_container_lock:
+                self.cif.vmContainer[vm_id] = _FakeVM(vm_id, vm_id)
 
-        self._make_fake_vms()
+        self.clock = _FakeClock()
+        self.exc = _FakeExecutor()
+        self.sched = periodic.VmScheduler(self.cif.getVMs, self.exc)
 
         _Visitor.VMS.clear()
+        _Fast.VMS.clear()
+
+    def test_run_once_per_period(self):
+        self.sched.add(_Visitor, self.PERIOD)
+        ticks = self._run(self.PERIOD)
+
+        for vm_id in self.cif.getVMs():
+            assert _Visitor.VMS[vm_id] == 1
+
+        # VMs are spread over the period.
+        assert len(ticks) > 1
+
+        self._run(self.PERIOD)
+        for vm_id in self.cif.getVMs():
+            assert _Visitor.VMS[vm_id] == 2
+
+    def test_skip_not_required(self):
+        vm_id = _fake_vm_id(0)
+        self.cif.vmContainer[vm_id].monitorable = False
+        self.sched.add(_Visitor, self.PERIOD)
+        self._run(self.PERIOD)
+
+        assert vm_id not in _Visitor.VMS
+        info = self.sched.info()["_Visitor"]
+        assert info["vms"] == VM_NUM - 1
+        assert info["dispatched"] == VM_NUM - 1
+
+        # The VM is checked again in the next period.
+        self.cif.vmContainer[vm_id].monitorable = True
+        self._run(self.PERIOD)
+        assert _Visitor.VMS[vm_id] == 1
+        assert self.sched.info()["_Visitor"]["vms"] == VM_NUM
+
+    def test_required_fails(self):
+        vm_id = _fake_vm_id(0)
+        self.cif.vmContainer[vm_id].fail_required = True
+        self.sched.add(_Visitor, self.PERIOD)
+        self._run(self.PERIOD)
+
+        assert vm_id not in _Visitor.VMS
+        assert len(_Visitor.VMS) == VM_NUM - 1
+
+    def test_add_remove_vms(self):
+        self.sched.add(_Visitor, self.PERIOD)
+        self._run(self.PERIOD)
+
+        removed_id = _fake_vm_id(0)
+        added_id = _fake_vm_id(VM_NUM)
+        with self.cif.vm_container_lock:
+            del self.cif.vmContainer[removed_id]
+            self.cif.vmContainer[added_id] = _FakeVM(added_id, added_id)
+
+        self._run(self.PERIOD)
+
+        assert _Visitor.VMS[removed_id] == 1
+        assert _Visitor.VMS[added_id] == 1
+        assert self.sched.info()["_Visitor"]["vms"] == VM_NUM
+
+    def test_adaptive_interval(self):
+        self.sched.add(_Visitor, self.PERIOD)
+        self.sched.add(_Fast, self.PERIOD)
+        self._run(self.PERIOD * 2)
+
+        # The first run is spread over the period, and then the VM runs
+        # every half period.
+        for vm_id in self.cif.getVMs():
+            assert _Visitor.VMS[vm_id] == 2
+            assert _Fast.VMS[vm_id] in (3, 4)
 
-    @permutations(VM_IDS)
-    def test_dispatch(self, failed_ids):
-        for i in failed_ids:
-            with self.cif.vm_container_lock:
-                vm_id = _fake_vm_id(i)
-                self.cif.vmContainer[vm_id].fail_required = True
+    def test_dispatch_fails(self):
+        self.exc = _FakeExecutor(fail=True)
+        self.sched = periodic.VmScheduler(self.cif.getVMs, self.exc)
+        self.sched.add(_Nop, self.PERIOD)
 
-        self._check_dispatching(failed_ids)
+        skipped = []
+        with MonkeyPatchScope([(periodic, 'monotonic_time', self.clock)]):
+            for i in range(int(self.PERIOD / self.TICK)):
+                skipped.extend(self.sched())
+                self.clock.now += self.TICK
 
-    @permutations(VM_IDS)
-    def test_skip_not_monitorable(self, unmonitorable_ids):
-        for i in unmonitorable_ids:
-            with self.cif.vm_container_lock:
-                vm_id = _fake_vm_id(i)
-                self.cif.vmContainer[vm_id].monitorable = False
+        assert set(skipped) == set(self.cif.getVMs().keys())
+        assert self.sched.info()["_Nop"]["skipped"] == VM_NUM
 
-        self._check_dispatching(unmonitorable_ids)
+    def test_lag(self):
+        self.sched.add(_Visitor, self.PERIOD)
+        self._run(self.PERIOD)
 
-    def test_dispatch_fails(self):
+        info = self.sched.info()["_Visitor"]
+        assert info["lag"]["count"] == VM_NUM
+        # The fake executor runs the task immediately, but a VM may be due
+        # up to one tick before it is dispatched.
+        assert info["lag"]["max"] < self.TICK
+
+    def _run(self, duration):
         """
-        make sure that VmDispatcher attempts to dispatch work
-        for every registered VMs, and doesn't exit prematurely
-        when one dispatch() fails.
+        Tick for duration seconds, and return the times when tasks were
+        dispatched.
         """
-        exc = _FakeExecutor(fail=True)
-
-        op = periodic.VmDispatcher(
-            self.cif.getVMs, exc, _Nop, 0)
-
-        skipped = op()
+        ticks = set()
+        end = self.clock.now + duration
+        with MonkeyPatchScope([(periodic, 'monotonic_time', self.clock)]):
+            while self.clock.now < end:
+                attempts = self.exc.attempts
+                self.sched()
+                if self.exc.attempts > attempts:
+                    ticks.add(self.clock.now)
+                self.clock.now += self.TICK
+        return ticks
 
-        assert set(skipped) == set(self.cif.getVMs().keys())
-
-    def _check_dispatching(self, skip_ids):
-        op = periodic.VmDispatcher(
-            self.cif.getVMs, _FakeExecutor(), _Visitor, 0)
-        # we don't care about executor (hence the simplistic fake)
-        op()
 
-        for vm_id in skip_ids:
-            assert _fake_vm_id(vm_id) not in _Visitor.VMS
+class _FakeClock(object):
 
-        vms = self.cif.getVMs()
-
-        expected = (
-            set(vms.keys()) -
-            set(_fake_vm_id(i) for i in skip_ids)
-        )
-        for vm_id in expected:
-            assert _Visitor.VMS.get(vm_id) == 1
+    def __init__(self):
+        self.now = 100.0
 
-    def _make_fake_vms(self):
-        for i in range(VM_NUM):
-            vm_id = _fake_vm_id(i)
-            with self.cif.vm_container_lock:
-                self.cif.vmContainer[vm_id] = _FakeVM(
-                    vm_id, vm_id)
+    def __call__(self):
+        return self.now
 
 
 def _fake_vm_id(i):
@@ -484,6 +542,17 @@ class _Visitor(periodic._RunnableOnVm):
         _Visitor.VMS[self._vm.id] += 1
 
 
+class _Fast(periodic._RunnableOnVm):
+
+    VMS = defaultdict(int)
+
+    def interval(self, period):
+        return period / 2
+
+    def _execute(self):
+        _Fast.VMS[self._vm.id] += 1
+
+
 class _Nop(periodic._RunnableOnVm):
 
     @property
@@ -580,8 +649,25 @@ class _FakeDrive(object):
         self.readonly = readonly
 
 
+class _FakeDriveMonitor(object):
+
+    def __init__(self, writing=False):
+        self._writing = writing
+
+    def writing(self):
+        return self._writing
+
+
 class PeriodicActionTests(TestCaseBase):
 
+    def test_watermark_interval(self):
+        vm = _FakeVM('123', 'test')
+        vm.drive_monitor = _FakeDriveMonitor()
+        assert periodic.DriveWatermarkMonitor(vm).interval(2) == 2
+
+        vm.drive_monitor = _FakeDriveMonitor(writing=True)
+        assert periodic.DriveWatermarkMonitor(vm).interval(2) == 1
+
     def test_update_volumes(self):
         ro_drive = _FakeDrive('ro', readonly=True)
         rw_drive = _FakeDrive('rw', readonly=False)
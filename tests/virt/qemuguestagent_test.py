@@ -340,3 +340,171 @@ class QemuGuestAgentTests(TestCaseBase):
             'driver_version': '100.80.104.17300',
             'vendor_id': 6900,
         }
+
+
+class PolledVM(FakeVM):
+    def __init__(self, vm_id, fail=False):
+        super(PolledVM, self).__init__()
+        self._id = vm_id
+        self._fail = fail
+        # Not starting up, see QemuGuestAgentPoller._on_boot().
+        self.start_time = 0
+
+    @property
+    def id(self):
+        return self._id
+
+    def isDomainRunning(self):
+        return True
+
+    def qemu_agent_command(self, command, timeout, flags):
+        if self._fail:
+            raise libvirt.libvirtError("Agent not responding")
+        return super(PolledVM, self).qemu_agent_command(
+            command, timeout, flags)
+
+
+class FakeExecutor(object):
+    def __init__(self):
+        self.tasks = []
+
+    def dispatch(self, func, timeout, discard=True):
+        self.tasks.append(func)
+
+    def run(self, vm_id=None):
+        """ Run dispatched tasks, or only the tasks of vm_id. """
+        for task in list(self.tasks):
+            if vm_id is None or task._vm.id == vm_id:
+                self.tasks.remove(task)
+                task()
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@MonkeyClass(libvirt_qemu, "qemuAgentCommand", _fake_qemuAgentCommand)
+@MonkeyClass(qemuguestagent.QemuGuestAgentDomain, 'guestInfo', _dom_guestInfo)
+class QemuGuestAgentPollerTests(TestCaseBase):
+
+    INFO_PERIOD = qemuguestagent._QEMU_COMMAND_PERIODS[
+        qemuguestagent.VDSM_GUEST_INFO]
+
+    def setUp(self):
+        self.cif = fake.ClientIF()
+        self.qga_poller = qemuguestagent.QemuGuestAgentPoller(
+            self.cif, logging.getLogger("test"), None)
+        self.executor = FakeExecutor()
+        self.qga_poller._executor = self.executor
+        self.clock = FakeClock()
+
+    def test_poll_vms_concurrently(self):
+        self._add_vms(PolledVM("vm-1"), PolledVM("vm-2"))
+        self._poll()
+
+        # Every vm is polled by its own task.
+        assert len(self.executor.tasks) == 2
+        self._run()
+
+        for vm_id in ("vm-1", "vm-2"):
+            assert self.qga_poller.get_caps(vm_id)["version"] == "1.2.3"
+
+        stats = self.qga_poller.stats()["qga:guest-info"]
+        assert stats["dispatched"] == 2
+        assert stats["vms"] == 2
+
+    def test_slow_agent(self):
+        self._add_vms(PolledVM("vm-1"), PolledVM("vm-2"))
+        self._poll()
+
+        # The agent of vm-1 does not respond, vm-2 completes its poll.
+        self._run("vm-2")
+        self.clock.now += self.INFO_PERIOD
+        self._poll()
+
+        # vm-2 is polled again, vm-1 is not polled again until its previous
+        # poll has finished.
+        assert [t._vm.id for t in self.executor.tasks] == ["vm-1", "vm-2"]
+
+        # The late poll is reported.
+        self._run("vm-1")
+        stats = self.qga_poller.stats()["qga:guest-info"]
+        assert stats["lag"]["max"] == self.INFO_PERIOD
+
+    def test_backoff(self):
+        vm_id = "vm-1"
+        self._add_vms(PolledVM(vm_id, fail=True))
+        self._poll()
+        self._run()
+
+        backoff = qemuguestagent._THROTTLING_INTERVAL
+        assert self.qga_poller.backoff(vm_id) == backoff
+
+        # The agent is not queried during the backoff.
+        self.clock.now += backoff - 1
+        self._poll()
+        assert self.executor.tasks == []
+
+        # Every failed poll doubles the backoff.
+        self.clock.now += 1
+        self._poll()
+        self._run()
+        assert self.qga_poller.backoff(vm_id) == 2 * backoff
+
+        self.clock.now += backoff
+        self._poll()
+        assert self.executor.tasks == []
+
+        self.clock.now += backoff
+        self._poll()
+        self._run()
+        assert self.qga_poller.backoff(vm_id) == 4 * backoff
+
+    def test_backoff_limit(self):
+        vm_id = "vm-1"
+        self.qga_poller._failures[vm_id] = 100
+        assert self.qga_poller.backoff(vm_id) == qemuguestagent._MAX_BACKOFF
+
+    def test_backoff_reset(self):
+        vm = PolledVM("vm-1", fail=True)
+        self._add_vms(vm)
+        self._poll()
+        self._run()
+
+        # The agent was fixed.
+        vm._fail = False
+        self.clock.now += qemuguestagent._THROTTLING_INTERVAL
+        self._poll()
+        self._run()
+        assert self.qga_poller.backoff(vm.id) == \
+            qemuguestagent._THROTTLING_INTERVAL
+        assert vm.id not in self.qga_poller._failures
+
+    def test_removed_vm(self):
+        self._add_vms(PolledVM("vm-1"))
+        self._poll()
+        self._run()
+
+        del self.cif.vmContainer["vm-1"]
+        self.clock.now += self.INFO_PERIOD
+        self._poll()
+        assert self.executor.tasks == []
+
+    def _add_vms(self, *vms):
+        with self.cif.vm_container_lock:
+            for vm in vms:
+                self.cif.vmContainer[vm.id] = vm
+
+    def _poll(self):
+        with MonkeyPatchScope([
+                (qemuguestagent, "monotonic_time", self.clock)]):
+            self.qga_poller._poller()
+
+    def _run(self, vm_id=None):
+        with MonkeyPatchScope([
+                (qemuguestagent, "monotonic_time", self.clock)]):
+            self.executor.run(vm_id)
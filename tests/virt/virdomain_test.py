@@ -113,6 +113,12 @@ class TestNotifying(VdsmTestCase):
         assert self.elapsed is not None
         assert not self.elapsed
 
+    def test_oncall(self):
+        calls = []
+        dom = virdomain.Notifying(self.libvirtdom, self.tocb, calls.append)
+        dom.state(0)
+        assert calls == ['state']
+
     def test_call_timeout(self):
         def _fail(*args, **kwargs):
             e = libvirt.libvirtError("timeout")
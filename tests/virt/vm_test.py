@@ -46,6 +46,7 @@ from vdsm.common import xmlutils
 
 import vdsm.common.time
 
+from vdsm.virt import metadata
 from vdsm.virt import periodic
 from vdsm.virt import virdomain
 from vdsm.virt import vm
@@ -153,6 +154,40 @@ class TestVm(XMLTestCase):
             stats = testvm.getStats()
             assert stats['vcpuUserLimit'] == LIMIT
 
+    def test_domain_xml_not_cached(self):
+        # Changes made by the guest, like ejecting a CD-ROM, have no event,
+        # so XML passed to hooks must be fetched from libvirt.
+        with fake.VM() as testvm:
+            old_xml = fake.default_domain_xml(vm_id=testvm.id)
+            new_xml = fake.default_domain_xml(
+                vm_id=testvm.id, devices='<disk type="file" device="cdrom"/>')
+            dom = fake.Domain(xml=old_xml)
+            testvm._dom = dom
+            testvm._updateDomainDescriptor()
+            dom._xml = new_xml
+            assert testvm._domain_xml() == new_xml
+
+    def test_sync_metadata_durable(self):
+        with fake.VM() as testvm:
+            dom = fake.Domain()
+            testvm._dom = dom
+            testvm._md_syncer = metadata.Syncer(testvm._write_metadata, 60)
+            testvm.sync_metadata()
+            assert dom._metadata == ""
+            testvm.sync_metadata(durable=True)
+            assert dom._metadata != ""
+
+    def test_sync_metadata_durable_error(self):
+        with fake.VM() as testvm:
+            testvm._dom = fake.Domain()
+
+            def fail(*args, **kwargs):
+                raise libvirt.libvirtError("error")
+
+            testvm._dom.setMetadata = fail
+            with self.assertRaises(libvirt.libvirtError):
+                testvm.sync_metadata(durable=True)
+
     def testGetVmPolicySucceded(self):
         with fake.VM() as testvm:
             testvm._dom = fake.Domain()
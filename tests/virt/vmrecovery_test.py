@@ -149,6 +149,36 @@ class TestAllDomains(TestCaseBase):
         assert self.conn.domains['a'].destroyed
         assert not self.conn.domains['b'].destroyed
 
+    def test_recover_many_domains(self):
+        vm_uuids = ['vm-%02d' % i for i in range(20)]
+        self.conn.domains = _make_domains_collection(
+            [(vm_uuid, False) for vm_uuid in vm_uuids])
+        recovery.all_domains(self.cif)
+        assert set(self.cif.vmRequests.keys()) == set(vm_uuids)
+
+    def test_recover_unexpected_error(self):
+        """
+        Unexpected error recovering one domain fails the recovery, so it is
+        retried, but only after trying to recover all the other domains.
+        """
+        create_vm = self.cif.createVm
+
+        def create_fn(vmParams, vmRecover=False):
+            if vmParams['vmId'] == 'a':
+                return _error()
+            return create_vm(vmParams, vmRecover=vmRecover)
+
+        def destroy():
+            raise RuntimeError("unexpected")
+
+        self.conn.domains['a'].destroy = destroy
+        with MonkeyPatchScope([
+            (self.cif, 'createVm', create_fn)
+        ]):
+            with self.assertRaises(RuntimeError):
+                recovery.all_domains(self.cif)
+        assert set(self.cif.vmRequests.keys()) == set(('b',))
+
     def test_external_vm(self):
         vm_infos = (('a', True), ('b', False),)
         self.conn.domains = _make_domains_collection(vm_infos)